@@ -4,18 +4,72 @@ AI Action Bridge - Käsittelee Telegram-komennot ja integroi Sentinel-palveluihi
 
 import json
 import os
+import threading
+import time
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 import openai
 import asyncio
 
+from backend.llm_cache import llm_cache
+
+ACTION_TIMEOUT_SECONDS = float(os.getenv("ACTION_TIMEOUT_SECONDS", "15"))
+ACTION_CONCURRENCY = int(os.getenv("ACTION_CONCURRENCY", "8"))
+ACTION_WORKERS = int(os.getenv("ACTION_WORKERS", "16"))
+
 # Import Sentinel Integration
 try:
     from backend.sentinel_integration_simple import simple_sentinel_integration as sentinel_integration
 except ImportError:
     sentinel_integration = None
 
+@dataclass
+class ActionHandler:
+    """Rekisteröity intent-käsittelijä: kutsu (user_id, intent, params), aikaraja ja rinnakkaisuusraja"""
+    handler: Callable
+    timeout: float = ACTION_TIMEOUT_SECONDS
+    concurrency: int = ACTION_CONCURRENCY
+    semaphore: Optional[asyncio.Semaphore] = None
+
+
+class ActionLoop:
+    """Pitkäikäinen tapahtumasilmukka omassa säikeessään - ei silmukan luontia viestiä kohden"""
+    
+    def __init__(self, workers: int = ACTION_WORKERS):
+        self.workers = workers
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def get(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(ThreadPoolExecutor(self.workers, thread_name_prefix="ai-action"))
+                self.thread = threading.Thread(target=loop.run_forever, name="ai-action-loop", daemon=True)
+                self.thread.start()
+                self.loop = loop
+            return self.loop
+    
+    def submit(self, coroutine) -> Future:
+        loop = self.get()
+        if threading.current_thread() is self.thread:
+            coroutine.close()
+            raise RuntimeError("AIActionBridge.execute kutsuttu toimintosilmukasta - käytä execute_async")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+    
+    def stop(self) -> None:
+        with self._lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+                self.loop = None
+                self.thread = None
+
+
 class AIActionBridge:
     """
     AI Action Bridge - Käsittelee intentit ja suorittaa toiminnat
@@ -25,6 +79,8 @@ class AIActionBridge:
     - Sentinel service integration
     - AI-powered responses
     - User context management
+    - Async-rekisteri: käsittelijät ajetaan pitkäikäisellä silmukalla
+      intent-kohtaisin aikarajoin, rinnakkaisuusrajoin ja ajoitusmittauksin
     """
     
     def __init__(self):
@@ -38,6 +94,50 @@ class AIActionBridge:
         # User context cache
         self.user_contexts = {}
         
+        # Intent-rekisteri ja pitkäikäinen tapahtumasilmukka
+        self.action_loop = ActionLoop()
+        self.handlers: Dict[str, ActionHandler] = {}
+        self.metrics: Dict[str, Dict[str, float]] = {}
+        self._metrics_lock = threading.Lock()
+        self._register_default_handlers()
+    
+    def register(self, intent: str, handler: Callable, timeout: float = ACTION_TIMEOUT_SECONDS,
+                 concurrency: int = ACTION_CONCURRENCY) -> None:
+        """
+        Rekisteröi käsittelijän intentille
+        
+        Args:
+            intent: Intent jota käsittelijä palvelee ("UNKNOWN" = tuntemattomat)
+            handler: Sync- tai async-funktio (user_id, intent, params) -> str
+            timeout: Aikaraja sekunteina
+            concurrency: Samanaikaisten suoritusten enimmäismäärä
+        """
+        self.handlers[intent] = ActionHandler(handler, timeout, concurrency)
+    
+    def _register_default_handlers(self) -> None:
+        handlers = {
+            "START": lambda user_id, intent, params: self._handle_start(user_id),
+            "DASHBOARD": lambda user_id, intent, params: self._handle_dashboard(user_id),
+            "SET_GOAL": lambda user_id, intent, params: self._handle_set_goal(user_id, params),
+            "ONBOARDING": lambda user_id, intent, params: self._handle_onboarding(user_id),
+            "RUN_ANALYSIS": lambda user_id, intent, params: self._handle_analysis(user_id),
+            "START_CYCLE": lambda user_id, intent, params: self._handle_new_cycle(user_id),
+            "WEEK": lambda user_id, intent, params: self._handle_week(user_id, params),
+            "REPORT": lambda user_id, intent, params: self._handle_report(user_id),
+            "INCOME": lambda user_id, intent, params: self._handle_income(user_id, params),
+            "EXPENSES": lambda user_id, intent, params: self._handle_expenses(user_id, params),
+            "MOTIVATE": lambda user_id, intent, params: self._handle_motivate(user_id),
+            "HELP": lambda user_id, intent, params: self._handle_help(),
+            "SETTINGS": lambda user_id, intent, params: self._handle_settings(user_id),
+            "EXPORT": lambda user_id, intent, params: self._handle_export(user_id),
+            "DELETE": lambda user_id, intent, params: self._handle_delete(user_id),
+            "RISK": lambda user_id, intent, params: self._handle_risk(user_id),
+        }
+        for intent, handler in handlers.items():
+            self.register(intent, handler)
+        # OpenAI-vastaukset ovat hitaita ja maksullisia: tiukempi rinnakkaisuus
+        self.register("UNKNOWN", self._handle_unknown, timeout=20, concurrency=4)
+        
     def execute(self, user_id: str, intent: str, params: dict) -> str:
         """
         Suorittaa intentin ja palauttaa vastauksen
@@ -53,50 +153,81 @@ class AIActionBridge:
         try:
             # Päivitä käyttäjän konteksti
             self._update_user_context(user_id, intent, params)
-            
-            # Jos Sentinel Integration on saatavilla, käytä sitä
-            if sentinel_integration and sentinel_integration.is_initialized:
-                return asyncio.run(self._execute_with_sentinel(user_id, intent, params))
-            
-            # Fallback: Suorita intent-spesifinen toiminto
-            if intent == "START":
-                return self._handle_start(user_id)
-            elif intent == "DASHBOARD":
-                return self._handle_dashboard(user_id)
-            elif intent == "SET_GOAL":
-                return self._handle_set_goal(user_id, params)
-            elif intent == "ONBOARDING":
-                return self._handle_onboarding(user_id)
-            elif intent == "RUN_ANALYSIS":
-                return self._handle_analysis(user_id)
-            elif intent == "START_CYCLE":
-                return self._handle_new_cycle(user_id)
-            elif intent == "WEEK":
-                return self._handle_week(user_id, params)
-            elif intent == "REPORT":
-                return self._handle_report(user_id)
-            elif intent == "INCOME":
-                return self._handle_income(user_id, params)
-            elif intent == "EXPENSES":
-                return self._handle_expenses(user_id, params)
-            elif intent == "MOTIVATE":
-                return self._handle_motivate(user_id)
-            elif intent == "HELP":
-                return self._handle_help()
-            elif intent == "SETTINGS":
-                return self._handle_settings(user_id)
-            elif intent == "EXPORT":
-                return self._handle_export(user_id)
-            elif intent == "DELETE":
-                return self._handle_delete(user_id)
-            elif intent == "RISK":
-                return self._handle_risk(user_id)
-            else:
-                return self._handle_unknown(user_id, intent, params)
-                
+            return self.action_loop.submit(self._dispatch(user_id, intent, params)).result()
+        except Exception as e:
+            print(f"❌ AI Action Bridge error: {e}")
+            return self._generate_error_response(user_id, e)
+    
+    async def execute_async(self, user_id: str, intent: str, params: dict) -> str:
+        """Kuten execute, mutta odotettavissa mistä tahansa tapahtumasilmukasta"""
+        self._update_user_context(user_id, intent, params)
+        if asyncio.get_running_loop() is self.action_loop.get():
+            return await self._dispatch(user_id, intent, params)
+        return await asyncio.wrap_future(self.action_loop.submit(self._dispatch(user_id, intent, params)))
+    
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Intent-kohtaiset suoritusajat ja virhemäärät"""
+        with self._metrics_lock:
+            return {
+                intent: {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'timeouts': stats['timeouts'],
+                    'avg_ms': round(stats['total_seconds'] / stats['count'] * 1000, 2),
+                    'max_ms': round(stats['max_seconds'] * 1000, 2)
+                }
+                for intent, stats in self.metrics.items()
+            }
+    
+    def _handler_for(self, intent: str) -> ActionHandler:
+        return self.handlers.get(intent) or self.handlers["UNKNOWN"]
+    
+    async def _dispatch(self, user_id: str, intent: str, params: dict) -> str:
+        """Suorittaa käsittelijän aikarajan ja rinnakkaisuusrajan sisällä ja mittaa keston"""
+        action = self._handler_for(intent)
+        if action.semaphore is None:
+            action.semaphore = asyncio.Semaphore(action.concurrency)
+        
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            async with action.semaphore:
+                # Jos Sentinel Integration on saatavilla, käytä sitä
+                if sentinel_integration and sentinel_integration.is_initialized:
+                    coroutine = self._execute_with_sentinel(user_id, intent, params)
+                else:
+                    coroutine = self._run_handler(action, user_id, intent, params)
+                return await asyncio.wait_for(coroutine, action.timeout)
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            return f"⏱️ Toiminto {intent} kesti liian kauan. Yritä hetken päästä uudelleen."
         except Exception as e:
+            outcome = 'error'
             print(f"❌ AI Action Bridge error: {e}")
             return self._generate_error_response(user_id, e)
+        finally:
+            self._record_timing(intent if intent in self.handlers else "UNKNOWN",
+                                time.perf_counter() - started, outcome)
+    
+    async def _run_handler(self, action: ActionHandler, user_id: str, intent: str, params: dict) -> str:
+        """Async-käsittelijät odotetaan suoraan, blokkaavat ajetaan säiepoolissa"""
+        if asyncio.iscoroutinefunction(action.handler):
+            return await action.handler(user_id, intent, params)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, action.handler, user_id, intent, params)
+    
+    def _record_timing(self, intent: str, seconds: float, outcome: str) -> None:
+        with self._metrics_lock:
+            stats = self.metrics.setdefault(intent, {
+                'count': 0, 'errors': 0, 'timeouts': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+            })
+            stats['count'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome == 'timeout':
+                stats['timeouts'] += 1
     
     def _handle_start(self, user_id: str) -> str:
         """Käsittelee /start komennon"""
@@ -565,13 +696,11 @@ Viikko 7: Optimointi ja seuraava sykli
         if self.openai_key:
             # Käytä OpenAI:tä ymmärtämään intent
             try:
-                response = openai.Completion.create(
-                    engine="text-davinci-003",
-                    prompt=f"Käyttäjä kirjoitti: '{intent}'. Mikä on hänen intenttinsa? Vastaa suomeksi ystävällisesti ja ohjaa käyttämään /help komentoa.",
+                return llm_cache.completion(
+                    f"Käyttäjä kirjoitti: '{intent}'. Mikä on hänen intenttinsa? Vastaa suomeksi ystävällisesti ja ohjaa käyttämään /help komentoa.",
                     max_tokens=100,
                     temperature=0.7
-                )
-                return response.choices[0].text.strip()
+                ).strip()
             except:
                 pass
         
@@ -599,29 +728,38 @@ Viikko 7: Optimointi ja seuraava sykli
         """.strip()
     
     async def _execute_with_sentinel(self, user_id: str, intent: str, params: dict) -> str:
-        """Suorittaa intentin Sentinel Integration:in kanssa"""
+        """
+        Suorittaa intentin Sentinel Integration:in kanssa
+        
+        Ajetaan jaetulla toimintosilmukalla; Sentinel-palvelut siirtävät omat
+        blokkaavat SDK-kutsunsa säiepooliin.
+        """
         try:
-            # Muodosta viesti intentin perusteella
-            message = self._intent_to_message(intent, params)
-            
-            # Käytä Sentinel Integration:ia käsittelemään viesti
-            response = await sentinel_integration.process_user_message(user_id, message)
-            
-            # Jos intent on spesifinen, lisää intent-spesifinen sisältö
-            if intent == "DASHBOARD":
-                dashboard_data = await sentinel_integration.get_dashboard_data(user_id)
-                response += f"\n\n📊 Palveluiden status: {len(dashboard_data.get('services_status', {}))} aktiivista"
-            
-            elif intent == "RUN_ANALYSIS":
-                analysis_result = await sentinel_integration.run_analysis(user_id)
-                response += f"\n\n🔍 Analyysi suoritettu: {len(analysis_result.get('services_used', []))} palvelua käytetty"
-            
-            return response
+            return await self._sentinel_response(user_id, intent, params)
             
         except Exception as e:
             print(f"❌ Virhe Sentinel Integration:in kanssa: {e}")
             # Fallback perinteiseen metodiin
-            return self._execute_fallback(user_id, intent, params)
+            return await self._execute_fallback(user_id, intent, params)
+    
+    async def _sentinel_response(self, user_id: str, intent: str, params: dict) -> str:
+        """Muodostaa vastauksen Sentinel Integration:in palveluilla"""
+        # Muodosta viesti intentin perusteella
+        message = self._intent_to_message(intent, params)
+        
+        # Käytä Sentinel Integration:ia käsittelemään viesti
+        response = await sentinel_integration.process_user_message(user_id, message)
+        
+        # Jos intent on spesifinen, lisää intent-spesifinen sisältö
+        if intent == "DASHBOARD":
+            dashboard_data = await sentinel_integration.get_dashboard_data(user_id)
+            response += f"\n\n📊 Palveluiden status: {len(dashboard_data.get('services_status', {}))} aktiivista"
+        
+        elif intent == "RUN_ANALYSIS":
+            analysis_result = await sentinel_integration.run_analysis(user_id)
+            response += f"\n\n🔍 Analyysi suoritettu: {len(analysis_result.get('services_used', []))} palvelua käytetty"
+        
+        return response
     
     def _intent_to_message(self, intent: str, params: dict) -> str:
         """Muuntaa intentin viestiksi"""
@@ -664,42 +802,9 @@ Viikko 7: Optimointi ja seuraava sykli
         else:
             return f"Tuntematon komento: {intent}"
     
-    def _execute_fallback(self, user_id: str, intent: str, params: dict) -> str:
+    async def _execute_fallback(self, user_id: str, intent: str, params: dict) -> str:
         """Fallback perinteiseen metodiin"""
-        if intent == "START":
-            return self._handle_start(user_id)
-        elif intent == "DASHBOARD":
-            return self._handle_dashboard(user_id)
-        elif intent == "SET_GOAL":
-            return self._handle_set_goal(user_id, params)
-        elif intent == "ONBOARDING":
-            return self._handle_onboarding(user_id)
-        elif intent == "RUN_ANALYSIS":
-            return self._handle_analysis(user_id)
-        elif intent == "START_CYCLE":
-            return self._handle_new_cycle(user_id)
-        elif intent == "WEEK":
-            return self._handle_week(user_id, params)
-        elif intent == "REPORT":
-            return self._handle_report(user_id)
-        elif intent == "INCOME":
-            return self._handle_income(user_id, params)
-        elif intent == "EXPENSES":
-            return self._handle_expenses(user_id, params)
-        elif intent == "MOTIVATE":
-            return self._handle_motivate(user_id)
-        elif intent == "HELP":
-            return self._handle_help()
-        elif intent == "SETTINGS":
-            return self._handle_settings(user_id)
-        elif intent == "EXPORT":
-            return self._handle_export(user_id)
-        elif intent == "DELETE":
-            return self._handle_delete(user_id)
-        elif intent == "RISK":
-            return self._handle_risk(user_id)
-        else:
-            return self._handle_unknown(user_id, intent, params)
+        return await self._run_handler(self._handler_for(intent), user_id, intent, params)
 
     def _update_user_context(self, user_id: str, intent: str, params: dict):
         """Päivittää käyttäjän kontekstin"""
@@ -1,94 +1,238 @@
 import re
 import os
+import json
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
 import openai
 
-class IntentEngine:
+from backend.llm_cache import llm_cache
+
+# Avainsanat prioriteettijärjestyksessä: jos viestissä on usean intentin avainsanoja,
+# voittaa ylimpänä listattu (sama järjestys kuin alkuperäisessä if-ketjussa)
+INTENT_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("SET_GOAL", ["/setgoal", "tavoite"]),
+    ("ONBOARDING", ["/onboarding", "aloita onboarding"]),
+    ("DASHBOARD", ["/dashboard", "dashboard", "tilannekatsaus"]),
+    ("START", ["/start"]),
+    ("RUN_ANALYSIS", ["/analyysi", "analyysi", "/runanalysis"]),
+    ("START_CYCLE", ["/cycle", "aloita uusi sykli", "/newcycle"]),
+    ("WEEK", ["/week", "viikko"]),
+    ("REPORT", ["/report", "raportti"]),
+    ("INCOME", ["/income", "tulot"]),
+    ("EXPENSES", ["/expenses", "menot"]),
+    ("MOTIVATE", ["/motivate", "motivo"]),
+    ("HELP", ["/help", "apua"]),
+    ("SETTINGS", ["/settings", "asetukset"]),
+    ("EXPORT", ["/export", "vie profiili"]),
+    ("DELETE", ["/delete", "poista profiili"]),
+    ("RISK", ["/risk", "riskini", "riskianalyysi"]),
+]
+INTENTS = [intent for intent, _ in INTENT_KEYWORDS]
+SLOT_INTENTS = {"SET_GOAL", "INCOME", "EXPENSES", "WEEK"}
+
+AMOUNT_PATTERN = re.compile(r"(\d+)")
+WEEK_PATTERN = re.compile(r"viikko\s*(\d+)")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+LLM_THRESHOLD = float(os.getenv("INTENT_LLM_THRESHOLD", "0.5"))
+CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "4096"))
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", os.path.join("data", "intent_log.jsonl"))
+MAX_TRAINING_EXAMPLES = 20000
+
+
+class IntentResult(NamedTuple):
+    intent: str
+    confidence: float
+    slots: Dict
+
+
+class KeywordAutomaton:
+    """Aho-Corasick-automaatti: kaikki avainsanat löydetään yhdellä läpikäynnillä"""
+
+    def __init__(self, keywords: List[Tuple[str, int]]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        for keyword, value in keywords:
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(value)
+
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str) -> set:
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            found.update(self.output[state])
+        return found
+
+
+class TfidfIntentModel:
+    """Pieni TF-IDF + lineaarinen (sentroidi) luokittelija lokitetuista viesteistä"""
+
     def __init__(self):
+        self.idf: Dict[str, float] = {}
+        self.centroids: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def features(text: str) -> Counter:
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        # Sanan alku kattaa suomen taivutusmuodot (tuloni -> tulo)
+        return Counter(tokens + ["~" + token[:4] for token in tokens if len(token) > 4])
+
+    def vectorize(self, text: str) -> Dict[str, float]:
+        vector = {
+            feature: (1 + math.log(count)) * self.idf[feature]
+            for feature, count in self.features(text).items() if feature in self.idf
+        }
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {feature: value / norm for feature, value in vector.items()} if norm else {}
+
+    def train(self, examples: List[Tuple[str, str]]) -> None:
+        documents = [(self.features(text), intent) for text, intent in examples]
+        document_frequency = Counter(feature for features, _ in documents for feature in features)
+        self.idf = {
+            feature: math.log((1 + len(documents)) / (1 + frequency)) + 1
+            for feature, frequency in document_frequency.items()
+        }
+
+        sums: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for text, intent in examples:
+            for feature, value in self.vectorize(text).items():
+                sums[intent][feature] += value
+        self.centroids = {}
+        for intent, vector in sums.items():
+            norm = math.sqrt(sum(value * value for value in vector.values()))
+            self.centroids[intent] = {feature: value / norm for feature, value in vector.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        vector = self.vectorize(text)
+        best_intent, best_score = "UNKNOWN", 0.0
+        for intent, centroid in self.centroids.items():
+            score = sum(value * centroid.get(feature, 0.0) for feature, value in vector.items())
+            if score > best_score:
+                best_intent, best_score = intent, score
+        return best_intent, best_score
+
+
+class IntentEngine:
+    def __init__(self, log_path: Optional[str] = INTENT_LOG_PATH, threshold: float = LLM_THRESHOLD,
+                 cache_size: int = CACHE_SIZE):
         self.openai_key = os.getenv("OPENAI_API_KEY")
         if self.openai_key:
             openai.api_key = self.openai_key
+        self.log_path = log_path
+        self.threshold = threshold
+        self.automaton = KeywordAutomaton([
+            (keyword, priority)
+            for priority, (_, keywords) in enumerate(INTENT_KEYWORDS) for keyword in keywords
+        ])
+        self.model = TfidfIntentModel()
+        self.retrain()
+        self._analyze_cached = lru_cache(maxsize=cache_size)(self._analyze)
+
+    def analyze(self, message: str) -> IntentResult:
+        """Intentti, varmuus ja parametrit yhdellä läpikäynnillä (LRU-välimuistissa)"""
+        result = self._analyze_cached(message.strip().lower())
+        return result._replace(slots=dict(result.slots))
 
     def detect_intent(self, message: str) -> str:
-        msg = message.lower()
-        # Komentopohjaiset intentit (regex)
-        if "/setgoal" in msg or "tavoite" in msg:
-            return "SET_GOAL"
-        if "/onboarding" in msg or "aloita onboarding" in msg:
-            return "ONBOARDING"
-        if "/dashboard" in msg or "dashboard" in msg or "tilannekatsaus" in msg:
-            return "DASHBOARD"
-        if "/start" in msg:
-            return "START"
-        if "/analyysi" in msg or "analyysi" in msg or "/runanalysis" in msg:
-            return "RUN_ANALYSIS"
-        if "/cycle" in msg or "aloita uusi sykli" in msg or "/newcycle" in msg:
-            return "START_CYCLE"
-        if "/week" in msg or "viikko" in msg:
-            return "WEEK"
-        if "/report" in msg or "raportti" in msg:
-            return "REPORT"
-        if "/income" in msg or "tulot" in msg:
-            return "INCOME"
-        if "/expenses" in msg or "menot" in msg:
-            return "EXPENSES"
-        if "/motivate" in msg or "motivo" in msg:
-            return "MOTIVATE"
-        if "/help" in msg or "apua" in msg:
-            return "HELP"
-        if "/settings" in msg or "asetukset" in msg:
-            return "SETTINGS"
-        if "/export" in msg or "vie profiili" in msg:
-            return "EXPORT"
-        if "/delete" in msg or "poista profiili" in msg:
-            return "DELETE"
-        if "/risk" in msg or "riskini" in msg or "riskianalyysi" in msg:
-            return "RISK"
-        # Universaali fallback: OpenAI intent tunnistus
-        if self.openai_key:
-            return self.openai_intent(message)
-        return "UNKNOWN"
+        return self.analyze(message).intent
 
     def extract_parameters(self, message: str, intent: str) -> dict:
+        result = self.analyze(message)
+        if result.intent == intent:
+            return result.slots
+        return self._slots(message.strip().lower(), intent, confident=True)
+
+    def retrain(self) -> None:
+        """Kouluttaa TF-IDF-mallin avainsanoista ja lokitetuista viesteistä"""
+        examples = [
+            (keyword.lstrip("/"), intent) for intent, keywords in INTENT_KEYWORDS for keyword in keywords
+        ]
+        if self.log_path and os.path.exists(self.log_path):
+            with open(self.log_path, encoding="utf-8") as log_file:
+                lines = log_file.readlines()[-MAX_TRAINING_EXAMPLES:]
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("intent") in INTENTS:
+                    examples.append((entry["message"], entry["intent"]))
+        self.model.train(examples)
+        if hasattr(self, "_analyze_cached"):
+            self._analyze_cached.cache_clear()
+
+    def log_example(self, message: str, intent: str) -> None:
+        if not self.log_path or intent not in INTENTS:
+            return
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps({"message": message, "intent": intent}, ensure_ascii=False) + "\n")
+
+    def _analyze(self, msg: str) -> IntentResult:
+        matches = self.automaton.search(msg)
+        if matches:
+            intent, confidence = INTENTS[min(matches)], 1.0
+        else:
+            intent, confidence = self.model.predict(msg)
+            if confidence < self.threshold:
+                # Universaali fallback: OpenAI intent tunnistus vain epävarmoille viesteille
+                intent = self.openai_intent(msg) if self.openai_key else "UNKNOWN"
+                if intent != "UNKNOWN":
+                    self.log_example(msg, intent)
+        return IntentResult(intent, confidence, self._slots(msg, intent, confidence >= self.threshold))
+
+    def _slots(self, msg: str, intent: str, confident: bool) -> dict:
         params = {}
         # Regex-parametrit
         if intent in ["SET_GOAL", "INCOME", "EXPENSES"]:
-            match = re.search(r"(\d+)", message)
+            match = AMOUNT_PATTERN.search(msg)
             if match:
                 params["amount"] = int(match.group(1))
         if intent == "WEEK":
-            match = re.search(r"viikko\s*(\d+)", message)
+            match = WEEK_PATTERN.search(msg)
             if match:
                 params["week"] = int(match.group(1))
-        # Universaali fallback: OpenAI parametrihaku
-        if self.openai_key and not params:
-            params = self.openai_parameters(message, intent)
+        # OpenAI parametrihaku vain epävarmoille viesteille jotka tarvitsevat parametreja
+        if self.openai_key and not params and not confident and intent in SLOT_INTENTS:
+            params = self.openai_parameters(msg, intent)
         return params
 
     def openai_intent(self, message: str) -> str:
         prompt = f"Mikä on seuraavan viestin intentti? Vastaa vain yhdellä sanalla (esim. SET_GOAL, INCOME, EXPENSES, REPORT, MOTIVATE, HELP, START_CYCLE, RUN_ANALYSIS, DASHBOARD, ONBOARDING, SETTINGS, EXPORT, DELETE, RISK, UNKNOWN). Viesti: '{message}'"
         try:
-            response = openai.Completion.create(
-                engine="text-davinci-003",
-                prompt=prompt,
-                max_tokens=10,
-                temperature=0
-            )
-            intent = response.choices[0].text.strip().upper()
-            return intent if intent else "UNKNOWN"
+            intent = llm_cache.completion(prompt, max_tokens=10).strip().upper()
+            return intent if intent in INTENTS else "UNKNOWN"
         except Exception:
             return "UNKNOWN"
 
     def openai_parameters(self, message: str, intent: str) -> dict:
         prompt = f"Poimi intentin '{intent}' tarvitsemat parametrit viestistä: '{message}'. Palauta JSON-muodossa. Esim. {{\"amount\": 20000}} tai {{}} jos ei löydy."
         try:
-            response = openai.Completion.create(
-                engine="text-davinci-003",
-                prompt=prompt,
-                max_tokens=30,
-                temperature=0
-            )
-            import json
-            params = json.loads(response.choices[0].text.strip())
+            params = json.loads(llm_cache.completion(prompt, max_tokens=30).strip())
             return params if isinstance(params, dict) else {}
         except Exception:
-            return {} 
\ No newline at end of file
+            return {}
@@ -0,0 +1,148 @@
+"""
+LLM Response Cache - Välimuisti ja pyyntöjen yhdistäminen OpenAI-kutsuille
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class _Flight:
+    """Käynnissä oleva upstream-kutsu jota samanaikaiset pyynnöt odottavat"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class LLMResponseCache:
+    """
+    LRU + TTL -välimuisti LLM-vastauksille normalisoidun kehotteen perusteella.
+
+    Kehotteet normalisoidaan (kirjainkoko, välilyönnit) ennen avaimen laskemista,
+    joten lähes identtiset kysymykset osuvat samaan vastaukseen. Samanaikaiset
+    identtiset pyynnöt yhdistetään (single-flight): vain ensimmäinen tekee
+    upstream-kutsun ja muut odottavat sen tulosta. Virheitä ei tallenneta.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream_seconds = 0.0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return WHITESPACE_PATTERN.sub(" ", str(text).strip().lower())
+
+    def make_key(self, *parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_or_call(self, key: str, call: Callable[[], Any]) -> Any:
+        """Palauttaa välimuistissa olevan arvon tai kutsuu call():ia (korkeintaan kerran per avain)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.perf_counter()
+        try:
+            flight.value = call()
+        except BaseException as error:
+            flight.error = error
+            with self._lock:
+                self.errors += 1
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), flight.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return flight.value
+        finally:
+            with self._lock:
+                self.upstream_seconds += time.perf_counter() - started
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def chat_completion(self, messages: List[Dict[str, str]], model: str = "gpt-3.5-turbo",
+                        max_tokens: int = 100, temperature: float = 0.7) -> str:
+        """openai.ChatCompletion.create välimuistin kautta, palauttaa vastaustekstin"""
+        key = self.make_key(
+            "chat", model, max_tokens,
+            [(message["role"], self.normalize(message["content"])) for message in messages]
+        )
+        return self.get_or_call(key, lambda: openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        ).choices[0].message.content)
+
+    def completion(self, prompt: str, engine: str = "text-davinci-003", max_tokens: int = 10,
+                   temperature: float = 0) -> str:
+        """openai.Completion.create välimuistin kautta, palauttaa vastaustekstin"""
+        key = self.make_key("completion", engine, max_tokens, self.normalize(prompt))
+        return self.get_or_call(key, lambda: openai.Completion.create(
+            engine=engine,
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        ).choices[0].text)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+                "avg_upstream_ms": round(self.upstream_seconds / self.misses * 1000, 2) if self.misses else 0.0
+            }
+
+
+llm_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 2048)),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", 3600))
+)
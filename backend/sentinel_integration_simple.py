@@ -172,7 +172,9 @@ Konteksti:
 Vastaa suomeksi ystävällisesti ja auttavasti. Ole konkreettinen ja anna käytännön neuvoja.
             """
             
-            response = openai.Completion.create(
+            # Blokkaava SDK-kutsu säiepoolissa, ettei kutsujan tapahtumasilmukka pysähdy
+            response = await asyncio.to_thread(
+                openai.Completion.create,
                 engine="text-davinci-003",
                 prompt=prompt,
                 max_tokens=150,
@@ -5,6 +5,5 @@ intent_engine = IntentEngine()
 ai_bridge = AIActionBridge()
 
 def handle_message(user_id: str, message: str) -> str:
-    intent = intent_engine.detect_intent(message)
-    params = intent_engine.extract_parameters(message, intent)
-    return ai_bridge.execute(user_id, intent, params) 
\ No newline at end of file
+    result = intent_engine.analyze(message)
+    return ai_bridge.execute(user_id, result.intent, result.slots)
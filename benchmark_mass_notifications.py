@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Mass notification throughput benchmark.
+
+Starts a local stub of the Telegram sendMessage endpoint that enforces a
+global rate limit (answering 429 + retry_after like Telegram does) and runs
+MassNotificationManager against it with synthetic users.
+
+Usage: python benchmark_mass_notifications.py [users] [stub_rate_per_second]
+"""
+
+import os
+import sys
+import time
+import threading
+import asyncio
+
+from aiohttp import web
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+STUB_RATE = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+PORT = 18081
+
+def run_stub_server(stats):
+    """Telegram-like stub: accept STUB_RATE messages/second, 429 above that"""
+    window = {"second": 0, "count": 0}
+    
+    async def send_message(request):
+        await request.json()
+        now = int(time.monotonic())
+        if window["second"] != now:
+            window["second"], window["count"] = now, 0
+        window["count"] += 1
+        if window["count"] > STUB_RATE:
+            stats["rejected"] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}, status=429)
+        stats["accepted"] += 1
+        return web.json_response({"ok": True})
+    
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = web.Application()
+    server.router.add_post("/bot{token}/sendMessage", send_message)
+    runner = web.AppRunner(server)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", PORT).start())
+    loop.run_forever()
+
+if __name__ == "__main__":
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{PORT}"
+    
+    stats = {"accepted": 0, "rejected": 0}
+    threading.Thread(target=run_stub_server, args=(stats,), daemon=True).start()
+    time.sleep(0.5)
+    
+    from sentinel_render_ready import mass_notification_manager
+    
+    users = [{"telegram_id": 10_000 + i, "email": f"bench{i}@example.com", "name": f"Bench {i}"}
+             for i in range(USERS)]
+    results = mass_notification_manager.send_mass_notification(
+        "custom_message", "Benchmark", broadcast_id=f"benchmark_{int(time.time())}", users=users)
+    
+    print(f"\n📊 {USERS} users, stub limit {STUB_RATE}/s")
+    print(f"   sent: {results['successful']}  failed: {results['failed']}  429 retries: {results['retries_429']}")
+    print(f"   elapsed: {results['elapsed_seconds']}s  throughput: {results['messages_per_second']} msg/s")
+    print(f"   stub accepted: {stats['accepted']}  rejected: {stats['rejected']}")
@@ -2,12 +2,14 @@
 Dashboard API routes for financial analytics, summaries, and insights.
 """
 from datetime import datetime, date, timedelta
+from types import SimpleNamespace
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import func, and_, extract
 from app.schemas import DashboardSummary, MonthlyTrend, CategoryBreakdown, GoalProgress
 from app.models import Transaction, Category, User, Goal, AgentState
 from app.db.init_db import get_db
 from app.api.auth import get_current_user
+from app.services.rollup_service import rollup_service, month_key, month_start
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,38 +28,36 @@ async def get_dashboard_summary(period_days=Query(30, ge=1, le=365, description=
         # Calculate date range
         end_date = datetime.now()
         start_date = end_date - timedelta(days=period_days)
+        prev_start = start_date - timedelta(days=period_days)
         
-        # Get transactions for the period
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date <= end_date
-        ).all()
+        # Whole months come from the rollup table, partial edge months from raw rows
+        period_totals = rollup_service.get_range_totals(db, current_user.id, start_date, end_date)
+        categories = _category_metadata(db, period_totals)
         
         # Calculate basic metrics
-        total_income = sum(abs(txn.amount) for txn in transactions if txn.amount < 0)
-        total_expenses = sum(txn.amount for txn in transactions if txn.amount > 0)
+        total_income = sum(row.total_amount for row in period_totals if row.is_income)
+        total_expenses = sum(row.total_amount for row in period_totals if not row.is_income)
         net_amount = total_income - total_expenses
-        transaction_count = len(transactions)
+        transaction_count = sum(row.transaction_count for row in period_totals)
         
         # Calculate average daily spending
         avg_daily_spending = total_expenses / period_days if period_days > 0 else 0
         
         # Get category breakdown
         category_stats = {}
-        for txn in transactions:
-            if txn.category:
-                category_name = txn.category.name
-                if category_name not in category_stats:
-                    category_stats[category_name] = {
+        for row in period_totals:
+            category = categories.get(row.category_id)
+            if category:
+                if category.name not in category_stats:
+                    category_stats[category.name] = {
                         "amount": 0,
                         "count": 0,
-                        "type": txn.category.type,
-                        "color": txn.category.color
+                        "type": category.type,
+                        "color": category.color
                     }
                 
-                category_stats[category_name]["amount"] += abs(txn.amount)
-                category_stats[category_name]["count"] += 1
+                category_stats[category.name]["amount"] += row.total_amount
+                category_stats[category.name]["count"] += row.transaction_count
         
         # Get monthly trends (last 6 months)
         monthly_trends = await _get_monthly_trends(current_user.id, db)
@@ -74,14 +74,8 @@ async def get_dashboard_summary(period_days=Query(30, ge=1, le=365, description=
         agent_message = _generate_agent_message(net_amount, agent_mood, goal_progress)
         
         # Previous period comparison
-        prev_start = start_date - timedelta(days=period_days)
-        prev_transactions = db.query(Transaction).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_date >= prev_start,
-            Transaction.transaction_date < start_date
-        ).all()
-        
-        prev_expenses = sum(txn.amount for txn in prev_transactions if txn.amount > 0)
+        prev_totals = rollup_service.get_range_totals(db, current_user.id, prev_start, start_date, inclusive_end=False)
+        prev_expenses = sum(row.total_amount for row in prev_totals if not row.is_income)
         expense_change = ((total_expenses - prev_expenses) / prev_expenses * 100) if prev_expenses > 0 else 0
         
         return DashboardSummary(
@@ -145,49 +139,47 @@ async def get_category_breakdown(period_days=Query(30, ge=1, le=365, description
         end_date = datetime.now()
         start_date = end_date - timedelta(days=period_days)
         
-        # Build query
-        query = db.query(
-            Category.id,
-            Category.name,
-            Category.type,
-            Category.color,
-            func.count(Transaction.id).label('transaction_count'),
-            func.sum(func.abs(Transaction.amount)).label('total_amount'),
-            func.avg(func.abs(Transaction.amount)).label('avg_amount'),
-            func.max(Transaction.transaction_date).label('last_transaction')
-        ).join(
-            Transaction, Transaction.category_id == Category.id
-        ).filter(
-            Transaction.user_id == current_user.id,
-            Transaction.transaction_date >= start_date,
-            Transaction.transaction_date <= end_date
-        ).group_by(
-            Category.id, Category.name, Category.type, Category.color
-        )
-        
-        if transaction_type:
-            query = query.filter(Category.type == transaction_type)
+        # Roll the range totals up per category
+        totals = rollup_service.get_range_totals(db, current_user.id, start_date, end_date)
+        metadata = _category_metadata(db, totals)
+        categories = {}
+        for row in totals:
+            category = metadata.get(row.category_id)
+            if category is None:
+                continue
+            if transaction_type and category.type != transaction_type:
+                continue
+            stats = categories.setdefault(row.category_id, {
+                "name": category.name,
+                "type": category.type,
+                "color": category.color,
+                "total_amount": 0.0,
+                "transaction_count": 0,
+                "last_transaction": None
+            })
+            stats["total_amount"] += row.total_amount
+            stats["transaction_count"] += row.transaction_count
+            if stats["last_transaction"] is None or row.last_transaction > stats["last_transaction"]:
+                stats["last_transaction"] = row.last_transaction
         
-        results = query.order_by(
-            func.sum(func.abs(Transaction.amount)).desc()
-        ).all()
+        results = sorted(categories.items(), key=lambda item: item[1]["total_amount"], reverse=True)
         
         # Calculate total for percentages
-        total_amount = sum(result.total_amount for result in results)
+        total_amount = sum(stats["total_amount"] for _, stats in results)
         
         return [
             CategoryBreakdown(
-                category_id=result.id,
-                category_name=result.name,
-                category_type=result.type,
-                category_color=result.color,
-                total_amount=float(result.total_amount),
-                transaction_count=result.transaction_count,
-                average_amount=float(result.avg_amount),
-                percentage=(result.total_amount / total_amount * 100) if total_amount > 0 else 0,
-                last_transaction=result.last_transaction
+                category_id=category_id,
+                category_name=stats["name"],
+                category_type=stats["type"],
+                category_color=stats["color"],
+                total_amount=stats["total_amount"],
+                transaction_count=stats["transaction_count"],
+                average_amount=stats["total_amount"] / stats["transaction_count"],
+                percentage=(stats["total_amount"] / total_amount * 100) if total_amount > 0 else 0,
+                last_transaction=stats["last_transaction"]
             )
-            for result in results
+            for category_id, stats in results
         ]
         
     except Exception as e:
@@ -396,42 +388,55 @@ async def get_agent_message(current_user=Depends(get_current_user), db=Depends(g
 
 async def _get_monthly_trends(user_id, db, months=6) -> None:
     """Get monthly trends for the specified number of months."""
-    trends = []
+    month_starts = _month_starts(months)
+    totals = {month_key(start): {"income": 0.0, "expenses": 0.0, "count": 0} for start in month_starts}
     
-    for i in range(months):
-        # Calculate month start/end dates
-        current_date = datetime.now().replace(day=1) - timedelta(days=i*30)
-        month_start = current_date.replace(day=1)
-        
-        if current_date.month == 12:
-            next_month = current_date.replace(year=current_date.year + 1, month=1)
-        else:
-            next_month = current_date.replace(month=current_date.month + 1)
-        
-        month_end = next_month - timedelta(days=1)
-        
-        # Get transactions for the month
-        transactions = db.query(Transaction).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= month_start,
-            Transaction.transaction_date <= month_end
-        ).all()
-        
-        income = sum(abs(txn.amount) for txn in transactions if txn.amount < 0)
-        expenses = sum(txn.amount for txn in transactions if txn.amount > 0)
-        
-        trends.insert(0, MonthlyTrend(  # Insert at beginning to maintain chronological order
-            month=month_start.strftime("%Y-%m"),
-            month_name=month_start.strftime("%B %Y"),
-            income=income,
-            expenses=expenses,
-            net_amount=income - expenses,
-            transaction_count=len(transactions)
+    # Read the monthly rollups - a few rows per month regardless of transaction volume
+    for rollup in rollup_service.get_months(db, user_id, month_key(month_starts[0]), month_key(month_starts[-1])):
+        month_totals = totals[rollup.month]
+        month_totals["income" if rollup.is_income else "expenses"] += rollup.total_amount
+        month_totals["count"] += rollup.transaction_count
+    
+    trends = []
+    for start in month_starts:
+        month_totals = totals[month_key(start)]
+        trends.append(MonthlyTrend(
+            month=start.strftime("%Y-%m"),
+            month_name=start.strftime("%B %Y"),
+            income=month_totals["income"],
+            expenses=month_totals["expenses"],
+            net_amount=month_totals["income"] - month_totals["expenses"],
+            transaction_count=month_totals["count"]
         ))
     
     return trends
 
 
+def _month_starts(months):
+    """First day of each of the last `months` calendar months, oldest first."""
+    starts = [month_start(datetime.now())]
+    for _ in range(months - 1):
+        starts.insert(0, month_start(starts[0] - timedelta(days=1)))
+    return starts
+
+
+def _category_metadata(db, rows):
+    """Name, type and color for the categories referenced by aggregated rows."""
+    category_ids = {row.category_id for row in rows if row.category_id is not None}
+    if not category_ids:
+        return {}
+    return {
+        category.id: SimpleNamespace(
+            name=category.name,
+            type="income" if category.is_income else "expense",
+            color=category.color
+        )
+        for category in db.query(Category.id, Category.name, Category.is_income, Category.color).filter(
+            Category.id.in_(category_ids)
+        ).all()
+    }
+
+
 async def _get_goal_progress(user_id, db):
     """Get progress for all user goals."""
     goals = db.query(Goal).filter(Goal.user_id == user_id).all()
@@ -321,6 +321,7 @@ async def reset_learning(db=Depends(get_db), current_user=Depends(get_current_us
             del learning_engine.user_patterns[user_id]
         if user_id in learning_engine.learning_history:
             del learning_engine.learning_history[user_id]
+        learning_engine.invalidate_user_models(user_id)
         
         # Alusta uudelleen
         learning_engine.initialize_user_learning(user_id, db)
@@ -2,6 +2,7 @@
 Transaction management API routes for CRUD operations, categorization, and filtering.
 """
 from datetime import datetime, date
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy import and_, or_, func
 from app.schemas import (
@@ -9,7 +10,7 @@ from app.schemas import (
     TransactionFilters, TransactionStats, CategorySuggestion
 )
 from app.models import Transaction, Category, User, CategoryCorrection
-from app.services import TransactionCategorizationService
+from app.services import TransactionCategorizationService, rollup_service
 from app.db.init_db import get_db
 from app.api.auth import get_current_user
 import logging
@@ -57,6 +58,7 @@ async def create_transaction(transaction_data, current_user=Depends(get_current_
         )
         
         db.add(transaction)
+        rollup_service.add_transaction(db, transaction)
         db.commit()
         db.refresh(transaction)
         
@@ -216,6 +218,7 @@ async def update_transaction(transaction_id, transaction_data, current_user=Depe
         
         # Store original category for correction tracking
         original_category_id = transaction.category_id
+        original = rollup_service.snapshot(transaction)
         
         # Update fields
         if transaction_data.amount is not None:
@@ -249,6 +252,7 @@ async def update_transaction(transaction_id, transaction_data, current_user=Depe
             transaction.status = transaction_data.status
         
         transaction.updated_at = datetime.utcnow()
+        _move_rollup(db, original, transaction)
         db.commit()
         db.refresh(transaction)
         
@@ -296,6 +300,7 @@ async def delete_transaction(transaction_id, current_user=Depends(get_current_us
                 detail="Transaction not found"
             )
         
+        rollup_service.remove_transaction(db, transaction)
         db.delete(transaction)
         db.commit()
         
@@ -312,41 +317,35 @@ async def delete_transaction(transaction_id, current_user=Depends(get_current_us
 
 
 @router.get("/stats/summary", response_model=TransactionStats)
-async def get_transaction_stats(date_from=Query(None), date_to=Query(None), current_user=Depends(get_current_user), db=Depends(get_db)):
+async def get_transaction_stats(date_from: Optional[datetime] = Query(None), date_to: Optional[datetime] = Query(None), current_user=Depends(get_current_user), db=Depends(get_db)):
     """
     Get transaction statistics for the current user.
     
     Returns income, expenses, and category breakdowns for the specified date range.
     """
     try:
-        # Build base query
-        query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
-        
-        # Apply date filters
-        if date_from:
-            query = query.filter(Transaction.transaction_date >= date_from)
-        
-        if date_to:
-            query = query.filter(Transaction.transaction_date <= date_to)
-        
-        transactions = query.all()
+        # Whole months come from the rollup table, partial edge months from raw rows
+        totals = rollup_service.get_range_totals(db, current_user.id, date_from, date_to)
         
         # Calculate statistics
-        total_income = sum(abs(txn.amount) for txn in transactions if txn.amount < 0)
-        total_expenses = sum(txn.amount for txn in transactions if txn.amount > 0)
+        total_income = sum(row.total_amount for row in totals if row.is_income)
+        total_expenses = sum(row.total_amount for row in totals if not row.is_income)
         net_amount = total_income - total_expenses
-        transaction_count = len(transactions)
+        transaction_count = sum(row.transaction_count for row in totals)
         
         # Category breakdown
+        category_names = dict(db.query(Category.id, Category.name).filter(
+            Category.id.in_({row.category_id for row in totals if row.category_id is not None})
+        ).all())
         category_stats = {}
-        for txn in transactions:
-            if txn.category:
-                category_name = txn.category.name
+        for row in totals:
+            category_name = category_names.get(row.category_id)
+            if category_name:
                 if category_name not in category_stats:
                     category_stats[category_name] = {"count": 0, "amount": 0}
                 
-                category_stats[category_name]["count"] += 1
-                category_stats[category_name]["amount"] += abs(txn.amount)
+                category_stats[category_name]["count"] += row.transaction_count
+                category_stats[category_name]["amount"] += row.total_amount
         
         return TransactionStats(
             total_income=total_income,
@@ -398,11 +397,13 @@ async def recategorize_transaction(transaction_id, current_user=Depends(get_curr
         
         # Store original category
         original_category_id = transaction.category_id
+        original = rollup_service.snapshot(transaction)
         
         # Update transaction
         transaction.category_id = categorization.get("category_id")
         transaction.ml_confidence = categorization.get("confidence", 0.0)
         transaction.updated_at = datetime.utcnow()
+        _move_rollup(db, original, transaction)
         db.commit()
         
         logger.info(f"Transaction {transaction_id} re-categorized by user {current_user.id}")
@@ -483,31 +484,41 @@ async def bulk_categorize_transactions(limit=Query(100, ge=1, le=500), current_u
             Transaction.category_id.is_(None)
         ).limit(limit).all()
         
-        categorized_count = 0
-        failed_count = 0
-        
-        for transaction in uncategorized:
-            try:
-                # Categorize transaction
-                categorization = categorization_service.categorize_transaction(
-                    description=transaction.description or "",
-                    amount=float(transaction.amount),
-                    merchant=transaction.merchant_name,
-                    user_id=current_user.id,
-                    db=db
-                )
-                
-                # Update transaction
-                transaction.category_id = categorization.get("category_id")
-                transaction.ml_confidence = categorization.get("confidence", 0.0)
-                transaction.updated_at = datetime.utcnow()
-                
-                categorized_count += 1
-                
-            except Exception as e:
-                logger.warning(f"Failed to categorize transaction {transaction.id}: {e}")
-                failed_count += 1
+        # One model call for the whole batch
+        results = categorization_service.categorize_batch(
+            [
+                {
+                    "description": transaction.description or "",
+                    "amount": float(transaction.amount),
+                    "merchant": transaction.merchant
+                }
+                for transaction in uncategorized
+            ],
+            user_id=current_user.id,
+            db=db
+        )
         
+        updates = []
+        rollup_changes = []
+        now = datetime.utcnow()
+        for transaction, categorization in zip(uncategorized, results):
+            category_id = categorization.get("category_id")
+            if category_id is None:
+                continue
+            updates.append({
+                "id": transaction.id,
+                "category_id": category_id,
+                "confidence_score": categorization.get("confidence", 0.0),
+                "updated_at": now
+            })
+            rollup_changes.append((rollup_service.snapshot(transaction), category_id))
+        
+        categorized_count = len(updates)
+        failed_count = len(uncategorized) - categorized_count
+        
+        # Write all categories with one bulk UPDATE, then move the rollups
+        db.bulk_update_mappings(Transaction, updates)
+        rollup_service.recategorize(db, rollup_changes)
         db.commit()
         
         logger.info(f"Bulk categorization completed for user {current_user.id}: {categorized_count} success, {failed_count} failed")
@@ -524,4 +535,15 @@ async def bulk_categorize_transactions(limit=Query(100, ge=1, le=500), current_u
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to bulk categorize transactions"
-        ) 
\ No newline at end of file
+        ) 
+
+
+def _move_rollup(db, original, transaction):
+    """Move a modified transaction between rollup cells if a rollup-relevant field changed."""
+    if (original.amount, original.transaction_date, original.category_id) == (
+        transaction.amount, transaction.transaction_date, transaction.category_id
+    ):
+        return
+    rollup_service.apply(db, original.user_id, original.amount, original.transaction_date,
+                         original.category_id, direction=-1, exclude_id=original.id)
+    rollup_service.add_transaction(db, transaction)
@@ -29,6 +29,10 @@ class Settings(BaseSettings):
     secret_key: str = Field(default_factory=lambda: os.getenv('SECRET_KEY', secrets.token_urlsafe(64)))
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 15  # Lyhennetty 30:sta 15 minuuttiin
+    auth_token_cache_size: int = 10000  # Verified tokens kept with their claims
+    auth_token_cache_ttl_seconds: int = 300  # Never beyond the token's own expiry
+    auth_user_cache_size: int = 10000  # Authenticated user rows kept in memory
+    auth_user_cache_ttl_seconds: int = 60  # Bounds staleness from bulk updates that bypass ORM events
     
     # API Configuration
     api_v1_str: str = "/api/v1"
@@ -62,6 +66,8 @@ class Settings(BaseSettings):
     # Sentinel Learning Engine Configuration
     learning_data_retention_days: int = 365
     ml_model_update_frequency: int = 7  # days
+    budget_model_workers: int = 0  # Budget model training processes; 0 = one per CPU core
+    budget_model_cache_size: int = 512  # Fitted (user, category) budget models kept in memory
     
     # Advanced Intelligence Configuration
     idea_engine_daily_rotation: bool = True
@@ -82,6 +88,11 @@ class Settings(BaseSettings):
     
     # OCR Service Configuration
     ocr_service: str = "tesseract"  # Options: tesseract, google_vision
+    ocr_workers: int = 0  # OCR processes; 0 = one per CPU core
+    ocr_batch_size: int = 32  # Documents claimed per batch
+    ocr_lease_seconds: int = 600  # A PROCESSING claim older than this can be reclaimed
+    ocr_cache_max_mb: int = 256  # On-disk OCR result cache size bound
+    ocr_max_dimension: int = 2000  # Longest image side after preprocessing
     
     # LLM Service Configuration
     llm_service: str = "local"  # Options: local, openai
@@ -99,6 +110,19 @@ class Settings(BaseSettings):
     budget_recalc_hour: int = 6  # Hour of day to recalculate budgets
     model_retrain_days: int = 7  # How often to retrain ML models
     scheduler_max_workers: int = 4
+    scheduler_sweep_chunk_size: int = 500  # Users per chunk in per-user sweeps
+    scheduler_sweep_concurrency: int = 8  # Sweep chunks processed concurrently
+    scheduler_sweep_max_attempts: int = 3  # Runs in a row that resume a failing sweep before a fresh pass
+    
+    # Event bus
+    event_bus_queue_size: int = 10000  # Queued events per priority level
+    event_bus_consumers: int = 4  # Concurrent dispatch loops
+    event_bus_batch_size: int = 100  # Max same-type events handed to a batch subscriber at once
+    event_bus_history_size: int = 10000  # Events kept in the history ring buffer
+    event_log_enabled: bool = False  # Persist events to a durable, replayable log
+    event_log_path: str = ""  # Defaults to <data path>/event_log.db
+    event_log_retention_days: int = 30
+    event_log_redelivery_seconds: int = 30  # Retry interval for failed durable deliveries
     
     # ML Configuration
     ml_max_features: int = 10000
@@ -39,7 +39,8 @@ def init_db():
         # Import all models to ensure they are registered
         from app.models import (
             User, Transaction, Category, Document, 
-            Budget, Goal, Recommendation, AgentState, CategoryCorrection
+            Budget, Goal, Recommendation, AgentState, CategoryCorrection,
+            TransactionRollup
         )
         
         # Create all tables
@@ -49,6 +50,9 @@ def init_db():
         # Initialize default categories if they don't exist
         _init_default_categories()
         
+        # Backfill reporting rollups for databases created before they existed
+        _init_transaction_rollups()
+        
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
@@ -100,6 +104,24 @@ def _init_default_categories():
     finally:
         db.close()
 
+def _init_transaction_rollups():
+    """Build transaction rollups from scratch if the table is empty but transactions exist."""
+    from app.models import Transaction, TransactionRollup
+    from app.services.rollup_service import rollup_service
+    
+    db = SessionLocal()
+    try:
+        if db.query(TransactionRollup.id).first() or not db.query(Transaction.id).first():
+            return
+        rows = rollup_service.rebuild(db)
+        logger.info(f"Backfilled {rows} transaction rollups")
+        
+    except Exception as e:
+        logger.error(f"Failed to backfill transaction rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
 def get_db():
     """Get database session."""
     db = SessionLocal()
@@ -19,6 +19,7 @@ from app.core.config import settings
 from app.db.init_db import init_db, get_db, engine, Base
 from app.services.scheduler_service import scheduler_service
 from app.services.event_bus import event_bus
+from app.services.auth_service import auth_service
 
 # Import API routers
 from app.api import auth, transactions, categories, dashboard, intelligence, watchdog
@@ -233,7 +234,8 @@ async def health_check():
         "services": {
             "database": "connected",
             "scheduler": scheduler_service.get_scheduler_status(),
-            "event_bus": event_bus.get_stats()
+            "event_bus": event_bus.get_stats(),
+            "auth_cache": auth_service.get_cache_stats()
         }
     }
 
@@ -15,6 +15,7 @@ from .goal import Goal, GoalType, GoalStatus
 from .recommendation import Recommendation
 from .agent_state import AgentState
 from .category_correction import CategoryCorrection
+from .transaction_rollup import TransactionRollup
 
 # Make all models available for easy import
 __all__ = [
@@ -30,5 +31,6 @@ __all__ = [
     "GoalStatus",
     "Recommendation",
     "AgentState",
-    "CategoryCorrection"
+    "CategoryCorrection",
+    "TransactionRollup"
 ]
@@ -2,7 +2,7 @@
 Transaction model for all financial transactions.
 The central model that tracks all income and expenses.
 """
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Text, ForeignKey, Enum
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Text, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
@@ -32,7 +32,11 @@ class Transaction(Base):
     Central model that connects users, categories, and documents.
     """
     __tablename__ = "transactions"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Covers the dashboard aggregations (one user's transactions by date range)
+        Index('ix_transactions_user_date', 'user_id', 'transaction_date', 'amount', 'category_id'),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
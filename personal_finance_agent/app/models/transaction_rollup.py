@@ -0,0 +1,44 @@
+"""
+TransactionRollup model - materialized per-user monthly totals.
+Maintained incrementally as transactions change so reports read a few rows
+instead of re-aggregating raw transactions.
+"""
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class TransactionRollup(Base):
+    """
+    Monthly aggregate of a user's transactions for one category and direction.
+    
+    Keyed by (user_id, month, category_id, is_income). Amounts are stored as
+    absolute values; `is_income` follows the transaction sign convention
+    (negative amount = income). Rebuildable from scratch with
+    TransactionRollupService.rebuild().
+    """
+    __tablename__ = "transaction_rollups"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'month', 'category_id', 'is_income', name='uq_transaction_rollup_key'),
+        {'extend_existing': True},
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Rollup key
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    month = Column(String(7), nullable=False, index=True)  # YYYY-MM
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    is_income = Column(Boolean, nullable=False, default=False)
+    
+    # Aggregates
+    total_amount = Column(Float, nullable=False, default=0.0)  # Sum of absolute amounts
+    transaction_count = Column(Integer, nullable=False, default=0)
+    weekend_count = Column(Integer, nullable=False, default=0)
+    month_end_count = Column(Integer, nullable=False, default=0)  # Transactions on day >= 25
+    last_transaction_date = Column(DateTime(timezone=True), nullable=True)
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<TransactionRollup(user_id={self.user_id}, month='{self.month}', category_id={self.category_id}, is_income={self.is_income}, total={self.total_amount})>"
@@ -8,10 +8,14 @@ from .ocr_service import OCREngine, BaseOCRService, TesseractOCRService, GoogleV
 from .categorization_service import TransactionCategorizationService
 from .scheduler_service import SchedulerService, scheduler_service
 from .event_bus import event_bus, EventBus, EventType, Event
+from .rollup_service import TransactionRollupService, rollup_service
+from .document_pipeline import DocumentProcessingPipeline, document_pipeline
 
 __all__ = [
     # Document services
     "DocumentService",
+    "DocumentProcessingPipeline",
+    "document_pipeline",
     
     # OCR services
     "OCREngine",
@@ -26,6 +30,10 @@ __all__ = [
     "SchedulerService",
     "scheduler_service",
     
+    # Reporting rollups
+    "TransactionRollupService",
+    "rollup_service",
+    
     # Event bus
     "event_bus",
     "EventBus",
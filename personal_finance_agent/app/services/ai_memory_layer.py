@@ -4,11 +4,438 @@ Tallentaa ja jakaa kontekstin IdeaEngine™, Watchdog™, LearningEngine™ ja C
 """
 
 import asyncio
+import atexit
+import bisect
+import heapq
 import json
+import os
+import sqlite3
 import time
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import hashlib
+import numpy as np
+
+from app.core.config import get_data_path
+
+RECENT_DAYS = 7
+MONTH_DAYS = 30
+TAG_WEIGHT = 0.3
+SERVICE_WEIGHT = 0.2
+IMPORTANCE_WEIGHT = 0.3
+
+# Muistin kapasiteetti ja säilytys (ks. AIMemoryLayer)
+HOT_CAPACITY = int(os.getenv("AI_MEMORY_CAPACITY", "20000"))
+SERVICE_WINDOW = int(os.getenv("AI_MEMORY_SERVICE_WINDOW", "1000"))
+COMPACT_AFTER_DAYS = int(os.getenv("AI_MEMORY_COMPACT_DAYS", "90"))
+RECENCY_HALF_LIFE_DAYS = 7
+EVICTION_HEADROOM = 0.9  # Häätö laskee kuuman muistin 90 %:iin kapasiteetista
+FLUSH_BATCH = 256
+FLUSH_INTERVAL_SECONDS = 5.0
+COMPACT_INTERVAL_SECONDS = 3600
+PATTERN_LIMIT = 500
+IMPORTANT_INSIGHTS = 10
+
+
+class MemoryRecallIndex:
+    """
+    Käänteinen indeksi muistien hakuun.
+    
+    Jokainen muisti lisätään postaus-listoihin avaimilla ('tag', tagi),
+    ('service', palvelu) ja ('user', käyttäjä). Listat on ryhmitelty tärkeyden
+    mukaan ja järjestetty ajan mukaan, joten saman tärkeys- ja ikäluokan
+    muisteilla on sama staattinen pistemäärä (tuoreus + tärkeys). Haku käy
+    segmenttejä läpi pistemäärän mukaan laskevassa järjestyksessä ja lopettaa
+    heti kun top-k on varma - koko muistia ei koskaan skannata.
+    """
+    
+    def __init__(self):
+        # avain -> tärkeys -> (aikaleimat, id:t) aikajärjestyksessä
+        self.postings: Dict[Tuple, Dict[float, Tuple[List[float], List[str]]]] = {}
+        self.tag_vocabulary: Dict[str, str] = {}  # pienillä kirjaimilla -> tagi
+        self.service_vocabulary: Dict[str, str] = {}
+        self.entries: Dict[str, Dict] = {}
+        self.timestamps: Dict[str, float] = {}
+        self.stale_postings = 0
+    
+    def add(self, memory_entry: Dict, timestamp: float) -> None:
+        memory_id = memory_entry['id']
+        if memory_id in self.entries:
+            self.remove(memory_id)
+        self.entries[memory_id] = memory_entry
+        self.timestamps[memory_id] = timestamp
+        importance = round(memory_entry.get('importance', 0.5), 4)
+        user_id = memory_entry.get('context', {}).get('user_id')
+        
+        keys = [('service', memory_entry['service'])]
+        self.service_vocabulary[memory_entry['service'].lower()] = memory_entry['service']
+        for tag in memory_entry.get('tags', []):
+            keys.append(('tag', tag))
+            self.tag_vocabulary[tag.lower()] = tag
+        if user_id is not None:
+            keys += [key + (user_id,) for key in keys] + [('user', user_id)]
+        
+        for key in keys:
+            times, ids = self.postings.setdefault(key, {}).setdefault(importance, ([], []))
+            if times and timestamp < times[-1]:
+                position = bisect.bisect_right(times, timestamp)
+                times.insert(position, timestamp)
+                ids.insert(position, memory_id)
+            else:
+                times.append(timestamp)
+                ids.append(memory_id)
+    
+    def remove(self, memory_id: str) -> None:
+        """
+        Poistaa muistin - haku ohittaa poistetut postaukset ja listat tiivistetään
+        kun vanhentuneita postauksia on enemmän kuin eläviä muisteja
+        """
+        memory = self.entries.pop(memory_id, None)
+        self.timestamps.pop(memory_id, None)
+        if memory is None:
+            return
+        keys = 1 + len(memory.get('tags', []))
+        self.stale_postings += keys * 2 + 1 if memory.get('context', {}).get('user_id') is not None else keys
+        if self.stale_postings > max(1024, len(self.entries)):
+            self.compact()
+    
+    def compact(self) -> None:
+        """Poistaa postauslistoista muistit joita ei enää ole indeksissä"""
+        for key in list(self.postings):
+            groups = self.postings[key]
+            for importance in list(groups):
+                times, ids = groups[importance]
+                keep = [position for position, memory_id in enumerate(ids) if memory_id in self.entries]
+                if not keep:
+                    del groups[importance]
+                elif len(keep) < len(ids):
+                    groups[importance] = ([times[p] for p in keep], [ids[p] for p in keep])
+            if not groups:
+                del self.postings[key]
+        self.stale_postings = 0
+    
+    def match_context(self, context: str) -> Tuple[List[str], set]:
+        """Kontekstissa mainitut tunnetut tagit ja palvelut"""
+        context_lower = context.lower()
+        matched_tags = [tag for lower, tag in self.tag_vocabulary.items() if lower in context_lower]
+        matched_services = {service for lower, service in self.service_vocabulary.items() if lower in context_lower}
+        return matched_tags, matched_services
+    
+    def search(self, context: str, service_name: str, own_service_known: bool,
+               limit: int = 10, user_id: Any = None) -> List[Tuple[float, Dict]]:
+        """Palauttaa (relevanssi, muisti) -parit relevanssin mukaan laskevassa järjestyksessä"""
+        context_lower = context.lower()
+        now = time.time()
+        recent_cutoff = now - RECENT_DAYS * 86400
+        month_cutoff = now - MONTH_DAYS * 86400
+        
+        matched_tags, matched_services = self.match_context(context)
+        max_bonus = TAG_WEIGHT * len(matched_tags) + (SERVICE_WEIGHT if matched_services else 0.0)
+        
+        # Lähteet: osuneet tagit, oma palvelu ja kontekstissa mainitut muut palvelut
+        sources = [('tag', tag) for tag in matched_tags]
+        if own_service_known:
+            sources.append(('service', service_name))
+        sources += [('service', service) for service in matched_services if service != service_name]
+        if user_id is not None:
+            sources = [source + (user_id,) for source in sources]
+        
+        # Segmentit: (−staattinen pistemäärä, järjestys, aikaleimat, id:t, alku, loppu)
+        segments = []
+        for source in sources:
+            for importance, (times, ids) in self.postings.get(source, {}).items():
+                base = importance * IMPORTANCE_WEIGHT
+                recent_start = bisect.bisect_left(times, recent_cutoff)
+                month_start = bisect.bisect_left(times, month_cutoff)
+                for static, lo, hi in ((base + 0.2, recent_start, len(times)),
+                                       (base + 0.1, month_start, recent_start),
+                                       (base, 0, month_start)):
+                    if lo < hi:
+                        heapq.heappush(segments, (-static, len(segments), ids, lo, hi))
+        
+        results: List[Tuple[float, int, str]] = []  # min-heap (relevanssi, järjestys, id)
+        seen = set()
+        while segments:
+            negative_static, order, ids, lo, hi = heapq.heappop(segments)
+            upper_bound = min(-negative_static + max_bonus, 1.0)
+            if upper_bound <= 0.3 or (len(results) >= limit and results[0][0] >= upper_bound):
+                break  # Yksikään jäljellä oleva muisti ei voi nousta top-k:hon
+            
+            for position in range(hi - 1, lo - 1, -1):  # uusimmat ensin
+                memory_id = ids[position]
+                if memory_id in seen or memory_id not in self.entries:
+                    continue
+                seen.add(memory_id)
+                memory = self.entries[memory_id]
+                relevance = self._score(memory, -negative_static, context_lower, matched_services)
+                threshold = 0.3 if memory['service'] == service_name else 0.5
+                if relevance <= threshold or (memory['service'] == service_name and not own_service_known):
+                    continue
+                item = (relevance, -len(seen), memory_id)
+                if len(results) < limit:
+                    heapq.heappush(results, item)
+                elif item > results[0]:
+                    heapq.heapreplace(results, item)
+                if len(results) >= limit and results[0][0] >= upper_bound:
+                    break
+        
+        return [(relevance, self.entries[memory_id])
+                for relevance, _, memory_id in sorted(results, reverse=True)]
+    
+    def _score(self, memory: Dict, static: float, context_lower: str, matched_services: set) -> float:
+        relevance = static
+        for tag in memory.get('tags', []):
+            if tag.lower() in context_lower:
+                relevance += TAG_WEIGHT
+        if memory['service'] in matched_services:
+            relevance += SERVICE_WEIGHT
+        return min(relevance, 1.0)
+
+
+class MemoryVectorIndex:
+    """
+    Valinnainen paikallinen vektori-indeksi semanttiseen hakuun.
+    
+    Tekstit upotetaan feature hashing -menetelmällä kiinteän mittaisiksi
+    normalisoiduiksi vektoreiksi (ei ulkoisia malleja), ja haku on yksi
+    matriisi-vektori-tulo + argpartition top-k.
+    """
+    
+    def __init__(self, dimensions: int = 128):
+        self.dimensions = dimensions
+        self.vectors = np.zeros((1024, dimensions), dtype=np.float32)
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+    
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in text.lower().split():
+            digest = hashlib.blake2b(token.encode(), digest_size=4).digest()
+            bucket = int.from_bytes(digest, 'little')
+            vector[bucket % self.dimensions] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def add(self, memory_id: str, text: str) -> None:
+        if memory_id in self.positions:
+            self.vectors[self.positions[memory_id]] = self.embed(text)
+            return
+        if len(self.ids) == len(self.vectors):
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.positions[memory_id] = len(self.ids)
+        self.vectors[len(self.ids)] = self.embed(text)
+        self.ids.append(memory_id)
+    
+    def remove(self, memory_id: str) -> None:
+        position = self.positions.pop(memory_id, None)
+        if position is None:
+            return
+        last = len(self.ids) - 1
+        if position != last:
+            self.vectors[position] = self.vectors[last]
+            self.ids[position] = self.ids[last]
+            self.positions[self.ids[position]] = position
+        self.vectors[last] = 0
+        self.ids.pop()
+    
+    def search(self, text: str, limit: int = 10) -> List[Tuple[str, float]]:
+        if not self.ids:
+            return []
+        similarities = self.vectors[:len(self.ids)] @ self.embed(text)
+        limit = min(limit, len(self.ids))
+        top = np.argpartition(-similarities, limit - 1)[:limit]
+        top = top[np.argsort(-similarities[top])]
+        return [(self.ids[i], float(similarities[i])) for i in top]
+
+
+class MemoryColdStore:
+    """
+    Levyllä oleva muistivarasto (SQLite) kylmille ja pysyville muisteille.
+    
+    Kaikki muistit kirjoitetaan tänne erissä, joten ne säilyvät uudelleen-
+    käynnistysten yli. Kuumasta muistista häädetyt rivit merkitään kylmiksi
+    ja haetaan takaisin vasta kun haku niitä tarvitsee. Vanhat muistit
+    tiivistetään (palvelu, käyttäjä, kategoria) -yhteenvedoiksi.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self.cold_count = 0
+    
+    def exists(self) -> bool:
+        return self._connection is not None or os.path.exists(self.path)
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS memories (
+                    id TEXT PRIMARY KEY,
+                    service TEXT NOT NULL,
+                    user_id TEXT NOT NULL DEFAULT '',
+                    category TEXT NOT NULL DEFAULT '',
+                    amount REAL,
+                    timestamp REAL NOT NULL,
+                    importance REAL NOT NULL,
+                    cold INTEGER NOT NULL DEFAULT 0,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_memories_timestamp ON memories (timestamp);
+                CREATE INDEX IF NOT EXISTS ix_memories_cold ON memories (cold, importance, timestamp);
+                CREATE TABLE IF NOT EXISTS memory_tags (
+                    tag TEXT NOT NULL,
+                    memory_id TEXT NOT NULL,
+                    PRIMARY KEY (tag, memory_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS ix_memory_tags_memory ON memory_tags (memory_id);
+                CREATE TABLE IF NOT EXISTS memory_summaries (
+                    service TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    total_amount REAL NOT NULL,
+                    importance_sum REAL NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    PRIMARY KEY (service, user_id, category)
+                );
+            """)
+            # Edellisen prosessin kuuma muisti on tässä prosessissa kylmää
+            connection.execute("UPDATE memories SET cold = 1 WHERE cold = 0")
+            connection.commit()
+            self.cold_count = connection.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+            self._connection = connection
+        return self._connection
+    
+    def write(self, entries: List[Tuple[Dict, float]]) -> None:
+        """Tallentaa (muisti, aikaleima) -parit kuumina"""
+        rows, tags = [], []
+        for entry, timestamp in entries:
+            data = entry.get('data', {})
+            amount = data.get('amount')
+            rows.append((
+                entry['id'], entry['service'], self._key(entry.get('context', {}).get('user_id')),
+                self._key(data.get('category')),
+                float(amount) if isinstance(amount, (int, float)) else None,
+                timestamp, entry.get('importance', 0.5), json.dumps(entry, default=str)
+            ))
+            tags += [(tag, entry['id']) for tag in entry.get('tags', [])]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO memories "
+                "(id, service, user_id, category, amount, timestamp, importance, cold, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)", rows
+            )
+            self.connection.executemany("INSERT OR IGNORE INTO memory_tags VALUES (?, ?)", tags)
+    
+    def set_cold(self, memory_ids: List[str], cold: bool) -> None:
+        if not memory_ids:
+            return
+        with self.connection:
+            changed = self.connection.executemany(
+                "UPDATE memories SET cold = ? WHERE id = ? AND cold = ?",
+                [(int(cold), memory_id, int(not cold)) for memory_id in memory_ids]
+            ).rowcount
+        self.cold_count += changed if cold else -changed
+    
+    def load_recent(self, limit: int) -> List[Dict]:
+        """Uusimmat muistit kuuman muistin lämmittämiseen, vanhimmasta uusimpaan"""
+        rows = self.connection.execute(
+            "SELECT payload FROM memories ORDER BY timestamp DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [json.loads(payload) for payload, in reversed(rows)]
+    
+    def vocabulary(self) -> Tuple[List[str], List[str]]:
+        tags = [tag for tag, in self.connection.execute("SELECT DISTINCT tag FROM memory_tags")]
+        services = [service for service, in self.connection.execute("SELECT DISTINCT service FROM memories")]
+        return tags, services
+    
+    def find_cold(self, tags: List[str], services: List[str], user_id: Any, limit: int) -> List[Dict]:
+        """Kylmät muistit joilla on jokin annetuista tageista tai palveluista, tärkeimmät ja uusimmat ensin"""
+        if not tags and not services:
+            return []
+        conditions = []
+        parameters: List[Any] = []
+        if tags:
+            conditions.append(
+                f"id IN (SELECT memory_id FROM memory_tags WHERE tag IN ({','.join('?' * len(tags))}))"
+            )
+            parameters += tags
+        if services:
+            conditions.append(f"service IN ({','.join('?' * len(services))})")
+            parameters += services
+        query = f"SELECT payload FROM memories WHERE cold = 1 AND ({' OR '.join(conditions)})"
+        if user_id is not None:
+            query += " AND user_id = ?"
+            parameters.append(self._key(user_id))
+        query += " ORDER BY importance DESC, timestamp DESC LIMIT ?"
+        parameters.append(limit)
+        return [json.loads(payload) for payload, in self.connection.execute(query, parameters)]
+    
+    def compact(self, cutoff: float) -> int:
+        """Tiivistää ennen cutoff-hetkeä tallennetut muistit yhteenvedoiksi ja poistaa ne"""
+        with self.connection:
+            self.connection.execute("""
+                INSERT INTO memory_summaries
+                    (service, user_id, category, count, total_amount, importance_sum, first_seen, last_seen)
+                SELECT service, user_id, category, COUNT(*), COALESCE(SUM(amount), 0),
+                       SUM(importance), MIN(timestamp), MAX(timestamp)
+                FROM memories WHERE timestamp < ?
+                GROUP BY service, user_id, category
+                ON CONFLICT (service, user_id, category) DO UPDATE SET
+                    count = count + excluded.count,
+                    total_amount = total_amount + excluded.total_amount,
+                    importance_sum = importance_sum + excluded.importance_sum,
+                    first_seen = MIN(first_seen, excluded.first_seen),
+                    last_seen = MAX(last_seen, excluded.last_seen)
+            """, (cutoff,))
+            cold_removed = self.connection.execute(
+                "SELECT COUNT(*) FROM memories WHERE timestamp < ? AND cold = 1", (cutoff,)
+            ).fetchone()[0]
+            self.connection.execute(
+                "DELETE FROM memory_tags WHERE memory_id IN (SELECT id FROM memories WHERE timestamp < ?)",
+                (cutoff,)
+            )
+            removed = self.connection.execute("DELETE FROM memories WHERE timestamp < ?", (cutoff,)).rowcount
+        self.cold_count -= cold_removed
+        return removed
+    
+    def summaries(self, service: Optional[str] = None, user_id: Any = None, limit: int = 10) -> List[Dict]:
+        query = "SELECT * FROM memory_summaries WHERE 1 = 1"
+        parameters: List[Any] = []
+        if service is not None:
+            query += " AND service = ?"
+            parameters.append(service)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            parameters.append(self._key(user_id))
+        query += " ORDER BY count DESC LIMIT ?"
+        parameters.append(limit)
+        cursor = self.connection.execute(query, parameters)
+        columns = [column[0] for column in cursor.description]
+        summaries = []
+        for row in cursor:
+            summary = dict(zip(columns, row))
+            summary['average_importance'] = summary.pop('importance_sum') / summary['count']
+            summary['first_seen'] = datetime.fromtimestamp(summary['first_seen']).isoformat()
+            summary['last_seen'] = datetime.fromtimestamp(summary['last_seen']).isoformat()
+            summaries.append(summary)
+        return summaries
+    
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+    
+    @staticmethod
+    def _key(value: Any) -> str:
+        return '' if value is None else str(value)
+
 
 class AIMemoryLayer:
     """
@@ -19,23 +446,42 @@ class AIMemoryLayer:
     - Automaattinen kontekstin jakaminen
     - Muistin optimointi ja puhdistus
     - Reaaliaikainen oppiminen
+    - Käänteinen indeksi (tagi/palvelu/käyttäjä) ja top-k haku
+    - Rajattu kuuma muisti: häätö tärkeys × tuoreus × käyttökerrat -pisteillä
+    - Kylmä muisti levyllä (MemoryColdStore), ladataan laiskasti haun tarpeen mukaan
+    - Vanhat muistit tiivistetään yhteenvedoiksi
     """
     
-    def __init__(self):
+    def __init__(self, enable_vectors: Optional[bool] = None, storage_path: Optional[str] = None,
+                 capacity: int = HOT_CAPACITY):
         self.memory_store = {
-            'interactions': [],
             'patterns': {},
             'contexts': {},
-            'insights': []
+            'insights': [],
+            'important': deque(maxlen=IMPORTANT_INSIGHTS)
         }
+        # Palvelukohtaiset näkymät viittaavat samoihin muisteihin kuin indeksi
         self.service_memories = {
-            'idea_engine': [],
-            'watchdog': [],
-            'learning_engine': [],
-            'chat': [],
-            'budget_system': []
+            service: deque(maxlen=SERVICE_WINDOW)
+            for service in ('idea_engine', 'watchdog', 'learning_engine', 'chat', 'budget_system')
         }
-        self.memory_index = {}
+        self.recall_index = MemoryRecallIndex()
+        self.capacity = capacity
+        self.access_stats: Dict[str, List[float]] = {}  # id -> [käyttökerrat, viimeisin käyttö]
+        
+        self.cold_store = MemoryColdStore(
+            storage_path or os.getenv("AI_MEMORY_STORE") or os.path.join(get_data_path(), "ai_memory.db")
+        )
+        self._pending_writes: Dict[str, Tuple[Dict, float]] = {}
+        self._last_flush = time.time()
+        self._last_compaction = 0.0
+        self._loaded = False
+        atexit.register(self.persist)
+        
+        # Valinnainen vektori-indeksi (AI_MEMORY_VECTORS=1)
+        if enable_vectors is None:
+            enable_vectors = os.getenv("AI_MEMORY_VECTORS", "0") == "1"
+        self.vector_index = MemoryVectorIndex() if enable_vectors else None
         
     async def remember(self, interaction: Dict[str, Any], service_name: str) -> str:
         """
@@ -48,6 +494,7 @@ class AIMemoryLayer:
         Returns:
             str: Muistin ID
         """
+        self._ensure_loaded()
         memory_id = self._generate_memory_id(interaction)
         
         memory_entry = {
@@ -60,20 +507,23 @@ class AIMemoryLayer:
             'tags': self._extract_tags(interaction)
         }
         
-        # Tallennus päämuistiin
-        self.memory_store['interactions'].append(memory_entry)
-        
-        # Tallennus palvelukohtaiseen muistiin
+        # Tallennus palvelukohtaiseen näkymään
         if service_name in self.service_memories:
             self.service_memories[service_name].append(memory_entry)
+        if memory_entry['importance'] > 0.8:
+            self.memory_store['important'].append(memory_entry)
         
-        # Indeksointi nopeaa hakua varten
+        # Indeksointi nopeaa hakua varten ja kirjoitus levylle erissä
         await self._index_memory(memory_entry)
+        self._pending_writes[memory_id] = (memory_entry, self.recall_index.timestamps[memory_id])
+        if len(self._pending_writes) >= FLUSH_BATCH or time.time() - self._last_flush > FLUSH_INTERVAL_SECONDS:
+            self.persist()
+        self._evict_if_needed()
         
         print(f"🧠 AI Memory Layer: Tallennettu muisti {memory_id} palvelulle {service_name}")
         return memory_id
     
-    async def recall(self, context: str, service_name: str, limit: int = 10) -> List[Dict]:
+    async def recall(self, context: str, service_name: str, limit: int = 10, user_id: Any = None) -> List[Dict]:
         """
         Hakee relevantin muistin annetulle kontekstille ja palvelulle
         
@@ -81,37 +531,185 @@ class AIMemoryLayer:
             context: Hakukonteksti
             service_name: Palvelun nimi
             limit: Maksimi määrä tuloksia
+            user_id: Rajaa haun yhden käyttäjän muisteihin (valinnainen)
             
         Returns:
             List[Dict]: Relevantit muistit
         """
-        relevant_memories = []
+        self._ensure_loaded()
+        own_service_known = service_name in self.service_memories
         
-        # Hae palvelukohtaisesta muistista
-        if service_name in self.service_memories:
-            service_memories = self.service_memories[service_name]
-            
-            for memory in service_memories:
-                relevance_score = self._calculate_relevance(memory, context)
-                if relevance_score > 0.3:  # Minimirelevanssi
-                    memory['relevance_score'] = relevance_score
-                    relevant_memories.append(memory)
-        
-        # Hae myös yleisestä muistista
-        for memory in self.memory_store['interactions']:
-            if memory['service'] != service_name:  # Älä toista palvelukohtaista
-                relevance_score = self._calculate_relevance(memory, context)
-                if relevance_score > 0.5:  # Korkeampi kynnys yleisestä muistista
-                    memory['relevance_score'] = relevance_score
-                    relevant_memories.append(memory)
-        
-        # Järjestä relevanssin mukaan ja rajaa määrä
-        relevant_memories.sort(key=lambda x: x['relevance_score'], reverse=True)
-        relevant_memories = relevant_memories[:limit]
+        # Palvelukohtaiset muistit > 0.3, muiden palveluiden muistit > 0.5 (ks. MemoryRecallIndex)
+        matches = self.recall_index.search(context, service_name, own_service_known, limit, user_id)
+        
+        # Nosta kylmät muistit levyltä jos ne voivat täydentää tai parantaa tulosta, ja hae uudelleen
+        if self._promote_cold(context, service_name, own_service_known, limit, user_id, matches):
+            matches = self.recall_index.search(context, service_name, own_service_known, limit, user_id)
+        
+        relevant_memories = []
+        for relevance_score, memory in matches:
+            memory['relevance_score'] = relevance_score
+            relevant_memories.append(memory)
+            self._touch(memory['id'])
+        self._evict_if_needed()
         
         print(f"🧠 AI Memory Layer: Haettu {len(relevant_memories)} muistia palvelulle {service_name}")
         return relevant_memories
     
+    async def recall_similar(self, text: str, service_name: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """
+        Hakee semanttisesti samankaltaisimmat muistit vektori-indeksistä
+        
+        Args:
+            text: Hakuteksti
+            service_name: Rajaa yhden palvelun muisteihin (valinnainen)
+            limit: Maksimi määrä tuloksia
+            
+        Returns:
+            List[Dict]: Muistit samankaltaisuuden mukaan järjestettynä
+        """
+        if self.vector_index is None:
+            return []
+        self._ensure_loaded()
+        
+        candidates = self.vector_index.search(text, limit if service_name is None else limit * 5)
+        similar = []
+        for memory_id, similarity in candidates:
+            memory = self.recall_index.entries.get(memory_id)
+            if memory and (service_name is None or memory['service'] == service_name):
+                similar.append({**memory, 'similarity': similarity})
+                self._touch(memory_id)
+        return similar[:limit]
+    
+    def persist(self) -> None:
+        """Kirjoittaa odottavat muistit levylle"""
+        if self._pending_writes:
+            self.cold_store.write(list(self._pending_writes.values()))
+            self._pending_writes.clear()
+        self._last_flush = time.time()
+    
+    def compact(self, older_than_days: int = COMPACT_AFTER_DAYS) -> int:
+        """
+        Tiivistää vanhat muistit (palvelu, käyttäjä, kategoria) -yhteenvedoiksi
+        
+        Args:
+            older_than_days: Tätä vanhemmat muistit tiivistetään
+            
+        Returns:
+            int: Tiivistettyjen muistien määrä
+        """
+        self.persist()
+        self._last_compaction = time.time()
+        cutoff = time.time() - older_than_days * 86400
+        for memory_id, timestamp in list(self.recall_index.timestamps.items()):
+            if timestamp < cutoff:
+                self._drop_hot(memory_id)
+        return self.cold_store.compact(cutoff)
+    
+    def get_summaries(self, service_name: Optional[str] = None, user_id: Any = None, limit: int = 10) -> List[Dict]:
+        """Tiivistettyjen muistien yhteenvedot suurimmasta pienimpään"""
+        if not self.cold_store.exists():
+            return []
+        self.persist()
+        return self.cold_store.summaries(service_name, user_id, limit)
+    
+    def _ensure_loaded(self) -> None:
+        """Lämmittää kuuman muistin levyltä ensimmäisellä käyttökerralla"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.cold_store.exists():
+            return
+        
+        tags, services = self.cold_store.vocabulary()
+        self.recall_index.tag_vocabulary.update({tag.lower(): tag for tag in tags})
+        self.recall_index.service_vocabulary.update({service.lower(): service for service in services})
+        
+        warm = self.cold_store.load_recent(int(self.capacity * EVICTION_HEADROOM))
+        for memory_entry in warm:
+            self._add_hot(memory_entry)
+            if memory_entry['service'] in self.service_memories:
+                self.service_memories[memory_entry['service']].append(memory_entry)
+            if memory_entry.get('importance', 0) > 0.8:
+                self.memory_store['important'].append(memory_entry)
+        self.cold_store.set_cold([memory_entry['id'] for memory_entry in warm], False)
+    
+    def _promote_cold(self, context: str, service_name: str, own_service_known: bool,
+                      limit: int, user_id: Any, matches: List[Tuple[float, Dict]]) -> bool:
+        """
+        Nostaa hakuun osuvat kylmät muistit kuumaan muistiin. Jos kuuma muisti
+        täytti jo top-k:n, levyltä haetaan vain tageihin osuvia muisteja ja vain
+        silloin kun ne voivat ylittää heikoimman tuloksen.
+        """
+        if not self.cold_store.exists() or not self.cold_store.cold_count:
+            return False
+        matched_tags, matched_services = self.recall_index.match_context(context)
+        services = [service for service in matched_services if service != service_name]
+        if own_service_known:
+            services.append(service_name)
+        
+        if len(matches) >= limit:
+            upper_bound = min(
+                0.2 + IMPORTANCE_WEIGHT + TAG_WEIGHT * len(matched_tags)
+                + (SERVICE_WEIGHT if matched_services else 0.0), 1.0
+            )
+            if not matched_tags or matches[-1][0] >= upper_bound:
+                return False
+            services = []
+        
+        promoted = self.cold_store.find_cold(matched_tags, services, user_id, limit)
+        for memory_entry in promoted:
+            self._add_hot(memory_entry)
+        self.cold_store.set_cold([memory_entry['id'] for memory_entry in promoted], False)
+        return bool(promoted)
+    
+    def _add_hot(self, memory_entry: Dict) -> None:
+        self.recall_index.add(memory_entry, datetime.fromisoformat(memory_entry['timestamp']).timestamp())
+        if self.vector_index is not None:
+            self.vector_index.add(memory_entry['id'], self._memory_text(memory_entry))
+    
+    def _drop_hot(self, memory_id: str) -> None:
+        self.recall_index.remove(memory_id)
+        if self.vector_index is not None:
+            self.vector_index.remove(memory_id)
+        self.access_stats.pop(memory_id, None)
+    
+    def _touch(self, memory_id: str) -> None:
+        stats = self.access_stats.setdefault(memory_id, [0, 0.0])
+        stats[0] += 1
+        stats[1] = time.time()
+    
+    def _evict_if_needed(self) -> None:
+        """
+        Häätää kuumasta muistista matalimman tärkeys × tuoreus × käyttö -pisteen
+        muistit kun kapasiteetti ylittyy (LRU/LFU-hybridi)
+        """
+        entries = self.recall_index.entries
+        if len(entries) <= self.capacity:
+            return
+        
+        self.persist()
+        now = time.time()
+        memory_ids = list(entries)
+        importance = np.array([entries[memory_id].get('importance', 0.5) for memory_id in memory_ids])
+        hits = np.zeros(len(memory_ids))
+        last_used = np.array([self.recall_index.timestamps[memory_id] for memory_id in memory_ids])
+        for position, memory_id in enumerate(memory_ids):
+            stats = self.access_stats.get(memory_id)
+            if stats:
+                hits[position] = stats[0]
+                last_used[position] = max(last_used[position], stats[1])
+        
+        scores = importance * (1 + np.log1p(hits)) * np.exp2((last_used - now) / (RECENCY_HALF_LIFE_DAYS * 86400))
+        evict_count = len(memory_ids) - int(self.capacity * EVICTION_HEADROOM)
+        victims = [memory_ids[position] for position in np.argpartition(scores, evict_count - 1)[:evict_count]]
+        for memory_id in victims:
+            self._drop_hot(memory_id)
+        self.cold_store.set_cold(victims, True)
+        
+        if now - self._last_compaction > COMPACT_INTERVAL_SECONDS:
+            self.compact()
+    
     async def share_context(self, service_name: str, current_context: Dict) -> Dict:
         """
         Jakaa relevantin kontekstin palvelulle
@@ -128,7 +726,8 @@ class AIMemoryLayer:
             'recent_patterns': await self._get_recent_patterns(service_name),
             'important_insights': await self._get_important_insights(),
             'service_specific': await self._get_service_specific_context(service_name),
-            'cross_service_insights': await self._get_cross_service_insights(service_name)
+            'cross_service_insights': await self._get_cross_service_insights(service_name),
+            'long_term_summary': self.get_summaries(service_name)
         }
         
         print(f"🧠 AI Memory Layer: Jaettu konteksti palvelulle {service_name}")
@@ -264,60 +863,20 @@ class AIMemoryLayer:
         return tags
     
     async def _index_memory(self, memory_entry: Dict) -> None:
-        """Indeksoi muistin nopeaa hakua varten"""
-        memory_id = memory_entry['id']
-        
-        # Indeksoi tagien mukaan
-        for tag in memory_entry.get('tags', []):
-            if tag not in self.memory_index:
-                self.memory_index[tag] = []
-            self.memory_index[tag].append(memory_id)
-        
-        # Indeksoi palvelun mukaan
-        service = memory_entry['service']
-        if f"service:{service}" not in self.memory_index:
-            self.memory_index[f"service:{service}"] = []
-        self.memory_index[f"service:{service}"].append(memory_id)
-    
-    def _calculate_relevance(self, memory: Dict, context: str) -> float:
-        """Laskee muistin relevanssin annetulle kontekstille"""
-        relevance = 0.0
-        
-        # Tarkista tagit
-        memory_tags = memory.get('tags', [])
-        context_lower = context.lower()
-        
-        for tag in memory_tags:
-            if tag.lower() in context_lower:
-                relevance += 0.3
-        
-        # Tarkista palvelu
-        if memory.get('service', '').lower() in context_lower:
-            relevance += 0.2
-        
-        # Tarkista aika (uudemmat ovat relevaantimpia)
-        if 'timestamp' in memory:
-            try:
-                memory_time = datetime.fromisoformat(memory['timestamp'])
-                days_old = (datetime.now() - memory_time).days
-                if days_old < 7:
-                    relevance += 0.2
-                elif days_old < 30:
-                    relevance += 0.1
-            except:
-                pass
-        
-        # Tarkista tärkeys
-        relevance += memory.get('importance', 0.5) * 0.3
-        
-        return min(relevance, 1.0)
+        """Indeksoi muistin nopeaa hakua varten (tagi-, palvelu- ja käyttäjäpostaukset)"""
+        self._add_hot(memory_entry)
+    
+    def _memory_text(self, memory_entry: Dict) -> str:
+        """Muistin teksti vektori-indeksiä varten"""
+        values = [str(value) for value in memory_entry['data'].values() if isinstance(value, (str, int, float))]
+        return " ".join(values + memory_entry.get('tags', []) + [memory_entry['service']])
     
     async def _get_user_preferences(self) -> Dict:
         """Hakee käyttäjän preferenssit muistista"""
         preferences = {}
         
         # Analysoi käyttäjän käyttäytymistä
-        chat_memories = self.service_memories.get('chat', [])
+        chat_memories = list(self.service_memories.get('chat', []))
         for memory in chat_memories[-20:]:  # Viimeiset 20
             if 'data' in memory and 'preference' in memory['data']:
                 pref_type = memory['data']['preference_type']
@@ -344,13 +903,8 @@ class AIMemoryLayer:
         """Hakee tärkeimmät insightit"""
         insights = []
         
-        # Hae korkeimman tärkeyden muistit
-        high_importance = [
-            m for m in self.memory_store['interactions'] 
-            if m.get('importance', 0) > 0.8
-        ]
-        
-        for memory in high_importance[-10:]:  # Viimeiset 10
+        # Viimeisimmät korkeimman tärkeyden muistit
+        for memory in self.memory_store['important']:
             insights.append({
                 'type': 'important_memory',
                 'data': memory,
@@ -364,7 +918,7 @@ class AIMemoryLayer:
         context = {}
         
         if service_name in self.service_memories:
-            recent_memories = self.service_memories[service_name][-5:]
+            recent_memories = list(self.service_memories[service_name])[-5:]
             
             context['recent_actions'] = [
                 {
@@ -515,9 +1069,10 @@ class AIMemoryLayer:
         return variance ** 0.5
     
     async def _index_pattern(self, pattern_entry: Dict) -> None:
-        """Indeksoi patternin"""
-        pattern_id = pattern_entry['id']
-        self.memory_index[f"pattern:{pattern_id}"] = [pattern_id]
+        """Pitää patternit rajattuina - vanhimmat poistetaan ensin"""
+        patterns = self.memory_store['patterns']
+        while len(patterns) > PATTERN_LIMIT:
+            del patterns[next(iter(patterns))]
 
 # Singleton instance
 ai_memory_layer = AIMemoryLayer() 
\ No newline at end of file
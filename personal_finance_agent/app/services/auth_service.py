@@ -3,13 +3,17 @@ Authentication service for JWT token management and user verification.
 Handles login, registration, and token-based authentication.
 """
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from fastapi import HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from app.models import User
 from app.schemas import UserCreate, UserLogin, Token
 from app.core.config import settings
@@ -24,16 +28,75 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 
+class ExpiringLRUCache:
+    """
+    Bounded, thread-safe LRU cache whose entries expire at a per-entry deadline.
+    Keeps hit/miss counters for the cache statistics.
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Any, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Any) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Any, value: Any, expires_at: float):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def pop(self, key: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
 class AuthService:
     """
     Authentication service handling user registration, login, and JWT token management.
     Implements secure password hashing and token-based authentication.
+    
+    Authenticated requests are served from two caches: verified token -> claims
+    (never kept past the token's expiry) and user id -> user row snapshot. A
+    cached user is merged into the request's session without a query, so it
+    behaves like a freshly loaded row. User snapshots are dropped whenever a
+    User row is updated or deleted through the ORM.
     """
     
     def __init__(self):
         self.secret_key = settings.secret_key
         self.algorithm = settings.algorithm
         self.access_token_expire_minutes = settings.access_token_expire_minutes
+        self.token_cache = ExpiringLRUCache(settings.auth_token_cache_size)
+        self.user_cache = ExpiringLRUCache(settings.auth_user_cache_size)
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a plain password against its hash."""
@@ -76,12 +139,21 @@ class AuthService:
         Returns:
             Decoded token payload or None if invalid
         """
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return payload
+        
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
         except JWTError as e:
             logger.warning(f"Token verification failed: {e}")
             return None
+        
+        expires_at = time.time() + settings.auth_token_cache_ttl_seconds
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        self.token_cache.put(token, payload, expires_at)
+        return payload
     
     def authenticate_user(self, db: Session, email: str, password: str) -> Optional[User]:
         """
@@ -238,7 +310,7 @@ class AuthService:
         except ValueError:
             raise credentials_exception
         
-        user = db.query(User).filter(User.id == user_id).first()
+        user = self.load_user(db, user_id)
         if user is None:
             raise credentials_exception
         
@@ -307,6 +379,7 @@ class AuthService:
         user.password_hash = self.get_password_hash(new_password)
         user.updated_at = datetime.utcnow()
         db.commit()
+        self.invalidate_user(user.id)
         
         logger.info(f"Password changed for user {user.email}")
         return True
@@ -325,10 +398,45 @@ class AuthService:
         user.is_active = False
         user.updated_at = datetime.utcnow()
         db.commit()
+        self.invalidate_user(user.id)
         
         logger.info(f"User account deactivated: {user.email}")
         return True
     
+    def load_user(self, db: Session, user_id: int) -> Optional[User]:
+        """
+        Get user by id, from the user cache when possible.
+        
+        Args:
+            db: Database session the returned user is attached to
+            user_id: User id
+            
+        Returns:
+            User object or None if not found
+        """
+        values = self.user_cache.get(user_id)
+        if values is not None:
+            cached = User(**values)
+            make_transient_to_detached(cached)
+            return db.merge(cached, load=False)
+        
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None:
+            values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+            self.user_cache.put(user_id, values, time.time() + settings.auth_user_cache_ttl_seconds)
+        return user
+    
+    def invalidate_user(self, user_id: int):
+        """Drop a user's cached row so the next request reloads it."""
+        self.user_cache.pop(user_id)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get token and user cache statistics."""
+        return {
+            "token_cache": self.token_cache.get_stats(),
+            "user_cache": self.user_cache.get_stats()
+        }
+    
     def _is_password_strong(self, password: str) -> bool:
         """
         Validate password strength with enhanced security requirements.
@@ -436,6 +544,7 @@ class AuthService:
         user.password_hash = self.get_password_hash(new_password)
         user.updated_at = datetime.utcnow()
         db.commit()
+        self.invalidate_user(user.id)
         
         logger.info(f"Password reset completed for user {user.email}")
         return True
@@ -444,13 +553,29 @@ class AuthService:
 # Global auth service instance
 auth_service = AuthService()
 
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    """Drop cached user rows on any ORM update, and again once the change is committed."""
+    auth_service.invalidate_user(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("auth_changed_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop("auth_changed_users", ()):
+        auth_service.invalidate_user(user_id)
+
 def get_current_user(db, token: str):
     """Dependency to get the current user from JWT token."""
     payload = auth_service.verify_token(token)
     if not payload or 'sub' not in payload:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     user_id = int(payload['sub'])
-    user = db.query(User).filter(User.id == user_id).first()
+    user = auth_service.load_user(db, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user 
\ No newline at end of file
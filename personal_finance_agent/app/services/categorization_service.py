@@ -70,61 +70,103 @@ class TransactionCategorizationService:
                 - confidence: Confidence score (0-1)
                 - all_predictions: List of all categories with scores
         """
+        result = self.categorize_batch(
+            [{"description": description, "amount": amount, "merchant": merchant}],
+            user_id=user_id,
+            db=db
+        )[0]
+        
+        if result.get("method") == "ml_model":
+            logger.info(f"Categorized '{description}' as '{result['category_name']}' with confidence {result['confidence']:.3f}")
+        return result
+    
+    def categorize_batch(
+        self,
+        transactions: List[Dict[str, Any]],
+        user_id: Optional[int] = None,
+        db: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Categorize many transactions with a single model call.
+        
+        All descriptions are vectorized into one TF-IDF matrix and scored with
+        one predict_proba call; the predicted class is the argmax of the
+        probabilities. Low-confidence rows share one rule-based fallback pass.
+        
+        Args:
+            transactions: Dicts with description, amount and optional merchant
+            user_id: User ID for personalized categorization
+            db: Database session for the rule-based fallback
+            
+        Returns:
+            One result dict per input, in order (same shape as categorize_transaction)
+        """
+        if not transactions:
+            return []
+        
         if not self.is_trained:
             logger.warning("Model not trained, returning default category")
-            return self._get_default_category()
+            return [self._get_default_category() for _ in transactions]
         
         try:
-            # Prepare features
-            text_features = self._prepare_text_features(description, merchant)
-            
-            # Get predictions
-            probabilities = self.pipeline.predict_proba([text_features])[0]
-            predicted_class = self.pipeline.predict([text_features])[0]
-            
-            # Get confidence score
-            max_confidence = max(probabilities)
-            
-            # If confidence is too low, apply fallback strategies
-            if max_confidence < self.min_confidence:
-                fallback_result = self._apply_fallback_categorization(
-                    description, amount, merchant, user_id, db
-                )
-                if fallback_result:
-                    return fallback_result
-            
-            # Map predicted class back to category
-            category_id = self.category_encoder['class_to_id'].get(predicted_class)
-            category_name = self.category_encoder['class_to_name'].get(predicted_class)
-            
-            # Prepare all predictions for transparency
-            all_predictions = []
+            # Prepare features and score everything at once
+            texts = [
+                self._prepare_text_features(txn.get("description") or "", txn.get("merchant"))
+                for txn in transactions
+            ]
+            probabilities = self.pipeline.predict_proba(texts)
             classes = self.pipeline.classes_
-            for i, prob in enumerate(probabilities):
-                class_name = self.category_encoder['class_to_name'].get(classes[i])
-                if class_name:
-                    all_predictions.append({
-                        "category_name": class_name,
-                        "confidence": float(prob)
-                    })
+            best = probabilities.argmax(axis=1)
+            ranked = np.argsort(-probabilities, axis=1)
+            class_to_id = self.category_encoder['class_to_id']
+            class_to_name = self.category_encoder['class_to_name']
             
-            # Sort by confidence
-            all_predictions.sort(key=lambda x: x['confidence'], reverse=True)
+            results = []
+            low_confidence = []
+            for row, txn in enumerate(transactions):
+                max_confidence = float(probabilities[row, best[row]])
+                predicted_class = classes[best[row]]
+                
+                # Top 5 named predictions for transparency
+                all_predictions = []
+                for index in ranked[row]:
+                    class_name = class_to_name.get(classes[index])
+                    if class_name:
+                        all_predictions.append({
+                            "category_name": class_name,
+                            "confidence": float(probabilities[row, index])
+                        })
+                        if len(all_predictions) == 5:
+                            break
+                
+                results.append({
+                    "category_id": class_to_id.get(predicted_class),
+                    "category_name": class_to_name.get(predicted_class),
+                    "confidence": max_confidence,
+                    "all_predictions": all_predictions,
+                    "method": "ml_model"
+                })
+                
+                # If confidence is too low, apply fallback strategies
+                if max_confidence < self.min_confidence:
+                    low_confidence.append(row)
             
-            result = {
-                "category_id": category_id,
-                "category_name": category_name,
-                "confidence": float(max_confidence),
-                "all_predictions": all_predictions[:5],  # Top 5 predictions
-                "method": "ml_model"
-            }
+            if low_confidence and db:
+                rules = self._load_fallback_rules(db)
+                for row in low_confidence:
+                    txn = transactions[row]
+                    fallback_result = self._match_fallback_rules(
+                        rules, txn.get("description") or "", txn.get("merchant")
+                    )
+                    if fallback_result:
+                        results[row] = fallback_result
             
-            logger.info(f"Categorized '{description}' as '{category_name}' with confidence {max_confidence:.3f}")
-            return result
+            logger.debug(f"Categorized batch of {len(transactions)} ({len(low_confidence)} low confidence)")
+            return results
             
         except Exception as e:
             logger.error(f"Categorization failed: {e}")
-            return self._get_default_category()
+            return [self._get_default_category() for _ in transactions]
     
     def train_model(self, db: Session, force_retrain: bool = False) -> Dict[str, Any]:
         """
@@ -343,24 +385,43 @@ class TransactionCategorizationService:
         if not db:
             return None
         
-        # Rule-based categorization using category keywords
-        categories = db.query(Category).all()
+        return self._match_fallback_rules(self._load_fallback_rules(db), description, merchant)
+    
+    def _load_fallback_rules(self, db: Session) -> Dict[str, Any]:
+        """Load category keywords and the default category once per batch."""
+        keyword_rules = []
+        for category in db.query(Category).all():
+            if category.keywords:
+                keywords = [kw.strip().lower() for kw in category.keywords.split(',') if kw.strip()]
+                keyword_rules.append((category, keywords))
+        
+        # If no keyword matches, fall back to the default expense category
+        default_category = db.query(Category).filter(
+            Category.name == "Muut",
+            Category.is_income == False
+        ).first()
         
+        return {"keywords": keyword_rules, "default": default_category}
+    
+    def _match_fallback_rules(
+        self,
+        rules: Dict[str, Any],
+        description: str,
+        merchant: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Rule-based categorization using category keywords."""
         best_match = None
         best_score = 0
         
         text_to_match = f"{description} {merchant or ''}".lower()
         
-        for category in categories:
-            if category.ml_keywords:
-                keywords = [kw.strip().lower() for kw in category.ml_keywords.split(',')]
-                
-                # Simple keyword matching score
-                score = sum(1 for keyword in keywords if keyword in text_to_match)
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = category
+        for category, keywords in rules["keywords"]:
+            # Simple keyword matching score
+            score = sum(1 for keyword in keywords if keyword in text_to_match)
+            
+            if score > best_score:
+                best_score = score
+                best_match = category
         
         if best_match and best_score > 0:
             return {
@@ -371,12 +432,7 @@ class TransactionCategorizationService:
                 "method": "rule_based_fallback"
             }
         
-        # If no match, return default expense category
-        default_category = db.query(Category).filter(
-            Category.name == "Muut",
-            Category.type == "expense"
-        ).first()
-        
+        default_category = rules["default"]
         if default_category:
             return {
                 "category_id": default_category.id,
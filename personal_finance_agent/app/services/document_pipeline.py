@@ -0,0 +1,263 @@
+"""
+Document processing pipeline.
+Claims pending documents in leased batches, runs OCR in a process pool and
+writes the results and the resulting transactions back one batch at a time.
+"""
+import asyncio
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models import Document, ProcessingStatus, Transaction
+from app.models.transaction import TransactionSource, TransactionStatus
+from app.services.event_bus import EventType, publish_event
+from app.services.rollup_service import rollup_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_PATTERN = re.compile(r'(\d+[.,]\d{2})')
+DEFAULT_CATEGORY_ID = 1
+
+_worker_engine = None
+
+
+def _init_ocr_worker(preferred_service: str):
+    """Create one OCR engine per worker process."""
+    global _worker_engine
+    from app.services.ocr_service import OCREngine
+    _worker_engine = OCREngine(preferred_service)
+
+
+def _ocr_document(file_path: str) -> Dict[str, Any]:
+    """Run OCR and receipt parsing for one file (executes in a worker process)."""
+    try:
+        text, confidence = _worker_engine.extract_text(file_path)
+        return {
+            "text": text,
+            "confidence": confidence,
+            "service": type(_worker_engine.ocr_service).__name__,
+            **parse_receipt_text(text)
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def parse_receipt_text(text: str) -> Dict[str, Any]:
+    """Pick the amount and a description line out of OCR text."""
+    amount = 0.0
+    description = ""
+
+    for line in text.split('\n'):
+        if '€' in line or 'EUR' in line:
+            amount_match = AMOUNT_PATTERN.search(line)
+            if amount_match:
+                amount = float(amount_match.group(1).replace(',', '.'))
+
+        if len(line.strip()) > 5 and not amount:
+            description = line.strip()
+
+    return {"amount": amount, "description": description}
+
+
+class DocumentProcessingPipeline:
+    """
+    Parallel OCR for the pending document backlog.
+
+    Workers claim documents by flipping PENDING -> PROCESSING with a
+    compare-and-set UPDATE per row (plus FOR UPDATE SKIP LOCKED on databases
+    that support it), so concurrent workers or scheduler instances never
+    process the same document. A PROCESSING claim older than the lease is
+    considered abandoned and can be claimed again. The claim's
+    processing_started_at doubles as the lease token: results are written
+    with a compare-and-set on it, so a worker whose lease expired and was
+    reclaimed drops its results instead of writing them twice. OCR for a
+    batch runs in a process pool; document updates, transactions and rollups
+    for the batch are committed together.
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 lease_seconds: Optional[int] = None, preferred_service: Optional[str] = None):
+        self.workers = workers or settings.ocr_workers or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.ocr_batch_size
+        self.lease_seconds = lease_seconds or settings.ocr_lease_seconds
+        self.preferred_service = preferred_service or settings.ocr_service
+        self.worker_id = uuid.uuid4().hex[:8]
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_ocr_worker,
+                initargs=(self.preferred_service,)
+            )
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def claim_batch(self, db: Session, limit: Optional[int] = None) -> List[Document]:
+        """Lease up to `limit` claimable documents for this worker."""
+        now = datetime.utcnow()
+        claimable = or_(
+            Document.processing_status == ProcessingStatus.PENDING,
+            and_(
+                Document.processing_status == ProcessingStatus.PROCESSING,
+                Document.processing_started_at < now - timedelta(seconds=self.lease_seconds)
+            )
+        )
+        candidates = [
+            row.id for row in db.query(Document.id).filter(claimable)
+            .order_by(Document.created_at.asc(), Document.id.asc())
+            .limit(limit or self.batch_size)
+            .with_for_update(skip_locked=True)
+        ]
+
+        claimed = []
+        for document_id in candidates:
+            updated = db.query(Document).filter(Document.id == document_id, claimable).update(
+                {"processing_status": ProcessingStatus.PROCESSING, "processing_started_at": now},
+                synchronize_session=False
+            )
+            if updated:
+                claimed.append(document_id)
+        db.commit()
+
+        if not claimed:
+            return []
+        return db.query(Document).filter(Document.id.in_(claimed)).order_by(Document.id).all()
+
+    def process_batch(self, db: Session, documents: List[Document]) -> Dict[str, int]:
+        """OCR a claimed batch in parallel and commit its results in one transaction."""
+        leases = [(document.id, document.user_id, document.created_at, document.processing_started_at)
+                  for document in documents]
+        results = list(self.pool.map(_ocr_document, [document.file_path for document in documents]))
+        now = datetime.utcnow()
+
+        transactions = []
+        failed = lease_lost = 0
+        for (document_id, user_id, created_at, claimed_at), result in zip(leases, results):
+            if "error" in result:
+                values = {
+                    "processing_status": ProcessingStatus.FAILED,
+                    "processing_error": result["error"],
+                    "processing_completed_at": now
+                }
+            else:
+                values = {
+                    "processing_status": ProcessingStatus.PROCESSED,
+                    "processing_completed_at": now,
+                    "extracted_text": result["text"],
+                    "extraction_confidence": result["confidence"],
+                    "ocr_service_used": result["service"]
+                }
+                if result["amount"] > 0:
+                    values["extracted_amount"] = result["amount"]
+
+            if not self._write_result(db, document_id, claimed_at, values):
+                lease_lost += 1
+                logger.warning(f"Lease on document {document_id} was lost; dropping worker {self.worker_id}'s result")
+                continue
+
+            if "error" in result:
+                failed += 1
+                logger.error(f"Failed to process document {document_id}: {result['error']}")
+            elif result["amount"] > 0:
+                transactions.append(Transaction(
+                    user_id=user_id,
+                    amount=result["amount"],
+                    description=result["description"] or "OCR extracted transaction",
+                    transaction_date=created_at or now,
+                    category_id=DEFAULT_CATEGORY_ID,
+                    source=TransactionSource.OCR_RECEIPT,
+                    status=TransactionStatus.PENDING,
+                    confidence_score=result["confidence"],
+                    raw_text=result["text"],
+                    document_id=document_id
+                ))
+
+        db.add_all(transactions)
+        rollup_service.add_transactions(db, transactions)
+        db.commit()
+
+        self._publish_created(transactions)
+        return {
+            "processed": len(documents) - failed - lease_lost,
+            "failed": failed,
+            "lease_lost": lease_lost,
+            "transactions_created": len(transactions)
+        }
+
+    def _write_result(self, db: Session, document_id: int, claimed_at: datetime, values: Dict[str, Any]) -> bool:
+        """Store a result only if this worker's claim is still the current one."""
+        updated = db.query(Document).filter(
+            Document.id == document_id,
+            Document.processing_status == ProcessingStatus.PROCESSING,
+            Document.processing_started_at == claimed_at
+        ).update(values, synchronize_session=False)
+        return bool(updated)
+
+    def run(self, db: Session, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """Drain the backlog batch by batch and report throughput."""
+        started = time.perf_counter()
+        totals = {"batches": 0, "processed": 0, "failed": 0, "lease_lost": 0, "transactions_created": 0}
+
+        while max_batches is None or totals["batches"] < max_batches:
+            documents = self.claim_batch(db, limit=self.batch_size)
+            if not documents:
+                break
+            batch = self.process_batch(db, documents)
+            totals["batches"] += 1
+            for key, value in batch.items():
+                totals[key] += value
+
+        elapsed = time.perf_counter() - started
+        handled = totals["processed"] + totals["failed"]
+        totals["elapsed_seconds"] = round(elapsed, 3)
+        totals["documents_per_second"] = round(handled / elapsed, 2) if elapsed > 0 else 0.0
+        if handled:
+            logger.info(
+                f"Document pipeline {self.worker_id}: {handled} documents in {elapsed:.1f}s "
+                f"({totals['documents_per_second']}/s, {self.workers} workers)"
+            )
+        return totals
+
+    def _publish_created(self, transactions: List[Transaction]):
+        """Publish TRANSACTION_CREATED for a committed batch."""
+        if not transactions:
+            return
+        events = [
+            publish_event(
+                EventType.TRANSACTION_CREATED,
+                transaction.user_id,
+                {"transaction_id": transaction.id, "amount": transaction.amount,
+                 "description": transaction.description},
+                "document_service"
+            )
+            for transaction in transactions
+        ]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        async def publish_all():
+            await asyncio.gather(*events, return_exceptions=True)
+
+        if loop is None:
+            asyncio.run(publish_all())
+        else:
+            loop.create_task(publish_all())
+
+
+document_pipeline = DocumentProcessingPipeline()
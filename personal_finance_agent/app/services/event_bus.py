@@ -3,14 +3,20 @@ Event Bus Service - Palveluiden välinen kommunikaatio
 Event-driven arkkitehtuuri Sentinel 100K:lle
 """
 import asyncio
+import heapq
 import json
 import logging
-from datetime import datetime
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Callable, Optional
 from enum import Enum
 from dataclasses import dataclass, asdict
 from sqlalchemy.orm import Session
+from app.core.config import settings, get_data_path
 from app.db.init_db import SessionLocal
+from app.services.event_log import EventLog
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +38,8 @@ class EventType(Enum):
     SAVINGS_GOAL_UPDATED = "savings_goal_updated"
     INCOME_DETECTED = "income_detected"
     EXPENSE_ANOMALY = "expense_anomaly"
+    BUDGET_PREDICTION_UPDATED = "budget_prediction_updated"
+    BUDGET_OPTIMIZATION_APPLIED = "budget_optimization_applied"
     
     # AI Service events
     IDEA_GENERATED = "idea_generated"
@@ -54,6 +62,7 @@ class Event:
     timestamp: datetime
     source: str
     priority: str = "normal"  # low, normal, high, critical
+    offset: Optional[int] = None  # Position in the durable event log
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert event to dictionary"""
@@ -65,6 +74,84 @@ class Event:
             "source": self.source,
             "priority": self.priority
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], offset: Optional[int] = None) -> "Event":
+        """Create event from dictionary"""
+        return cls(
+            event_type=EventType(data["event_type"]),
+            user_id=data["user_id"],
+            data=data["data"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            source=data["source"],
+            priority=data["priority"],
+            offset=offset
+        )
+
+PRIORITY_ORDER = ["critical", "high", "normal", "low"]
+
+# Täyden jonon käsittely prioriteeteittain:
+# block = julkaisija odottaa tilaa (enintään block_timeout), drop_oldest = vanhin jonossa
+# oleva tapahtuma pudotetaan, drop_new = uusi tapahtuma hylätään
+DEFAULT_OVERFLOW_POLICIES = {
+    "critical": "block",
+    "high": "block",
+    "normal": "drop_oldest",
+    "low": "drop_oldest"
+}
+
+
+class _DurableCursor:
+    """
+    Kestävän tilaajan kuittaamattomat offsetit.
+    
+    Vesiraja on suurin offset, jota pienemmät tämän tilaajan tapahtumat on
+    kaikki käsitelty; epäonnistuneet ja jonosta pudotetut tapahtumat pitävät
+    sen paikallaan, kunnes ne on toimitettu uudelleen.
+    """
+    
+    def __init__(self, committed: int):
+        self.committed = committed
+        self.highest = committed
+        self.unacked = set()
+        self.acked = set()  # Kuitatut vesirajan yläpuolella
+        self.failed = set()
+        self.recovered = False
+        self.redelivery_lock: Optional[asyncio.Lock] = None
+        self._heap: List[int] = []
+    
+    def track(self, offset: int):
+        if offset not in self.unacked:
+            self.unacked.add(offset)
+            heapq.heappush(self._heap, offset)
+        self.failed.discard(offset)
+        self.highest = max(self.highest, offset)
+    
+    def ack(self, offsets) -> bool:
+        """Kuittaa offsetit; palauttaa True jos vesiraja nousi"""
+        self.unacked.difference_update(offsets)
+        self.failed.difference_update(offsets)
+        self.acked.update(offsets)
+        while self._heap and self._heap[0] not in self.unacked:
+            heapq.heappop(self._heap)
+        watermark = self._heap[0] - 1 if self._heap else self.highest
+        if watermark > self.committed:
+            self.committed = watermark
+            self.acked = {offset for offset in self.acked if offset > watermark}
+            return True
+        return False
+    
+    def fail(self, offsets):
+        self.failed.update(offset for offset in offsets if offset in self.unacked)
+
+
+@dataclass
+class _Subscriber:
+    callback: Callable
+    batch: bool = False
+    name: Optional[str] = None
+    cursor: Optional[_DurableCursor] = None
+
 
 class EventBus:
     """
@@ -72,18 +159,53 @@ class EventBus:
     
     Ominaisuudet:
     - Asynkroninen event processing
-    - Prioriteettijärjestelmä
-    - Event history ja replay
+    - Prioriteettijärjestelmä (critical > high > normal > low)
+    - Rajatut jonot ja täyden jonon käsittelypolitiikat (backpressure)
+    - Usea rinnakkainen kuluttaja
+    - Saman tyypin tapahtumien niputus erä-tilaajille
+    - Event history (rengaspuskuri) ja replay
+    - Valinnainen pysyvä tapahtumaloki, kestävät tilaajat ja uudelleentoimitus
     - Service discovery
     - Error handling ja retry logic
+    
+    Jokaisella prioriteetilla on oma rajattu jononsa ja kuluttajat ottavat
+    aina korkeimman prioriteetin tapahtuman ensin, joten tuhansien
+    normaalien tapahtumien ryöppy ei viivästä hälytyksiä. Peräkkäiset saman
+    tyypin tapahtumat otetaan jonosta kerralla (enintään batch_size) ja
+    toimitetaan batch=True -tilaajille yhtenä listana.
+    
+    Kun tapahtumaloki on käytössä, jokainen tapahtuma kirjoitetaan lokiin
+    ennen jonoon lisäämistä. Nimetyt (durable_name) tilaajat kuittaavat
+    käsittelemänsä tapahtumat, ja kuittaamattomat toimitetaan uudelleen
+    lokista: käynnistyksessä, tilauksen yhteydessä ja määräajoin
+    epäonnistuneille. Historia ja replay luetaan tällöin lokista.
     """
     
-    def __init__(self):
-        self.subscribers: Dict[EventType, List[Callable]] = {}
-        self.event_history: List[Event] = []
+    def __init__(self, max_queue_size: int = None, consumers: int = None, batch_size: int = None,
+                 max_history_size: int = None, overflow_policies: Dict[str, str] = None,
+                 block_timeout: float = 1.0, event_log: Optional[EventLog] = None):
+        self.subscribers: Dict[EventType, List[_Subscriber]] = {}
+        self.max_history_size = max_history_size or settings.event_bus_history_size
+        self.event_history: deque = deque(maxlen=self.max_history_size)
         self.is_running = False
-        self.event_queue = asyncio.Queue()
-        self.max_history_size = 10000
+        self.max_queue_size = max_queue_size or settings.event_bus_queue_size
+        self.consumers = consumers or settings.event_bus_consumers
+        self.batch_size = batch_size or settings.event_bus_batch_size
+        self.overflow_policies = {**DEFAULT_OVERFLOW_POLICIES, **(overflow_policies or {})}
+        self.block_timeout = block_timeout
+        self.queues: Dict[str, deque] = {priority: deque() for priority in PRIORITY_ORDER}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._available: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._consumer_tasks: List[asyncio.Task] = []
+        self._background_tasks = set()
+        
+        # Durable event log
+        if event_log is None and settings.event_log_enabled:
+            event_log = EventLog(settings.event_log_path or os.path.join(get_data_path(), "event_log.db"))
+        self.event_log = event_log
+        self._cursor_lock = threading.Lock()
         
         # Service registry
         self.services = {}
@@ -92,6 +214,9 @@ class EventBus:
         self.stats = {
             "events_processed": 0,
             "events_failed": 0,
+            "events_dropped": 0,
+            "batches_dispatched": 0,
+            "events_redelivered": 0,
             "active_subscribers": 0
         }
     
@@ -100,55 +225,157 @@ class EventBus:
         if self.is_running:
             return
         
+        self._loop = asyncio.get_running_loop()
+        self._available = asyncio.Event()
+        self._space = asyncio.Event()
         self.is_running = True
-        asyncio.create_task(self._process_events())
-        logger.info("Event Bus started successfully")
+        if self.queue_size():
+            self._available.set()
+        self._consumer_tasks = [asyncio.create_task(self._process_events()) for _ in range(self.consumers)]
+        if self.event_log is not None:
+            self._consumer_tasks.append(asyncio.create_task(self._redelivery_loop()))
+        logger.info(f"Event Bus started successfully ({self.consumers} consumers)")
     
     async def stop(self):
         """Stop event bus"""
         self.is_running = False
+        tasks = self._consumer_tasks + list(self._background_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._consumer_tasks = []
+        self._background_tasks.clear()
         logger.info("Event Bus stopped")
     
-    def subscribe(self, event_type: EventType, callback: Callable):
-        """Subscribe to event type"""
+    def subscribe(self, event_type: EventType, callback: Callable, batch: bool = False,
+                  durable_name: Optional[str] = None):
+        """
+        Subscribe to event type
+        
+        batch=True: callback saa listan saman tyypin tapahtumia kerralla.
+        durable_name: tilaaja kuittaa tapahtumat ja saa kuittaamattomat
+        uudelleen tapahtumalokista (vaatii lokin, nimi yksilöi tilauksen).
+        """
         if event_type not in self.subscribers:
             self.subscribers[event_type] = []
         
-        self.subscribers[event_type].append(callback)
+        subscriber = _Subscriber(callback, batch)
+        if durable_name and self.event_log is not None:
+            subscriber.name = durable_name
+            subscriber.cursor = _DurableCursor(self.event_log.committed_offset(durable_name))
+        self.subscribers[event_type].append(subscriber)
+        if subscriber.cursor is not None and self._on_bus_loop():
+            self._spawn(self.redeliver(durable_name))
         self.stats["active_subscribers"] = sum(len(callbacks) for callbacks in self.subscribers.values())
         logger.info(f"Subscribed to {event_type.value}")
     
     def unsubscribe(self, event_type: EventType, callback: Callable):
         """Unsubscribe from event type"""
         if event_type in self.subscribers:
-            if callback in self.subscribers[event_type]:
-                self.subscribers[event_type].remove(callback)
+            remaining = [subscriber for subscriber in self.subscribers[event_type] if subscriber.callback != callback]
+            if len(remaining) != len(self.subscribers[event_type]):
+                self.subscribers[event_type] = remaining
                 self.stats["active_subscribers"] = sum(len(callbacks) for callbacks in self.subscribers.values())
                 logger.info(f"Unsubscribed from {event_type.value}")
     
-    async def publish(self, event: Event):
-        """Publish event to all subscribers"""
+    async def publish(self, event: Event) -> bool:
+        """Publish event to all subscribers. Returns False if the event was dropped."""
         try:
+            # Write-ahead: lokiin ennen jonoa, jotta kaatuminen ei hukkaa tapahtumaa
+            if self.event_log is not None:
+                event.offset = self.event_log.append([event.to_dict()])[0]
+                self._track(event)
+            
             # Add to history
             self.event_history.append(event)
-            if len(self.event_history) > self.max_history_size:
-                self.event_history.pop(0)
             
-            # Add to processing queue
-            await self.event_queue.put(event)
+            priority = event.priority if event.priority in self.queues else "normal"
+            policy = self.overflow_policies.get(priority, "drop_oldest")
+            
+            if policy == "block" and self._on_bus_loop():
+                deadline = self._loop.time() + self.block_timeout
+                while len(self.queues[priority]) >= self.max_queue_size and self.is_running:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    self._space.clear()
+                    try:
+                        await asyncio.wait_for(self._space.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+            
+            dropped = self._enqueue(event, priority, "drop_new" if policy == "drop_new" else "drop_oldest")
+            if dropped is not None:
+                self._mark_failed(dropped)
+            self._notify()
             logger.debug(f"Published event: {event.event_type.value}")
+            return dropped is not event
             
         except Exception as e:
             logger.error(f"Failed to publish event: {e}")
             self.stats["events_failed"] += 1
+            return False
+    
+    def _enqueue(self, event: Event, priority: str, policy: str) -> Optional[Event]:
+        """Lisää tapahtuman jonoon; palauttaa pudotetun tapahtuman, jos jono oli täynnä"""
+        with self._lock:
+            queue = self.queues[priority]
+            dropped = None
+            if len(queue) >= self.max_queue_size:
+                self.stats["events_dropped"] += 1
+                if policy == "drop_new":
+                    return event
+                dropped = queue.popleft()
+            queue.append(event)
+            return dropped
+    
+    def _on_bus_loop(self) -> bool:
+        if not self.is_running or self._loop is None:
+            return False
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+    
+    def _notify(self):
+        """Herätä kuluttajat (myös toisesta säikeestä tai event loopista julkaistaessa)"""
+        if not self.is_running or self._available is None:
+            return
+        if self._on_bus_loop():
+            self._available.set()
+        else:
+            self._loop.call_soon_threadsafe(self._available.set)
+    
+    def _take_batch(self) -> List[Event]:
+        """Korkeimman prioriteetin tapahtuma ja sitä jonossa seuraavat saman tyypin tapahtumat"""
+        with self._lock:
+            for priority in PRIORITY_ORDER:
+                queue = self.queues[priority]
+                if not queue:
+                    continue
+                batch = [queue.popleft()]
+                while queue and len(batch) < self.batch_size and queue[0].event_type == batch[0].event_type:
+                    batch.append(queue.popleft())
+                return batch
+            return []
     
     async def _process_events(self):
-        """Process events from queue"""
+        """Process events from the priority queues"""
         while self.is_running:
             try:
-                event = await self.event_queue.get()
-                await self._handle_event(event)
-                self.stats["events_processed"] += 1
+                batch = self._take_batch()
+                if not batch:
+                    self._available.clear()
+                    # Julkaisu on voinut tapahtua tarkistuksen ja clear():n välissä
+                    if self.queue_size():
+                        continue
+                    await self._available.wait()
+                    continue
+                self._space.set()
+                
+                await self._handle_batch(batch)
+                self.stats["events_processed"] += len(batch)
+                self.stats["batches_dispatched"] += 1
                 
             except asyncio.CancelledError:
                 break
@@ -158,30 +385,182 @@ class EventBus:
     
     async def _handle_event(self, event: Event):
         """Handle individual event"""
-        if event.event_type not in self.subscribers:
+        await self._handle_batch([event])
+    
+    async def _handle_batch(self, events: List[Event]):
+        """Toimita saman tyypin tapahtumat tilaajille"""
+        event_type = events[0].event_type
+        if event_type not in self.subscribers:
             return
         
         # Get subscribers for this event type
-        callbacks = self.subscribers[event.event_type].copy()
+        subscribers = list(self.subscribers[event_type])
         
-        # Execute callbacks
-        tasks = []
-        for callback in callbacks:
-            try:
+        # Execute callbacks and wait for all of them to complete
+        if len(subscribers) == 1:
+            await self._deliver(subscribers[0], events)
+        elif subscribers:
+            await asyncio.gather(*(self._deliver(subscriber, events) for subscriber in subscribers))
+    
+    async def _deliver(self, subscriber: _Subscriber, events: List[Event]):
+        """Toimita tapahtumat yhdelle tilaajalle ja kuittaa onnistuneet"""
+        event_type = events[0].event_type
+        callback = subscriber.callback
+        failed = []
+        try:
+            if subscriber.batch:
                 if asyncio.iscoroutinefunction(callback):
-                    task = asyncio.create_task(callback(event))
-                    tasks.append(task)
+                    await callback(events)
                 else:
                     # Run sync callback in thread pool
-                    loop = asyncio.get_event_loop()
-                    task = loop.run_in_executor(None, callback, event)
-                    tasks.append(task)
+                    await asyncio.to_thread(callback, events)
+            elif asyncio.iscoroutinefunction(callback):
+                if len(events) == 1:
+                    await callback(events[0])
+                else:
+                    results = await asyncio.gather(*(callback(event) for event in events), return_exceptions=True)
+                    for event, result in zip(events, results):
+                        if isinstance(result, Exception):
+                            logger.error(f"Error executing callback for {event_type.value}: {result}")
+                            failed.append(event)
+            else:
+                # Yksi executor-kutsu koko erälle
+                failed = await asyncio.to_thread(_call_each, callback, events)
+        except Exception as e:
+            logger.error(f"Error executing callback for {event_type.value}: {e}")
+            failed = events
+        
+        if subscriber.cursor is not None:
+            self._acknowledge(subscriber, events, failed)
+    
+    def _track(self, event: Event):
+        """Kirjaa uuden lokitapahtuman kuittaamattomaksi sen kestäville tilaajille"""
+        with self._cursor_lock:
+            for subscriber in self.subscribers.get(event.event_type, []):
+                if subscriber.cursor is not None:
+                    subscriber.cursor.track(event.offset)
+    
+    def _mark_failed(self, event: Event):
+        if event.offset is None:
+            return
+        with self._cursor_lock:
+            for subscriber in self.subscribers.get(event.event_type, []):
+                if subscriber.cursor is not None:
+                    subscriber.cursor.fail([event.offset])
+    
+    def _acknowledge(self, subscriber: _Subscriber, events: List[Event], failed: List[Event]):
+        failed_offsets = {event.offset for event in failed}
+        acked = [event.offset for event in events if event.offset is not None and event.offset not in failed_offsets]
+        with self._cursor_lock:
+            subscriber.cursor.fail(failed_offsets)
+            advanced = subscriber.cursor.ack(acked)
+            committed = subscriber.cursor.committed
+        if advanced:
+            self.event_log.commit_offset(subscriber.name, committed)
+    
+    async def redeliver(self, durable_name: Optional[str] = None) -> int:
+        """
+        Toimita kestäville tilaajille lokista tapahtumat, joita ne eivät ole kuitanneet.
+        
+        Tämän prosessin jonossa tai käsittelyssä olevat tapahtumat ohitetaan,
+        joten toimitettavaksi jäävät edellisen ajon käsittelemättömät sekä
+        epäonnistuneet ja jonosta pudotetut tapahtumat.
+        """
+        if self.event_log is None:
+            return 0
+        
+        delivered = 0
+        for event_type, subscribers in list(self.subscribers.items()):
+            for subscriber in subscribers:
+                if subscriber.cursor is None or (durable_name and subscriber.name != durable_name):
+                    continue
+                delivered += await self._redeliver_to(event_type, subscriber)
+        
+        if delivered:
+            self.stats["events_redelivered"] += delivered
+            logger.info(f"Redelivered {delivered} events from event log")
+        return delivered
+    
+    async def _redeliver_to(self, event_type: EventType, subscriber: _Subscriber) -> int:
+        cursor = subscriber.cursor
+        if cursor.redelivery_lock is None:
+            cursor.redelivery_lock = asyncio.Lock()
+        
+        delivered = 0
+        async with cursor.redelivery_lock:
+            with self._cursor_lock:
+                # Jonossa/käsittelyssä olevat ja jo kuitatut ohitetaan
+                skip = (cursor.unacked - cursor.failed) | cursor.acked
+                after = cursor.committed
+                before = self.event_log.last_offset() + 1
+                cursor.recovered = True
+            while True:
+                rows = await asyncio.to_thread(
+                    self.event_log.read, [event_type.value], after=after, before=before, limit=self.batch_size
+                )
+                if not rows:
+                    return delivered
+                after = rows[-1][0]
+                events = [Event.from_dict(data, offset) for offset, data in rows if offset not in skip]
+                if not events:
+                    continue
+                with self._cursor_lock:
+                    for event in events:
+                        cursor.track(event.offset)
+                await self._deliver(subscriber, events)
+                delivered += len(events)
+    
+    async def _redelivery_loop(self):
+        """Toista määräajoin epäonnistuneet ja vielä palauttamattomat kestävät tilaukset"""
+        while self.is_running:
+            try:
+                for subscribers in list(self.subscribers.values()):
+                    for subscriber in subscribers:
+                        if subscriber.cursor is not None and (subscriber.cursor.failed or not subscriber.cursor.recovered):
+                            await self.redeliver(subscriber.name)
+                await asyncio.sleep(settings.event_log_redelivery_seconds)
+            except asyncio.CancelledError:
+                break
             except Exception as e:
-                logger.error(f"Error executing callback for {event.event_type.value}: {e}")
+                logger.error(f"Event redelivery failed: {e}")
+                await asyncio.sleep(settings.event_log_redelivery_seconds)
+    
+    async def replay(self, handler: Callable, event_types: Optional[List[EventType]] = None,
+                     user_id: Optional[int] = None, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None, batch_size: int = 1000) -> int:
+        """
+        Toista lokin tapahtumat suoraan käsittelijälle erinä offsetjärjestyksessä.
         
-        # Wait for all tasks to complete
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        Tarkoitettu johdetun tilan (ennusteet, muistit) uudelleenrakennukseen:
+        tapahtumat eivät kulje jonojen eivätkä tilaajien kautta. Palauttaa
+        toistettujen tapahtumien määrän.
+        """
+        if self.event_log is None:
+            raise RuntimeError("Event log is not enabled")
+        
+        types = [event_type.value for event_type in event_types] if event_types else None
+        after, replayed = 0, 0
+        while True:
+            rows = await asyncio.to_thread(
+                self.event_log.read, types, user_id, since, until, after=after, limit=batch_size
+            )
+            if not rows:
+                return replayed
+            after = rows[-1][0]
+            events = [Event.from_dict(data, offset) for offset, data in rows]
+            if asyncio.iscoroutinefunction(handler):
+                await handler(events)
+            else:
+                await asyncio.to_thread(handler, events)
+            replayed += len(events)
+    
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    def queue_size(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
     
     def register_service(self, service_name: str, service_instance: Any):
         """Register service for discovery"""
@@ -196,7 +575,13 @@ class EventBus:
                          user_id: Optional[int] = None, 
                          limit: int = 100) -> List[Event]:
         """Get event history with filters"""
-        events = self.event_history
+        if self.event_log is not None:
+            rows = self.event_log.read(
+                [event_type.value] if event_type else None, user_id, limit=limit, newest_first=True
+            )
+            return [Event.from_dict(data, offset) for offset, data in reversed(rows)]
+        
+        events = list(self.event_history)
         
         if event_type:
             events = [e for e in events if e.event_type == event_type]
@@ -208,14 +593,43 @@ class EventBus:
     
     def get_stats(self) -> Dict[str, Any]:
         """Get event bus statistics"""
+        durable = {
+            subscriber.name: {
+                "committed_offset": subscriber.cursor.committed,
+                "unacked": len(subscriber.cursor.unacked),
+                "failed": len(subscriber.cursor.failed)
+            }
+            for subscribers in self.subscribers.values()
+            for subscriber in subscribers
+            if subscriber.cursor is not None
+        }
         return {
             **self.stats,
             "event_types": len(self.subscribers),
             "history_size": len(self.event_history),
-            "queue_size": self.event_queue.qsize(),
+            "queue_size": self.queue_size(),
+            "queue_sizes": {priority: len(queue) for priority, queue in self.queues.items()},
+            "max_queue_size": self.max_queue_size,
+            "consumers": self.consumers,
+            "avg_batch_size": round(self.stats["events_processed"] / self.stats["batches_dispatched"], 2)
+            if self.stats["batches_dispatched"] else 0.0,
+            "event_log_enabled": self.event_log is not None,
+            "durable_subscribers": durable,
             "is_running": self.is_running
         }
 
+
+def _call_each(callback: Callable, events: List[Event]) -> List[Event]:
+    """Kutsuu synkronista callbackia tapahtuma kerrallaan; palauttaa epäonnistuneet"""
+    failed = []
+    for event in events:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Error executing callback for {event.event_type.value}: {e}")
+            failed.append(event)
+    return failed
+
 # Global event bus instance
 event_bus = EventBus()
 
@@ -233,9 +647,10 @@ async def publish_event(event_type: EventType, user_id: Optional[int],
     )
     await event_bus.publish(event)
 
-def subscribe_to_event(event_type: EventType, callback: Callable):
+def subscribe_to_event(event_type: EventType, callback: Callable, batch: bool = False,
+                       durable_name: Optional[str] = None):
     """Subscribe to event on global event bus"""
-    event_bus.subscribe(event_type, callback)
+    event_bus.subscribe(event_type, callback, batch=batch, durable_name=durable_name)
 
 def register_service(service_name: str, service_instance: Any):
     """Register service on global event bus"""
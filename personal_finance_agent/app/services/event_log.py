@@ -0,0 +1,157 @@
+"""
+Event Log - Tapahtumaväylän pysyvä tapahtumaloki
+Vain lisäävä SQLite (WAL) -taulu, tilaajakohtaiset offsetit ja uudelleentoisto
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LogRow = Tuple[int, Dict[str, Any]]
+
+
+class EventLog:
+    """
+    Pysyvä, vain lisäävä tapahtumaloki (SQLite WAL).
+
+    Jokainen julkaistu tapahtuma saa kasvavan offsetin. Kestävät tilaajat
+    tallentavat vesirajansa (offset, jota pienemmät tapahtumat ne ovat kaikki
+    käsitelleet), joten kesken käsittelyn kaatunut tilaaja saa tapahtumat
+    uudelleen käynnistyksen jälkeen (at-least-once). Tyyppi- ja aikaindeksien
+    ansiosta historiaa voidaan lukea ja toistaa suoraan levyltä sivuittain.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_type TEXT NOT NULL,
+                    user_id INTEGER,
+                    timestamp REAL NOT NULL,
+                    source TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_events_type_timestamp ON events (event_type, timestamp);
+                CREATE INDEX IF NOT EXISTS ix_events_timestamp ON events (timestamp);
+                CREATE TABLE IF NOT EXISTS subscriber_offsets (
+                    subscriber TEXT PRIMARY KEY,
+                    committed INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def append(self, events: Sequence[Dict[str, Any]]) -> List[int]:
+        """Kirjoittaa tapahtumat (Event.to_dict()) lokiin ja palauttaa niiden offsetit"""
+        with self._lock, self.connection:
+            return [
+                self.connection.execute(
+                    "INSERT INTO events (event_type, user_id, timestamp, source, priority, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (event["event_type"], event["user_id"],
+                     datetime.fromisoformat(event["timestamp"]).timestamp(), event["source"],
+                     event["priority"], json.dumps(event["data"], default=str))
+                ).lastrowid
+                for event in events
+            ]
+
+    def read(self, event_types: Optional[Sequence[str]] = None, user_id: Optional[int] = None,
+             since: Optional[datetime] = None, until: Optional[datetime] = None,
+             after: int = 0, before: Optional[int] = None, limit: int = 1000,
+             newest_first: bool = False) -> List[LogRow]:
+        """
+        Yksi sivu (offset, tapahtuma) -rivejä offsetjärjestyksessä.
+
+        Seuraava sivu luetaan antamalla edellisen sivun viimeinen offset
+        after- (tai newest_first-tilassa before-) parametrina.
+        """
+        conditions, params = ["id > ?"], [after]
+        if before is not None:
+            conditions.append("id < ?")
+            params.append(before)
+        if event_types:
+            conditions.append(f"event_type IN ({', '.join('?' for _ in event_types)})")
+            params.extend(event_types)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until.timestamp())
+        params.append(limit)
+
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT id, event_type, user_id, timestamp, source, priority, data FROM events "
+                f"WHERE {' AND '.join(conditions)} ORDER BY id {'DESC' if newest_first else 'ASC'} LIMIT ?",
+                params
+            ).fetchall()
+        return [
+            (offset, {
+                "event_type": event_type,
+                "user_id": user_id,
+                "data": json.loads(data),
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "source": source,
+                "priority": priority
+            })
+            for offset, event_type, user_id, timestamp, source, priority, data in rows
+        ]
+
+    def committed_offset(self, subscriber: str) -> int:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT committed FROM subscriber_offsets WHERE subscriber = ?", (subscriber,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def commit_offset(self, subscriber: str, offset: int) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO subscriber_offsets (subscriber, committed, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(subscriber) DO UPDATE SET committed = excluded.committed, "
+                "updated_at = excluded.updated_at",
+                (subscriber, offset, datetime.now().timestamp())
+            )
+
+    def last_offset(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    def prune(self, before: datetime) -> int:
+        """Poistaa annettua ajankohtaa vanhemmat tapahtumat"""
+        with self._lock, self.connection:
+            removed = self.connection.execute(
+                "DELETE FROM events WHERE timestamp < ?", (before.timestamp(),)
+            ).rowcount
+        if removed:
+            logger.info(f"Pruned {removed} events older than {before.isoformat()} from event log")
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
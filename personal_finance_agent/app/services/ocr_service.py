@@ -3,11 +3,17 @@ OCR Service for document text extraction.
 Supports multiple OCR engines with fallback mechanisms.
 """
 import os
+import json
+import hashlib
 import logging
+import tempfile
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Optional, Dict, Any, Tuple
 import cv2
 import numpy as np
+from app.core.config import settings, get_data_path
 
 # Try to import OCR libraries, but don't fail if they're missing
 try:
@@ -33,6 +39,138 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+
+def preprocess_image(image: np.ndarray, max_dimension: Optional[int] = None) -> np.ndarray:
+    """Downscale, grayscale and deskew an image for OCR."""
+    max_dimension = max_dimension or settings.ocr_max_dimension
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    
+    height, width = gray.shape[:2]
+    scale = max_dimension / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    
+    # Deskew: angle of the minimum-area rectangle around the dark (text) pixels
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(binary)
+    if coords is not None and len(coords) > 50:
+        angle = cv2.minAreaRect(coords)[-1]
+        if angle > 45:
+            angle -= 90
+        elif angle < -45:
+            angle += 90
+        if 0.5 < abs(angle) < 45:
+            height, width = gray.shape[:2]
+            matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+            gray = cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_CUBIC,
+                                  borderMode=cv2.BORDER_REPLICATE)
+    return gray
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of raw file bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def image_hash(image: np.ndarray) -> str:
+    """SHA-256 of normalized pixels, independent of file encoding and metadata."""
+    digest = hashlib.sha256(str(image.shape).encode())
+    digest.update(np.ascontiguousarray(image).tobytes())
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    Content-addressed on-disk cache of OCR results.
+    
+    Entries are small JSON files named by key under the cache directory and
+    written atomically, so several OCR worker processes can share one cache.
+    The least recently used entries are evicted once the directory grows past
+    max_bytes.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes if max_bytes is not None else settings.ocr_cache_max_mb * 1024 * 1024
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+    
+    def _load_index(self):
+        """Build the LRU index from disk, oldest modification first."""
+        if self.directory is None:
+            self.directory = os.path.join(get_data_path(), "ocr_cache")
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as cache_file:
+                    value = json.load(cache_file)
+                os.utime(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self._index[key] = self._index.pop(key, os.path.getsize(path))
+            self.hits += 1
+            return value
+    
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+                json.dump(value, cache_file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            
+            self._total_bytes -= self._index.pop(key, 0)
+            size = os.path.getsize(path)
+            self._index[key] = size
+            self._total_bytes += size
+            
+            if self._total_bytes > self.max_bytes:
+                # Other processes may have written too - re-read the directory before evicting
+                self._load_index()
+                while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                    old_key, old_size = self._index.popitem(last=False)
+                    self._total_bytes -= old_size
+                    try:
+                        os.remove(self._path(old_key))
+                    except OSError:
+                        pass
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index or {}),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
 class BaseOCRService(ABC):
     """Base class for OCR services."""
     
@@ -41,6 +179,16 @@ class BaseOCRService(ABC):
         """Extract text from image and return (text, confidence)."""
         pass
     
+    def extract_text_from_image(self, image: np.ndarray) -> Tuple[str, float]:
+        """Extract text from an already preprocessed image."""
+        fd, path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        try:
+            cv2.imwrite(path, image)
+            return self.extract_text(path)
+        finally:
+            os.remove(path)
+    
     @abstractmethod
     def is_available(self) -> bool:
         """Check if this OCR service is available."""
@@ -54,6 +202,10 @@ class MockOCRService(BaseOCRService):
         logger.info(f"Mock OCR: Processing {image_path}")
         return "MOCK OCR TEXT - Testing mode", 0.8
     
+    def extract_text_from_image(self, image: np.ndarray) -> Tuple[str, float]:
+        """Return mock text for testing."""
+        return "MOCK OCR TEXT - Testing mode", 0.8
+    
     def is_available(self) -> bool:
         """Always available for testing."""
         return True
@@ -79,22 +231,24 @@ class TesseractOCRService(BaseOCRService):
         if not self.available:
             raise RuntimeError("Tesseract OCR not available")
         
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Could not read image: {image_path}")
+        return self.extract_text_from_image(preprocess_image(image))
+    
+    def extract_text_from_image(self, image: np.ndarray) -> Tuple[str, float]:
+        """Extract text from a preprocessed grayscale image."""
+        if not self.available:
+            raise RuntimeError("Tesseract OCR not available")
+        
         try:
-            # Read image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not read image: {image_path}")
-            
-            # Preprocess image
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
             # Extract text
-            text = pytesseract.image_to_string(gray, lang='eng+fin')
+            text = pytesseract.image_to_string(image, lang='eng+fin')
             
             # Get confidence (simplified)
             confidence = 0.8  # Mock confidence for now
             
-            logger.info(f"Tesseract OCR: Extracted {len(text)} characters from {image_path}")
+            logger.info(f"Tesseract OCR: Extracted {len(text)} characters")
             return text.strip(), confidence
             
         except Exception as e:
@@ -122,11 +276,20 @@ class GoogleVisionOCRService(BaseOCRService):
         if not self.available:
             raise RuntimeError("Google Vision OCR not available")
         
+        with open(image_path, 'rb') as image_file:
+            return self._detect_text(image_file.read())
+    
+    def extract_text_from_image(self, image: np.ndarray) -> Tuple[str, float]:
+        """Extract text from a preprocessed image (sent as PNG)."""
+        if not self.available:
+            raise RuntimeError("Google Vision OCR not available")
+        ok, encoded = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Could not encode image")
+        return self._detect_text(encoded.tobytes())
+    
+    def _detect_text(self, content: bytes) -> Tuple[str, float]:
         try:
-            # Read image file
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
-            
             # Create image object
             image = vision.Image(content=content)
             
@@ -141,7 +304,7 @@ class GoogleVisionOCRService(BaseOCRService):
                 # Calculate average confidence
                 confidence = sum(t.confidence for t in texts[1:]) / len(texts[1:]) if len(texts) > 1 else 0.8
                 
-                logger.info(f"Google Vision OCR: Extracted {len(text)} characters from {image_path}")
+                logger.info(f"Google Vision OCR: Extracted {len(text)} characters")
                 return text.strip(), confidence
             else:
                 return "", 0.0
@@ -157,10 +320,11 @@ class GoogleVisionOCRService(BaseOCRService):
 class OCREngine:
     """Main OCR engine that manages multiple OCR services."""
     
-    def __init__(self, preferred_service: str = "tesseract"):
+    def __init__(self, preferred_service: str = "tesseract", cache: Optional[OCRResultCache] = None):
         """Initialize OCR engine with preferred service."""
         self.preferred_service = preferred_service
         self.ocr_service = self._create_ocr_service()
+        self.cache = cache or OCRResultCache()
         logger.info(f"OCR Engine initialized with {self.preferred_service}")
     
     def _create_ocr_service(self) -> BaseOCRService:
@@ -191,8 +355,41 @@ class OCREngine:
         return MockOCRService()
     
     def extract_text(self, image_path: str) -> Tuple[str, float]:
-        """Extract text from image using available OCR service."""
-        return self.ocr_service.extract_text(image_path)
+        """
+        Extract text from image using available OCR service.
+        
+        Results are cached by content: an exact re-upload hits on the raw
+        file hash, and a re-encoded copy of the same image hits on the hash
+        of its preprocessed pixels. Preprocessing runs once per miss and its
+        output is what the OCR service reads.
+        """
+        service = type(self.ocr_service).__name__
+        if isinstance(self.ocr_service, MockOCRService) or not self.ocr_service.is_available():
+            return self.ocr_service.extract_text(image_path)
+        
+        with open(image_path, "rb") as image_file:
+            data = image_file.read()
+        raw_key = content_hash(f"{service}:".encode() + data)
+        cached = self.cache.get(raw_key)
+        if cached is not None:
+            return cached["text"], cached["confidence"]
+        
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            # Not a decodable image (e.g. PDF): let the service read the file itself
+            text, confidence = self.ocr_service.extract_text(image_path)
+        else:
+            prepared = preprocess_image(image)
+            pixel_key = content_hash(f"{service}:{image_hash(prepared)}".encode())
+            cached = self.cache.get(pixel_key)
+            if cached is not None:
+                self.cache.put(raw_key, cached)
+                return cached["text"], cached["confidence"]
+            text, confidence = self.ocr_service.extract_text_from_image(prepared)
+            self.cache.put(pixel_key, {"text": text, "confidence": confidence})
+        
+        self.cache.put(raw_key, {"text": text, "confidence": confidence})
+        return text, confidence
     
     def is_available(self) -> bool:
         """Check if any OCR service is available."""
@@ -205,7 +402,8 @@ class OCREngine:
             "tesseract_available": TESSERACT_AVAILABLE,
             "google_vision_available": GOOGLE_VISION_AVAILABLE,
             "current_service": type(self.ocr_service).__name__,
-            "service_available": self.is_available()
+            "service_available": self.is_available(),
+            "cache": self.cache.get_stats()
         }
 
 # Global OCR engine instance
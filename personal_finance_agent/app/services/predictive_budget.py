@@ -2,13 +2,23 @@
 Sentinel Predictive Budget™ - ML-based Budget Prediction and Optimization
 Integrates with LearningEngine, Watchdog, and Scheduler for intelligent budget management
 """
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
+from ..core.config import settings, get_model_path
 from ..models.transaction import Transaction
 from ..models.user import User
 from ..models.category import Category
+from ..models.transaction_rollup import TransactionRollup
 from ..services.event_bus import EventType, publish_event
+from ..services.rollup_service import rollup_service, month_key
 import logging
 import numpy as np
 import pandas as pd
@@ -22,6 +32,38 @@ from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+FEATURE_COLUMNS = ["transaction_count", "avg_amount", "weekend_ratio", "month_end_ratio"]
+MODEL_PARAMS = {"n_estimators": 100, "random_state": 42, "max_depth": 5}
+# Bump when features or model parameters change so stored models are retrained
+MODEL_VERSION = "1"
+MIN_TRANSACTIONS = 10
+MIN_MONTHS = 3
+
+
+def _fit_category_model(X: np.ndarray, y: np.ndarray) -> Tuple[RandomForestRegressor, StandardScaler, Optional[float]]:
+    """Fit scaler and forest for one category (runs in a worker process)."""
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # Hold-out accuracy from a separate fit; the served model sees every month
+    accuracy = None
+    if len(X) >= 4:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X_scaled, y, test_size=0.25, random_state=42
+        )
+        holdout_model = RandomForestRegressor(**MODEL_PARAMS).fit(X_train, y_train)
+        accuracy = max(0, holdout_model.score(X_test, y_test))
+
+    model = RandomForestRegressor(**MODEL_PARAMS).fit(X_scaled, y)
+    return model, scaler, accuracy
+
+
+def feature_fingerprint(monthly: pd.DataFrame) -> str:
+    """Data version of a category's monthly features; changes whenever a rollup changes."""
+    digest = hashlib.sha256(MODEL_VERSION.encode())
+    digest.update(pd.util.hash_pandas_object(monthly, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
 class BudgetOptimizationLevel(Enum):
     """Budget optimization levels"""
     CONSERVATIVE = "conservative"
@@ -52,6 +94,105 @@ class BudgetOptimization:
     priority: str  # high, medium, low
     reasoning: str
 
+@dataclass
+class CategoryModel:
+    """Fitted model for one (user, category) and the data version it was trained on"""
+    fingerprint: str
+    model: RandomForestRegressor
+    scaler: StandardScaler
+    accuracy: Optional[float]
+    trained_at: datetime
+
+
+class BudgetModelRegistry:
+    """
+    Fitted category models per (user, category).
+
+    Models are kept in a bounded in-memory LRU and pickled to disk so they
+    survive restarts. A stored model is only returned when its fingerprint
+    matches the current features; otherwise the caller retrains.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: Optional[int] = None):
+        self._directory = directory
+        self.max_entries = max_entries or settings.budget_model_cache_size
+        self._models: "OrderedDict[Tuple[int, int], CategoryModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.trained = 0
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = os.path.join(get_model_path(), "budget_models")
+        return self._directory
+
+    def get(self, user_id: int, category_id: int, fingerprint: str) -> Optional[CategoryModel]:
+        """Model trained on exactly this data version, from memory or disk."""
+        key = (user_id, category_id)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+
+        if entry is None:
+            entry = self._load(user_id, category_id)
+            if entry is not None:
+                self._remember(key, entry)
+
+        with self._lock:
+            if entry is not None and entry.fingerprint == fingerprint:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, user_id: int, category_id: int, entry: CategoryModel):
+        self._remember((user_id, category_id), entry)
+        with self._lock:
+            self.trained += 1
+        try:
+            path = self._path(user_id, category_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(entry, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Failed to store budget model for user {user_id} category {category_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models_in_memory": len(self._models),
+                "hits": self.hits,
+                "misses": self.misses,
+                "trained": self.trained
+            }
+
+    def _remember(self, key: Tuple[int, int], entry: CategoryModel):
+        with self._lock:
+            self._models[key] = entry
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_entries:
+                self._models.popitem(last=False)
+
+    def _load(self, user_id: int, category_id: int) -> Optional[CategoryModel]:
+        path = self._path(user_id, category_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable budget model {path}: {e}")
+            return None
+
+    def _path(self, user_id: int, category_id: int) -> str:
+        return os.path.join(self.directory, str(user_id), f"{category_id}.pkl")
+
+
 class PredictiveBudget:
     """
     Sentinel Predictive Budget™ - ML-based Budget Prediction
@@ -64,12 +205,12 @@ class PredictiveBudget:
     - Savings potential calculation and optimization suggestions
     """
     
-    def __init__(self):
-        self.ml_models = {}  # category_id -> RandomForestRegressor
-        self.scalers = {}  # category_id -> StandardScaler
+    def __init__(self, model_registry: Optional[BudgetModelRegistry] = None, workers: Optional[int] = None):
+        self.model_registry = model_registry or BudgetModelRegistry()
+        self.workers = workers or settings.budget_model_workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
         self.prediction_history = {}  # user_id -> List[Dict]
         self.optimization_history = {}  # user_id -> List[Dict]
-        self.model_accuracy = {}  # category_id -> float
         
         # Budget optimization rules
         self.optimization_rules = {
@@ -98,26 +239,27 @@ class PredictiveBudget:
     async def generate_next_month_budget(self, user_id: int, db: Session) -> Dict[str, Any]:
         """Generate ML-based budget prediction for next month"""
         try:
-            # Get user's transaction history
-            transactions = self._get_user_transactions(user_id, db)
+            # Get user's monthly expense history
+            rollups = self._get_monthly_rollups(user_id, db)
             
-            if not transactions:
+            if not rollups:
                 return {
                     "status": "no_data",
                     "message": "Insufficient transaction data for prediction"
                 }
             
             # Prepare features for ML
-            features = self._prepare_features(transactions)
+            features = self._prepare_features(rollups)
+            
+            # Reuse stored models; retrain only categories whose data changed
+            models = await self._get_category_models(user_id, features)
             
             # Generate predictions for each category
             predictions = []
             total_predicted = 0.0
             
-            for category_id in features.keys():
-                prediction = await self._predict_category_expense(
-                    user_id, category_id, features[category_id]
-                )
+            for category_id, model in models.items():
+                prediction = self._predict_category_expense(category_id, features[category_id], model)
                 if prediction:
                     predictions.append(prediction)
                     total_predicted += prediction.predicted_amount
@@ -160,117 +302,130 @@ class PredictiveBudget:
             logger.error(f"Failed to generate budget prediction: {e}")
             return {"status": "error", "message": str(e)}
     
-    def _get_user_transactions(self, user_id: int, db: Session) -> List[Transaction]:
-        """Get user's transaction history for ML training"""
+    def _get_monthly_rollups(self, user_id: int, db: Session) -> List[TransactionRollup]:
+        """Get user's monthly expense rollups for ML training"""
         try:
-            # Get last 12 months of transactions
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=365)
+            # Get last 12 months of expenses
+            start_month = month_key(datetime.now() - timedelta(days=365))
             
-            transactions = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.transaction_date >= start_date,
-                Transaction.amount > 0  # Expenses only
-            ).order_by(Transaction.transaction_date).all()
+            rollups = rollup_service.get_months(db, user_id, first_month=start_month, is_income=False)
             
-            return transactions
+            return sorted(rollups, key=lambda rollup: rollup.month)
             
         except Exception as e:
-            logger.error(f"Failed to get user transactions: {e}")
+            logger.error(f"Failed to get monthly rollups: {e}")
             return []
     
-    def _prepare_features(self, transactions: List[Transaction]) -> Dict[int, List[Dict[str, Any]]]:
-        """Prepare features for ML prediction"""
+    def _prepare_features(self, rollups: List[TransactionRollup]) -> Dict[int, pd.DataFrame]:
+        """Prepare per-category monthly features (one row per month) for ML prediction"""
         try:
-            features = {}
+            if not rollups:
+                return {}
+            
+            frame = pd.DataFrame.from_records(
+                [
+                    (rollup.category_id or 1, rollup.month, rollup.total_amount, rollup.transaction_count,
+                     rollup.weekend_count, rollup.month_end_count)
+                    for rollup in rollups
+                ],
+                columns=["category_id", "month", "total_amount", "transaction_count",
+                         "weekend_count", "month_end_count"]
+            )
             
-            # Group transactions by category
-            for transaction in transactions:
-                category_id = transaction.category_id or 1  # Default category
-                
-                if category_id not in features:
-                    features[category_id] = []
-                
-                # Create feature vector for each transaction
-                feature_vector = {
-                    "amount": transaction.amount,
-                    "day_of_week": transaction.transaction_date.weekday(),
-                    "day_of_month": transaction.transaction_date.day,
-                    "month": transaction.transaction_date.month,
-                    "quarter": (transaction.transaction_date.month - 1) // 3 + 1,
-                    "is_weekend": transaction.transaction_date.weekday() >= 5,
-                    "is_month_end": transaction.transaction_date.day >= 25,
-                    "is_month_start": transaction.transaction_date.day <= 5
-                }
-                
-                features[category_id].append(feature_vector)
+            # Sum rollups per (category, month) and derive averages
+            monthly = frame.groupby(["category_id", "month"], sort=True).sum()
+            count = monthly["transaction_count"].clip(lower=1)
+            monthly["avg_amount"] = monthly["total_amount"] / count
+            monthly["weekend_ratio"] = monthly.pop("weekend_count") / count
+            monthly["month_end_ratio"] = monthly.pop("month_end_count") / count
             
-            return features
+            return {
+                int(category_id): group.droplevel("category_id")
+                for category_id, group in monthly.groupby(level="category_id")
+            }
             
         except Exception as e:
             logger.error(f"Failed to prepare features: {e}")
             return {}
     
-    async def _predict_category_expense(self, user_id: int, category_id: int, 
-                                      features: List[Dict[str, Any]]) -> Optional[BudgetPrediction]:
-        """Predict expense for specific category using ML"""
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+    
+    async def _get_category_models(self, user_id: int,
+                                   features: Dict[int, pd.DataFrame]) -> Dict[int, CategoryModel]:
+        """Current model for every category with enough data, training stale ones in parallel"""
+        models = {}
+        stale = {}
+        for category_id, monthly in features.items():
+            # Need minimum data for prediction: 10 transactions over at least 3 months
+            if monthly["transaction_count"].sum() < MIN_TRANSACTIONS or len(monthly) < MIN_MONTHS:
+                continue
+            fingerprint = feature_fingerprint(monthly)
+            model = self.model_registry.get(user_id, category_id, fingerprint)
+            if model is not None:
+                models[category_id] = model
+            else:
+                stale[category_id] = fingerprint
+        
+        if stale:
+            trained = await self._train_category_models({
+                category_id: features[category_id] for category_id in stale
+            })
+            for category_id, (model, scaler, accuracy) in trained.items():
+                models[category_id] = CategoryModel(
+                    fingerprint=stale[category_id],
+                    model=model,
+                    scaler=scaler,
+                    accuracy=accuracy,
+                    trained_at=datetime.now()
+                )
+                self.model_registry.put(user_id, category_id, models[category_id])
+            logger.info(f"Trained {len(trained)}/{len(stale)} budget models for user {user_id}")
+        
+        return {category_id: models[category_id] for category_id in features if category_id in models}
+    
+    async def _train_category_models(self, features: Dict[int, pd.DataFrame]) -> Dict[int, Tuple]:
+        """Fit category models, across the process pool when there is more than one"""
+        loop = asyncio.get_running_loop()
+        executor = self.pool if len(features) > 1 and self.workers > 1 else None
+        category_ids = list(features)
+        results = await asyncio.gather(*[
+            loop.run_in_executor(
+                executor, _fit_category_model,
+                features[category_id][FEATURE_COLUMNS].to_numpy(dtype=float),
+                features[category_id]["total_amount"].to_numpy(dtype=float)
+            )
+            for category_id in category_ids
+        ], return_exceptions=True)
+        
+        trained = {}
+        for category_id, result in zip(category_ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to train category model {category_id}: {result}")
+            else:
+                trained[category_id] = result
+        return trained
+    
+    def _predict_category_expense(self, category_id: int, monthly: pd.DataFrame,
+                                  category_model: CategoryModel) -> Optional[BudgetPrediction]:
+        """Predict expense for specific category using its fitted model"""
         try:
-            if len(features) < 10:  # Need minimum data for prediction
-                return None
-            
-            # Prepare training data
-            X = []
-            y = []
-            
-            # Create monthly aggregates
-            monthly_data = {}
-            for feature in features:
-                month_key = f"{feature['month']}_{feature['quarter']}"
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {
-                        "total_amount": 0,
-                        "transaction_count": 0,
-                        "avg_amount": 0,
-                        "weekend_ratio": 0,
-                        "month_end_ratio": 0
-                    }
-                
-                monthly_data[month_key]["total_amount"] += feature["amount"]
-                monthly_data[month_key]["transaction_count"] += 1
-                monthly_data[month_key]["weekend_ratio"] += feature["is_weekend"]
-                monthly_data[month_key]["month_end_ratio"] += feature["is_month_end"]
-            
-            # Calculate averages
-            for month_data in monthly_data.values():
-                month_data["avg_amount"] = month_data["total_amount"] / month_data["transaction_count"]
-                month_data["weekend_ratio"] /= month_data["transaction_count"]
-                month_data["month_end_ratio"] /= month_data["transaction_count"]
-            
-            # Create feature matrix
-            for month_key, month_data in monthly_data.items():
-                X.append([
-                    month_data["transaction_count"],
-                    month_data["avg_amount"],
-                    month_data["weekend_ratio"],
-                    month_data["month_end_ratio"]
-                ])
-                y.append(month_data["total_amount"])
-            
-            if len(X) < 3:  # Need at least 3 months of data
-                return None
-            
-            # Train or update ML model
-            model = await self._train_category_model(category_id, X, y)
-            
-            if not model:
-                return None
+            y = monthly["total_amount"].tolist()
             
             # Make prediction for next month
-            next_month_features = self._generate_next_month_features(monthly_data)
-            predicted_amount = model.predict([next_month_features])[0]
+            next_month_features = category_model.scaler.transform([self._generate_next_month_features(monthly)])
+            predicted_amount = float(category_model.model.predict(next_month_features)[0])
             
             # Calculate confidence score
-            confidence_score = self._calculate_prediction_confidence(model, X, y)
+            confidence_score = self._calculate_prediction_confidence(category_model, y)
             
             # Determine trend direction
             trend_direction = self._determine_trend_direction(y)
@@ -300,96 +455,49 @@ class PredictiveBudget:
             logger.error(f"Failed to predict category expense: {e}")
             return None
     
-    async def _train_category_model(self, category_id: int, X: List[List[float]], 
-                                  y: List[float]) -> Optional[RandomForestRegressor]:
-        """Train or update ML model for category"""
-        try:
-            if len(X) < 3:
-                return None
-            
-            # Initialize model if not exists
-            if category_id not in self.ml_models:
-                self.ml_models[category_id] = RandomForestRegressor(
-                    n_estimators=100,
-                    random_state=42,
-                    max_depth=5
-                )
-                self.scalers[category_id] = StandardScaler()
-            
-            # Scale features
-            X_scaled = self.scalers[category_id].fit_transform(X)
-            
-            # Train model
-            self.ml_models[category_id].fit(X_scaled, y)
-            
-            # Calculate model accuracy
-            if len(X) >= 4:
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X_scaled, y, test_size=0.25, random_state=42
-                )
-                self.ml_models[category_id].fit(X_train, y_train)
-                accuracy = self.ml_models[category_id].score(X_test, y_test)
-                self.model_accuracy[category_id] = max(0, accuracy)
-            
-            return self.ml_models[category_id]
-            
-        except Exception as e:
-            logger.error(f"Failed to train category model: {e}")
-            return None
-    
-    def _generate_next_month_features(self, monthly_data: Dict[str, Dict[str, Any]]) -> List[float]:
+    def _generate_next_month_features(self, monthly: pd.DataFrame) -> List[float]:
         """Generate features for next month prediction"""
         try:
-            if not monthly_data:
+            if monthly.empty:
                 return [1, 100, 0.3, 0.2]  # Default features
             
-            # Calculate averages from historical data
-            total_transactions = sum(d["transaction_count"] for d in monthly_data.values())
-            avg_amount = sum(d["avg_amount"] for d in monthly_data.values()) / len(monthly_data)
-            avg_weekend_ratio = sum(d["weekend_ratio"] for d in monthly_data.values()) / len(monthly_data)
-            avg_month_end_ratio = sum(d["month_end_ratio"] for d in monthly_data.values()) / len(monthly_data)
-            
             # Predict next month based on trends
-            recent_data = list(monthly_data.values())[-3:]  # Last 3 months
-            if len(recent_data) >= 2:
+            recent_counts = monthly["transaction_count"].iloc[-3:]  # Last 3 months
+            if len(recent_counts) >= 2:
                 # Simple trend calculation
-                recent_avg = sum(d["transaction_count"] for d in recent_data) / len(recent_data)
-                predicted_transactions = recent_avg * 1.05  # 5% growth assumption
+                predicted_transactions = recent_counts.mean() * 1.05  # 5% growth assumption
             else:
-                predicted_transactions = total_transactions / len(monthly_data)
+                predicted_transactions = monthly["transaction_count"].mean()
             
+            averages = monthly[["avg_amount", "weekend_ratio", "month_end_ratio"]].mean()
             return [
-                predicted_transactions,
-                avg_amount,
-                avg_weekend_ratio,
-                avg_month_end_ratio
+                float(predicted_transactions),
+                float(averages["avg_amount"]),
+                float(averages["weekend_ratio"]),
+                float(averages["month_end_ratio"])
             ]
             
         except Exception as e:
             logger.error(f"Failed to generate next month features: {e}")
             return [1, 100, 0.3, 0.2]
     
-    def _calculate_prediction_confidence(self, model: RandomForestRegressor, 
-                                       X: List[List[float]], y: List[float]) -> float:
+    def _calculate_prediction_confidence(self, category_model: CategoryModel, y: List[float]) -> float:
         """Calculate confidence score for prediction"""
         try:
-            if len(X) < 3:
+            if len(y) < 3:
                 return 0.5
             
-            # Use model accuracy as confidence
-            accuracy = self.model_accuracy.get(id(model), 0.7)
+            # Use hold-out accuracy of the model as confidence
+            accuracy = category_model.accuracy if category_model.accuracy is not None else 0.7
             
             # Adjust based on data consistency
-            if len(y) >= 3:
-                variance = np.var(y)
-                mean = np.mean(y)
-                coefficient_of_variation = np.sqrt(variance) / mean if mean > 0 else 1
-                
-                # Higher confidence for more consistent data
-                consistency_factor = max(0.1, 1 - coefficient_of_variation)
-                confidence = accuracy * consistency_factor
-            else:
-                confidence = accuracy * 0.8
+            variance = np.var(y)
+            mean = np.mean(y)
+            coefficient_of_variation = np.sqrt(variance) / mean if mean > 0 else 1
+            
+            # Higher confidence for more consistent data
+            consistency_factor = max(0.1, 1 - coefficient_of_variation)
+            confidence = accuracy * consistency_factor
             
             return min(max(confidence, 0.1), 0.95)
             
@@ -0,0 +1,321 @@
+"""
+Transaction rollup service.
+Keeps the per-user monthly/category totals in TransactionRollup in step with
+transaction writes and answers range queries from them.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from app.models import Transaction, TransactionRollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def month_key(value: datetime) -> str:
+    """YYYY-MM key of a date."""
+    return value.strftime("%Y-%m")
+
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the month containing `value`."""
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    """First instant of the month after the one containing `value`."""
+    if value.month == 12:
+        return datetime(value.year + 1, 1, 1)
+    return datetime(value.year, value.month + 1, 1)
+
+
+class TransactionRollupService:
+    """
+    Incremental maintenance and reads of TransactionRollup.
+
+    Writers call add_transaction/remove_transaction inside the same session
+    (before commit) so rollups change atomically with the transaction rows.
+    Readers use get_months for whole months and get_range_totals for arbitrary
+    date ranges, which combines whole-month rollups with raw aggregation of
+    the partial months at either edge.
+    """
+
+    def add_transaction(self, db: Session, transaction: Transaction):
+        """Count a new (or updated) transaction into its rollup."""
+        self.apply(db, transaction.user_id, transaction.amount, transaction.transaction_date,
+                   transaction.category_id, direction=1)
+
+    def add_transactions(self, db: Session, transactions: List[Transaction]):
+        """Count many new transactions with one update per affected rollup cell."""
+        deltas: Dict[Tuple, Dict] = {}
+        for transaction in transactions:
+            key = (transaction.user_id, month_key(transaction.transaction_date),
+                   transaction.category_id, transaction.amount < 0)
+            _add_to_delta(deltas.setdefault(key, _new_delta()), transaction.amount,
+                          transaction.transaction_date, 1)
+
+        for key, delta in deltas.items():
+            self._apply_delta(db, key, delta)
+
+    def remove_transaction(self, db: Session, transaction: Transaction):
+        """Remove a deleted (or about to be updated) transaction from its rollup."""
+        self.apply(db, transaction.user_id, transaction.amount, transaction.transaction_date,
+                   transaction.category_id, direction=-1, exclude_id=transaction.id)
+
+    def snapshot(self, transaction: Transaction) -> SimpleNamespace:
+        """Capture the rollup-relevant fields of a transaction before it is modified."""
+        return SimpleNamespace(
+            id=transaction.id,
+            user_id=transaction.user_id,
+            amount=transaction.amount,
+            transaction_date=transaction.transaction_date,
+            category_id=transaction.category_id
+        )
+
+    def apply(self, db: Session, user_id: int, amount: float, transaction_date: datetime,
+              category_id: Optional[int], direction: int = 1, exclude_id: Optional[int] = None):
+        """Add (direction=1) or subtract (direction=-1) one transaction from its rollup row."""
+        key = (user_id, month_key(transaction_date), category_id, amount < 0)
+        delta = _new_delta()
+        _add_to_delta(delta, amount, transaction_date, direction)
+        self._apply_delta(db, key, delta, exclude_id=exclude_id)
+
+    def recategorize(self, db: Session, changes: List[Tuple[SimpleNamespace, Optional[int]]]):
+        """
+        Move many transactions to new categories with one update per affected rollup cell.
+
+        `changes` pairs a snapshot taken before the change with the new
+        category_id. Call after the transaction rows have been updated.
+        """
+        deltas: Dict[Tuple, Dict] = {}
+        for original, new_category_id in changes:
+            if original.category_id == new_category_id:
+                continue
+            for category_id, direction in ((original.category_id, -1), (new_category_id, 1)):
+                key = (original.user_id, month_key(original.transaction_date), category_id, original.amount < 0)
+                _add_to_delta(deltas.setdefault(key, _new_delta()), original.amount,
+                              original.transaction_date, direction)
+
+        for key, delta in deltas.items():
+            self._apply_delta(db, key, delta)
+
+    def _apply_delta(self, db: Session, key: Tuple, delta: Dict, exclude_id: Optional[int] = None):
+        user_id, month, category_id, is_income = key
+
+        rollup = self._query_cell(db, user_id, month, category_id, is_income).with_for_update().first()
+        if rollup is None:
+            if delta["transaction_count"] < 0:
+                logger.warning(f"No rollup for user {user_id} {month} category {category_id}; rebuild recommended")
+                return
+            rollup = TransactionRollup(
+                user_id=user_id, month=month, category_id=category_id, is_income=is_income,
+                total_amount=0.0, transaction_count=0, weekend_count=0, month_end_count=0
+            )
+            db.add(rollup)
+
+        rollup.total_amount += delta["total_amount"]
+        rollup.transaction_count += delta["transaction_count"]
+        rollup.weekend_count += delta["weekend_count"]
+        rollup.month_end_count += delta["month_end_count"]
+
+        if rollup.transaction_count <= 0:
+            db.delete(rollup)
+        elif delta["removed"]:
+            # The latest date may have left the cell - recompute it from the remaining rows
+            rollup.last_transaction_date = self._latest_date(db, user_id, month, category_id, is_income, exclude_id)
+        elif delta["latest"] is not None and (
+            rollup.last_transaction_date is None or _naive(delta["latest"]) > _naive(rollup.last_transaction_date)
+        ):
+            rollup.last_transaction_date = delta["latest"]
+
+        # Sessions run with autoflush off; flush so a second change to the same cell finds this row
+        db.flush()
+
+    def rebuild(self, db: Session, user_id: Optional[int] = None) -> int:
+        """Recompute rollups from raw transactions (all users or one). Returns rollup rows written."""
+        delete_query = db.query(TransactionRollup)
+        source = db.query(
+            Transaction.user_id, Transaction.amount, Transaction.transaction_date, Transaction.category_id
+        )
+        if user_id is not None:
+            delete_query = delete_query.filter(TransactionRollup.user_id == user_id)
+            source = source.filter(Transaction.user_id == user_id)
+        delete_query.delete(synchronize_session=False)
+
+        cells: Dict[Tuple, Dict] = {}
+        for txn_user_id, amount, txn_date, category_id in source.yield_per(10000):
+            key = (txn_user_id, month_key(txn_date), category_id, amount < 0)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {
+                    "total_amount": 0.0, "transaction_count": 0, "weekend_count": 0,
+                    "month_end_count": 0, "last_transaction_date": txn_date
+                }
+            cell["total_amount"] += abs(amount)
+            cell["transaction_count"] += 1
+            cell["weekend_count"] += txn_date.weekday() >= 5
+            cell["month_end_count"] += txn_date.day >= 25
+            if _naive(txn_date) > _naive(cell["last_transaction_date"]):
+                cell["last_transaction_date"] = txn_date
+
+        db.bulk_insert_mappings(TransactionRollup, [
+            {"user_id": key[0], "month": key[1], "category_id": key[2], "is_income": key[3], **cell}
+            for key, cell in cells.items()
+        ])
+        db.commit()
+
+        logger.info(f"Rebuilt {len(cells)} transaction rollups" + (f" for user {user_id}" if user_id is not None else ""))
+        return len(cells)
+
+    def get_months(self, db: Session, user_id: int, first_month: str = None, last_month: str = None,
+                   is_income: Optional[bool] = None) -> List[TransactionRollup]:
+        """Rollup rows for the user's months in [first_month, last_month] (YYYY-MM, inclusive)."""
+        query = db.query(TransactionRollup).filter(TransactionRollup.user_id == user_id)
+        if first_month:
+            query = query.filter(TransactionRollup.month >= first_month)
+        if last_month:
+            query = query.filter(TransactionRollup.month <= last_month)
+        if is_income is not None:
+            query = query.filter(TransactionRollup.is_income == is_income)
+        return query.all()
+
+    def get_range_totals(self, db: Session, user_id: int, start: datetime = None, end: datetime = None,
+                         inclusive_end: bool = True) -> List[SimpleNamespace]:
+        """
+        Totals per (category_id, is_income) for transactions in [start, end].
+
+        Whole months inside the range are read from rollups; the partial
+        months at the edges are aggregated from raw transactions. Either
+        bound may be None for an open range.
+        """
+        start, end = _as_naive_datetime(start), _as_naive_datetime(end)
+        full_from = None
+        if start is not None:
+            full_from = start if start == month_start(start) else next_month(start)
+        full_to = month_start(end) if end is not None else None  # exclusive
+
+        totals: Dict[Tuple, SimpleNamespace] = {}
+        if full_from is not None and full_to is not None and full_from >= full_to:
+            self._merge(totals, self._raw_totals(db, user_id, start, end, inclusive_end))
+            return list(totals.values())
+
+        last_full_month = month_key(full_to - timedelta(days=1)) if full_to is not None else None
+        self._merge(totals, [
+            SimpleNamespace(
+                category_id=rollup.category_id,
+                is_income=rollup.is_income,
+                total_amount=rollup.total_amount,
+                transaction_count=rollup.transaction_count,
+                last_transaction=rollup.last_transaction_date
+            )
+            for rollup in self.get_months(
+                db, user_id, month_key(full_from) if full_from is not None else None, last_full_month
+            )
+        ])
+        if start is not None and start < full_from:
+            self._merge(totals, self._raw_totals(db, user_id, start, full_from, inclusive_end=False))
+        if end is not None:
+            self._merge(totals, self._raw_totals(db, user_id, full_to, end, inclusive_end))
+        return list(totals.values())
+
+    def _raw_totals(self, db: Session, user_id: int, start: datetime, end: datetime,
+                    inclusive_end: bool) -> List[SimpleNamespace]:
+        """Grouped aggregation of raw transactions for a (short) edge range."""
+        is_income = case((Transaction.amount < 0, True), else_=False).label('is_income')
+        rows = db.query(
+            Transaction.category_id,
+            is_income,
+            func.sum(func.abs(Transaction.amount)).label('total_amount'),
+            func.count(Transaction.id).label('transaction_count'),
+            func.max(Transaction.transaction_date).label('last_transaction')
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date >= start,
+            Transaction.transaction_date <= end if inclusive_end else Transaction.transaction_date < end
+        ).group_by(Transaction.category_id, is_income).all()
+
+        return [
+            SimpleNamespace(
+                category_id=row.category_id,
+                is_income=bool(row.is_income),
+                total_amount=float(row.total_amount or 0),
+                transaction_count=row.transaction_count,
+                last_transaction=row.last_transaction
+            )
+            for row in rows
+        ]
+
+    def _merge(self, totals: Dict[Tuple, SimpleNamespace], rows: List[SimpleNamespace]):
+        for row in rows:
+            key = (row.category_id, row.is_income)
+            existing = totals.get(key)
+            if existing is None:
+                totals[key] = row
+                continue
+            existing.total_amount += row.total_amount
+            existing.transaction_count += row.transaction_count
+            if row.last_transaction is not None and (
+                existing.last_transaction is None or _naive(row.last_transaction) > _naive(existing.last_transaction)
+            ):
+                existing.last_transaction = row.last_transaction
+
+    def _query_cell(self, db: Session, user_id: int, month: str, category_id: Optional[int], is_income: bool):
+        category_filter = (TransactionRollup.category_id.is_(None) if category_id is None
+                           else TransactionRollup.category_id == category_id)
+        return db.query(TransactionRollup).filter(
+            TransactionRollup.user_id == user_id,
+            TransactionRollup.month == month,
+            category_filter,
+            TransactionRollup.is_income == is_income
+        )
+
+    def _latest_date(self, db: Session, user_id: int, month: str, category_id: Optional[int],
+                     is_income: bool, exclude_id: Optional[int]) -> Optional[datetime]:
+        """Latest remaining transaction date in one rollup cell."""
+        start = datetime.strptime(month, "%Y-%m")
+        query = db.query(func.max(Transaction.transaction_date)).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date >= start,
+            Transaction.transaction_date < next_month(start),
+            Transaction.category_id.is_(None) if category_id is None else Transaction.category_id == category_id,
+            Transaction.amount < 0 if is_income else Transaction.amount >= 0
+        )
+        if exclude_id is not None:
+            query = query.filter(Transaction.id != exclude_id)
+        return query.scalar()
+
+
+def _new_delta() -> Dict:
+    return {"total_amount": 0.0, "transaction_count": 0, "weekend_count": 0,
+            "month_end_count": 0, "latest": None, "removed": False}
+
+
+def _add_to_delta(delta: Dict, amount: float, transaction_date: datetime, direction: int):
+    delta["total_amount"] += direction * abs(amount)
+    delta["transaction_count"] += direction
+    delta["weekend_count"] += direction * (transaction_date.weekday() >= 5)
+    delta["month_end_count"] += direction * (transaction_date.day >= 25)
+    if direction < 0:
+        delta["removed"] = True
+    elif delta["latest"] is None or _naive(transaction_date) > _naive(delta["latest"]):
+        delta["latest"] = transaction_date
+
+
+def _naive(value: datetime) -> datetime:
+    """Drop tzinfo so dates from SQLite (naive) and callers (aware) compare."""
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+def _as_naive_datetime(value) -> Optional[datetime]:
+    """Accept date, datetime or ISO-format string bounds (query params may be any of these)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value is None or isinstance(value, datetime):
+        return _naive(value)
+    return datetime(value.year, value.month, value.day)
+
+
+# Global service instance
+rollup_service = TransactionRollupService()
@@ -13,11 +13,15 @@ from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
 from sqlalchemy.orm import sessionmaker
 from app.db.init_db import SessionLocal
-from app.models import Document, ProcessingStatus, User, Transaction, AgentState
+from app.models import Document, ProcessingStatus, User, Transaction, AgentState, Category
 from app.services.document_service import DocumentService
 from app.services.ocr_service import OCREngine
 from app.services.categorization_service import TransactionCategorizationService
 from app.services.event_bus import event_bus, EventType, publish_event
+from app.services.rollup_service import rollup_service
+from app.services.document_pipeline import document_pipeline, parse_receipt_text
+from app.services.sentinel_watchdog_service import SentinelWatchdogService, WatchdogMode
+from app.services.user_sweep import user_sweep
 from app.core.config import settings
 import logging
 
@@ -26,6 +30,7 @@ logger = logging.getLogger(__name__)
 document_service = DocumentService()
 ocr_engine = OCREngine()
 categorization_service = TransactionCategorizationService()
+watchdog_service = SentinelWatchdogService()
 
 class SchedulerService:
     """
@@ -49,6 +54,7 @@ class SchedulerService:
             'memory': None,
             'budget': None
         }
+        self._watchdog_modes: Dict[int, str] = {}  # Last watchdog mode seen per user
         
         # Configure scheduler
         self._setup_scheduler()
@@ -120,6 +126,7 @@ class SchedulerService:
         
         try:
             self.scheduler.shutdown(wait=True)
+            document_pipeline.shutdown()
             self.is_running = False
             logger.info("Scheduler stopped successfully")
             
@@ -128,9 +135,12 @@ class SchedulerService:
     
     def _subscribe_to_events(self):
         """Subscribe to relevant events"""
-        event_bus.subscribe(EventType.TRANSACTION_CREATED, self._handle_transaction_created)
-        event_bus.subscribe(EventType.BUDGET_EXCEEDED, self._handle_budget_exceeded)
-        event_bus.subscribe(EventType.EXPENSE_ANOMALY, self._handle_expense_anomaly)
+        event_bus.subscribe(EventType.TRANSACTION_CREATED, self._handle_transaction_created,
+                            durable_name="scheduler.transaction_created")
+        event_bus.subscribe(EventType.BUDGET_EXCEEDED, self._handle_budget_exceeded,
+                            durable_name="scheduler.budget_exceeded")
+        event_bus.subscribe(EventType.EXPENSE_ANOMALY, self._handle_expense_anomaly,
+                            durable_name="scheduler.expense_anomaly")
         logger.info("Scheduler subscribed to events")
     
     async def _handle_transaction_created(self, event):
@@ -280,135 +290,145 @@ class SchedulerService:
     
     async def _auto_transfer_savings(self):
         """Automaattinen säästösiirto"""
-        try:
-            db = SessionLocal()
-            users = db.query(User).all()
-            
-            for user in users:
-                try:
-                    # Laske kuukausitulot ja -menot
-                    monthly_income = self._calculate_monthly_income(user.id, db)
-                    monthly_expenses = self._calculate_monthly_expenses(user.id, db)
-                    
-                    # Säästösiirto 20% nettotuloista
-                    net_income = monthly_income - monthly_expenses
-                    savings_amount = net_income * 0.2
-                    
-                    if savings_amount > 0:
-                        # Luo säästötransaktio
-                        savings_transaction = Transaction(
-                            user_id=user.id,
-                            amount=-savings_amount,  # Negatiivinen = tulo
-                            description="Automaattinen säästösiirto",
-                            category_id=self._get_savings_category_id(db),
-                            transaction_date=datetime.now()
-                        )
-                        db.add(savings_transaction)
-                        
-                        # Publish event
-                        await publish_event(
-                            EventType.SAVINGS_GOAL_UPDATED,
-                            user.id,
-                            {"amount": savings_amount, "type": "auto_transfer"},
-                            "scheduler_service"
-                        )
-                        
-                        logger.info(f"Auto transfer {savings_amount}€ for user {user.id}")
+        await user_sweep.run("auto_transfer_savings", self._auto_transfer_savings_chunk, timedelta(days=1))
+    
+    async def _auto_transfer_savings_chunk(self, db, users: List[User]):
+        """Säästösiirrot yhdelle käyttäjäjoukolle (commit per chunk, tapahtumat commitin jälkeen)"""
+        savings_category_id = self._get_savings_category_id(db)
+        transfers = []
+        
+        for user in users:
+            try:
+                # Laske kuukausitulot ja -menot
+                monthly_income = self._calculate_monthly_income(user.id, db)
+                monthly_expenses = self._calculate_monthly_expenses(user.id, db)
                 
-                except Exception as e:
-                    logger.error(f"Error in auto transfer for user {user.id}: {e}")
-            
-            db.commit()
+                # Säästösiirto 20% nettotuloista
+                net_income = monthly_income - monthly_expenses
+                savings_amount = net_income * 0.2
+                
+                if savings_amount > 0:
+                    # Luo säästötransaktio
+                    savings_transaction = Transaction(
+                        user_id=user.id,
+                        amount=-savings_amount,  # Negatiivinen = tulo
+                        description="Automaattinen säästösiirto",
+                        category_id=savings_category_id,
+                        transaction_date=datetime.now()
+                    )
+                    db.add(savings_transaction)
+                    rollup_service.add_transaction(db, savings_transaction)
+                    transfers.append((user.id, savings_amount))
             
-        except Exception as e:
-            logger.error(f"Auto transfer failed: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"Error in auto transfer for user {user.id}: {e}")
+        
+        # Commit before publishing so the write lock is not held across awaits
+        db.commit()
+        
+        for user_id, savings_amount in transfers:
+            await publish_event(
+                EventType.SAVINGS_GOAL_UPDATED,
+                user_id,
+                {"amount": savings_amount, "type": "auto_transfer"},
+                "scheduler_service"
+            )
+            logger.info(f"Auto transfer {savings_amount}€ for user {user_id}")
     
     async def _cancel_unused_subscriptions(self):
         """Peruuta käyttämättömät tilaukset"""
-        try:
-            db = SessionLocal()
-            users = db.query(User).all()
-            
-            for user in users:
-                try:
-                    unused_subscriptions = self._find_unused_subscriptions(user.id, db)
-                    
-                    for subscription in unused_subscriptions:
-                        result = await self._cancel_subscription(subscription)
-                        if result.get('success'):
-                            logger.info(f"Cancelled subscription {subscription['name']} for user {user.id}")
+        await user_sweep.run("cancel_subscriptions", self._cancel_unused_subscriptions_chunk, timedelta(days=1))
+    
+    async def _cancel_unused_subscriptions_chunk(self, db, users: List[User]):
+        for user in users:
+            try:
+                unused_subscriptions = self._find_unused_subscriptions(user.id, db)
                 
-                except Exception as e:
-                    logger.error(f"Error cancelling subscriptions for user {user.id}: {e}")
+                for subscription in unused_subscriptions:
+                    result = await self._cancel_subscription(subscription)
+                    if result.get('success'):
+                        logger.info(f"Cancelled subscription {subscription['name']} for user {user.id}")
             
-        except Exception as e:
-            logger.error(f"Cancel subscriptions failed: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"Error cancelling subscriptions for user {user.id}: {e}")
     
     async def _negotiate_better_rates(self):
         """Neuvottele parempia hintoja"""
-        try:
-            db = SessionLocal()
-            users = db.query(User).all()
-            
-            for user in users:
-                try:
-                    negotiable_services = self._find_negotiable_services(user.id, db)
-                    
-                    for service in negotiable_services:
-                        result = await self._negotiate_service_rate(service)
-                        if result.get('success'):
-                            logger.info(f"Negotiated better rate for {service['name']} for user {user.id}")
+        await user_sweep.run("negotiate_rates", self._negotiate_better_rates_chunk, timedelta(days=1))
+    
+    async def _negotiate_better_rates_chunk(self, db, users: List[User]):
+        for user in users:
+            try:
+                negotiable_services = self._find_negotiable_services(user.id, db)
                 
-                except Exception as e:
-                    logger.error(f"Error negotiating rates for user {user.id}: {e}")
+                for service in negotiable_services:
+                    result = await self._negotiate_service_rate(service)
+                    if result.get('success'):
+                        logger.info(f"Negotiated better rate for {service['name']} for user {user.id}")
             
-        except Exception as e:
-            logger.error(f"Rate negotiation failed: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"Error negotiating rates for user {user.id}: {e}")
     
     async def _continuous_monitoring(self):
         """Reaaliaikainen valvonta"""
-        try:
-            db = SessionLocal()
-            users = db.query(User).all()
-            
-            for user in users:
-                try:
-                    # Tarkista epätavalliset menot
-                    unusual_expenses = self._detect_unusual_expenses(user.id, db)
-                    
-                    for expense in unusual_expenses:
-                        await publish_event(
-                            EventType.EXPENSE_ANOMALY,
-                            user.id,
-                            expense,
-                            "scheduler_service",
-                            priority="high"
-                        )
-                    
-                    # Tarkista budjetin tila
-                    budget_status = self._check_budget_status(user.id, db)
-                    if budget_status.get('exceeded'):
-                        await publish_event(
-                            EventType.BUDGET_EXCEEDED,
-                            user.id,
-                            budget_status,
-                            "scheduler_service",
-                            priority="high"
-                        )
+        await user_sweep.run("continuous_monitoring", self._continuous_monitoring_chunk, timedelta(minutes=5))
+    
+    async def _continuous_monitoring_chunk(self, db, users: List[User]):
+        # Riskiarvio koko käyttäjäjoukolle yhdellä ryhmitellyllä kyselyllä
+        assessments = await asyncio.to_thread(watchdog_service.assess_all_users, db, [user.id for user in users])
+        await self._publish_watchdog_alerts(assessments)
+        
+        for user in users:
+            try:
+                # Tarkista epätavalliset menot
+                unusual_expenses = self._detect_unusual_expenses(user.id, db)
                 
-                except Exception as e:
-                    logger.error(f"Error in continuous monitoring for user {user.id}: {e}")
+                for expense in unusual_expenses:
+                    await publish_event(
+                        EventType.EXPENSE_ANOMALY,
+                        user.id,
+                        expense,
+                        "scheduler_service",
+                        priority="high"
+                    )
+                
+                # Tarkista budjetin tila
+                budget_status = await self._check_budget_status(user.id, db)
+                if budget_status.get('exceeded'):
+                    await publish_event(
+                        EventType.BUDGET_EXCEEDED,
+                        user.id,
+                        budget_status,
+                        "scheduler_service",
+                        priority="high"
+                    )
             
-        except Exception as e:
-            logger.error(f"Continuous monitoring failed: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"Error in continuous monitoring for user {user.id}: {e}")
+    
+    async def _publish_watchdog_alerts(self, assessments: Dict[int, Dict[str, Any]]):
+        """
+        Publish a watchdog alert when a user's mode changes to aggressive or emergency.
+        Users without transactions in the analysis window are not assessed.
+        """
+        alert_modes = {WatchdogMode.AGGRESSIVE.value: "high", WatchdogMode.EMERGENCY.value: "critical"}
+        for user_id, assessment in assessments.items():
+            if not assessment.get("transaction_count"):
+                self._watchdog_modes.pop(user_id, None)
+                continue
+            mode = assessment["watchdog_mode"]
+            if self._watchdog_modes.get(user_id) == mode:
+                continue
+            priority = alert_modes.get(mode)
+            if priority:
+                await publish_event(
+                    EventType.WATCHDOG_ALERT,
+                    user_id,
+                    assessment,
+                    "scheduler_service",
+                    priority=priority
+                )
+            self._watchdog_modes[user_id] = mode
     
     async def _update_learning_models(self):
         """Päivitä oppimismallit"""
@@ -422,32 +442,26 @@ class SchedulerService:
     
     async def _weekly_optimization(self):
         """Viikoittainen optimointi"""
-        try:
-            db = SessionLocal()
-            users = db.query(User).all()
-            
-            for user in users:
-                try:
-                    # Analysoi viikon kulut
-                    weekly_analysis = self._analyze_weekly_spending(user.id, db)
-                    
-                    # Optimoi budjettikategoriat
-                    optimizations = self._optimize_budget_categories(weekly_analysis)
-                    
-                    # Sovella optimoinnit
-                    for optimization in optimizations:
-                        await self._apply_budget_optimization(user.id, optimization, db)
-                    
-                    # Generoi seuraavan viikon ideat
-                    await self._generate_next_week_ideas(user.email, weekly_analysis)
+        await user_sweep.run("weekly_optimization", self._weekly_optimization_chunk, timedelta(weeks=1))
+    
+    async def _weekly_optimization_chunk(self, db, users: List[User]):
+        for user in users:
+            try:
+                # Analysoi viikon kulut
+                weekly_analysis = self._analyze_weekly_spending(user.id, db)
+                
+                # Optimoi budjettikategoriat
+                optimizations = self._optimize_budget_categories(weekly_analysis)
+                
+                # Sovella optimoinnit
+                for optimization in optimizations:
+                    await self._apply_budget_optimization(user.id, optimization, db)
                 
-                except Exception as e:
-                    logger.error(f"Error in weekly optimization for user {user.id}: {e}")
+                # Generoi seuraavan viikon ideat
+                await self._generate_next_week_ideas(user.email, weekly_analysis)
             
-        except Exception as e:
-            logger.error(f"Weekly optimization failed: {e}")
-        finally:
-            db.close()
+            except Exception as e:
+                logger.error(f"Error in weekly optimization for user {user.id}: {e}")
     
     async def _cleanup_old_documents(self):
         """Clean old processed documents"""
@@ -492,6 +506,10 @@ class SchedulerService:
                             os.remove(filepath)
                             logger.info(f"Removed old log file: {filename}")
             
+            # Prune the durable event log
+            if event_bus.event_log is not None:
+                event_bus.event_log.prune(datetime.now() - timedelta(days=settings.event_log_retention_days))
+            
         except Exception as e:
             logger.error(f"Log cleanup failed: {e}")
     
@@ -545,12 +563,16 @@ class SchedulerService:
             if result.get('category_id'):
                 # Update transaction with category
                 db = SessionLocal()
+                transaction_id = transaction_data.get('transaction_id', transaction_data.get('id'))
                 transaction = db.query(Transaction).filter(
-                    Transaction.id == transaction_data.get('id')
+                    Transaction.id == transaction_id
                 ).first()
                 
                 if transaction:
+                    original = rollup_service.snapshot(transaction)
                     transaction.category_id = result['category_id']
+                    db.flush()
+                    rollup_service.recategorize(db, [(original, result['category_id'])])
                     db.commit()
                     
                     await publish_event(
@@ -638,13 +660,8 @@ class SchedulerService:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=30)
             
-            transactions = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.transaction_date >= start_date,
-                Transaction.amount < 0  # Income is negative
-            ).all()
-            
-            return abs(sum(t.amount for t in transactions))
+            totals = rollup_service.get_range_totals(db, user_id, start_date, end_date)
+            return sum(row.total_amount for row in totals if row.is_income)  # Income is negative
         
         except Exception as e:
             logger.error(f"Monthly income calculation failed: {e}")
@@ -656,13 +673,8 @@ class SchedulerService:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=30)
             
-            transactions = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.transaction_date >= start_date,
-                Transaction.amount > 0  # Expenses are positive
-            ).all()
-            
-            return sum(t.amount for t in transactions)
+            totals = rollup_service.get_range_totals(db, user_id, start_date, end_date)
+            return sum(row.total_amount for row in totals if not row.is_income)  # Expenses are positive
         
         except Exception as e:
             logger.error(f"Monthly expenses calculation failed: {e}")
@@ -837,41 +849,15 @@ class SchedulerService:
 scheduler_service = SchedulerService()
 
 # Legacy functions for backward compatibility
-def process_pending_documents():
-    """Process pending documents (legacy function)"""
+def process_pending_documents(max_batches: Optional[int] = None) -> Dict[str, Any]:
+    """Drain pending documents through the parallel OCR pipeline (legacy entry point)"""
+    db = SessionLocal()
     try:
-        db = SessionLocal()
-        pending_docs = db.query(Document).filter(
-            Document.status == ProcessingStatus.PENDING
-        ).all()
-        
-        for doc in pending_docs:
-            try:
-                # Process document with OCR
-                text, confidence = ocr_engine.extract_text(doc.file_path)
-                
-                # Update document status
-                doc.status = ProcessingStatus.COMPLETED
-                doc.processed_text = text
-                doc.confidence_score = confidence
-                
-                # Create transaction from OCR result
-                asyncio.create_task(create_transaction_from_ocr(doc, {
-                    "text": text,
-                    "confidence": confidence
-                }, db))
-                
-                logger.info(f"Processed document {doc.id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to process document {doc.id}: {e}")
-                doc.status = ProcessingStatus.FAILED
-                doc.error_message = str(e)
-        
-        db.commit()
-        
+        return document_pipeline.run(db, max_batches=max_batches)
     except Exception as e:
         logger.error(f"Document processing failed: {e}")
+        db.rollback()
+        return {"error": str(e)}
     finally:
         db.close()
 
@@ -879,23 +865,9 @@ async def create_transaction_from_ocr(document: Document, ocr_result: Dict, db):
     """Create transaction from OCR result"""
     try:
         # Extract transaction data from OCR text
-        text = ocr_result.get("text", "")
-        
-        # Simple parsing (in real implementation, use more sophisticated parsing)
-        lines = text.split('\n')
-        amount = 0.0
-        description = ""
-        
-        for line in lines:
-            if '€' in line or 'EUR' in line:
-                # Extract amount
-                import re
-                amount_match = re.search(r'(\d+[.,]\d{2})', line)
-                if amount_match:
-                    amount = float(amount_match.group(1).replace(',', '.'))
-            
-            if len(line.strip()) > 5 and not amount:
-                description = line.strip()
+        parsed = parse_receipt_text(ocr_result.get("text", ""))
+        amount = parsed["amount"]
+        description = parsed["description"]
         
         if amount > 0:
             # Create transaction
@@ -908,6 +880,7 @@ async def create_transaction_from_ocr(document: Document, ocr_result: Dict, db):
             )
             
             db.add(transaction)
+            rollup_service.add_transaction(db, transaction)
             db.commit()
             
             # Publish event
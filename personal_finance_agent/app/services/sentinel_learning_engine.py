@@ -2,25 +2,65 @@
 Sentinel Learning Engine™ - Kehittynyt oppimismoottori
 Tekee Sentinel Watchdog™:sta oppivan AI-kumppanin, joka mukautuu käyttäjään ajan myötä.
 """
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, date
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 from sqlalchemy.orm import Session
 from ..models.transaction import Transaction
 from ..models.user import User
 from ..models.category import Category
 import logging
+import hashlib
+import threading
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.ensemble import RandomForestRegressor, IsolationForest
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import json
 import pickle
-from collections import defaultdict, deque
+from collections import defaultdict, deque, OrderedDict
 import statistics
 
 logger = logging.getLogger(__name__)
 
+FORECAST_WINDOW = 7          # Edellisten kulutuspäivien määrä ennusteen ominaisuuksina
+FORECAST_MAX_DAYS = 90       # Pisin ennustejakso (API sallii 1-90 päivää)
+ANOMALY_MODEL_MAX_AGE = timedelta(hours=24)  # Anomaliamallin uudelleenkoulutusväli
+MODEL_CACHE_USERS = 1000     # Käyttäjiä joiden mallit pidetään muistissa
+
+
+class ForecastModel(NamedTuple):
+    """Käyttäjän kulutusennustemalli ja päiväsarja jolla se on sovitettu"""
+    version: str
+    scaler: StandardScaler
+    predictor: RandomForestRegressor
+    accuracy: float
+    last_window: Tuple[float, ...]
+
+
+class AnomalyModel(NamedTuple):
+    """Käyttäjän anomaliamalli ja sen koulutusaika"""
+    scaler: StandardScaler
+    detector: IsolationForest
+    trained_at: datetime
+
+
+class UserModelState:
+    """
+    Käyttäjäkohtaiset sovitetut mallit.
+    
+    Jokaisella käyttäjällä on omat mallioliot ja lukko, joten samanaikaiset
+    pyynnöt eivät sovita jaettua mallia toistensa päälle. Uusi malli
+    rakennetaan kokonaan ennen kuin se vaihdetaan tilalle.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.forecast: Optional[ForecastModel] = None
+        self.forecast_path: Optional[Tuple[str, date, np.ndarray]] = None
+        self.anomaly: Optional[AnomalyModel] = None
+
 class UserBehaviorPattern:
     """Käyttäjän käyttäytymismallin tallentamiseen"""
     
@@ -311,16 +351,14 @@ class SentinelLearningEngine:
     
     def __init__(self):
         self.user_patterns = {}  # user_id -> UserBehaviorPattern
-        self.ml_models = {}      # user_id -> ML models
+        self.ml_models: "OrderedDict[int, UserModelState]" = OrderedDict()  # user_id -> ML models
+        self._models_lock = threading.Lock()
         self.global_insights = {}
         self.learning_history = defaultdict(list)
         self.status_system = SentinelStatusSystem()  # Lisätty statussysteemi
         
-        # ML-mallit
-        self.expense_predictor = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
+        # ML-mallit (ennuste- ja anomaliamallit ovat käyttäjäkohtaisia, ks. ml_models)
         self.behavior_clusterer = KMeans(n_clusters=5, random_state=42)
-        self.scaler = StandardScaler()
         
         # Yhdistä statussysteemi learning engineen
         self.status_system.learning_engine = self
@@ -488,6 +526,10 @@ class SentinelLearningEngine:
     def predict_spending(self, user_id: int, days_ahead: int, db: Session) -> Dict[str, Any]:
         """
         Ennusta käyttäjän kulutusta tulevaisuudessa ML:llä
+        
+        Malli sovitetaan uudelleen vain kun käyttäjän päiväkohtainen kulutus
+        muuttuu. Ennustepolku lasketaan kerran pisimmälle jaksolle per
+        malliversio ja päivä, ja lyhyemmät ennusteet ovat sen alkuosia.
         """
         try:
             pattern = self.initialize_user_learning(user_id, db)
@@ -496,67 +538,36 @@ class SentinelLearningEngine:
             end_date = datetime.now()
             start_date = end_date - timedelta(days=90)
             
-            transactions = db.query(Transaction).filter(
+            rows = db.query(Transaction.transaction_date, Transaction.amount).filter(
                 Transaction.user_id == user_id,
                 Transaction.transaction_date >= start_date,
                 Transaction.amount > 0
             ).all()
             
-            if len(transactions) < 10:
+            if len(rows) < 10:
                 return {"status": "insufficient_data", "message": "Ei riittävästi dataa ennustamiseen"}
             
-            # Valmistele ominaisuudet (features)
-            features = []
-            targets = []
+            # Ryhmittele päivittäin (vain päivät joina on kulutusta)
+            daily = pd.DataFrame(rows, columns=["date", "amount"])
+            daily = daily.groupby(daily["date"].map(lambda value: value.date()))["amount"].sum().sort_index()
             
-            # Ryhmittele päivittäin
-            daily_data = defaultdict(lambda: {'amount': 0, 'count': 0})
-            for t in transactions:
-                date_key = t.transaction_date.date()
-                daily_data[date_key]['amount'] += t.amount
-                daily_data[date_key]['count'] += 1
-            
-            # Luo aikasarja-ominaisuudet
-            sorted_dates = sorted(daily_data.keys())
-            for i in range(7, len(sorted_dates)):  # 7 päivän ikkuna
-                # Ominaisuudet: edellisten 7 päivän kulutus, viikonpäivä, kuukauden päivä
-                date = sorted_dates[i]
-                weekday = date.weekday()
-                day_of_month = date.day
-                
-                # Edellisten 7 päivän kulutus
-                prev_7_days = [daily_data[sorted_dates[j]]['amount'] for j in range(i-7, i)]
-                
-                feature_vector = prev_7_days + [weekday, day_of_month]
-                features.append(feature_vector)
-                targets.append(daily_data[date]['amount'])
-            
-            if len(features) < 5:
+            if len(daily) - FORECAST_WINDOW < 5:
                 return {"status": "insufficient_data", "message": "Ei riittävästi dataa mallintamiseen"}
             
-            # Skaalaa ominaisuudet
-            features_scaled = self.scaler.fit_transform(features)
+            version = hashlib.sha256(pd.util.hash_pandas_object(daily, index=True).to_numpy().tobytes()).hexdigest()
+            origin = end_date.date()
             
-            # Harjoita malli
-            self.expense_predictor.fit(features_scaled, targets)
-            
-            # Tee ennuste
-            predictions = []
-            last_7_days = [daily_data[sorted_dates[j]]['amount'] for j in range(-7, 0)]
-            
-            for day in range(days_ahead):
-                future_date = end_date.date() + timedelta(days=day+1)
-                weekday = future_date.weekday()
-                day_of_month = future_date.day
-                
-                feature_vector = last_7_days + [weekday, day_of_month]
-                feature_scaled = self.scaler.transform([feature_vector])
-                
-                prediction = self.expense_predictor.predict(feature_scaled)[0]
-                predictions.append(max(0, prediction))  # Ei negatiivisia ennusteita
+            state = self._get_user_models(user_id)
+            with state.lock:
+                model = state.forecast
+                if model is None or model.version != version:
+                    model = state.forecast = self._fit_forecast_model(daily, version)
                 
-                # Päivitä liukuvaa ikkunaa
-                last_7_days = last_7_days[1:] + [prediction]
+                path = state.forecast_path
+                if path is None or path[0] != version or path[1] != origin:
+                    path = state.forecast_path = (version, origin, self._forecast_path(model, origin, FORECAST_MAX_DAYS))
+            
+            predictions = [max(0, prediction) for prediction in path[2][:days_ahead].tolist()]  # Ei negatiivisia ennusteita
             
             return {
                 "status": "success",
@@ -564,64 +575,86 @@ class SentinelLearningEngine:
                 "total_predicted": sum(predictions),
                 "daily_average": sum(predictions) / len(predictions),
                 "confidence": "medium",  # Yksinkertainen luottamustaso
-                "model_accuracy": self.expense_predictor.score(features_scaled, targets)
+                "model_accuracy": model.accuracy
             }
             
         except Exception as e:
             logger.error(f"Virhe kulutusennusteessa: {e}")
             return {"status": "error", "message": str(e)}
     
+    def _fit_forecast_model(self, daily: pd.Series, version: str) -> ForecastModel:
+        """Sovita ennustemalli päiväsarjasta (7 edellistä kulutuspäivää + viikonpäivä + kuukauden päivä)"""
+        amounts = daily.to_numpy(dtype=float)
+        target_dates = daily.index[FORECAST_WINDOW:]
+        
+        # Rivi i: päivien i..i+6 kulutus, tavoitteena päivän i+7 kulutus
+        features = np.column_stack([
+            sliding_window_view(amounts[:-1], FORECAST_WINDOW),
+            [target.weekday() for target in target_dates],
+            [target.day for target in target_dates]
+        ])
+        targets = amounts[FORECAST_WINDOW:]
+        
+        scaler = StandardScaler()
+        features_scaled = scaler.fit_transform(features)
+        predictor = RandomForestRegressor(n_estimators=100, random_state=42).fit(features_scaled, targets)
+        
+        return ForecastModel(
+            version=version,
+            scaler=scaler,
+            predictor=predictor,
+            accuracy=predictor.score(features_scaled, targets),
+            last_window=tuple(amounts[-FORECAST_WINDOW:])
+        )
+    
+    def _forecast_path(self, model: ForecastModel, origin: date, days: int) -> np.ndarray:
+        """Rekursiivinen ennuste `days` päivälle alkaen päivästä origin + 1"""
+        future_dates = [origin + timedelta(days=day + 1) for day in range(days)]
+        calendar = np.array([[future.weekday(), future.day] for future in future_dates], dtype=float)
+        
+        window = np.empty(FORECAST_WINDOW + 2)
+        window[:FORECAST_WINDOW] = model.last_window
+        predictions = np.empty(days)
+        for day in range(days):
+            window[FORECAST_WINDOW:] = calendar[day]
+            predictions[day] = model.predictor.predict(model.scaler.transform(window.reshape(1, -1)))[0]
+            
+            # Päivitä liukuvaa ikkunaa
+            window[:FORECAST_WINDOW - 1] = window[1:FORECAST_WINDOW]
+            window[FORECAST_WINDOW - 1] = predictions[day]
+        return predictions
+    
     def detect_spending_anomalies(self, user_id: int, db: Session) -> List[Dict[str, Any]]:
         """
         Tunnista epätavalliset kulutuskuviot ML:llä
+        
+        Käyttää käyttäjän jaksottain koulutettua anomaliamallia; malli
+        koulutetaan uudelleen vasta kun se on vanhempi kuin ANOMALY_MODEL_MAX_AGE.
         """
         try:
             pattern = self.initialize_user_learning(user_id, db)
-            
-            # Hae viimeisen 30 päivän transaktiot
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-            
-            transactions = db.query(Transaction).filter(
-                Transaction.user_id == user_id,
-                Transaction.transaction_date >= start_date,
-                Transaction.amount > 0
-            ).all()
+            transactions = self._recent_expenses(user_id, db)
             
             if len(transactions) < 10:
                 return []
             
-            # Valmistele ominaisuudet anomalian tunnistukseen
-            features = []
-            transaction_info = []
-            
-            for t in transactions:
-                # Ominaisuudet: summa, viikonpäivä, tunti, kategoria
-                weekday = t.transaction_date.weekday()
-                hour = t.transaction_date.hour
-                category_id = t.category_id or 0
-                
-                features.append([t.amount, weekday, hour, category_id])
-                transaction_info.append({
-                    'id': t.id,
-                    'amount': t.amount,
-                    'date': t.transaction_date.isoformat(),
-                    'description': t.description,
-                    'category_id': category_id
-                })
-            
-            # Skaalaa ja tunnista anomaliat
-            features_scaled = self.scaler.fit_transform(features)
-            anomaly_scores = self.anomaly_detector.fit_predict(features_scaled)
+            # Ominaisuudet: summa, viikonpäivä, tunti, kategoria
+            features = self._anomaly_features(transactions)
+            model = self._get_anomaly_model(user_id, db, features)
+            anomaly_scores = model.detector.predict(model.scaler.transform(features))
             
             # Palauta anomaaliset transaktiot
             anomalies = []
-            for i, score in enumerate(anomaly_scores):
+            for t, score in zip(transactions, anomaly_scores):
                 if score == -1:  # Anomalia
-                    anomaly_data = transaction_info[i].copy()
-                    anomaly_data['anomaly_reason'] = self._explain_anomaly(
-                        transaction_info[i], pattern.spending_patterns
-                    )
+                    anomaly_data = {
+                        'id': t.id,
+                        'amount': t.amount,
+                        'date': t.transaction_date.isoformat(),
+                        'description': t.description,
+                        'category_id': t.category_id or 0
+                    }
+                    anomaly_data['anomaly_reason'] = self._explain_anomaly(anomaly_data, pattern.spending_patterns)
                     anomalies.append(anomaly_data)
             
             return anomalies
@@ -630,6 +663,78 @@ class SentinelLearningEngine:
             logger.error(f"Virhe anomalian tunnistuksessa: {e}")
             return []
     
+    def score_transaction(self, user_id: int, transaction: Transaction, db: Session = None) -> Optional[Dict[str, Any]]:
+        """
+        Pisteytä yksittäinen uusi transaktio käyttäjän anomaliamallilla.
+        
+        Yksi predict-kutsu valmiiksi koulutetulla mallilla; malli koulutetaan
+        vain jos sitä ei vielä ole (tai se on vanhentunut) ja db on annettu.
+        Palauttaa None jos mallia ei voi muodostaa.
+        """
+        try:
+            state = self._get_user_models(user_id)
+            model = state.anomaly
+            if model is None or datetime.now() - model.trained_at > ANOMALY_MODEL_MAX_AGE:
+                if db is None:
+                    if model is None:
+                        return None
+                else:
+                    transactions = self._recent_expenses(user_id, db)
+                    if len(transactions) < 10:
+                        return None
+                    model = self._get_anomaly_model(user_id, db, self._anomaly_features(transactions))
+            
+            features = model.scaler.transform(self._anomaly_features([transaction]))
+            return {
+                "is_anomaly": bool(model.detector.predict(features)[0] == -1),
+                "anomaly_score": float(model.detector.decision_function(features)[0])
+            }
+            
+        except Exception as e:
+            logger.error(f"Virhe transaktion pisteytyksessä: {e}")
+            return None
+    
+    def invalidate_user_models(self, user_id: int):
+        """Poista käyttäjän sovitetut mallit (esim. oppimisdatan nollauksen jälkeen)"""
+        with self._models_lock:
+            self.ml_models.pop(user_id, None)
+    
+    def _get_user_models(self, user_id: int) -> UserModelState:
+        with self._models_lock:
+            state = self.ml_models.get(user_id)
+            if state is None:
+                state = self.ml_models[user_id] = UserModelState()
+            self.ml_models.move_to_end(user_id)
+            while len(self.ml_models) > MODEL_CACHE_USERS:
+                self.ml_models.popitem(last=False)
+            return state
+    
+    def _get_anomaly_model(self, user_id: int, db: Session, features: np.ndarray) -> AnomalyModel:
+        """Käyttäjän anomaliamalli; koulutetaan `features`-datalla jos puuttuu tai vanhentunut"""
+        state = self._get_user_models(user_id)
+        with state.lock:
+            model = state.anomaly
+            if model is None or datetime.now() - model.trained_at > ANOMALY_MODEL_MAX_AGE:
+                scaler = StandardScaler()
+                detector = IsolationForest(contamination=0.1, random_state=42).fit(scaler.fit_transform(features))
+                model = state.anomaly = AnomalyModel(scaler=scaler, detector=detector, trained_at=datetime.now())
+            return model
+    
+    def _recent_expenses(self, user_id: int, db: Session) -> List[Transaction]:
+        """Viimeisen 30 päivän kulut anomalioiden tunnistukseen"""
+        return db.query(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date >= datetime.now() - timedelta(days=30),
+            Transaction.amount > 0
+        ).all()
+    
+    @staticmethod
+    def _anomaly_features(transactions: List[Transaction]) -> np.ndarray:
+        return np.array([
+            [t.amount, t.transaction_date.weekday(), t.transaction_date.hour, t.category_id or 0]
+            for t in transactions
+        ], dtype=float)
+    
     def _explain_anomaly(self, transaction: Dict, spending_patterns: Dict) -> str:
         """Selitä miksi transaktio on epätavallinen"""
         amount = transaction['amount']
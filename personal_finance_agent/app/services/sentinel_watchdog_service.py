@@ -9,17 +9,31 @@ Sisältää:
 - Hätätila-protokolla
 """
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from sqlalchemy import and_, case, func
 from sqlalchemy.orm import Session
 from ..models.transaction import Transaction
 from ..models.user import User
 from ..models.category import Category
 import logging
-import statistics
+import math
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Tilanneanalyysin aikajaksot (nimi -> päivät)
+ANALYSIS_PERIODS = {"7d": 7, "30d": 30, "90d": 90}
+# Käyttäjä-id:tä per kysely koko käyttäjäkunnan riskiarviossa
+BATCH_USER_CHUNK = 500
+
+
+def _sample_stdev(count: int, total: float, sum_of_squares: float) -> float:
+    """Otoskeskihajonta summasta ja neliösummasta (sama kuin statistics.stdev)"""
+    if not count or count < 2:
+        return 0
+    variance = (float(sum_of_squares or 0) - total * total / count) / (count - 1)
+    return math.sqrt(variance) if variance > 0 else 0.0
+
 class WatchdogMode(Enum):
     """Sentinel Watchdog toimenpidemoodit"""
     PASSIVE = "passive"          # 🟢 Valpas seuraaja
@@ -72,73 +86,142 @@ class SentinelWatchdogService:
             if not user:
                 return {"status": "error", "message": "Käyttäjää ei löytynyt"}
             
-            # Analysoi eri aikajaksot
-            analysis_periods = {"7d": 7, "30d": 30, "90d": 90}
-            situation_data = {}
-            
-            for period_name, days in analysis_periods.items():
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=days)
-                
-                transactions = db.query(Transaction).filter(
-                    Transaction.user_id == user_id,
-                    Transaction.transaction_date >= start_date
-                ).all()
-                
-                # Laske tulot ja menot
-                income_transactions = [abs(t.amount) for t in transactions if t.amount < 0]
-                expense_transactions = [t.amount for t in transactions if t.amount > 0]
-                
-                total_income = sum(income_transactions)
-                total_expenses = sum(expense_transactions)
-                net_savings = total_income - total_expenses
-                
-                # Laske volatiliteetti (tulojen ja kulujen vaihtelevuus)
-                income_volatility = statistics.stdev(income_transactions) if len(income_transactions) > 1 else 0
-                expense_volatility = statistics.stdev(expense_transactions) if len(expense_transactions) > 1 else 0
-                
-                situation_data[period_name] = {
-                    "total_income": total_income,
-                    "total_expenses": total_expenses,
-                    "net_savings": net_savings,
-                    "daily_savings": net_savings / days if days > 0 else 0,
-                    "income_volatility": income_volatility,
-                    "expense_volatility": expense_volatility,
-                    "transaction_count": len(transactions)
-                }
-            
-            # Laske tavoitteen vaatima säästövauhti
-            required_monthly_savings = self.target_amount / (5 * 12)  # 5 vuotta aikaa
-            current_monthly_savings = situation_data["30d"]["net_savings"]
-            savings_gap = required_monthly_savings - current_monthly_savings
-            
-            # Laske riskimittari (0.0-1.0)
-            risk_score = self._calculate_risk_score(situation_data, savings_gap, required_monthly_savings)
-            risk_level = self._determine_risk_level(risk_score)
-            watchdog_mode = self._determine_watchdog_mode(risk_score)
+            # Analysoi kaikki aikajaksot (7pv, 30pv, 90pv) yhdellä kyselyllä
+            now = datetime.now()
+            situation_data = self._window_statistics(db, now, [user_id]).get(user_id) or self._empty_situation()
             
             return {
                 "status": "success",
-                "analysis_timestamp": datetime.now().isoformat(),
+                "analysis_timestamp": now.isoformat(),
                 "situation_data": situation_data,
-                "target_analysis": {
-                    "target_amount": self.target_amount,
-                    "required_monthly_savings": required_monthly_savings,
-                    "current_monthly_savings": current_monthly_savings,
-                    "savings_gap": savings_gap,
-                    "gap_percentage": (savings_gap / required_monthly_savings) * 100 if required_monthly_savings > 0 else 0
-                },
-                "risk_assessment": {
-                    "risk_score": risk_score,
-                    "risk_level": risk_level.value,
-                    "watchdog_mode": watchdog_mode.value
-                }
+                **self._assess_situation(situation_data)
             }
             
         except Exception as e:
             logger.error(f"Virhe tilanneanalyysissä: {e}")
             return {"status": "error", "message": str(e)}
     
+    def assess_all_users(self, db: Session, user_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Riskiarvio kaikille (tai annetuille) käyttäjille kerralla.
+        
+        Aikajaksojen tunnusluvut lasketaan yhdellä käyttäjittäin ryhmitellyllä
+        kyselyllä, joten ajastettu valvonta voi käydä koko käyttäjäkunnan läpi
+        ilman käyttäjäkohtaisia kyselyitä. Käyttäjät ilman transaktioita
+        arvioidaan nollatilanteella; `transaction_count` kertoo analyysijakson
+        transaktioiden määrän.
+        """
+        if user_ids is None:
+            user_ids = [row.id for row in db.query(User.id)]
+        if not user_ids:
+            return {}
+        
+        now = datetime.now()
+        statistics_by_user: Dict[int, Dict] = {}
+        for offset in range(0, len(user_ids), BATCH_USER_CHUNK):
+            statistics_by_user.update(self._window_statistics(db, now, user_ids[offset:offset + BATCH_USER_CHUNK]))
+        
+        assessments = {}
+        longest_period = max(ANALYSIS_PERIODS, key=ANALYSIS_PERIODS.get)
+        for user_id in user_ids:
+            situation_data = statistics_by_user.get(user_id) or self._empty_situation()
+            assessment = self._assess_situation(situation_data)
+            assessments[user_id] = {
+                **assessment["risk_assessment"],
+                "savings_gap": assessment["target_analysis"]["savings_gap"],
+                "transaction_count": situation_data[longest_period]["transaction_count"]
+            }
+        return assessments
+    
+    def _window_statistics(self, db: Session, now: datetime, user_ids: List[int]) -> Dict[int, Dict[str, Dict]]:
+        """
+        Tulot, menot, lukumäärät ja keskihajonnat kaikille aikajaksoille.
+        
+        Lyhyemmät jaksot ovat 90 päivän jakson osajoukkoja, joten haetaan vain
+        pisin jakso ja lasketaan jokaisen jakson summat, neliösummat ja
+        lukumäärät ehdollisina aggregaatteina samassa läpikäynnissä.
+        """
+        columns = [Transaction.user_id]
+        for period_name, days in ANALYSIS_PERIODS.items():
+            in_period = Transaction.transaction_date >= now - timedelta(days=days)
+            columns.append(func.count(case((in_period, 1))).label(f"{period_name}_count"))
+            for side, condition, value in (
+                ("income", Transaction.amount < 0, -Transaction.amount),
+                ("expense", Transaction.amount > 0, Transaction.amount)
+            ):
+                selected = and_(in_period, condition)
+                columns += [
+                    func.count(case((selected, 1))).label(f"{period_name}_{side}_count"),
+                    func.sum(case((selected, value), else_=0.0)).label(f"{period_name}_{side}_sum"),
+                    func.sum(case((selected, value * value), else_=0.0)).label(f"{period_name}_{side}_sumsq")
+                ]
+        
+        rows = db.query(*columns).filter(
+            Transaction.user_id.in_(user_ids),
+            Transaction.transaction_date >= now - timedelta(days=max(ANALYSIS_PERIODS.values()))
+        ).group_by(Transaction.user_id)
+        
+        result = {}
+        for row in rows:
+            values = row._mapping
+            situation_data = {}
+            for period_name, days in ANALYSIS_PERIODS.items():
+                total_income = float(values[f"{period_name}_income_sum"] or 0)
+                total_expenses = float(values[f"{period_name}_expense_sum"] or 0)
+                net_savings = total_income - total_expenses
+                situation_data[period_name] = {
+                    "total_income": total_income,
+                    "total_expenses": total_expenses,
+                    "net_savings": net_savings,
+                    "daily_savings": net_savings / days,
+                    "income_volatility": _sample_stdev(
+                        values[f"{period_name}_income_count"], total_income, values[f"{period_name}_income_sumsq"]
+                    ),
+                    "expense_volatility": _sample_stdev(
+                        values[f"{period_name}_expense_count"], total_expenses, values[f"{period_name}_expense_sumsq"]
+                    ),
+                    "transaction_count": values[f"{period_name}_count"]
+                }
+            result[row.user_id] = situation_data
+        return result
+    
+    def _empty_situation(self) -> Dict[str, Dict]:
+        """Tilannetiedot käyttäjälle jolla ei ole transaktioita analyysijaksolla"""
+        return {
+            period_name: {
+                "total_income": 0, "total_expenses": 0, "net_savings": 0, "daily_savings": 0,
+                "income_volatility": 0, "expense_volatility": 0, "transaction_count": 0
+            }
+            for period_name in ANALYSIS_PERIODS
+        }
+    
+    def _assess_situation(self, situation_data: Dict) -> Dict[str, Any]:
+        """Tavoiteanalyysi ja riskiarvio valmiiksi lasketuista jaksotiedoista"""
+        # Laske tavoitteen vaatima säästövauhti
+        required_monthly_savings = self.target_amount / (5 * 12)  # 5 vuotta aikaa
+        current_monthly_savings = situation_data["30d"]["net_savings"]
+        savings_gap = required_monthly_savings - current_monthly_savings
+        
+        # Laske riskimittari (0.0-1.0)
+        risk_score = self._calculate_risk_score(situation_data, savings_gap, required_monthly_savings)
+        risk_level = self._determine_risk_level(risk_score)
+        watchdog_mode = self._determine_watchdog_mode(risk_score)
+        
+        return {
+            "target_analysis": {
+                "target_amount": self.target_amount,
+                "required_monthly_savings": required_monthly_savings,
+                "current_monthly_savings": current_monthly_savings,
+                "savings_gap": savings_gap,
+                "gap_percentage": (savings_gap / required_monthly_savings) * 100 if required_monthly_savings > 0 else 0
+            },
+            "risk_assessment": {
+                "risk_score": risk_score,
+                "risk_level": risk_level.value,
+                "watchdog_mode": watchdog_mode.value
+            }
+        }
+    
     def _calculate_risk_score(self, situation_data: Dict, savings_gap: float, required_savings: float) -> float:
         """
         Laske riskimittari (0.0-1.0) joka yhdistää:
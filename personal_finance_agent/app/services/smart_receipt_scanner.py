@@ -12,6 +12,8 @@ import base64
 import io
 from PIL import Image
 import numpy as np
+import cv2
+from app.services.ocr_service import OCRResultCache, content_hash, image_hash, preprocess_image
 
 class SmartReceiptScanner:
     """
@@ -22,10 +24,12 @@ class SmartReceiptScanner:
     - Automaattinen AI-palveluintegraatio
     - Reaaliaikainen budjettitarkistus
     - Pattern-oppiminen taustalla
+    - Sisältöhash-välimuisti: saman kuitin uudelleenlähetys ei aja OCR:ää uudelleen
     """
     
-    def __init__(self):
+    def __init__(self, cache: Optional[OCRResultCache] = None):
         self.ocr_engine = MockGoogleVisionAPI()  # Mock toteutus
+        self.receipt_cache = cache or OCRResultCache()
         self.services = {
             'watchdog': MockSentinelWatchdog(),
             'learning': MockLearningEngine(),
@@ -101,7 +105,33 @@ class SmartReceiptScanner:
             }
     
     async def _extract_receipt_data(self, image_data: bytes) -> Dict:
-        """Poimii kuittidata OCR:llä"""
+        """
+        Poimii kuittidata OCR:llä - tulos haetaan välimuistista jos sama kuva
+        (tiedostona tai esikäsiteltyinä pikseleinä) on jo skannattu
+        """
+        raw_key = content_hash(b"receipt:" + image_data)
+        cached = self.receipt_cache.get(raw_key)
+        if cached is not None:
+            return cached
+        
+        pixel_key = None
+        image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            prepared = await asyncio.to_thread(preprocess_image, image)
+            pixel_key = content_hash(f"receipt:{image_hash(prepared)}".encode())
+            cached = self.receipt_cache.get(pixel_key)
+            if cached is not None:
+                self.receipt_cache.put(raw_key, cached)
+                return cached
+        
+        receipt_data = await self._run_receipt_ocr(image_data)
+        self.receipt_cache.put(raw_key, receipt_data)
+        if pixel_key:
+            self.receipt_cache.put(pixel_key, receipt_data)
+        return receipt_data
+    
+    async def _run_receipt_ocr(self, image_data: bytes) -> Dict:
+        """Ajaa kuitin OCR:n"""
         # Mock OCR-toteutus - oikeassa toteutuksessa Google Vision API
         receipt_data = {
             'merchant': 'Prisma',
@@ -0,0 +1,240 @@
+"""
+Per-user sweep fan-out.
+Pages users by keyset, hands each page to a chunk handler with its own
+session and runs chunks concurrently, checkpointing progress so an
+interrupted sweep resumes where it stopped within the same scheduled run.
+On SQLite, which allows a
+single writer, chunks run one at a time.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings, get_data_path
+from app.db.init_db import SessionLocal
+from app.models import User
+import logging
+
+logger = logging.getLogger(__name__)
+
+ChunkHandler = Callable[[Session, List[User]], Awaitable[None]]
+
+
+class SweepCheckpointStore:
+    """One small JSON checkpoint per sweep name, replaced atomically on every save."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self._directory = directory
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            self._directory = os.path.join(get_data_path(), "sweeps")
+        os.makedirs(self._directory, exist_ok=True)
+        return self._directory
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(name), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint for sweep {name}: {e}")
+            return None
+
+    def save(self, name: str, state: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path(name))
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.json")
+
+
+class UserSweep:
+    """
+    Keyset-paged, chunked fan-out of a per-user job.
+
+    Users are read in id order one page (chunk) at a time with
+    `id > last_id ORDER BY id LIMIT chunk_size`, so no sweep ever loads the
+    whole user table. Each chunk runs the handler with its own session, up
+    to `concurrency` chunks at once; a slow or failing chunk only delays
+    itself. SQLite has a single write lock, and a chunk that awaits while
+    its transaction is open would make the other chunks fail with
+    "database is locked", so there chunks run one at a time. The checkpoint records the id below which every chunk has
+    finished plus the ranges finished beyond it. A sweep that crashed or had
+    failed chunks resumes from there on its next run instead of starting
+    over, but only while the checkpoint belongs to the current scheduled
+    run (younger than the job's `interval`) and at most `max_attempts`
+    runs in a row; otherwise, as after a completed sweep, it starts a fresh
+    pass from the first user so a chunk that keeps failing cannot hold the
+    other users back.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, chunk_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, checkpoints: Optional[SweepCheckpointStore] = None,
+                 max_attempts: Optional[int] = None):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size or settings.scheduler_sweep_chunk_size
+        self.concurrency = concurrency or settings.scheduler_sweep_concurrency
+        self.max_attempts = max_attempts or settings.scheduler_sweep_max_attempts
+        self.checkpoints = checkpoints or SweepCheckpointStore()
+        self._running = set()
+
+    async def run(self, name: str, handler: ChunkHandler, interval: Optional[timedelta] = None) -> Dict[str, Any]:
+        """
+        Run `handler` over every user, chunk by chunk. Returns sweep statistics.
+        `interval` is how often the job is scheduled; an unfinished checkpoint
+        older than that belongs to an earlier run and is not resumed.
+        """
+        if name in self._running:
+            logger.warning(f"Sweep {name} is still running; skipping this run")
+            return {"status": "skipped"}
+
+        self._running.add(name)
+        try:
+            return await self._run(name, handler, interval)
+        finally:
+            self._running.discard(name)
+
+    async def _run(self, name: str, handler: ChunkHandler, interval: Optional[timedelta]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        state = self.checkpoints.load(name)
+        resumed = self._resumable(name, state, interval)
+        if resumed:
+            state["attempts"] = state.get("attempts", 1) + 1
+            logger.info(f"Resuming sweep {name} after user {state['watermark']} (attempt {state['attempts']})")
+        else:
+            state = {"started_at": datetime.now().isoformat(), "watermark": 0, "completed": [], "attempts": 1}
+        state.update(status="running", failed_chunks=0)
+        self.checkpoints.save(name, state)
+
+        dispatched: List[Tuple[int, int]] = []  # Chunk id ranges of this run in id order
+        finished = {}  # (first_id, last_id) -> succeeded
+        semaphore = asyncio.Semaphore(self._chunk_concurrency())
+        totals = {"users": 0, "chunks": 0}
+
+        async def run_chunk(user_ids: List[int]):
+            chunk = (user_ids[0], user_ids[-1])
+            try:
+                succeeded = await self._run_chunk(name, handler, user_ids)
+            finally:
+                semaphore.release()
+            finished[chunk] = succeeded
+            if succeeded:
+                totals["users"] += len(user_ids)
+                state["completed"].append(list(chunk))
+            else:
+                state["failed_chunks"] += 1
+            self._advance_watermark(state, dispatched, finished)
+            self.checkpoints.save(name, state)
+
+        tasks = []
+        after_id = state["watermark"]
+        skip = [tuple(completed) for completed in state["completed"]]
+        while True:
+            user_ids, after_id = self._next_chunk(after_id, skip)
+            if not user_ids:
+                break
+            await semaphore.acquire()
+            dispatched.append((user_ids[0], user_ids[-1]))
+            totals["chunks"] += 1
+            tasks.append(asyncio.create_task(run_chunk(user_ids)))
+        await asyncio.gather(*tasks)
+
+        state["status"] = "completed" if state["failed_chunks"] == 0 else "incomplete"
+        if state["status"] == "completed":
+            state["completed"] = []
+        state["finished_at"] = datetime.now().isoformat()
+        self.checkpoints.save(name, state)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "status": state["status"],
+            "resumed": resumed,
+            "users": totals["users"],
+            "chunks": totals["chunks"],
+            "failed_chunks": state["failed_chunks"],
+            "elapsed_seconds": round(elapsed, 3),
+            "users_per_second": round(totals["users"] / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        logger.info(f"Sweep {name}: {stats}")
+        return stats
+
+    def _resumable(self, name: str, state: Optional[Dict[str, Any]], interval: Optional[timedelta]) -> bool:
+        """Whether `state` is an unfinished checkpoint of the current run that may still be retried."""
+        if state is None or state.get("status") == "completed":
+            return False
+        if state.get("attempts", 1) >= self.max_attempts:
+            logger.warning(f"Sweep {name} failed {state.get('attempts', 1)} runs in a row; starting a fresh pass")
+            return False
+        if interval is not None:
+            try:
+                age = datetime.now() - datetime.fromisoformat(state["started_at"])
+            except (KeyError, TypeError, ValueError):
+                return False
+            if age >= interval:
+                logger.info(f"Checkpoint of sweep {name} is from an earlier run; starting a fresh pass")
+                return False
+        return True
+
+    def _chunk_concurrency(self) -> int:
+        """Chunks allowed in flight: `concurrency`, or one on SQLite."""
+        db = self.session_factory()
+        try:
+            if db.get_bind().dialect.name == "sqlite":
+                return 1
+            return self.concurrency
+        finally:
+            db.close()
+
+    def _next_chunk(self, after_id: int, skip: List[Tuple[int, int]]) -> Tuple[List[int], int]:
+        """Next page of user ids after `after_id`, minus ranges finished by an earlier run."""
+        db = self.session_factory()
+        try:
+            while True:
+                page = [row.id for row in db.query(User.id).filter(User.id > after_id)
+                        .order_by(User.id).limit(self.chunk_size)]
+                if not page:
+                    return [], after_id
+                after_id = page[-1]
+                user_ids = [user_id for user_id in page
+                            if not any(first <= user_id <= last for first, last in skip)]
+                if user_ids:
+                    return user_ids, after_id
+        finally:
+            db.close()
+
+    async def _run_chunk(self, name: str, handler: ChunkHandler, user_ids: List[int]) -> bool:
+        db = self.session_factory()
+        try:
+            users = db.query(User).filter(User.id.in_(user_ids)).order_by(User.id).all()
+            await handler(db, users)
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Sweep {name} failed for users {user_ids[0]}-{user_ids[-1]}: {e}")
+            return False
+        finally:
+            db.close()
+
+    @staticmethod
+    def _advance_watermark(state: Dict[str, Any], dispatched: List[Tuple[int, int]],
+                           finished: Dict[Tuple[int, int], bool]):
+        """Move the watermark past the longest prefix of successfully finished chunks."""
+        watermark = state["watermark"]
+        for chunk in dispatched:
+            if not finished.get(chunk):
+                break
+            watermark = max(watermark, chunk[1])
+        state["watermark"] = watermark
+        state["completed"] = [completed for completed in state["completed"] if completed[1] > watermark]
+
+
+user_sweep = UserSweep()
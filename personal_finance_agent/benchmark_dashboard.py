@@ -0,0 +1,83 @@
+"""
+Dashboard aggregation benchmark.
+
+Builds a throwaway SQLite database with a large transaction fixture
+(default 1M rows for one user, spread over two years), builds the monthly
+rollups and times the dashboard summary, monthly trends and category
+breakdown handlers.
+
+Usage: python benchmark_dashboard.py [transactions]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Transaction, Category
+from app.api.dashboard import get_dashboard_summary, get_monthly_trends, get_category_breakdown
+from app.services.rollup_service import rollup_service
+
+TRANSACTIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+CHUNK = 50_000
+
+
+def build_fixture(engine):
+    """Insert categories and TRANSACTIONS random transactions for user 1."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Category.__table__), [
+            {"name": f"Category {i}", "is_income": i == 0, "color": "#6B7280"} for i in range(12)
+        ])
+        now = datetime.now()
+        rng = random.Random(42)
+        for offset in range(0, TRANSACTIONS, CHUNK):
+            conn.execute(insert(Transaction.__table__), [
+                {
+                    "user_id": 1,
+                    "category_id": rng.choice([None, *range(1, 13)]),
+                    "amount": -rng.uniform(500, 3000) if rng.random() < 0.05 else rng.uniform(1, 200),
+                    "description": "benchmark",
+                    "transaction_date": now - timedelta(minutes=rng.randrange(0, 730 * 24 * 60)),
+                }
+                for _ in range(min(CHUNK, TRANSACTIONS - offset))
+            ])
+
+
+async def timed(name, coro):
+    started = time.perf_counter()
+    result = await coro
+    print(f"  {name:<22} {(time.perf_counter() - started) * 1000:8.1f} ms")
+    return result
+
+
+async def run(db):
+    user = SimpleNamespace(id=1)
+    await timed("summary (30 days)", get_dashboard_summary(period_days=30, current_user=user, db=db))
+    await timed("summary (365 days)", get_dashboard_summary(period_days=365, current_user=user, db=db))
+    await timed("monthly trends (12)", get_monthly_trends(months=12, current_user=user, db=db))
+    await timed("category breakdown", get_category_breakdown(period_days=90, transaction_type=None, current_user=user, db=db))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'benchmark.db')}")
+        started = time.perf_counter()
+        build_fixture(engine)
+        print(f"Fixture: {TRANSACTIONS:,} transactions in {time.perf_counter() - started:.1f}s")
+        db = sessionmaker(bind=engine)()
+        started = time.perf_counter()
+        rows = rollup_service.rebuild(db)
+        print(f"Rollups: {rows} rows rebuilt in {time.perf_counter() - started:.1f}s")
+        try:
+            asyncio.run(run(db))
+        finally:
+            db.close()
+            engine.dispose()
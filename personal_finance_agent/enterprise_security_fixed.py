@@ -6,6 +6,7 @@ Golden Standard Security Implementation - All Vulnerabilities FIXED
 
 import os
 import hashlib
+import heapq
 import secrets
 import time
 import jwt
@@ -66,6 +67,10 @@ class SecurityConfig:
     max_session_per_user: int = 3      # FIXED: Limit concurrent sessions
     enable_ip_whitelist: bool = True
     enable_device_tracking: bool = True
+    brute_force_window_seconds: int = 300   # Failed attempts counted over 5 minutes
+    threat_window_minutes: int = 60         # Per-IP event scoring window
+    auto_block_min_events: int = 20         # Events per window before an IP can be auto-blocked
+    auto_block_threat_score: int = 30       # Threat score that auto-blocks an IP
 
 @dataclass
 class SessionInfo:
@@ -97,6 +102,186 @@ class SecurityEvent:
     blocked: bool = False
     correlation_id: str = field(default_factory=lambda: str(uuid.uuid4()))
 
+class SlidingWindowCounter:
+    """
+    Fixed-size sliding-window counter: counts of the current and previous
+    window, weighted by how far the current window has progressed. Windows
+    start at the key's first event, so an initial burst is counted exactly.
+    """
+    __slots__ = ("window", "window_start", "current", "previous")
+    
+    def __init__(self, window: float, now: float):
+        self.window = window
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+    
+    def _advance(self, now: float):
+        elapsed_windows = int((now - self.window_start) // self.window)
+        if elapsed_windows > 0:
+            self.previous = self.current if elapsed_windows == 1 else 0
+            self.current = 0
+            self.window_start += elapsed_windows * self.window
+    
+    def add(self, now: float):
+        self._advance(now)
+        self.current += 1
+    
+    def estimate(self, now: float) -> float:
+        self._advance(now)
+        progress = (now - self.window_start) / self.window
+        return self.previous * (1 - progress) + self.current
+
+class ExpiringKeyStore:
+    """
+    Keyed store with per-entry TTL. Expiry deadlines are indexed in coarse
+    time buckets so cleanup removes everything expired in bulk without
+    scanning live entries; reads also drop expired entries lazily.
+    """
+    
+    def __init__(self, bucket_seconds: float = 60):
+        self.bucket_seconds = bucket_seconds
+        self._entries: Dict[Any, List[Any]] = {}  # key -> [value, expires_at]
+        self._buckets: Dict[int, Set[Any]] = {}
+        self._bucket_heap: List[int] = []
+        self._lock = threading.Lock()
+    
+    def set(self, key: Any, value: Any, ttl: float, now: Optional[float] = None):
+        with self._lock:
+            self._set(key, value, (time.time() if now is None else now) + ttl)
+    
+    def _set(self, key: Any, value: Any, expires_at: float):
+        self._entries[key] = [value, expires_at]
+        bucket = int(expires_at // self.bucket_seconds)
+        if bucket not in self._buckets:
+            self._buckets[bucket] = set()
+            heapq.heappush(self._bucket_heap, bucket)
+        self._buckets[bucket].add(key)
+    
+    def get(self, key: Any, now: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= (time.time() if now is None else now):
+                del self._entries[key]
+                return None
+            return entry[0]
+    
+    def get_or_create(self, key: Any, factory, ttl: float, now: Optional[float] = None) -> Any:
+        """Return the live value for key (created by factory if missing) and extend its TTL."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            value = entry[0] if entry is not None and entry[1] > now else factory()
+            self._set(key, value, now + ttl)
+            return value
+    
+    def pop(self, key: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Remove all expired entries; cost is proportional to the expired buckets."""
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            while self._bucket_heap and (self._bucket_heap[0] + 1) * self.bucket_seconds <= now:
+                bucket = heapq.heappop(self._bucket_heap)
+                for key in self._buckets.pop(bucket):
+                    entry = self._entries.get(key)
+                    # Keys whose TTL was extended live on in a later bucket
+                    if entry is not None and entry[1] <= now:
+                        del self._entries[key]
+                        removed += 1
+        return removed
+    
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SecurityEventWindow:
+    """
+    Per-IP event counts and threat scores over a sliding time window,
+    maintained incrementally in per-minute buckets. Recording an event is
+    O(1); expired buckets are subtracted from the running totals as the
+    window moves.
+    """
+    
+    def __init__(self, window_minutes: int = 60, bucket_seconds: int = 60):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(1, window_minutes * 60 // bucket_seconds)
+        self._buckets: deque = deque()  # (bucket_id, ip_counts, ip_scores, level_counts)
+        self.ip_counts: Dict[str, int] = defaultdict(int)
+        self.ip_scores: Dict[str, int] = defaultdict(int)
+        self.level_counts: Dict[ThreatLevel, int] = defaultdict(int)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def event_score(threat_level: ThreatLevel) -> int:
+        return 2 if threat_level == ThreatLevel.HIGH else 1
+    
+    def record(self, source_ip: str, threat_level: ThreatLevel, now: Optional[float] = None) -> Dict[str, int]:
+        """Add an event and return the IP's running count and score for the window."""
+        bucket_id = int((time.time() if now is None else now) // self.bucket_seconds)
+        score = self.event_score(threat_level)
+        with self._lock:
+            self._expire(bucket_id)
+            if self._buckets:
+                # A clock stepping back must not put buckets out of order
+                bucket_id = max(bucket_id, self._buckets[-1][0])
+            if not self._buckets or self._buckets[-1][0] != bucket_id:
+                self._buckets.append((bucket_id, defaultdict(int), defaultdict(int), defaultdict(int)))
+            _, ip_counts, ip_scores, level_counts = self._buckets[-1]
+            ip_counts[source_ip] += 1
+            ip_scores[source_ip] += score
+            level_counts[threat_level] += 1
+            self.ip_counts[source_ip] += 1
+            self.ip_scores[source_ip] += score
+            self.level_counts[threat_level] += 1
+            return {"events": self.ip_counts[source_ip], "threat_score": self.ip_scores[source_ip]}
+    
+    def advance(self, now: Optional[float] = None):
+        with self._lock:
+            self._expire(int((time.time() if now is None else now) // self.bucket_seconds))
+    
+    def _expire(self, bucket_id: int):
+        while self._buckets and self._buckets[0][0] <= bucket_id - self.window_buckets:
+            _, ip_counts, ip_scores, level_counts = self._buckets.popleft()
+            for ip, count in ip_counts.items():
+                self._subtract(self.ip_counts, ip, count)
+                self._subtract(self.ip_scores, ip, ip_scores[ip])
+            for level, count in level_counts.items():
+                self._subtract(self.level_counts, level, count)
+    
+    @staticmethod
+    def _subtract(totals: Dict[Any, int], key: Any, amount: int):
+        remaining = totals[key] - amount
+        if remaining > 0:
+            totals[key] = remaining
+        else:
+            del totals[key]
+    
+    def level_totals(self) -> Dict[ThreatLevel, int]:
+        """Event counts by threat level over the whole window."""
+        with self._lock:
+            return dict(self.level_counts)
+    
+    def recent_level_counts(self, minutes: int, now: Optional[float] = None) -> Dict[ThreatLevel, int]:
+        """Event counts by threat level over the last `minutes` (at most the window)."""
+        bucket_id = int((time.time() if now is None else now) // self.bucket_seconds)
+        oldest = bucket_id - max(1, minutes * 60 // self.bucket_seconds)
+        counts: Dict[ThreatLevel, int] = defaultdict(int)
+        with self._lock:
+            for bucket in reversed(self._buckets):
+                if bucket[0] <= oldest:
+                    break
+                for level, count in bucket[3].items():
+                    counts[level] += count
+        return counts
+
 class EnterpriseSecuritySystemFixed:
     """
     🔒 ENTERPRISE SECURITY SYSTEM - ALL VULNERABILITIES FIXED
@@ -134,14 +319,15 @@ class EnterpriseSecuritySystemFixed:
         self.user_sessions: Dict[str, Set[str]] = defaultdict(set)
         self.session_lock = threading.RLock()  # FIXED: Use RLock
         
-        # FIXED: Enhanced threat detection
-        self.failed_attempts: Dict[str, deque] = defaultdict(lambda: deque(maxlen=20))
-        self.blocked_ips: Dict[str, datetime] = {}  # FIXED: Track block time
+        # FIXED: Enhanced threat detection with constant memory per key
+        self.failed_attempts = ExpiringKeyStore()  # (ip, email) -> SlidingWindowCounter
+        self.blocked_ips = ExpiringKeyStore()      # ip -> block time, expires after lockout
         self.suspicious_ips: Dict[str, Dict[str, Any]] = {}
         self.trusted_devices: Dict[str, Set[str]] = defaultdict(set)
         
         # FIXED: Comprehensive security events with correlation
         self.security_events: deque = deque(maxlen=50000)  # FIXED: Increased capacity
+        self.event_window = SecurityEventWindow(self.config.threat_window_minutes)
         
         # FIXED: Strong password context
         self.pwd_context = CryptContext(
@@ -505,34 +691,34 @@ class EnterpriseSecuritySystemFixed:
         }
     
     def _is_ip_blocked(self, ip_address: str) -> bool:
-        """FIXED: Check if IP is currently blocked"""
-        if ip_address in self.blocked_ips:
-            block_time = self.blocked_ips[ip_address]
-            if datetime.utcnow() - block_time < timedelta(minutes=self.config.lockout_duration_minutes):
-                return True
-            else:
-                # Remove expired block
-                del self.blocked_ips[ip_address]
-        return False
+        """FIXED: Check if IP is currently blocked (blocks expire with the lockout)"""
+        return ip_address in self.blocked_ips
+    
+    def _block_ip(self, ip_address: str):
+        """Block IP for the configured lockout duration"""
+        self.blocked_ips.set(ip_address, datetime.utcnow(), self.config.lockout_duration_minutes * 60)
     
     def _is_brute_force_attempt(self, source_ip: str, email: str) -> bool:
-        """FIXED: Enhanced brute force detection"""
-        key = f"{source_ip}_{email}"
-        attempts = self.failed_attempts[key]
+        """FIXED: Enhanced brute force detection, O(1) per check"""
+        counter = self.failed_attempts.get((source_ip, email))
         
         # FIXED: Check for 3+ attempts in 5 minutes
-        recent_attempts = [t for t in attempts if time.time() - t < 300]
-        return len(recent_attempts) >= self.config.max_failed_attempts
+        return counter is not None and counter.estimate(time.time()) >= self.config.max_failed_attempts
     
     def _record_failed_attempt(self, source_ip: str, email: str):
-        """FIXED: Record failed attempt with timestamp"""
-        key = f"{source_ip}_{email}"
-        self.failed_attempts[key].append(time.time())
+        """FIXED: Count failed attempt in the key's sliding window"""
+        now = time.time()
+        window = self.config.brute_force_window_seconds
+        # Counter state is irrelevant two windows after the last attempt, so it expires then
+        counter = self.failed_attempts.get_or_create(
+            (source_ip, email), lambda: SlidingWindowCounter(window, now), 2 * window, now
+        )
+        counter.add(now)
     
     def _handle_brute_force(self, source_ip: str, email: str):
         """FIXED: Handle brute force attack"""
         # Block IP for configured duration
-        self.blocked_ips[source_ip] = datetime.utcnow()
+        self._block_ip(source_ip)
         
         self._log_security_event(
             event_type="brute_force_detected",
@@ -688,6 +874,14 @@ class EnterpriseSecuritySystemFixed:
         
         self.security_events.append(event)
         
+        # Incremental per-IP scoring replaces rescanning the event history
+        ip_window = self.event_window.record(source_ip, threat_level)
+        if (ip_window["events"] > self.config.auto_block_min_events
+                and ip_window["threat_score"] > self.config.auto_block_threat_score
+                and not self._is_ip_blocked(source_ip)):
+            self._block_ip(source_ip)
+            logger.warning(f"IP {source_ip} auto-blocked due to threat score: {ip_window['threat_score']}")
+        
         # FIXED: Structured security logging
         log_data = {
             "event_id": event.event_id,
@@ -724,31 +918,15 @@ class EnterpriseSecuritySystemFixed:
         logger.info("✅ Enhanced security monitoring started")
     
     def _analyze_security_events(self):
-        """FIXED: Analyze security events for patterns"""
-        recent_events = [e for e in self.security_events 
-                        if (datetime.utcnow() - e.timestamp).total_seconds() < 3600]
-        
-        # Analyze by IP
-        ip_events = defaultdict(list)
-        for event in recent_events:
-            ip_events[event.source_ip].append(event)
-        
-        for ip, events in ip_events.items():
-            if len(events) > 20:  # More than 20 events per hour
-                threat_score = sum(2 if e.threat_level == ThreatLevel.HIGH else 1 for e in events)
-                if threat_score > 30:
-                    self.blocked_ips[ip] = datetime.utcnow()
-                    logger.warning(f"IP {ip} auto-blocked due to threat score: {threat_score}")
+        """FIXED: Move the per-IP scoring window forward (IPs are scored as events arrive)"""
+        self.event_window.advance()
     
     def _cleanup_expired_blocks(self):
-        """FIXED: Clean up expired IP blocks"""
-        current_time = datetime.utcnow()
-        expired_ips = [ip for ip, block_time in self.blocked_ips.items()
-                      if current_time - block_time > timedelta(minutes=self.config.lockout_duration_minutes)]
-        
-        for ip in expired_ips:
-            del self.blocked_ips[ip]
-            logger.info(f"IP block expired for {ip}")
+        """FIXED: Clean up expired IP blocks and idle failed-attempt counters in bulk"""
+        expired_blocks = self.blocked_ips.cleanup()
+        expired_counters = self.failed_attempts.cleanup()
+        if expired_blocks or expired_counters:
+            logger.info(f"Expired {expired_blocks} IP blocks and {expired_counters} failed-attempt counters")
     
     def _detect_anomalies(self):
         """FIXED: Detect anomalous patterns"""
@@ -757,15 +935,16 @@ class EnterpriseSecuritySystemFixed:
     
     def get_security_status(self) -> Dict[str, Any]:
         """FIXED: Comprehensive security status"""
-        recent_events = [e for e in self.security_events 
-                        if (datetime.utcnow() - e.timestamp).total_seconds() < 3600]
+        self.event_window.advance()
+        self.blocked_ips.cleanup()
+        level_counts = self.event_window.level_totals()
         
         return {
             "timestamp": datetime.utcnow().isoformat(),
             "active_sessions": len(self.active_sessions),
             "blocked_ips": len(self.blocked_ips),
-            "recent_events": len(recent_events),
-            "high_threat_events": len([e for e in recent_events if e.threat_level in [ThreatLevel.HIGH, ThreatLevel.CRITICAL]]),
+            "recent_events": sum(level_counts.values()),
+            "high_threat_events": level_counts.get(ThreatLevel.HIGH, 0) + level_counts.get(ThreatLevel.CRITICAL, 0),
             "security_config": {
                 "mfa_required": self.config.require_mfa,
                 "session_timeout_minutes": self.config.session_timeout_minutes,
@@ -777,17 +956,16 @@ class EnterpriseSecuritySystemFixed:
     
     def _calculate_overall_threat_level(self) -> str:
         """Calculate overall system threat level"""
-        recent_events = [e for e in self.security_events 
-                        if (datetime.utcnow() - e.timestamp).total_seconds() < 300]  # Last 5 minutes
+        recent_events = self.event_window.recent_level_counts(5)  # Last 5 minutes
         
-        critical_events = len([e for e in recent_events if e.threat_level == ThreatLevel.CRITICAL])
-        high_events = len([e for e in recent_events if e.threat_level == ThreatLevel.HIGH])
+        critical_events = recent_events[ThreatLevel.CRITICAL]
+        high_events = recent_events[ThreatLevel.HIGH]
         
         if critical_events > 0:
             return "CRITICAL"
         elif high_events > 5:
             return "HIGH"
-        elif len(recent_events) > 20:
+        elif sum(recent_events.values()) > 20:
             return "MEDIUM"
         else:
             return "LOW"
@@ -0,0 +1,135 @@
+"""
+AI Memory Layer recall index tests
+"""
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import pytest
+
+from app.services.ai_memory_layer import AIMemoryLayer
+
+
+def reference_relevance(memory, context):
+    """Linear-scan relevance the index must reproduce"""
+    context_lower = context.lower()
+    relevance = sum(0.3 for tag in memory['tags'] if tag.lower() in context_lower)
+    if memory['service'].lower() in context_lower:
+        relevance += 0.2
+    days_old = (datetime.now() - datetime.fromisoformat(memory['timestamp'])).days
+    relevance += 0.2 if days_old < 7 else 0.1 if days_old < 30 else 0.0
+    relevance += memory['importance'] * 0.3
+    return min(relevance, 1.0)
+
+
+@pytest.fixture
+def layer(tmp_path):
+    layer = AIMemoryLayer(enable_vectors=True, storage_path=str(tmp_path / "memory.db"))
+    rng = random.Random(3)
+    services = list(layer.service_memories)
+    now = time.time()
+    for i in range(3000):
+        interaction = {
+            'user_id': rng.randrange(5),
+            'category': rng.choice(['ruoka', 'liikenne', 'viihde']),
+            'action_type': rng.choice(['expense', 'idea', 'alert']),
+            'amount': rng.choice([50, 200, 700, 1500]),
+            'type': rng.choice(['watchdog_alert', 'idea_generated', 'other']),
+            'n': i
+        }
+        timestamp = now - rng.uniform(0, 60) * 86400
+        service = rng.choice(services)
+        entry = {
+            'id': f"m{i}",
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+            'service': service,
+            'data': interaction,
+            'context': layer._extract_context(interaction),
+            'importance': layer._calculate_importance(interaction),
+            'tags': layer._extract_tags(interaction)
+        }
+        layer.service_memories[service].append(entry)
+        asyncio.run(layer._index_memory(entry))
+    return layer
+
+
+class TestRecallIndex:
+    """Indexed recall returns the same top-k scores as a full scan"""
+
+    @pytest.mark.parametrize("context,service", [
+        ("category:ruoka kulut", "chat"),
+        ("watchdog hälytys action:alert high_value", "idea_engine"),
+        ("mitä kuuluu", "budget_system"),
+        ("category:viihde category:liikenne low_value chat", "watchdog"),
+    ])
+    def test_matches_linear_scan(self, layer, context, service):
+        results = asyncio.run(layer.recall(context, service, limit=10))
+
+        expected = []
+        for memory in layer.recall_index.entries.values():
+            score = reference_relevance(memory, context)
+            if score > (0.3 if memory['service'] == service else 0.5):
+                expected.append(score)
+        expected = sorted(expected, reverse=True)[:10]
+
+        assert [m['relevance_score'] for m in results] == pytest.approx(expected)
+
+    def test_user_filter(self, layer):
+        results = asyncio.run(layer.recall("category:ruoka", "chat", limit=20, user_id=2))
+        assert results and all(m['context']['user_id'] == 2 for m in results)
+
+    def test_recall_similar(self, layer):
+        results = asyncio.run(layer.recall_similar("category:ruoka expense", limit=5))
+        assert len(results) == 5
+        assert results[0]['similarity'] >= results[-1]['similarity']
+
+
+class TestTieredMemory:
+    """Bounded hot memory, cold store on disk and compaction"""
+
+    def remember_many(self, layer, count, category='ruoka'):
+        for i in range(count):
+            interaction = {'user_id': 1, 'category': category, 'amount': 50 + i % 3, 'n': i}
+            asyncio.run(layer.remember(interaction, 'budget_system'))
+
+    def test_capacity_is_bounded(self, tmp_path):
+        layer = AIMemoryLayer(storage_path=str(tmp_path / "memory.db"), capacity=100)
+        self.remember_many(layer, 500)
+
+        assert len(layer.recall_index.entries) <= 100
+        assert len(layer.service_memories['budget_system']) == 500
+        layer.persist()
+        assert layer.cold_store.cold_count == 500 - len(layer.recall_index.entries)
+
+    def test_evicted_memories_are_recalled_from_disk(self, tmp_path):
+        layer = AIMemoryLayer(storage_path=str(tmp_path / "memory.db"), capacity=100)
+        self.remember_many(layer, 5, category='matkat')
+        self.remember_many(layer, 300)
+        assert not any('category:matkat' in m['tags'] for m in layer.recall_index.entries.values())
+
+        results = asyncio.run(layer.recall("category:matkat", "budget_system", limit=5))
+        assert len(results) == 5
+        assert all('category:matkat' in m['tags'] for m in results)
+
+    def test_memories_survive_restart(self, tmp_path):
+        path = str(tmp_path / "memory.db")
+        layer = AIMemoryLayer(storage_path=path)
+        self.remember_many(layer, 20)
+        layer.persist()
+        layer.cold_store.close()
+
+        restarted = AIMemoryLayer(storage_path=path)
+        results = asyncio.run(restarted.recall("category:ruoka", "budget_system", limit=30))
+        assert len(results) == 20
+
+    def test_compaction_summarizes_old_memories(self, tmp_path):
+        layer = AIMemoryLayer(storage_path=str(tmp_path / "memory.db"))
+        self.remember_many(layer, 30)
+
+        assert layer.compact(older_than_days=-1) == 30
+        assert not layer.recall_index.entries
+        summary, = layer.get_summaries('budget_system')
+        assert summary['count'] == 30
+        assert summary['category'] == 'ruoka'
+        assert summary['total_amount'] == sum(50 + i % 3 for i in range(30))
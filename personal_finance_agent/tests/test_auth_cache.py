@@ -0,0 +1,104 @@
+"""
+Authentication token and user cache tests
+"""
+import time
+import pytest
+from datetime import timedelta
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import User
+from app.services import auth_service as auth_module
+from app.services.auth_service import AuthService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username="user1", email="user1@example.com", hashed_password="x", full_name="User One"))
+    db.commit()
+    db.close()
+    return engine
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = AuthService()
+    # Module-level ORM listeners invalidate the global instance
+    monkeypatch.setattr(auth_module, "auth_service", service)
+    return service
+
+
+def _count_user_selects(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    return lambda: len([sql for sql in statements if sql.lstrip().startswith("SELECT") and "FROM users" in sql])
+
+
+class TestTokenCache:
+    """Verified tokens skip signature checks until they expire"""
+
+    def test_repeated_verification_decodes_once(self, service, monkeypatch):
+        decodes = []
+        original = auth_module.jwt.decode
+        monkeypatch.setattr(auth_module.jwt, "decode", lambda *args, **kwargs: decodes.append(1) or original(*args, **kwargs))
+
+        token = service.create_access_token({"sub": "1"})
+        assert service.verify_token(token) == service.verify_token(token)
+        assert len(decodes) == 1
+        assert service.get_cache_stats()["token_cache"]["hit_rate"] == 0.5
+
+    def test_cached_claims_expire_with_token(self, service):
+        token = service.create_access_token({"sub": "1"}, expires_delta=timedelta(seconds=2))
+        payload = service.verify_token(token)
+        assert service.token_cache._entries[token][1] <= payload["exp"] < time.time() + 3
+
+        expired = service.create_access_token({"sub": "1"}, expires_delta=timedelta(seconds=-1))
+        assert service.verify_token(expired) is None
+        assert expired not in service.token_cache._entries
+
+
+class TestUserCache:
+    """Authenticated users come from the cache and are invalidated on change"""
+
+    def test_cached_user_attached_without_query(self, service, engine, session_factory):
+        token = service.create_access_token({"sub": "1"})
+        service.get_current_user(session_factory(), token)
+
+        selects = _count_user_selects(engine)
+        db = session_factory()
+        user = service.get_current_user(db, token)
+        assert selects() == 0
+        assert user in db
+        assert user.full_name == "User One"
+
+        user.full_name = "Renamed"
+        db.commit()
+        assert session_factory().get(User, 1).full_name == "Renamed"
+
+    def test_orm_update_invalidates(self, service, session_factory):
+        service.load_user(session_factory(), 1)
+
+        other = session_factory()
+        other.get(User, 1).monthly_income = 4200.0
+        other.commit()
+        assert service.load_user(session_factory(), 1).monthly_income == 4200.0
+
+    def test_deactivated_user_rejected(self, service, session_factory):
+        token = service.create_access_token({"sub": "1"})
+        db = session_factory()
+        service.deactivate_user(db, service.get_current_user(db, token))
+
+        with pytest.raises(HTTPException) as error:
+            service.get_current_user(session_factory(), token)
+        assert error.value.status_code == 400
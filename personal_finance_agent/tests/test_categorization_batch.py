@@ -0,0 +1,54 @@
+"""
+Batched categorization tests
+"""
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+
+from app.services.categorization_service import TransactionCategorizationService
+
+
+@pytest.fixture
+def service():
+    service = TransactionCategorizationService()
+    texts = ["k-market ruoka", "s-market maito", "lidl leipä", "hsl lippu", "vr juna", "taksi kyyti",
+             "netflix tilaus", "spotify musiikki", "finnkino elokuva"] * 3
+    labels = ["food"] * 3 + ["transport"] * 3 + ["entertainment"] * 3
+    service.pipeline = Pipeline([
+        ('tfidf', TfidfVectorizer()),
+        ('classifier', LogisticRegression(max_iter=1000))
+    ]).fit(texts, labels * 3)
+    service.category_encoder = {
+        'class_to_id': {"food": 1, "transport": 2, "entertainment": 3},
+        'class_to_name': {"food": "Ruoka", "transport": "Liikenne", "entertainment": "Viihde"}
+    }
+    service.is_trained = True
+    service.min_confidence = 0.0
+    return service
+
+
+class TestCategorizeBatch:
+    """categorize_batch must match per-transaction categorization"""
+
+    def test_batch_matches_single(self, service):
+        transactions = [
+            {"description": "K-Market Kamppi", "amount": 12.5, "merchant": None},
+            {"description": "HSL mobiililippu", "amount": 2.8, "merchant": "HSL"},
+            {"description": "Netflix", "amount": 11.99, "merchant": None},
+        ]
+        batch = service.categorize_batch(transactions)
+        single = [service.categorize_transaction(t["description"], t["amount"], t["merchant"]) for t in transactions]
+
+        assert [r["category_id"] for r in batch] == [1, 2, 3]
+        for batch_result, single_result in zip(batch, single):
+            assert batch_result["category_id"] == single_result["category_id"]
+            assert batch_result["confidence"] == pytest.approx(single_result["confidence"])
+            assert batch_result["all_predictions"] == single_result["all_predictions"]
+
+    def test_untrained_returns_defaults(self):
+        service = TransactionCategorizationService()
+        service.is_trained = False
+        results = service.categorize_batch([{"description": "x", "amount": 1.0}] * 3)
+        assert len(results) == 3
+        assert all(r["method"] == "default" for r in results)
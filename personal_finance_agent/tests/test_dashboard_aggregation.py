@@ -0,0 +1,168 @@
+"""
+Dashboard aggregation tests: the grouped/rollup figures must equal a
+row-by-row computation over the raw transactions
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import transactions as transactions_api
+from app.api.auth import get_current_user
+from app.api.dashboard import get_dashboard_summary, get_monthly_trends, get_category_breakdown, _month_starts
+from app.db.base import Base
+from app.db.init_db import get_db
+from app.models import Transaction, Category
+from app.services.rollup_service import rollup_service, next_month
+
+USER = SimpleNamespace(id=1)
+
+
+@pytest.fixture
+def session():
+    # One shared connection so endpoint requests served on another thread see the same data
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add_all([
+        Category(name="Palkka", is_income=True, color="#10B981"),
+        Category(name="Ruoka", is_income=False, color="#F59E0B"),
+        Category(name="Asuminen", is_income=False, color="#3B82F6"),
+        Category(name="Viihde", is_income=False, color="#EC4899"),
+    ])
+    db.commit()
+
+    rng = random.Random(11)
+    now = datetime.now()
+    for i in range(600):
+        # Half-day offsets keep every row well clear of the now-relative period bounds
+        when = now - timedelta(days=rng.randrange(0, 240), hours=12, minutes=rng.randrange(0, 600))
+        amount = -rng.uniform(500, 3000) if rng.random() < 0.1 else rng.uniform(1, 250)
+        db.add(Transaction(user_id=1, amount=round(amount, 2), description=f"Transaction {i}",
+                           transaction_date=when, category_id=rng.choice([None, 1, 2, 3, 4])))
+    # Another user's rows must not leak into the figures
+    db.add(Transaction(user_id=2, amount=999.0, description="Other user", transaction_date=now - timedelta(days=1),
+                       category_id=2))
+    db.commit()
+    rollup_service.rebuild(db)
+    db.commit()
+    yield db
+    db.close()
+
+
+def _rows(db, start, end, inclusive_end=True):
+    return [
+        txn for txn in db.query(Transaction).filter(Transaction.user_id == USER.id).all()
+        if txn.transaction_date >= start and (txn.transaction_date <= end if inclusive_end else txn.transaction_date < end)
+    ]
+
+
+def _category_type(category):
+    return "income" if category.is_income else "expense"
+
+
+class TestDashboardAggregation:
+    """Summary, trends and breakdown match the per-row computation"""
+
+    def test_summary_matches_row_by_row(self, session):
+        summary = asyncio.run(get_dashboard_summary(period_days=30, current_user=USER, db=session))
+
+        end = datetime.now()
+        start = end - timedelta(days=30)
+        transactions = _rows(session, start, end)
+        income = sum(abs(txn.amount) for txn in transactions if txn.amount < 0)
+        expenses = sum(txn.amount for txn in transactions if txn.amount > 0)
+        categories = {}
+        for txn in transactions:
+            if txn.category:
+                stats = categories.setdefault(txn.category.name, {
+                    "amount": 0, "count": 0, "type": _category_type(txn.category), "color": txn.category.color
+                })
+                stats["amount"] += abs(txn.amount)
+                stats["count"] += 1
+        prev_expenses = sum(txn.amount for txn in _rows(session, start - timedelta(days=30), start, False)
+                            if txn.amount > 0)
+
+        assert summary.total_income == pytest.approx(income)
+        assert summary.total_expenses == pytest.approx(expenses)
+        assert summary.net_amount == pytest.approx(income - expenses)
+        assert summary.transaction_count == len(transactions)
+        assert summary.avg_daily_spending == pytest.approx(expenses / 30)
+        assert summary.expense_change_percent == pytest.approx((expenses - prev_expenses) / prev_expenses * 100)
+        assert summary.category_breakdown.keys() == categories.keys()
+        for name, stats in categories.items():
+            assert summary.category_breakdown[name] == {**stats, "amount": pytest.approx(stats["amount"])}
+        assert [top["name"] for top in summary.top_categories] == [
+            name for name, _ in sorted(categories.items(), key=lambda item: item[1]["amount"], reverse=True)
+        ][:5]
+
+    def test_monthly_trends_match_row_by_row(self, session):
+        trends = asyncio.run(get_monthly_trends(months=8, current_user=USER, db=session))
+
+        month_starts = _month_starts(8)
+        assert [trend.month for trend in trends] == [start.strftime("%Y-%m") for start in month_starts]
+        for trend, start in zip(trends, month_starts):
+            transactions = _rows(session, start, next_month(start), inclusive_end=False)
+            income = sum(abs(txn.amount) for txn in transactions if txn.amount < 0)
+            expenses = sum(txn.amount for txn in transactions if txn.amount > 0)
+            assert trend.income == pytest.approx(income)
+            assert trend.expenses == pytest.approx(expenses)
+            assert trend.net_amount == pytest.approx(income - expenses)
+            assert trend.transaction_count == len(transactions)
+
+    @pytest.mark.parametrize("transaction_type", [None, "expense", "income"])
+    def test_category_breakdown_matches_row_by_row(self, session, transaction_type):
+        breakdown = asyncio.run(get_category_breakdown(
+            period_days=90, transaction_type=transaction_type, current_user=USER, db=session
+        ))
+
+        end = datetime.now()
+        categories = {}
+        for txn in _rows(session, end - timedelta(days=90), end):
+            if txn.category is None:
+                continue
+            if transaction_type and _category_type(txn.category) != transaction_type:
+                continue
+            categories.setdefault(txn.category_id, []).append(txn)
+        total = sum(abs(txn.amount) for txns in categories.values() for txn in txns)
+
+        assert [row.category_id for row in breakdown] == sorted(
+            categories, key=lambda category_id: sum(abs(txn.amount) for txn in categories[category_id]), reverse=True
+        )
+        for row in breakdown:
+            txns = categories[row.category_id]
+            amount = sum(abs(txn.amount) for txn in txns)
+            assert row.category_name == txns[0].category.name
+            assert row.category_type == _category_type(txns[0].category)
+            assert row.category_color == txns[0].category.color
+            assert row.total_amount == pytest.approx(amount)
+            assert row.transaction_count == len(txns)
+            assert row.average_amount == pytest.approx(amount / len(txns))
+            assert row.percentage == pytest.approx(amount / total * 100)
+            assert row.last_transaction == max(txn.transaction_date for txn in txns)
+
+    def test_stats_endpoint_accepts_date_filters(self, session):
+        app = FastAPI()
+        app.include_router(transactions_api.router)
+        app.dependency_overrides[get_db] = lambda: session
+        app.dependency_overrides[get_current_user] = lambda: USER
+
+        start = (datetime.now() - timedelta(days=100)).replace(hour=0, minute=0, second=0, microsecond=0)
+        end = (datetime.now() - timedelta(days=10)).replace(hour=0, minute=0, second=0, microsecond=0)
+        response = TestClient(app).get("/transactions/stats/summary", params={
+            "date_from": start.date().isoformat(), "date_to": end.isoformat()
+        })
+
+        assert response.status_code == 200
+        stats = response.json()
+        transactions = _rows(session, start, end)
+        assert stats["transaction_count"] == len(transactions)
+        assert stats["total_expenses"] == pytest.approx(sum(txn.amount for txn in transactions if txn.amount > 0))
+        assert stats["date_range"] == {"from": start.isoformat(), "to": end.isoformat()}
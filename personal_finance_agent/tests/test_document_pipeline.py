@@ -0,0 +1,124 @@
+"""
+Document pipeline claim leasing and batch processing tests
+"""
+import sys
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Document, ProcessingStatus, Transaction, TransactionRollup
+from app.services.document_pipeline import DocumentProcessingPipeline, parse_receipt_text
+
+# app.services re-exports the singleton under the module's name
+pipeline_module = sys.modules["app.services.document_pipeline"]
+
+
+class InlinePool:
+    """Runs the OCR function in-process with canned OCR output"""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def map(self, function, paths):
+        for path in paths:
+            text = self.texts[path]
+            yield {"error": "unreadable"} if text is None else {
+                "text": text, "confidence": 0.9, "service": "Inline", **parse_receipt_text(text)
+            }
+
+
+def _seed(engine):
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    for i in range(10):
+        db.add(Document(filename=f"r{i}.jpg", original_filename=f"r{i}.jpg", file_path=f"/tmp/r{i}.jpg",
+                        file_size=100, mime_type="image/jpeg", user_id=1))
+    db.commit()
+    return db
+
+
+@pytest.fixture
+def session():
+    db = _seed(create_engine("sqlite:///:memory:"))
+    yield db
+    db.close()
+
+
+def test_claims_are_disjoint_and_leased(session):
+    first = DocumentProcessingPipeline(workers=1, batch_size=4, lease_seconds=60)
+    second = DocumentProcessingPipeline(workers=1, batch_size=4, lease_seconds=60)
+
+    a = {d.id for d in first.claim_batch(session)}
+    b = {d.id for d in second.claim_batch(session)}
+    c = {d.id for d in second.claim_batch(session)}
+    assert len(a) == len(b) == 4 and len(c) == 2
+    assert not (a & b) and not (b & c)
+    assert second.claim_batch(session) == []
+
+    # An abandoned lease becomes claimable again
+    session.query(Document).filter(Document.id.in_(a)).update(
+        {"processing_started_at": datetime.utcnow() - timedelta(minutes=5)}, synchronize_session=False
+    )
+    session.commit()
+    assert {d.id for d in second.claim_batch(session)} == a
+
+
+def test_run_drains_backlog_and_creates_transactions(session, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "publish_event", lambda *args: _noop())
+    texts = {f"/tmp/r{i}.jpg": f"K-Market\nYHTEENSÄ {i + 1},50 €" for i in range(10)}
+    texts["/tmp/r3.jpg"] = None
+    pipeline = DocumentProcessingPipeline(workers=1, batch_size=3)
+    pipeline._pool = InlinePool(texts)
+
+    report = pipeline.run(session)
+
+    assert report["batches"] == 4
+    assert (report["processed"], report["failed"], report["transactions_created"]) == (9, 1, 9)
+    assert report["documents_per_second"] > 0
+    statuses = [d.processing_status for d in session.query(Document).order_by(Document.id)]
+    assert statuses.count(ProcessingStatus.PROCESSED) == 9 and statuses[3] == ProcessingStatus.FAILED
+    amounts = sorted(t.amount for t in session.query(Transaction))
+    assert amounts == [i + 1.5 for i in range(10) if i != 3]
+    assert sum(r.transaction_count for r in session.query(TransactionRollup)) == 9
+
+
+def test_expired_lease_result_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_module, "publish_event", lambda *args: _noop())
+    engine = create_engine(f"sqlite:///{tmp_path / 'pipeline.db'}")
+    _seed(engine).close()
+    # Each worker has its own session, as separate processes would
+    slow_db = sessionmaker(bind=engine, autoflush=False)()
+    fast_db = sessionmaker(bind=engine, autoflush=False)()
+    texts = {f"/tmp/r{i}.jpg": f"K-Market\nYHTEENSÄ {i + 1},00 €" for i in range(10)}
+    slow = DocumentProcessingPipeline(workers=1, batch_size=4, lease_seconds=60)
+    fast = DocumentProcessingPipeline(workers=1, batch_size=4, lease_seconds=60)
+    slow._pool = InlinePool(texts)
+    fast._pool = InlinePool(texts)
+
+    stalled = slow.claim_batch(slow_db)
+    claimed = [d.id for d in stalled]
+    # The slow worker overruns its lease and another worker takes the batch over
+    fast_db.query(Document).filter(Document.id.in_(claimed)).update(
+        {"processing_started_at": datetime.utcnow() - timedelta(minutes=5)}, synchronize_session=False
+    )
+    fast_db.commit()
+    reclaimed = fast.claim_batch(fast_db)
+    assert [d.id for d in reclaimed] == claimed
+
+    assert fast.process_batch(fast_db, reclaimed)["transactions_created"] == 4
+    late = slow.process_batch(slow_db, stalled)
+    assert (late["processed"], late["lease_lost"], late["transactions_created"]) == (0, 4, 0)
+
+    check = sessionmaker(bind=engine)()
+    assert sorted(t.document_id for t in check.query(Transaction)) == claimed
+    assert sum(r.transaction_count for r in check.query(TransactionRollup)) == 4
+    assert all(d.processing_status == ProcessingStatus.PROCESSED
+               for d in check.query(Document).filter(Document.id.in_(claimed)))
+    for db in (slow_db, fast_db, check):
+        db.close()
+
+
+async def _noop():
+    return None
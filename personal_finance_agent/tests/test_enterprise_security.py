@@ -0,0 +1,181 @@
+"""
+Brute-force counters, expiring blocks and per-IP threat scoring tests
+"""
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import enterprise_security_fixed as security
+from enterprise_security_fixed import (
+    EnterpriseSecuritySystemFixed, ExpiringKeyStore, SecurityConfig, SecurityEventWindow, SlidingWindowCounter,
+    ThreatLevel
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(security, "time", SimpleNamespace(time=lambda: now[0], sleep=time.sleep))
+    return now
+
+
+@pytest.fixture
+def system(tmp_path, monkeypatch, clock):
+    # The constructor writes its key files to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(EnterpriseSecuritySystemFixed, "_start_security_monitoring", lambda self: None)
+    config = SecurityConfig(max_failed_attempts=3, brute_force_window_seconds=300, lockout_duration_minutes=30,
+                            auto_block_min_events=20, auto_block_threat_score=30)
+    return EnterpriseSecuritySystemFixed(config)
+
+
+class TestSlidingWindowCounter:
+    """Current and previous window counts, weighted across the rollover"""
+
+    def test_burst_counted_exactly_within_first_window(self):
+        counter = SlidingWindowCounter(300, now=0)
+        for now in (0, 10, 299):
+            counter.add(now)
+        assert counter.estimate(299) == 3
+
+    def test_previous_window_weight_decays_linearly(self):
+        counter = SlidingWindowCounter(300, now=0)
+        for now in (0, 10, 20, 30):
+            counter.add(now)
+
+        assert counter.estimate(300) == pytest.approx(4)  # Window edge: previous window at full weight
+        assert counter.estimate(375) == pytest.approx(3)
+        counter.add(450)
+        assert counter.estimate(450) == pytest.approx(3)
+        assert counter.estimate(600) == pytest.approx(1)  # Next edge: only the attempt at 450 carries over
+        assert counter.estimate(899) == pytest.approx(1 / 300)
+
+    def test_idle_for_two_windows_forgets_everything(self):
+        counter = SlidingWindowCounter(300, now=0)
+        for now in (0, 1, 2):
+            counter.add(now)
+        assert counter.estimate(600) == 0
+        counter.add(1000)
+        assert counter.window_start == 900
+        assert counter.estimate(1000) == 1
+
+
+class TestExpiringKeyStore:
+    """Per-key TTL with bulk cleanup by expiry bucket"""
+
+    def test_cleanup_removes_only_expired_buckets(self):
+        store = ExpiringKeyStore(bucket_seconds=60)
+        store.set("a", 1, ttl=30, now=0)
+        store.set("b", 2, ttl=90, now=0)
+        store.set("c", 3, ttl=30, now=0)
+
+        assert store.cleanup(now=59) == 0  # Bucket 0 still covers t < 60
+        assert store.cleanup(now=60) == 2
+        assert len(store) == 1
+        assert store.cleanup(now=119) == 0
+        assert store.cleanup(now=120) == 1
+        assert len(store) == 0
+        assert store._buckets == {} and store._bucket_heap == []
+
+    def test_extended_ttl_survives_cleanup_of_its_old_bucket(self):
+        store = ExpiringKeyStore(bucket_seconds=60)
+        store.set("key", "old", ttl=30, now=0)
+        assert store.get_or_create("key", lambda: "new", ttl=100, now=20) == "old"
+
+        assert store.cleanup(now=60) == 0
+        assert store.get("key", now=119) == "old"
+        assert store.cleanup(now=180) == 1
+        assert store.get("key", now=180) is None
+
+    def test_expired_entry_dropped_on_read(self):
+        store = ExpiringKeyStore(bucket_seconds=60)
+        store.set("key", "value", ttl=30, now=0)
+        assert store.get("key", now=29) == "value"
+        assert store.get("key", now=30) is None
+        assert len(store) == 0
+        assert store.get_or_create("key", lambda: "fresh", ttl=30, now=31) == "fresh"
+
+
+class TestSecurityEventWindow:
+    """Per-IP counts and scores over the sliding window"""
+
+    def test_buckets_leave_the_window(self):
+        window = SecurityEventWindow(window_minutes=60)
+        window.record("10.0.0.1", ThreatLevel.HIGH, now=0)
+        window.record("10.0.0.1", ThreatLevel.LOW, now=1800)
+        assert window.record("10.0.0.2", ThreatLevel.LOW, now=3599) == {"events": 1, "threat_score": 1}
+        assert window.ip_counts["10.0.0.1"] == 2
+
+        window.advance(now=3600)
+        assert (window.ip_counts["10.0.0.1"], window.ip_scores["10.0.0.1"]) == (1, 1)
+        assert window.level_totals() == {ThreatLevel.LOW: 2}
+
+        window.advance(now=7200)
+        assert window.level_totals() == {}
+        assert not window.ip_counts and not window.ip_scores
+
+    def test_recent_level_counts(self):
+        window = SecurityEventWindow(window_minutes=60)
+        window.record("10.0.0.1", ThreatLevel.CRITICAL, now=0)
+        window.record("10.0.0.1", ThreatLevel.HIGH, now=3060)
+        window.record("10.0.0.1", ThreatLevel.HIGH, now=3300)
+
+        assert window.recent_level_counts(5, now=3300) == {ThreatLevel.HIGH: 2}
+        assert window.recent_level_counts(60, now=3300)[ThreatLevel.CRITICAL] == 1
+
+
+class TestBruteForceAndBlocking:
+    """Failed attempts, IP blocks and auto-blocking on the security system"""
+
+    def test_brute_force_threshold_and_reset(self, system, clock):
+        for _ in range(2):
+            system._record_failed_attempt("10.0.0.1", "a@example.com")
+        assert not system._is_brute_force_attempt("10.0.0.1", "a@example.com")
+
+        system._record_failed_attempt("10.0.0.1", "a@example.com")
+        assert system._is_brute_force_attempt("10.0.0.1", "a@example.com")
+        assert not system._is_brute_force_attempt("10.0.0.1", "b@example.com")
+
+        clock[0] += 600
+        assert not system._is_brute_force_attempt("10.0.0.1", "a@example.com")
+        system._cleanup_expired_blocks()
+        assert len(system.failed_attempts) == 0
+
+    def test_block_expires_after_lockout(self, system, clock):
+        system._block_ip("10.0.0.1")
+        clock[0] += 30 * 60 - 1
+        assert system._is_ip_blocked("10.0.0.1")
+
+        clock[0] += 1
+        assert not system._is_ip_blocked("10.0.0.1")
+        assert system.get_security_status()["blocked_ips"] == 0
+
+    def test_block_cleanup_in_bulk(self, system, clock):
+        for i in range(5):
+            system._block_ip(f"10.0.0.{i}")
+        clock[0] += 30 * 60 + 60
+        system._cleanup_expired_blocks()
+        assert len(system.blocked_ips) == 0
+
+    def test_auto_block_needs_both_event_count_and_score(self, system):
+        # HIGH events score 2: the score passes 30 long before the count passes 20
+        for _ in range(20):
+            system._log_security_event("probe", ThreatLevel.HIGH, "10.0.0.1", "", {})
+        assert not system._is_ip_blocked("10.0.0.1")
+        system._log_security_event("probe", ThreatLevel.HIGH, "10.0.0.1", "", {})
+        assert system._is_ip_blocked("10.0.0.1")
+
+        # LOW events score 1: the count passes 20 before the score passes 30
+        for _ in range(30):
+            system._log_security_event("probe", ThreatLevel.LOW, "10.0.0.2", "", {})
+        assert not system._is_ip_blocked("10.0.0.2")
+        system._log_security_event("probe", ThreatLevel.LOW, "10.0.0.2", "", {})
+        assert system._is_ip_blocked("10.0.0.2")
+
+    def test_auto_block_counts_only_the_window(self, system, clock):
+        for _ in range(20):
+            system._log_security_event("probe", ThreatLevel.HIGH, "10.0.0.1", "", {})
+        clock[0] += 3600
+        system._log_security_event("probe", ThreatLevel.HIGH, "10.0.0.1", "", {})
+        assert not system._is_ip_blocked("10.0.0.1")
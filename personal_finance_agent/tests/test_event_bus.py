@@ -0,0 +1,129 @@
+"""
+Event bus priority queue, batching and backpressure tests
+"""
+import asyncio
+import threading
+from datetime import datetime
+
+from app.services.event_bus import EventBus, Event, EventType
+
+
+def _event(event_type=EventType.EXPENSE_ANOMALY, priority="normal", user_id=1, **data):
+    return Event(event_type=event_type, user_id=user_id, data=data, timestamp=datetime.now(),
+                 source="test", priority=priority)
+
+
+async def _drain(bus):
+    while bus.queue_size():
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+
+
+class TestEventBusDispatch:
+    """Higher priorities are dispatched first and same-type events are batched"""
+
+    def test_high_priority_dispatched_before_backlog(self):
+        bus = EventBus(consumers=1, batch_size=10)
+        received = []
+
+        async def on_event(event):
+            received.append(event.priority)
+
+        async def scenario():
+            bus.subscribe(EventType.EXPENSE_ANOMALY, on_event)
+            bus.subscribe(EventType.WATCHDOG_ALERT, on_event)
+            for i in range(50):
+                await bus.publish(_event(priority="low", index=i))
+            await bus.publish(_event(EventType.WATCHDOG_ALERT, priority="critical"))
+            await bus.publish(_event(priority="high"))
+            await bus.start()
+            await _drain(bus)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert received[:2] == ["critical", "high"]
+        assert received.count("low") == 50
+
+    def test_batch_subscriber_receives_same_type_events_together(self):
+        bus = EventBus(consumers=1, batch_size=20)
+        batches = []
+        single = []
+
+        async def on_batch(events):
+            batches.append([event.data["index"] for event in events])
+
+        def on_event(event):
+            single.append(event.data["index"])
+
+        async def scenario():
+            bus.subscribe(EventType.EXPENSE_ANOMALY, on_batch, batch=True)
+            bus.subscribe(EventType.EXPENSE_ANOMALY, on_event)
+            for i in range(45):
+                await bus.publish(_event(index=i))
+            await bus.start()
+            await _drain(bus)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert [len(batch) for batch in batches] == [20, 20, 5]
+        assert sum(batches, []) == list(range(45))
+        assert single == list(range(45))
+        assert bus.get_stats()["batches_dispatched"] == 3
+
+    def test_publish_from_another_thread(self):
+        bus = EventBus(consumers=2)
+        received = []
+
+        async def on_event(event):
+            received.append(event.data["index"])
+
+        async def scenario():
+            bus.subscribe(EventType.EXPENSE_ANOMALY, on_event)
+            await bus.start()
+            thread = threading.Thread(target=lambda: asyncio.run(bus.publish(_event(index=7))))
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0.05)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert received == [7]
+
+
+class TestEventBusBounds:
+    """Queues and history stay bounded under a flood of events"""
+
+    def test_full_normal_queue_drops_oldest(self):
+        bus = EventBus(max_queue_size=10, max_history_size=25)
+
+        async def scenario():
+            for i in range(100):
+                await bus.publish(_event(index=i))
+
+        asyncio.run(scenario())
+        stats = bus.get_stats()
+        assert stats["queue_sizes"]["normal"] == 10
+        assert stats["events_dropped"] == 90
+        assert [event.data["index"] for event in bus.queues["normal"]] == list(range(90, 100))
+        assert len(bus.event_history) == 25
+        assert bus.get_event_history(limit=1)[0].data["index"] == 99
+
+    def test_high_priority_publisher_waits_for_space(self):
+        bus = EventBus(max_queue_size=5, consumers=1, batch_size=1)
+        received = []
+
+        async def on_event(event):
+            await asyncio.sleep(0.001)
+            received.append(event.data["index"])
+
+        async def scenario():
+            bus.subscribe(EventType.EXPENSE_ANOMALY, on_event)
+            await bus.start()
+            for i in range(30):
+                await bus.publish(_event(priority="high", index=i))
+            await _drain(bus)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert received == list(range(30))
+        assert bus.get_stats()["events_dropped"] == 0
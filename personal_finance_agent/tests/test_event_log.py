@@ -0,0 +1,139 @@
+"""
+Durable event log, redelivery and replay tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.services.event_bus import EventBus, Event, EventType
+from app.services.event_log import EventLog
+
+
+def _event(event_type=EventType.TRANSACTION_CREATED, user_id=1, timestamp=None, **data):
+    return Event(event_type=event_type, user_id=user_id, data=data, timestamp=timestamp or datetime.now(),
+                 source="test")
+
+
+async def _drain(bus):
+    while bus.queue_size():
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.02)
+
+
+class TestDurableSubscribers:
+    """Unacknowledged events are redelivered from the log"""
+
+    def test_events_published_before_crash_redelivered_after_restart(self, tmp_path):
+        path = str(tmp_path / "events.db")
+        crashed = EventBus(event_log=EventLog(path))
+        crashed.subscribe(EventType.TRANSACTION_CREATED, lambda event: None, durable_name="worker")
+
+        async def publish_without_consuming():
+            for i in range(5):
+                await crashed.publish(_event(index=i))
+
+        asyncio.run(publish_without_consuming())
+        crashed.event_log.close()
+
+        received = []
+
+        async def on_event(event):
+            received.append(event.data["index"])
+
+        async def restart():
+            bus = EventBus(event_log=EventLog(path))
+            await bus.start()
+            bus.subscribe(EventType.TRANSACTION_CREATED, on_event, durable_name="worker")
+            await asyncio.sleep(0.05)
+            await bus.publish(_event(index=5))
+            await _drain(bus)
+            await bus.stop()
+            return bus
+
+        bus = asyncio.run(restart())
+        assert received == [0, 1, 2, 3, 4, 5]
+        assert bus.event_log.committed_offset("worker") == 6
+
+    def test_failed_event_retried_until_handled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "event_log_redelivery_seconds", 0.01)
+        bus = EventBus(event_log=EventLog(str(tmp_path / "events.db")))
+        attempts = []
+
+        async def flaky(event):
+            attempts.append(event.data["index"])
+            if event.data["index"] == 1 and attempts.count(1) == 1:
+                raise RuntimeError("temporarily unavailable")
+
+        async def scenario():
+            await bus.start()
+            bus.subscribe(EventType.TRANSACTION_CREATED, flaky, durable_name="worker")
+            for i in range(3):
+                await bus.publish(_event(index=i))
+            for _ in range(100):
+                if bus.event_log.committed_offset("worker") == 3:
+                    break
+                await asyncio.sleep(0.01)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert sorted(attempts) == [0, 1, 1, 2]
+        assert bus.event_log.committed_offset("worker") == 3
+        assert bus.get_stats()["events_redelivered"] == 1
+
+    def test_dropped_events_recovered_from_log(self, tmp_path):
+        bus = EventBus(max_queue_size=2, event_log=EventLog(str(tmp_path / "events.db")))
+        received = []
+
+        async def on_event(event):
+            received.append(event.data["index"])
+
+        async def scenario():
+            bus.subscribe(EventType.TRANSACTION_CREATED, on_event, durable_name="worker")
+            for i in range(6):
+                await bus.publish(_event(index=i))
+            assert bus.get_stats()["events_dropped"] == 4
+            await bus.start()
+            await _drain(bus)
+            await bus.stop()
+
+        asyncio.run(scenario())
+        assert sorted(received) == list(range(6))
+        assert bus.event_log.committed_offset("worker") == 6
+
+
+class TestReplay:
+    """History and replay are read from disk with type, user and time filters"""
+
+    def test_replay_filters_by_type_user_and_time(self, tmp_path):
+        bus = EventBus(event_log=EventLog(str(tmp_path / "events.db")))
+        now = datetime.now()
+        batches = []
+
+        async def scenario():
+            for day in range(10):
+                await bus.publish(_event(user_id=1 + day % 2, timestamp=now - timedelta(days=day), day=day))
+                await bus.publish(_event(EventType.EXPENSE_ANOMALY, timestamp=now - timedelta(days=day), day=day))
+            return await bus.replay(
+                batches.append, [EventType.TRANSACTION_CREATED], user_id=1,
+                since=now - timedelta(days=6), until=now, batch_size=2
+            )
+
+        assert asyncio.run(scenario()) == 3
+        assert [[event.data["day"] for event in batch] for batch in batches] == [[2, 4], [6]]
+        assert all(event.offset is not None for batch in batches for event in batch)
+
+    def test_history_survives_restart(self, tmp_path):
+        path = str(tmp_path / "events.db")
+        bus = EventBus(event_log=EventLog(path))
+
+        async def publish():
+            for i in range(5):
+                await bus.publish(_event(EventType.WATCHDOG_ALERT, index=i))
+            await bus.publish(_event(index=99))
+
+        asyncio.run(publish())
+        bus.event_log.close()
+
+        history = EventBus(event_log=EventLog(path)).get_event_history(EventType.WATCHDOG_ALERT, limit=3)
+        assert [event.data["index"] for event in history] == [2, 3, 4]
+        assert all(event.event_type == EventType.WATCHDOG_ALERT for event in history)
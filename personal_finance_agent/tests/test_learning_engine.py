@@ -0,0 +1,146 @@
+"""
+Sentinel Learning Engine per-user model state tests
+"""
+import random
+import pytest
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sklearn.ensemble import RandomForestRegressor, IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from app.db.base import Base
+from app.models import Transaction
+from app.services.sentinel_learning_engine import SentinelLearningEngine
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    rng = random.Random(5)
+    now = datetime.now()
+    # Whole-euro amounts keep daily sums exact, so the reference fit sees identical data
+    for user_id in (1, 2):
+        for i in range(120):
+            db.add(Transaction(
+                user_id=user_id,
+                amount=float(rng.randint(3, 150) * user_id),
+                description=f"Expense {i}",
+                transaction_date=now - timedelta(days=rng.randrange(0, 85), hours=rng.randrange(0, 12)),
+                category_id=rng.choice([None, 1, 2])
+            ))
+    db.commit()
+    yield db
+    db.close()
+
+
+def _reference_forecast(db, user_id, days_ahead):
+    """Forecast computed the original way: fresh fit and day-by-day recursion"""
+    end_date = datetime.now()
+    transactions = db.query(Transaction).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= end_date - timedelta(days=90),
+        Transaction.amount > 0
+    ).all()
+    daily = defaultdict(float)
+    for t in transactions:
+        daily[t.transaction_date.date()] += t.amount
+    dates = sorted(daily)
+    features, targets = [], []
+    for i in range(7, len(dates)):
+        features.append([daily[dates[j]] for j in range(i - 7, i)] + [dates[i].weekday(), dates[i].day])
+        targets.append(daily[dates[i]])
+    scaler = StandardScaler()
+    model = RandomForestRegressor(n_estimators=100, random_state=42).fit(scaler.fit_transform(features), targets)
+
+    predictions = []
+    window = [daily[dates[j]] for j in range(-7, 0)]
+    for day in range(days_ahead):
+        future = end_date.date() + timedelta(days=day + 1)
+        prediction = model.predict(scaler.transform([window + [future.weekday(), future.day]]))[0]
+        predictions.append(max(0, prediction))
+        window = window[1:] + [prediction]
+    return predictions
+
+
+def _count_calls(monkeypatch, engine, name):
+    calls = []
+    original = getattr(engine, name)
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(engine, name, counting)
+    return calls
+
+
+class TestForecasting:
+    """Forecasts come from cached per-user models and match the original algorithm"""
+
+    def test_matches_reference_forecast(self, session):
+        result = SentinelLearningEngine().predict_spending(1, 14, session)
+        assert result["status"] == "success"
+        assert result["predictions"] == pytest.approx(_reference_forecast(session, 1, 14))
+
+    def test_model_reused_until_data_changes(self, session, monkeypatch):
+        engine = SentinelLearningEngine()
+        fits = _count_calls(monkeypatch, engine, "_fit_forecast_model")
+
+        first = engine.predict_spending(1, 30, session)
+        shorter = engine.predict_spending(1, 7, session)
+        assert len(fits) == 1
+        assert shorter["predictions"] == first["predictions"][:7]
+
+        session.add(Transaction(user_id=1, amount=99.0, description="New", transaction_date=datetime.now()))
+        session.commit()
+        engine.predict_spending(1, 7, session)
+        assert len(fits) == 2
+
+    def test_users_have_separate_models(self, session):
+        engine = SentinelLearningEngine()
+        engine.predict_spending(1, 7, session)
+        engine.predict_spending(2, 7, session)
+        assert engine.ml_models[1].forecast.predictor is not engine.ml_models[2].forecast.predictor
+        assert engine.ml_models[1].forecast.version != engine.ml_models[2].forecast.version
+
+
+class TestAnomalies:
+    """Anomaly scoring reuses a periodically trained model"""
+
+    def test_matches_fit_predict(self, session):
+        engine = SentinelLearningEngine()
+        anomalies = engine.detect_spending_anomalies(1, session)
+
+        transactions = engine._recent_expenses(1, session)
+        features = engine._anomaly_features(transactions)
+        labels = IsolationForest(contamination=0.1, random_state=42).fit_predict(
+            StandardScaler().fit_transform(features)
+        )
+        expected = [t.id for t, label in zip(transactions, labels) if label == -1]
+        assert [anomaly["id"] for anomaly in anomalies] == expected
+
+    def test_model_trained_once_per_period(self, session):
+        engine = SentinelLearningEngine()
+        engine.detect_spending_anomalies(1, session)
+        model = engine.ml_models[1].anomaly
+
+        engine.detect_spending_anomalies(1, session)
+        assert engine.ml_models[1].anomaly is model
+
+        engine.ml_models[1].anomaly = model._replace(trained_at=datetime.now() - timedelta(days=2))
+        engine.detect_spending_anomalies(1, session)
+        assert engine.ml_models[1].anomaly.trained_at > datetime.now() - timedelta(minutes=1)
+
+    def test_score_single_transaction(self, session):
+        engine = SentinelLearningEngine()
+        assert engine.score_transaction(1, Transaction(amount=10.0, transaction_date=datetime.now())) is None
+
+        engine.detect_spending_anomalies(1, session)
+        huge = Transaction(amount=50000.0, transaction_date=datetime.now().replace(hour=3), category_id=2)
+        result = engine.score_transaction(1, huge)
+        assert result["is_anomaly"] is True
+        assert result["anomaly_score"] < 0
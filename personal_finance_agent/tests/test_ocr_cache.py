@@ -0,0 +1,93 @@
+"""
+OCR preprocessing and content-addressed result cache tests
+"""
+import asyncio
+import cv2
+import numpy as np
+import pytest
+
+from app.services.ocr_service import BaseOCRService, OCREngine, OCRResultCache, preprocess_image
+from app.services.smart_receipt_scanner import SmartReceiptScanner
+
+
+class CountingOCRService(BaseOCRService):
+    def __init__(self):
+        self.calls = []
+
+    def extract_text(self, image_path):
+        raise AssertionError("engine should pass the preprocessed image")
+
+    def extract_text_from_image(self, image):
+        self.calls.append(image.shape)
+        return "K-Market 12,50 €", 0.9
+
+    def is_available(self):
+        return True
+
+
+def receipt_image(width=1200, height=3000):
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for row in range(200, height - 200, 120):
+        cv2.putText(image, "MAITO 1,29 EUR", (100, row), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    return image
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = OCREngine(cache=OCRResultCache(str(tmp_path / "cache")))
+    engine.ocr_service = CountingOCRService()
+    return engine
+
+
+def test_preprocess_downscales_grayscales_and_deskews():
+    image = receipt_image()
+    rotation = cv2.getRotationMatrix2D((600, 1500), 8, 1.0)
+    skewed = cv2.warpAffine(image, rotation, (1200, 3000), borderValue=(255, 255, 255))
+
+    prepared = preprocess_image(skewed, max_dimension=1500)
+    assert prepared.ndim == 2 and max(prepared.shape) == 1500
+
+    _, binary = cv2.threshold(prepared, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    angle = cv2.minAreaRect(cv2.findNonZero(binary))[-1] % 90
+    assert min(angle, 90 - angle) < 1.5
+
+
+def test_duplicate_and_reencoded_uploads_hit_cache(engine, tmp_path):
+    image = receipt_image()
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    cv2.imwrite(str(first), image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    cv2.imwrite(str(second), image, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+    assert first.read_bytes() != second.read_bytes()
+
+    assert engine.extract_text(str(first)) == ("K-Market 12,50 €", 0.9)
+    assert engine.extract_text(str(first)) == ("K-Market 12,50 €", 0.9)
+    assert engine.extract_text(str(second)) == ("K-Market 12,50 €", 0.9)
+    assert len(engine.ocr_service.calls) == 1
+    assert max(engine.ocr_service.calls[0]) == 2000
+
+
+def test_cache_is_size_bounded(tmp_path):
+    cache = OCRResultCache(str(tmp_path / "cache"), max_bytes=2000)
+    for i in range(50):
+        cache.put(f"{i:064x}", {"text": "x" * 100, "confidence": 0.9})
+
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 2000 and stats["entries"] < 50
+    assert cache.get(f"{49:064x}") is not None
+    assert cache.get(f"{0:064x}") is None
+
+
+def test_receipt_scanner_reuses_cached_scan(tmp_path, monkeypatch):
+    scanner = SmartReceiptScanner(cache=OCRResultCache(str(tmp_path / "cache")))
+    calls = []
+
+    async def fake_ocr(image_data):
+        calls.append(1)
+        return {"merchant": "Prisma", "total_amount": 45.67}
+
+    monkeypatch.setattr(scanner, "_run_receipt_ocr", fake_ocr)
+    ok, encoded = cv2.imencode(".png", receipt_image(600, 800))
+
+    first = asyncio.run(scanner._extract_receipt_data(encoded.tobytes()))
+    second = asyncio.run(scanner._extract_receipt_data(encoded.tobytes()))
+    assert first == second and len(calls) == 1
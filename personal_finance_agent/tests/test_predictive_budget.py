@@ -0,0 +1,108 @@
+"""
+Predictive budget model registry tests
+"""
+import asyncio
+import random
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Transaction, Category
+from app.services.predictive_budget import PredictiveBudget, BudgetModelRegistry
+from app.services.rollup_service import TransactionRollupService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add_all([Category(name=f"Category {i}") for i in range(3)])
+    db.commit()
+
+    rng = random.Random(3)
+    rollups = TransactionRollupService()
+    now = datetime.now()
+    transactions = [
+        Transaction(
+            user_id=1,
+            amount=round(rng.uniform(5, 120), 2),
+            description=f"Expense {i}",
+            transaction_date=now - timedelta(days=rng.uniform(1, 300)),
+            category_id=rng.choice([1, 2, 3])
+        )
+        for i in range(400)
+    ]
+    db.add_all(transactions)
+    rollups.add_transactions(db, transactions)
+    db.commit()
+    yield db
+    db.close()
+
+
+def _add_expense(db, category_id):
+    transaction = Transaction(user_id=1, amount=75.0, description="New expense",
+                              transaction_date=datetime.now() - timedelta(days=40), category_id=category_id)
+    db.add(transaction)
+    TransactionRollupService().add_transaction(db, transaction)
+    db.commit()
+
+
+class TestPredictiveBudgetModels:
+    """Fitted models are reused until the category's data changes"""
+
+    def test_repeated_requests_reuse_models(self, session, tmp_path):
+        budget = PredictiveBudget(BudgetModelRegistry(str(tmp_path)), workers=1)
+
+        first = asyncio.run(budget.generate_next_month_budget(1, session))
+        assert first["status"] == "success"
+        assert len(first["predictions"]) == 3
+        assert budget.model_registry.trained == 3
+
+        second = asyncio.run(budget.generate_next_month_budget(1, session))
+        assert budget.model_registry.trained == 3
+        assert second["predictions"] == first["predictions"]
+
+    def test_only_changed_category_retrains(self, session, tmp_path):
+        budget = PredictiveBudget(BudgetModelRegistry(str(tmp_path)), workers=1)
+        asyncio.run(budget.generate_next_month_budget(1, session))
+
+        _add_expense(session, 2)
+        asyncio.run(budget.generate_next_month_budget(1, session))
+        assert budget.model_registry.trained == 4
+        assert budget.model_registry.get(1, 2, "stale") is None
+
+    def test_models_persist_across_instances(self, session, tmp_path):
+        first = PredictiveBudget(BudgetModelRegistry(str(tmp_path)), workers=1)
+        expected = asyncio.run(first.generate_next_month_budget(1, session))
+
+        restarted = PredictiveBudget(BudgetModelRegistry(str(tmp_path)), workers=1)
+        result = asyncio.run(restarted.generate_next_month_budget(1, session))
+        assert restarted.model_registry.trained == 0
+        assert result["predictions"] == expected["predictions"]
+
+    def test_parallel_training_matches_serial(self, session, tmp_path):
+        serial = asyncio.run(PredictiveBudget(
+            BudgetModelRegistry(str(tmp_path / "serial")), workers=1
+        ).generate_next_month_budget(1, session))
+
+        parallel_budget = PredictiveBudget(BudgetModelRegistry(str(tmp_path / "parallel")), workers=2)
+        try:
+            parallel = asyncio.run(parallel_budget.generate_next_month_budget(1, session))
+        finally:
+            parallel_budget.shutdown()
+        assert parallel["predictions"] == serial["predictions"]
+
+    def test_features_aggregate_per_month(self, session):
+        budget = PredictiveBudget(BudgetModelRegistry("unused"), workers=1)
+        features = budget._prepare_features(budget._get_monthly_rollups(1, session))
+
+        monthly = features[1]
+        assert list(monthly.index) == sorted(monthly.index)
+        first_month = monthly.iloc[0]
+        assert first_month["avg_amount"] == pytest.approx(
+            first_month["total_amount"] / first_month["transaction_count"]
+        )
+        assert 0 <= first_month["weekend_ratio"] <= 1
@@ -0,0 +1,134 @@
+"""
+Transaction rollup maintenance and range query tests
+"""
+import asyncio
+import importlib
+import random
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Transaction, Category, TransactionRollup
+from app.services.rollup_service import TransactionRollupService
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    db.add_all([Category(name=f"Category {i}", is_income=i == 0) for i in range(3)])
+    db.commit()
+    yield db
+    db.close()
+
+
+def _rollup_state(db):
+    return sorted(
+        (r.user_id, r.month, r.category_id or 0, r.is_income, round(r.total_amount, 6), r.transaction_count,
+         r.weekend_count, r.month_end_count, r.last_transaction_date)
+        for r in db.query(TransactionRollup).all()
+    )
+
+
+def _add_transactions(db, service, count=200):
+    rng = random.Random(7)
+    now = datetime.now()
+    transactions = []
+    for i in range(count):
+        txn = Transaction(
+            user_id=1,
+            amount=rng.choice([-1, 1]) * rng.uniform(1, 300),
+            description=f"Transaction {i}",
+            transaction_date=now - timedelta(days=rng.randrange(0, 200), minutes=i),
+            category_id=rng.choice([None, 1, 2, 3])
+        )
+        db.add(txn)
+        service.add_transaction(db, txn)
+        transactions.append(txn)
+    db.commit()
+    return transactions
+
+
+class TestTransactionRollups:
+    """Incremental rollups must match a rebuild from scratch"""
+
+    def test_incremental_matches_rebuild(self, session):
+        service = TransactionRollupService()
+        transactions = _add_transactions(session, service)
+
+        # Update some, delete some
+        for txn in transactions[:30]:
+            original = service.snapshot(txn)
+            txn.amount = -txn.amount
+            txn.category_id = 2
+            service.apply(session, original.user_id, original.amount, original.transaction_date,
+                          original.category_id, direction=-1, exclude_id=original.id)
+            service.add_transaction(session, txn)
+        for txn in transactions[30:60]:
+            service.remove_transaction(session, txn)
+            session.delete(txn)
+        session.commit()
+
+        incremental = _rollup_state(session)
+        service.rebuild(session)
+        assert incremental == _rollup_state(session)
+
+    def test_recategorize_matches_rebuild(self, session):
+        service = TransactionRollupService()
+        transactions = _add_transactions(session, service)
+
+        changes = []
+        for txn in transactions[:80]:
+            changes.append((service.snapshot(txn), 3))
+            txn.category_id = 3
+        session.flush()
+        service.recategorize(session, changes)
+        session.commit()
+
+        incremental = _rollup_state(session)
+        service.rebuild(session)
+        assert incremental == _rollup_state(session)
+
+    def test_scheduler_categorization_updates_rollups(self, session, monkeypatch):
+        # app.services re-exports the scheduler instance under the module's name
+        scheduler_module = importlib.import_module("app.services.scheduler_service")
+
+        service = TransactionRollupService()
+        transaction = service.snapshot(_add_transactions(session, service, count=20)[0])
+        new_category_id = 3 if transaction.category_id != 3 else 2
+        session.expunge_all()
+
+        async def publish_event(*args, **kwargs):
+            pass
+
+        monkeypatch.setattr(scheduler_module, "SessionLocal", lambda: session)
+        monkeypatch.setattr(scheduler_module, "publish_event", publish_event)
+        monkeypatch.setattr(scheduler_module.categorization_service, "categorize_transaction",
+                            lambda **kwargs: {"category_id": new_category_id})
+
+        asyncio.run(scheduler_module.SchedulerService()._categorize_transaction(
+            1, {"transaction_id": transaction.id, "amount": transaction.amount}
+        ))
+        assert session.get(Transaction, transaction.id).category_id == new_category_id
+
+        incremental = _rollup_state(session)
+        service.rebuild(session)
+        assert incremental == _rollup_state(session)
+
+    def test_range_totals_match_raw_transactions(self, session):
+        service = TransactionRollupService()
+        _add_transactions(session, service)
+
+        end = datetime.now()
+        start = end - timedelta(days=75)
+        totals = service.get_range_totals(session, 1, start, end)
+
+        raw = [t for t in session.query(Transaction).all() if start <= t.transaction_date <= end]
+        assert sum(r.transaction_count for r in totals) == len(raw)
+        assert sum(r.total_amount for r in totals if not r.is_income) == pytest.approx(
+            sum(t.amount for t in raw if t.amount >= 0))
+        assert sum(r.total_amount for r in totals if r.is_income) == pytest.approx(
+            sum(-t.amount for t in raw if t.amount < 0))
@@ -0,0 +1,165 @@
+"""
+Keyset-paged per-user sweep tests
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import User
+from app.services.user_sweep import UserSweep, SweepCheckpointStore
+
+USER_COUNT = 25
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sweep.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    db = factory()
+    db.add_all([
+        User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", hashed_password="x")
+        for user_id in range(1, USER_COUNT + 1)
+    ])
+    db.commit()
+    db.close()
+    return factory
+
+
+@pytest.fixture
+def sweep(session_factory, tmp_path):
+    return UserSweep(session_factory, chunk_size=4, concurrency=3,
+                     checkpoints=SweepCheckpointStore(str(tmp_path / "sweeps")))
+
+
+class TestUserSweep:
+    """Chunks cover every user once, run concurrently and resume from checkpoints"""
+
+    def test_every_user_once(self, sweep):
+        seen = []
+        chunk_sizes = []
+
+        async def handler(db, users):
+            chunk_sizes.append(len(users))
+            seen.extend(user.id for user in users)
+
+        stats = asyncio.run(sweep.run("test", handler))
+        assert sorted(seen) == list(range(1, USER_COUNT + 1))
+        assert max(chunk_sizes) <= 4
+        assert stats["status"] == "completed"
+        assert stats["users"] == USER_COUNT
+        assert sweep.checkpoints.load("test")["completed"] == []
+
+    def test_chunks_run_concurrently_within_bound(self, sweep, monkeypatch):
+        # SQLite runs one chunk at a time; pretend the database allows concurrent writers
+        monkeypatch.setattr(sweep, "_chunk_concurrency", lambda: sweep.concurrency)
+        in_flight = []
+        peak = []
+
+        async def handler(db, users):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+
+        asyncio.run(sweep.run("test", handler))
+        assert 1 < max(peak) <= 3
+
+    def test_writing_chunks_on_sqlite_do_not_lock(self, sweep, session_factory):
+        sweep.concurrency = 6
+        in_flight = []
+        peak = []
+
+        async def handler(db, users):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            for user in users:
+                user.current_savings = 100.0
+            db.flush()
+            await asyncio.sleep(0.01)  # e.g. publishing an event with the write transaction open
+            db.commit()
+            in_flight.pop()
+
+        stats = asyncio.run(sweep.run("test", handler))
+        assert (stats["status"], stats["failed_chunks"], stats["users"]) == ("completed", 0, USER_COUNT)
+        assert max(peak) == 1
+        db = session_factory()
+        assert [user.current_savings for user in db.query(User)] == [100.0] * USER_COUNT
+        db.close()
+
+    def test_failed_chunk_resumes_without_repeating_others(self, sweep):
+        processed = []
+
+        async def flaky(db, users):
+            if any(user.id == 10 for user in users):
+                raise RuntimeError("database unavailable")
+            processed.extend(user.id for user in users)
+
+        first = asyncio.run(sweep.run("test", flaky))
+        assert first["status"] == "incomplete"
+        assert first["failed_chunks"] == 1
+        assert sweep.checkpoints.load("test")["watermark"] < 10
+
+        async def healthy(db, users):
+            processed.extend(user.id for user in users)
+
+        second = asyncio.run(sweep.run("test", healthy))
+        assert second["resumed"] is True
+        assert second["status"] == "completed"
+        assert sorted(processed) == list(range(1, USER_COUNT + 1))
+
+    def test_crashed_sweep_resumes_after_watermark(self, sweep):
+        sweep.checkpoints.save("test", {"status": "running", "watermark": 12, "completed": [[17, 20]]})
+        processed = []
+
+        async def handler(db, users):
+            processed.extend(user.id for user in users)
+
+        stats = asyncio.run(sweep.run("test", handler))
+        assert stats["resumed"] is True
+        assert sorted(processed) == [13, 14, 15, 16] + list(range(21, USER_COUNT + 1))
+
+        # A completed sweep starts from the first user again
+        processed.clear()
+        asyncio.run(sweep.run("test", handler))
+        assert sorted(processed) == list(range(1, USER_COUNT + 1))
+
+    def test_failing_chunk_does_not_hold_back_next_run(self, sweep):
+        processed = []
+
+        async def broken_chunk(db, users):
+            if any(user.id == 10 for user in users):
+                raise RuntimeError("bad record")
+            processed.extend(user.id for user in users)
+
+        interval = timedelta(minutes=5)
+        first = asyncio.run(sweep.run("test", broken_chunk, interval))
+        assert first["status"] == "incomplete"
+
+        # The next scheduled run finds the checkpoint of the previous one and starts over
+        state = sweep.checkpoints.load("test")
+        state["started_at"] = (datetime.now() - interval).isoformat()
+        sweep.checkpoints.save("test", state)
+        processed.clear()
+        second = asyncio.run(sweep.run("test", broken_chunk, interval))
+        assert second["resumed"] is False
+        assert sorted(processed) == [user_id for user_id in range(1, USER_COUNT + 1) if not 9 <= user_id <= 12]
+
+    def test_failing_chunk_retries_are_capped(self, sweep):
+        sweep.max_attempts = 2
+        runs = []
+
+        async def broken_chunk(db, users):
+            if any(user.id == 10 for user in users):
+                raise RuntimeError("bad record")
+            runs[-1].extend(user.id for user in users)
+
+        for _ in range(3):
+            runs.append([])
+            asyncio.run(sweep.run("test", broken_chunk))
+        assert runs[1] == []  # The resumed run retries only the failing chunk
+        assert sweep.checkpoints.load("test")["attempts"] == 1
+        assert sorted(runs[2]) == [user_id for user_id in range(1, USER_COUNT + 1) if not 9 <= user_id <= 12]
@@ -0,0 +1,140 @@
+"""
+Sentinel Watchdog situation analysis tests
+"""
+import asyncio
+import importlib
+import random
+import statistics
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.models import Transaction, User
+from app.services.sentinel_watchdog_service import SentinelWatchdogService
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    db = sessionmaker(bind=engine, autoflush=False)()
+    rng = random.Random(11)
+    now = datetime.now()
+    for user_id in (1, 2, 3):
+        db.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com",
+                    hashed_password="x", full_name=f"User {user_id}"))
+    for i in range(300):
+        db.add(Transaction(
+            user_id=rng.choice([1, 2]),
+            amount=rng.choice([-1, 1, 1]) * round(rng.uniform(1, 900), 2),
+            description=f"Transaction {i}",
+            transaction_date=now - timedelta(days=rng.uniform(0, 120))
+        ))
+    db.commit()
+    yield db
+    db.close()
+
+
+def _reference_periods(db, user_id):
+    """Per-period figures computed the old way, one full-row query per window"""
+    periods = {}
+    for name, days in {"7d": 7, "30d": 30, "90d": 90}.items():
+        transactions = db.query(Transaction).filter(
+            Transaction.user_id == user_id,
+            Transaction.transaction_date >= datetime.now() - timedelta(days=days)
+        ).all()
+        income = [abs(t.amount) for t in transactions if t.amount < 0]
+        expenses = [t.amount for t in transactions if t.amount > 0]
+        periods[name] = {
+            "total_income": sum(income),
+            "total_expenses": sum(expenses),
+            "income_volatility": statistics.stdev(income) if len(income) > 1 else 0,
+            "expense_volatility": statistics.stdev(expenses) if len(expenses) > 1 else 0,
+            "transaction_count": len(transactions)
+        }
+    return periods
+
+
+class TestSituationRoom:
+    """All windows come from one aggregate query and match the per-window computation"""
+
+    def test_matches_per_window_statistics(self, session):
+        service = SentinelWatchdogService()
+        result = service.analyze_situation_room(1, session)
+        assert result["status"] == "success"
+
+        for name, expected in _reference_periods(session, 1).items():
+            actual = result["situation_data"][name]
+            assert actual["transaction_count"] == expected["transaction_count"]
+            for key in ("total_income", "total_expenses", "income_volatility", "expense_volatility"):
+                assert actual[key] == pytest.approx(expected[key], rel=1e-9, abs=1e-6)
+
+    def test_single_query(self, session, engine):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        SentinelWatchdogService().analyze_situation_room(1, session)
+        assert len([sql for sql in statements if "FROM transactions" in sql]) == 1
+
+    def test_batch_matches_single_user(self, session):
+        service = SentinelWatchdogService()
+        assessments = service.assess_all_users(session)
+
+        assert set(assessments) == {1, 2, 3}
+        for user_id in (1, 2, 3):
+            single = service.analyze_situation_room(user_id, session)
+            assert assessments[user_id]["risk_score"] == pytest.approx(single["risk_assessment"]["risk_score"])
+            assert assessments[user_id]["watchdog_mode"] == single["risk_assessment"]["watchdog_mode"]
+
+    def test_user_without_transactions(self, session):
+        result = SentinelWatchdogService().analyze_situation_room(3, session)
+        assert result["status"] == "success"
+        assert result["situation_data"]["90d"]["transaction_count"] == 0
+
+
+class TestWatchdogAlerts:
+    """Monitoring alerts only on mode changes and skips users without transactions"""
+
+    @pytest.fixture
+    def published(self, monkeypatch):
+        events = []
+
+        async def publish_event(event_type, user_id, data, source, priority="normal"):
+            events.append((user_id, data["watchdog_mode"], priority))
+
+        # app.services re-exports the scheduler instance under the module's name
+        monkeypatch.setattr(importlib.import_module("app.services.scheduler_service"), "publish_event", publish_event)
+        return events
+
+    def test_alert_once_per_mode_change(self, session, published):
+        from app.services.scheduler_service import SchedulerService
+        scheduler = SchedulerService()
+        assessments = SentinelWatchdogService().assess_all_users(session, [1])
+        assessments[1]["watchdog_mode"] = "aggressive"
+
+        for _ in range(3):
+            asyncio.run(scheduler._publish_watchdog_alerts(assessments))
+        assert published == [(1, "aggressive", "high")]
+
+        assessments[1]["watchdog_mode"] = "emergency"
+        asyncio.run(scheduler._publish_watchdog_alerts(assessments))
+        assessments[1]["watchdog_mode"] = "passive"
+        asyncio.run(scheduler._publish_watchdog_alerts(assessments))
+        assessments[1]["watchdog_mode"] = "aggressive"
+        asyncio.run(scheduler._publish_watchdog_alerts(assessments))
+        assert published == [(1, "aggressive", "high"), (1, "emergency", "critical"), (1, "aggressive", "high")]
+
+    def test_users_without_transactions_are_skipped(self, session, published):
+        from app.services.scheduler_service import SchedulerService
+        assessments = SentinelWatchdogService().assess_all_users(session, [3])
+        assert assessments[3]["transaction_count"] == 0
+        assert assessments[3]["watchdog_mode"] == "aggressive"
+
+        asyncio.run(SchedulerService()._publish_watchdog_alerts(assessments))
+        assert published == []
@@ -18,22 +18,30 @@ from datetime import datetime, timedelta, date
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 import base64
+import copy
 import hashlib
 import schedule
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 import uuid
 import logging
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict, deque
 import statistics
 import random
+import re
+import sqlite3
+import tempfile
 import aiohttp
+import numpy as np
+import openai
 
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+
+from backend.llm_cache import LLMResponseCache
 try:
     from apscheduler.schedulers.background import BackgroundScheduler
 except ImportError:
@@ -118,22 +126,196 @@ class DeepOnboardingData(BaseModel):
     investment_experience: str
     preferred_income_methods: List[str]
 
+# ⚡ User Context Cache
+class UserContextCache:
+    """
+    LRU + TTL cache of per-user record slices (profile, cycles, analysis, user).
+    ProductionDataManager invalidates entries on every write, so repeated
+    context builds within a request or a batch job become a dict lookup.
+    Slices are copied in and out, so callers can mutate what they get back
+    without changing the cached entry; persist changes through save_*.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def email_for_key(key: str) -> str:
+        """Map a store key (email or onboarding_<email>) to the cache key"""
+        key = str(key)
+        return key[len("onboarding_"):] if key.startswith("onboarding_") else key
+    
+    def get(self, user_email: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_email)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[user_email]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_email)
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+    
+    def set(self, user_email: str, value: dict, version: int):
+        """Store a slice loaded at `version`; skipped if a write happened meanwhile"""
+        value = copy.deepcopy(value)
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[user_email] = (time.monotonic(), value)
+            self._entries.move_to_end(user_email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, keys):
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                self._entries.pop(self.email_for_key(key), None)
+    
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+user_context_cache = UserContextCache(
+    max_entries=int(os.getenv("CONTEXT_CACHE_SIZE", 10000)),
+    ttl_seconds=float(os.getenv("CONTEXT_CACHE_TTL", 300))
+)
+
+# 🧠 LLM Response Cache (shared with the Telegram bot: backend/llm_cache.py)
+openai.api_key = OPENAI_API_KEY
+if os.getenv("OPENAI_API_BASE"):
+    openai.api_base = os.getenv("OPENAI_API_BASE")
+
+llm_response_cache = LLMResponseCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", 2048)),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL", 3600))
+)
+
 # 🗄️ Production Data Storage
 class ProductionDataManager:
+    """
+    Per-record production storage.
+
+    Each store (users, onboarding, cycles, analysis) is a keyed table in an
+    embedded SQLite database (WAL mode), so reading or updating one user only
+    touches that user's row. The whole-store get_*/save_* methods are kept for
+    bulk callers, and the legacy JSON files are imported once on first start.
+    Every write invalidates the affected users in user_context_cache.
+    """
+    
+    USERS = "users"
+    ONBOARDING = "onboarding"
+    CYCLES = "cycles"
+    ANALYSIS_RESULTS = "analysis_results"
+    ANALYSIS_META = "analysis_meta"
+    _MIGRATIONS = "_migrations"
+    
     def __init__(self):
         self.data_dir = Path("data")
         self.data_dir.mkdir(exist_ok=True)
         
-        # File paths
+        # Legacy JSON file paths (imported into the record store once)
         self.user_data_file = self.data_dir / "users.json"
         self.onboarding_file = self.data_dir / "onboarding.json"
         self.cycles_file = self.data_dir / "cycles.json"
         self.analysis_file = self.data_dir / "analysis.json"
         
+        # Record store
+        self.store_file = self.data_dir / "sentinel_store.db"
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.store_file), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS records (
+                store TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (store, key)
+            ) WITHOUT ROWID"""
+        )
+        self._import_legacy_json()
+        
         # Upload directories
         self.cv_uploads_dir = Path("cv_uploads")
         self.cv_uploads_dir.mkdir(exist_ok=True)
     
+    @contextmanager
+    def _transaction(self):
+        """Run a group of statements as one atomic write"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def _import_legacy_json(self):
+        """Import users.json/onboarding.json/cycles.json/analysis.json once"""
+        legacy_files = {
+            self.USERS: self.user_data_file,
+            self.ONBOARDING: self.onboarding_file,
+            self.CYCLES: self.cycles_file,
+            "analysis": self.analysis_file,
+        }
+        try:
+            with self._transaction() as conn:
+                for name, file_path in legacy_files.items():
+                    if conn.execute(
+                        "SELECT 1 FROM records WHERE store = ? AND key = ?", (self._MIGRATIONS, name)
+                    ).fetchone():
+                        continue
+                    data = self._read_legacy_json(file_path)
+                    if data is None:
+                        continue  # Unreadable file: leave it for the next start
+                    if name == "analysis":
+                        self._write_many(conn, self.ANALYSIS_RESULTS, data.get("results", {}))
+                        self._write_many(conn, self.ANALYSIS_META, {k: v for k, v in data.items() if k != "results"})
+                    else:
+                        self._write_many(conn, name, data)
+                    self._write_many(conn, self._MIGRATIONS, {name: {"imported_at": datetime.now().isoformat()}})
+                    if data:
+                        print(f"✅ Imported {len(data)} records from {file_path}")
+        except Exception as e:
+            print(f"Error importing legacy JSON data: {e}")
+        user_context_cache.clear()
+    
+    def _read_legacy_json(self, file_path: Path) -> Optional[dict]:
+        """Legacy file contents, {} if it does not exist, None if it cannot be read or parsed"""
+        if not file_path.exists():
+            return {}
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading {file_path}, not importing it yet: {e}")
+            return None
+    
     def load_data(self, file_path: Path) -> dict:
         """Load data from JSON file"""
         try:
@@ -152,29 +334,151 @@ class ProductionDataManager:
         except Exception as e:
             print(f"Error saving {file_path}: {e}")
     
+    # --- Per-record access ---
+    
+    @staticmethod
+    def _write_many(conn, store: str, records: dict):
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO records (store, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            [(store, str(key), json.dumps(value, ensure_ascii=False), now) for key, value in records.items()]
+        )
+    
+    def get_record(self, store: str, key: str) -> Optional[dict]:
+        """Load a single record by key"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value FROM records WHERE store = ? AND key = ?", (store, str(key))
+                ).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            print(f"Error loading {store}/{key}: {e}")
+            return None
+    
+    def save_record(self, store: str, key: str, value: dict):
+        """Insert or replace a single record"""
+        self.save_records(store, {key: value})
+    
+    def save_records(self, store: str, records: dict):
+        """Insert or replace many records in one transaction"""
+        if not records:
+            return
+        try:
+            with self._transaction() as conn:
+                self._write_many(conn, store, records)
+        except Exception as e:
+            print(f"Error saving {store}: {e}")
+        finally:
+            user_context_cache.invalidate(records.keys())
+    
+    def delete_record(self, store: str, key: str):
+        """Delete a single record"""
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM records WHERE store = ? AND key = ?", (store, str(key)))
+        except Exception as e:
+            print(f"Error deleting {store}/{key}: {e}")
+        finally:
+            user_context_cache.invalidate([key])
+    
+    def load_store(self, store: str) -> dict:
+        """Load every record of a store"""
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, value FROM records WHERE store = ?", (store,)
+                ).fetchall()
+            return {key: json.loads(value) for key, value in rows}
+        except Exception as e:
+            print(f"Error loading {store}: {e}")
+            return {}
+    
+    def replace_store(self, store: str, data: dict):
+        """Replace every record of a store (whole-store save semantics)"""
+        try:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM records WHERE store = ?", (store,))
+                self._write_many(conn, store, data)
+        except Exception as e:
+            print(f"Error saving {store}: {e}")
+        finally:
+            user_context_cache.clear()
+    
+    def get_user(self, user_key: str) -> Optional[dict]:
+        return self.get_record(self.USERS, user_key)
+    
+    def save_user(self, user_key: str, user: dict):
+        self.save_record(self.USERS, user_key, user)
+    
+    def get_onboarding_profile(self, onboarding_key: str) -> Optional[dict]:
+        return self.get_record(self.ONBOARDING, onboarding_key)
+    
+    def save_onboarding_profile(self, onboarding_key: str, profile: dict):
+        self.save_record(self.ONBOARDING, onboarding_key, profile)
+    
+    def get_cycle(self, onboarding_key: str) -> Optional[dict]:
+        return self.get_record(self.CYCLES, onboarding_key)
+    
+    def save_cycle(self, onboarding_key: str, cycle: dict):
+        self.save_record(self.CYCLES, onboarding_key, cycle)
+    
+    def get_analysis_result(self, onboarding_key: str) -> Optional[dict]:
+        return self.get_record(self.ANALYSIS_RESULTS, onboarding_key)
+    
+    def save_analysis_result(self, onboarding_key: str, result: dict):
+        self.save_record(self.ANALYSIS_RESULTS, onboarding_key, result)
+    
+    def save_analysis_results(self, results: dict, meta: Optional[dict] = None):
+        """Write a batch of analysis results (and optional metadata) in one transaction"""
+        try:
+            with self._transaction() as conn:
+                self._write_many(conn, self.ANALYSIS_RESULTS, results)
+                if meta:
+                    self._write_many(conn, self.ANALYSIS_META, meta)
+        except Exception as e:
+            print(f"Error saving analysis results: {e}")
+        finally:
+            user_context_cache.invalidate(results.keys())
+    
+    # --- Whole-store access (legacy interface) ---
+    
     def get_user_data(self) -> dict:
-        return self.load_data(self.user_data_file)
+        return self.load_store(self.USERS)
     
     def save_user_data(self, data: dict):
-        self.save_data(self.user_data_file, data)
+        self.replace_store(self.USERS, data)
     
     def get_onboarding_data(self) -> dict:
-        return self.load_data(self.onboarding_file)
+        return self.load_store(self.ONBOARDING)
     
     def save_onboarding_data(self, data: dict):
-        self.save_data(self.onboarding_file, data)
+        self.replace_store(self.ONBOARDING, data)
     
     def get_cycles_data(self) -> dict:
-        return self.load_data(self.cycles_file)
+        return self.load_store(self.CYCLES)
     
     def save_cycles_data(self, data: dict):
-        self.save_data(self.cycles_file, data)
+        self.replace_store(self.CYCLES, data)
     
     def get_analysis_data(self) -> dict:
-        return self.load_data(self.analysis_file)
+        return {
+            **self.load_store(self.ANALYSIS_META),
+            "results": self.load_store(self.ANALYSIS_RESULTS)
+        }
     
     def save_analysis_data(self, data: dict):
-        self.save_data(self.analysis_file, data)
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "DELETE FROM records WHERE store IN (?, ?)", (self.ANALYSIS_RESULTS, self.ANALYSIS_META)
+                )
+                self._write_many(conn, self.ANALYSIS_RESULTS, data.get("results", {}))
+                self._write_many(conn, self.ANALYSIS_META, {k: v for k, v in data.items() if k != "results"})
+        except Exception as e:
+            print(f"Error saving {self.analysis_file}: {e}")
+        finally:
+            user_context_cache.clear()
 
 # Initialize data manager
 data_manager = ProductionDataManager()
@@ -198,6 +502,9 @@ async def lifespan(app: FastAPI):
     scheduler_thread.start()
     print("✅ Notification scheduler started in background")
     
+    # Start Telegram update workers
+    telegram_pipeline.start()
+    
     # Initialize production systems
     print("✅ Analytics system initialized")
     print("✅ Mass notification system ready")
@@ -210,6 +517,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Sentinel 100K shutting down...")
+    await telegram_pipeline.stop()
     analytics.save_analytics()
     ai_learning_engine.save_learning_data()
 
@@ -250,16 +558,13 @@ class ProductionOnboardingSystem:
         }
         
         # Save to data manager
-        onboarding_data_dict = data_manager.get_onboarding_data()
-        onboarding_data_dict[user_id] = user_profile
-        data_manager.save_onboarding_data(onboarding_data_dict)
+        data_manager.save_onboarding_profile(user_id, user_profile)
         
         return user_profile
 
 class ProductionCycleSystem:
     def initialize_cycles(self, user_id: str, user_profile: dict):
         """Initialize 7-week progressive cycles for user"""
-        cycles_data = data_manager.get_cycles_data()
         onboarding_key = f"onboarding_{user_profile['email']}"
         
         # Calculate progressive weekly targets
@@ -296,8 +601,7 @@ class ProductionCycleSystem:
             }
         }
         
-        cycles_data[onboarding_key] = cycle_data
-        data_manager.save_cycles_data(cycles_data)
+        data_manager.save_cycle(onboarding_key, cycle_data)
         
         return cycle_data
     
@@ -342,13 +646,12 @@ class ProductionCycleSystem:
     
     def get_current_week_data(self, user_id: str) -> dict:
         """Get current week data with progressive targets"""
-        cycles_data = data_manager.get_cycles_data()
         onboarding_key = f"onboarding_{user_id}"
+        cycle_data = data_manager.get_cycle(onboarding_key)
         
-        if onboarding_key not in cycles_data:
+        if cycle_data is None:
             return {"error": "No cycle data found"}
         
-        cycle_data = cycles_data[onboarding_key]
         current_week = cycle_data.get("current_week", 1)
         weekly_targets = cycle_data.get("weekly_targets", [])
         
@@ -377,114 +680,207 @@ class ProductionCycleSystem:
         }
 
 class ProductionAnalysisSystem:
+    RISK_LEVELS = ("Low", "Medium", "High", "Critical")
+    
     def run_night_analysis(self):
         """Run comprehensive night analysis with Watchdog activation"""
+        return self.run_night_analysis_batch()
+    
+    def run_night_analysis_batch(self) -> Dict[str, Any]:
+        """
+        Analyse every user in one vectorized pass.
+        
+        Profiles, cycles and previous results are loaded once into columnar
+        NumPy arrays, all metrics are computed array-wide and the results are
+        written back in a single transaction. Returns a summary with per-stage
+        timings in milliseconds.
+        """
         print("🌙 Starting night analysis...")
+        timings = {}
+        stage_started = time.perf_counter()
+        
+        def mark(stage: str):
+            nonlocal stage_started
+            now = time.perf_counter()
+            timings[stage] = round((now - stage_started) * 1000, 2)
+            stage_started = now
         
-        # Get all users
+        # 1. Load every store once
         users_data = data_manager.get_user_data()
         onboarding_data = data_manager.get_onboarding_data()
-        analysis_data = data_manager.get_analysis_data()
+        cycles_data = data_manager.get_cycles_data()
+        previous_results = data_manager.load_store(ProductionDataManager.ANALYSIS_RESULTS)
+        mark("load")
         
-        for user_email, user_info in users_data.items():
+        # 2. Build columnar arrays, skipping users whose records do not validate
+        emails, rows, skipped = [], [], []
+        for email in users_data:
+            key = f"onboarding_{email}"
             try:
-                onboarding_key = f"onboarding_{user_email}"
-                onboarding_info = onboarding_data.get(onboarding_key, {})
-                
-                # Get current context
-                context_manager = RenderUserContextManager(user_email)
-                context = context_manager.get_enhanced_context()
-                
-                # Analyze user's financial situation
-                current_savings = context.get('current_savings', 0)
-                savings_goal = context.get('savings_goal', 100000)
-                monthly_income = context.get('monthly_income', 0)
-                monthly_expenses = context.get('monthly_expenses', 0)
-                current_week = context.get('current_week', 1)
-                weekly_target = context.get('target_income_weekly', 300)
-                
-                # Calculate risk level and Watchdog state
-                risk_level = self._calculate_risk_level(context)
-                watchdog_state = self._determine_watchdog_state(context, risk_level)
-                
-                # Generate AI recommendations
-                ai_recommendations = self._generate_ai_recommendations(context, risk_level)
-                
-                # Create analysis result
-                analysis_result = {
-                    "user_id": onboarding_key,
-                    "goal_progress": (current_savings / savings_goal * 100) if savings_goal > 0 else 0,
-                    "current_week": current_week,
-                    "weekly_performance": self._assess_weekly_performance(context),
-                    "risk_level": risk_level,
-                    "watchdog_state": watchdog_state,
-                    "ai_recommendations": ai_recommendations,
-                    "next_week_adjustments": self._calculate_next_week_adjustments(context),
-                    "analysis_timestamp": datetime.now().isoformat(),
-                    "strategy_updated": True,
-                    "emergency_actions": self._get_emergency_actions(context, risk_level)
-                }
-                
-                # Save analysis
-                if "results" not in analysis_data:
-                    analysis_data["results"] = {}
-                analysis_data["results"][onboarding_key] = analysis_result
-                
-                # Send notifications if needed
-                if watchdog_state in ["Alert", "Emergency"]:
-                    self._send_watchdog_notification(user_email, watchdog_state, analysis_result)
-                
-                print(f"✅ Night analysis completed for {user_email}")
-                
+                rows.append(self._analysis_row(onboarding_data.get(key, {}), cycles_data.get(key, {})))
             except Exception as e:
-                print(f"❌ Night analysis failed for {user_email}: {e}")
-        
-        data_manager.save_analysis_data(analysis_data)
-        print("🌅 Night analysis completed for all users")
-    
-    def _calculate_risk_level(self, context: dict) -> str:
-        """Calculate risk level based on user's financial situation"""
-        current_savings = context.get('current_savings', 0)
-        savings_goal = context.get('savings_goal', 100000)
-        monthly_income = context.get('monthly_income', 0)
-        monthly_expenses = context.get('monthly_expenses', 0)
-        current_week = context.get('current_week', 1)
-        weekly_target = context.get('target_income_weekly', 300)
-        
-        # Calculate various risk factors
-        savings_ratio = current_savings / savings_goal if savings_goal > 0 else 0
-        expense_ratio = monthly_expenses / monthly_income if monthly_income > 0 else 1
+                skipped.append(email)
+                print(f"❌ Night analysis failed for {email}: {e}")
+                continue
+            emails.append(email)
+        keys = [f"onboarding_{email}" for email in emails]
+        count = len(keys)
+        
+        columns = np.array(rows, dtype=np.float64).reshape(count, 6).T
+        current_savings, savings_goal, monthly_income, monthly_expenses, _, weekly_target = columns
+        current_week = columns[4].astype(np.int64)
+        mark("vectorize")
+        
+        # 3. Compute metrics array-wide
+        has_goal = savings_goal > 0
+        safe_goal = np.where(has_goal, savings_goal, 1)
+        savings_ratio = np.where(has_goal, current_savings / safe_goal, 0)
+        goal_progress = savings_ratio * 100
+        expense_ratio = np.where(
+            monthly_income > 0, monthly_expenses / np.where(monthly_income > 0, monthly_income, 1), 1
+        )
         week_progress = current_week / 7  # 7-week cycle
         
-        # Risk scoring
-        risk_score = 0
-        
-        if savings_ratio < 0.1:
-            risk_score += 3  # Very low savings
-        elif savings_ratio < 0.3:
-            risk_score += 2  # Low savings
-        elif savings_ratio < 0.5:
-            risk_score += 1  # Moderate savings
-        
-        if expense_ratio > 0.9:
-            risk_score += 3  # Very high expenses
-        elif expense_ratio > 0.8:
-            risk_score += 2  # High expenses
-        elif expense_ratio > 0.7:
-            risk_score += 1  # Moderate expenses
-        
-        if week_progress > 0.5 and savings_ratio < 0.2:
-            risk_score += 2  # Behind schedule
-        
-        # Determine risk level
-        if risk_score >= 6:
-            return "Critical"
-        elif risk_score >= 4:
-            return "High"
-        elif risk_score >= 2:
-            return "Medium"
-        else:
-            return "Low"
+        risk_score = (
+            np.select([savings_ratio < 0.1, savings_ratio < 0.3, savings_ratio < 0.5], [3, 2, 1], 0)
+            + np.select([expense_ratio > 0.9, expense_ratio > 0.8, expense_ratio > 0.7], [3, 2, 1], 0)
+            + np.where((week_progress > 0.5) & (savings_ratio < 0.2), 2, 0)  # Behind schedule
+        )
+        risk_index = np.select([risk_score >= 6, risk_score >= 4, risk_score >= 2], [3, 2, 1], 0)
+        
+        expected = weekly_target * current_week
+        performance = np.select(
+            [current_week == 1, current_savings >= expected, current_savings >= expected * 0.8,
+             current_savings >= expected * 0.6],
+            ["not_started", "excellent", "good", "fair"],
+            "poor"
+        )
+        
+        required_weekly = (savings_goal - current_savings) / np.maximum(1, 7 - current_week)
+        increase = required_weekly > weekly_target * 1.2
+        decrease = ~increase & (required_weekly < weekly_target * 0.8)
+        new_target = np.where(
+            increase, np.minimum(required_weekly, weekly_target * 1.5), np.maximum(required_weekly, 200)
+        )
+        mark("compute")
+        
+        # 4. Assemble results and write them in one transaction
+        timestamp = datetime.now().isoformat()
+        per_level = {
+            level: {
+                "watchdog_state": self._determine_watchdog_state({}, level),
+                "ai_recommendations": self._generate_ai_recommendations({}, level),
+                "emergency_actions": self._get_emergency_actions({}, level)
+            }
+            for level in self.RISK_LEVELS
+        }
+        goal_progress_list = goal_progress.tolist()
+        weeks_list = current_week.tolist()
+        performance_list = performance.tolist()
+        risk_list = risk_index.tolist()
+        weekly_target_list = weekly_target.tolist()
+        new_target_list = new_target.tolist()
+        increase_list = increase.tolist()
+        decrease_list = decrease.tolist()
+        
+        results = {}
+        risk_changes = 0
+        for i, key in enumerate(keys):
+            level = self.RISK_LEVELS[risk_list[i]]
+            if increase_list[i]:
+                adjustments = {
+                    "increase_target": True,
+                    "new_target": new_target_list[i],
+                    "reason": "Tavoite vaarassa - lisää viikkotavoitetta"
+                }
+            elif decrease_list[i]:
+                adjustments = {
+                    "decrease_target": True,
+                    "new_target": new_target_list[i],
+                    "reason": "Tavoite saavutettavissa - optimoi strategiaa"
+                }
+            else:
+                adjustments = {
+                    "maintain_target": True,
+                    "current_target": weekly_target_list[i],
+                    "reason": "Olet hyvällä tiellä - jatka samaan malliin"
+                }
+            
+            results[key] = {
+                "user_id": key,
+                "goal_progress": goal_progress_list[i],
+                "current_week": weeks_list[i],
+                "weekly_performance": performance_list[i],
+                "risk_level": level,
+                "watchdog_state": per_level[level]["watchdog_state"],
+                "ai_recommendations": list(per_level[level]["ai_recommendations"]),
+                "next_week_adjustments": adjustments,
+                "analysis_timestamp": timestamp,
+                "strategy_updated": True,
+                "emergency_actions": list(per_level[level]["emergency_actions"])
+            }
+            if previous_results.get(key, {}).get("risk_level") != level:
+                risk_changes += 1
+        
+        data_manager.save_analysis_results(results, meta={
+            "last_analysis": timestamp,
+            "users_analyzed": count
+        })
+        mark("write")
+        
+        # 5. Send notifications if needed
+        alert_indices = np.flatnonzero(risk_index >= 2)
+        for i in alert_indices.tolist():
+            result = results[keys[i]]
+            self._send_watchdog_notification(emails[i], result["watchdog_state"], result)
+        mark("notify")
+        
+        risk_distribution = dict(zip(self.RISK_LEVELS, np.bincount(risk_index, minlength=4).tolist()))
+        timings["total"] = round(sum(timings.values()), 2)
+        data_manager.save_records(ProductionDataManager.ANALYSIS_META, {"last_run_timings_ms": timings})
+        print(f"🌅 Night analysis completed for {count} users in {timings['total']} ms")
+        
+        return {
+            "summary": f"{count} käyttäjää analysoitu, {len(alert_indices)} hälytystä",
+            "users_analyzed": count,
+            "users_skipped": skipped,
+            "risk_distribution": risk_distribution,
+            "risk_changes": risk_changes,
+            "alerts_sent": len(alert_indices),
+            "timings_ms": timings,
+            "analysis_timestamp": timestamp
+        }
+    
+    @staticmethod
+    def _analysis_row(profile: dict, cycle: dict) -> tuple:
+        """
+        Validate one user's profile and cycle into the numeric batch columns:
+        (savings, goal, income, expenses, week, weekly target). Raises
+        TypeError for non-numeric values, as the per-user analysis did.
+        """
+        def number(record: dict, field: str, default):
+            value = record.get(field, default)
+            if not isinstance(value, (int, float)):
+                raise TypeError(f"{field} is not a number: {value!r}")
+            return value
+        
+        week = cycle.get("current_week", 1)
+        if not isinstance(week, int):
+            raise TypeError(f"current_week is not an integer: {week!r}")
+        # Same lookup as RenderUserContextManager.get_enhanced_context
+        weekly_target = 0
+        week_cycles = cycle.get("cycles") or []
+        if 1 <= week <= len(week_cycles):
+            weekly_target = number(week_cycles[week - 1], "savings_target", 0)
+        
+        return (
+            number(profile, "current_savings", 0),
+            number(profile, "savings_goal", 100000),
+            number(profile, "monthly_income", 0),
+            number(profile, "monthly_expenses", 0),
+            week,
+            weekly_target
+        )
     
     def _determine_watchdog_state(self, context: dict, risk_level: str) -> str:
         """Determine Watchdog state based on risk level and context"""
@@ -532,36 +928,6 @@ class ProductionAnalysisSystem:
         
         return recommendations
     
-    def _calculate_next_week_adjustments(self, context: dict) -> dict:
-        """Calculate adjustments for next week"""
-        current_savings = context.get('current_savings', 0)
-        savings_goal = context.get('savings_goal', 100000)
-        weekly_target = context.get('target_income_weekly', 300)
-        
-        # Calculate if we need to adjust targets
-        remaining_amount = savings_goal - current_savings
-        weeks_remaining = max(1, (7 - context.get('current_week', 1)))
-        required_weekly = remaining_amount / weeks_remaining
-        
-        if required_weekly > weekly_target * 1.2:
-            return {
-                "increase_target": True,
-                "new_target": min(required_weekly, weekly_target * 1.5),
-                "reason": "Tavoite vaarassa - lisää viikkotavoitetta"
-            }
-        elif required_weekly < weekly_target * 0.8:
-            return {
-                "decrease_target": True,
-                "new_target": max(required_weekly, 200),
-                "reason": "Tavoite saavutettavissa - optimoi strategiaa"
-            }
-        else:
-            return {
-                "maintain_target": True,
-                "current_target": weekly_target,
-                "reason": "Olet hyvällä tiellä - jatka samaan malliin"
-            }
-    
     def _get_emergency_actions(self, context: dict, risk_level: str) -> list:
         """Get emergency actions for critical situations"""
         if risk_level != "Critical":
@@ -576,23 +942,6 @@ class ProductionAnalysisSystem:
             "🎯 Aseta päivittäiset säästötavoitteet"
         ]
     
-    def _assess_weekly_performance(self, context: dict) -> str:
-        """Assess weekly performance"""
-        current_week = context.get('current_week', 1)
-        weekly_target = context.get('target_income_weekly', 300)
-        current_savings = context.get('current_savings', 0)
-        
-        if current_week == 1:
-            return "not_started"
-        elif current_savings >= weekly_target * current_week:
-            return "excellent"
-        elif current_savings >= weekly_target * current_week * 0.8:
-            return "good"
-        elif current_savings >= weekly_target * current_week * 0.6:
-            return "fair"
-        else:
-            return "poor"
-    
     def _send_watchdog_notification(self, user_email: str, watchdog_state: str, analysis_result: dict):
         """Send Watchdog notification to user"""
         try:
@@ -623,17 +972,22 @@ class RenderUserContextManager:
         self.user_email = user_email
         self.data_key = f"onboarding_{user_email}"
         
-        # Load data via data manager
-        self.onboarding_data = data_manager.get_onboarding_data()
-        self.cycles_data = data_manager.get_cycles_data()
-        self.analysis_data = data_manager.get_analysis_data()
-        self.users_data = data_manager.get_user_data()
+        # Load this user's records via data manager (cached per email)
+        records = user_context_cache.get(user_email)
+        if records is None:
+            version = user_context_cache.version
+            records = {
+                "profile": data_manager.get_onboarding_profile(self.data_key) or {},
+                "cycles": data_manager.get_cycle(self.data_key) or {},
+                "analysis": data_manager.get_analysis_result(self.data_key) or {},
+                "user_info": data_manager.get_user(user_email) or {}
+            }
+            user_context_cache.set(user_email, records, version)
         
-        # Get user profiles
-        self.profile = self.onboarding_data.get(self.data_key, {})
-        self.cycles = self.cycles_data.get(self.data_key, {})
-        self.analysis = self.analysis_data.get("results", {}).get(self.data_key, {})
-        self.user_info = self.users_data.get(user_email, {})
+        self.profile = records["profile"]
+        self.cycles = records["cycles"]
+        self.analysis = records["analysis"]
+        self.user_info = records["user_info"]
 
     def get_enhanced_context(self) -> Dict[str, Any]:
         """Get complete user context for Render"""
@@ -826,6 +1180,8 @@ def health_check():
             "night_analysis": "operational",
             "data_storage": "operational"
         },
+        "context_cache": user_context_cache.get_stats(),
+        "llm_cache": llm_response_cache.get_stats(),
         "ready_for_production": True
     }
 
@@ -994,10 +1350,10 @@ def get_user_enhanced_context_render(user_email: str):
             "enhanced_context": enhanced_context,
             "environment": "render_production",
             "data_sources": [
-                "data/onboarding.json",
-                "data/cycles.json", 
-                "data/analysis.json",
-                "data/users.json"
+                "data/sentinel_store.db:onboarding",
+                "data/sentinel_store.db:cycles",
+                "data/sentinel_store.db:analysis_results",
+                "data/sentinel_store.db:users"
             ],
             "features_active": [
                 "goal_tracking", "watchdog_monitoring", "progress_analysis", 
@@ -1050,10 +1406,7 @@ def enhanced_ai_chat_render(message: ChatMessage, user_email: str):
 
         # Use OpenAI API for real AI responses
         try:
-            import openai
-            openai.api_key = OPENAI_API_KEY
-            
-            response = openai.ChatCompletion.create(
+            ai_response = llm_response_cache.chat_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "Olet Sentinel 100K - henkilökohtainen talousneuvoja. Vastaa aina suomeksi, lyhyesti (max 2 lausetta) ja käytä emojiita."},
@@ -1063,8 +1416,6 @@ def enhanced_ai_chat_render(message: ChatMessage, user_email: str):
                 temperature=0.7
             )
             
-            ai_response = response.choices[0].message.content
-            
             return {
                 "response": ai_response,
                 "enhanced_prompt_used": True,
@@ -1197,15 +1548,13 @@ def get_goal_progress_render(user_email: str):
 
 def get_or_create_telegram_user(telegram_id: int, username: str = None) -> dict:
     """Get or create a user profile for a Telegram user. Returns user dict with email as key."""
-    users_data = data_manager.get_user_data()
-    onboarding_data = data_manager.get_onboarding_data()
     telegram_email = f"telegram_{telegram_id}@sentinel100k.com"
     onboarding_key = f"onboarding_{telegram_email}"
 
     # Check if user exists
-    if telegram_email in users_data:
-        user_profile = users_data[telegram_email]
-        onboarding_profile = onboarding_data.get(onboarding_key, {})
+    user_profile = data_manager.get_user(telegram_email)
+    if user_profile is not None:
+        onboarding_profile = data_manager.get_onboarding_profile(onboarding_key) or {}
         return {
             "email": telegram_email,
             "user": user_profile,
@@ -1222,8 +1571,7 @@ def get_or_create_telegram_user(telegram_id: int, username: str = None) -> dict:
         "created_at": now,
         "is_active": True
     }
-    users_data[telegram_email] = user_profile
-    data_manager.save_user_data(users_data)
+    data_manager.save_user(telegram_email, user_profile)
 
     # Create onboarding profile with default values
     onboarding_profile = {
@@ -1247,13 +1595,11 @@ def get_or_create_telegram_user(telegram_id: int, username: str = None) -> dict:
         "profile_completeness": 10,
         "personalization_level": "basic"
     }
-    onboarding_data[onboarding_key] = onboarding_profile
-    data_manager.save_onboarding_data(onboarding_data)
+    data_manager.save_onboarding_profile(onboarding_key, onboarding_profile)
 
     # Optionally, initialize cycles and analysis for new user
-    cycles_data = data_manager.get_cycles_data()
-    if onboarding_key not in cycles_data:
-        cycles_data[onboarding_key] = {
+    if data_manager.get_cycle(onboarding_key) is None:
+        data_manager.save_cycle(onboarding_key, {
             "data_key": onboarding_key,
             "user_id": user_id,
             "user_email": telegram_email,
@@ -1262,13 +1608,9 @@ def get_or_create_telegram_user(telegram_id: int, username: str = None) -> dict:
             "status": "active",
             "total_target": 0,
             "cycles": []
-        }
-        data_manager.save_cycles_data(cycles_data)
-    analysis_data = data_manager.get_analysis_data()
-    if "results" not in analysis_data:
-        analysis_data["results"] = {}
-    if onboarding_key not in analysis_data["results"]:
-        analysis_data["results"][onboarding_key] = {
+        })
+    if data_manager.get_analysis_result(onboarding_key) is None:
+        data_manager.save_analysis_result(onboarding_key, {
             "user_id": onboarding_key,
             "goal_progress": 0.0,
             "current_week": 1,
@@ -1278,8 +1620,7 @@ def get_or_create_telegram_user(telegram_id: int, username: str = None) -> dict:
             "next_week_adjustments": {},
             "analysis_timestamp": now,
             "strategy_updated": False
-        }
-        data_manager.save_analysis_data(analysis_data)
+        })
 
     return {
         "email": telegram_email,
@@ -1520,10 +1861,7 @@ Aloitetaan! Kerro ensin ikäsi ja ammattisi. 🚀"""
                 # If AI response is empty, try again with a simple prompt
                 try:
                     simple_prompt = f"Käyttäjä kysyy: {text}. Vastaa lyhyesti (max 2 lausetta) ja ystävällisesti."
-                    import openai
-                    openai.api_key = OPENAI_API_KEY
-                    
-                    response = openai.ChatCompletion.create(
+                    return llm_response_cache.chat_completion(
                         model="gpt-3.5-turbo",
                         messages=[
                             {"role": "system", "content": "Olet Sentinel 100K - talousneuvoja. Vastaa aina lyhyesti (max 2 lausetta) ja ystävällisesti. Käytä emojiita."},
@@ -1532,8 +1870,6 @@ Aloitetaan! Kerro ensin ikäsi ja ammattisi. 🚀"""
                         max_tokens=50,
                         temperature=0.7
                     )
-                    
-                    return response.choices[0].message.content
                 except:
                     # Only if everything fails, give minimal response
                     return f"🤖 Hei {name}! Vastaan pian kysymykseesi."
@@ -1542,10 +1878,7 @@ Aloitetaan! Kerro ensin ikäsi ja ammattisi. 🚀"""
             print(f"❌ AI response error: {e}")
             # Try one more time with simple AI call
             try:
-                import openai
-                openai.api_key = OPENAI_API_KEY
-                
-                response = openai.ChatCompletion.create(
+                return llm_response_cache.chat_completion(
                     model="gpt-3.5-turbo",
                     messages=[
                         {"role": "system", "content": "Olet Sentinel 100K - talousneuvoja. Vastaa aina lyhyesti (max 2 lausetta) ja ystävällisesti. Käytä emojiita."},
@@ -1554,8 +1887,6 @@ Aloitetaan! Kerro ensin ikäsi ja ammattisi. 🚀"""
                     max_tokens=30,
                     temperature=0.7
                 )
-                
-                return response.choices[0].message.content
             except:
                 # Only if AI completely fails
                 return f"🤖 Hei {name}! Pahoittelut, tekninen ongelma. Yritä uudelleen pian."
@@ -1565,105 +1896,198 @@ class TelegramUpdate(BaseModel):
     message: Optional[Dict[str, Any]] = None
     callback_query: Optional[Dict[str, Any]] = None
 
-@app.post("/telegram/webhook")
-async def telegram_webhook(update: TelegramUpdate):
-    """Handle Telegram webhook updates - PRODUCTION READY WITH ANALYTICS"""
-    start_time = time.time()
+# 📬 TELEGRAM UPDATE PIPELINE
+TELEGRAM_WORKERS = int(os.getenv("TELEGRAM_WORKERS", 8))
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", 1000))
+
+class TelegramUpdatePipeline:
+    """
+    Non-blocking Telegram update pipeline.
     
-    try:
-        # Extract message data
-        if update.message:
-            message = update.message
-            chat_id = message.get("chat", {}).get("id")
-            text = message.get("text", "")
-            user_id = message.get("from", {}).get("id")
-            username = message.get("from", {}).get("username", "Unknown")
-            
-            print(f"📱 Telegram message from {username} ({user_id}): {text}")
-            print(f"🔍 Chat ID: {chat_id}, User ID: {user_id}")
-            
-            # Track message
-            analytics.data["system_health"]["total_requests"] += 1
-            
-            # --- USER PROFILE AUTO-REGISTRATION ---
-            user_info = get_or_create_telegram_user(user_id, username)
-            print(f"👤 User profile: {user_info['email']}")
-            
-            # --- AUTOMATIC CUSTOMER SERVICE CHECK ---
-            support_response = customer_service.handle_support_request(user_id, username, text)
-            if support_response:
-                print(f"🆘 Support response: {support_response}")
-                # Send support response
-                telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-                if telegram_token:
-                    telegram_url = f"https://api.telegram.org/bot{telegram_token}/sendMessage"
-                    payload = {
-                        "chat_id": chat_id,
-                        "text": support_response,
-                        "parse_mode": "HTML"
-                    }
-                    response = requests.post(telegram_url, json=payload)
-                    print(f"📤 Support response sent: {response.status_code}")
-                
-                # Track support interaction
-                analytics.track_message(user_id, username, text, time.time() - start_time, ai_used=False)
-                analytics.track_feature_usage("customer_service")
-                
-                return {"status": "success", "message": "Support response sent"}
-            
-            # --- SMART TELEGRAM RESPONSE HANDLING ---
-            print(f"🤖 Getting AI response for: {text}")
-            response_text = get_telegram_response(text, user_id, username)
-            print(f"🤖 AI response: {response_text[:100]}...")
-            
-            # Send response back to Telegram
-            telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
-            if telegram_token:
-                # Send message to Telegram
-                telegram_url = f"https://api.telegram.org/bot{telegram_token}/sendMessage"
-                payload = {
-                    "chat_id": chat_id,
-                    "text": response_text,
-                    "parse_mode": "HTML"
-                }
-                
-                print(f"📤 Sending to Telegram: {telegram_url}")
-                print(f"📤 Payload: {payload}")
-                
-                response = requests.post(telegram_url, json=payload)
-                response_time = time.time() - start_time
-                
-                print(f"📤 Telegram response: {response.status_code} - {response.text}")
-                
-                if response.status_code == 200:
-                    print(f"✅ Telegram response sent successfully")
-                    
-                    # Track successful interaction
-                    analytics.track_message(user_id, username, text, response_time, ai_used=True)
-                    
-                    # Track AI learning
-                    ai_learning_engine.track_user_preference(user_id, "general", 5)  # Assume good response
-                    
-                    return {"status": "success", "message": "Telegram message processed"}
-                else:
-                    print(f"❌ Failed to send Telegram response: {response.status_code}")
-                    print(f"❌ Response text: {response.text}")
-                    analytics.track_error("telegram_send", f"Status: {response.status_code}")
-                    return {"status": "error", "message": f"Failed to send response: {response.status_code}"}
-            else:
-                print("⚠️ TELEGRAM_BOT_TOKEN not found in environment variables")
-                analytics.track_error("telegram_token", "Token not configured")
-                return {"status": "warning", "message": "Bot token not configured"}
+    The webhook only enqueues the update and returns. A bounded pool of worker
+    tasks builds the reply in a thread (storage and OpenAI calls are blocking)
+    and sends it through one pooled aiohttp session. Redelivered update_ids
+    are dropped.
+    """
+    
+    def __init__(self, workers: int = TELEGRAM_WORKERS, queue_size: int = TELEGRAM_QUEUE_SIZE,
+                 dedup_window: int = 10000):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.dedup_window = dedup_window
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._seen_updates: "OrderedDict[int, None]" = OrderedDict()
+        self.stats = {"received": 0, "processed": 0, "duplicates": 0, "dropped": 0, "failed": 0}
+        self._latencies = deque(maxlen=1000)
+    
+    def start(self):
+        """Start the worker pool on the running event loop (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._queue is not None and self._loop is loop:
+            return
+        self._loop = loop
+        self._session = None
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"✅ Telegram pipeline started with {self.workers} workers")
+    
+    async def stop(self, drain_timeout: float = 10.0):
+        """Drain queued updates, then stop workers and close the HTTP pool"""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Telegram pipeline stopped with {self._queue.qsize()} updates pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    def submit(self, update: "TelegramUpdate") -> str:
+        """Enqueue an update; returns 'queued', 'duplicate' or 'dropped'"""
+        self.start()
+        self.stats["received"] += 1
+        
+        if update.update_id in self._seen_updates:
+            self.stats["duplicates"] += 1
+            return "duplicate"
         
-        return {"status": "success", "message": "Update processed"}
+        try:
+            self._queue.put_nowait((time.monotonic(), update))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return "dropped"
+        
+        self._seen_updates[update.update_id] = None
+        if len(self._seen_updates) > self.dedup_window:
+            self._seen_updates.popitem(last=False)
+        return "queued"
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.workers * 2, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=15)
+            )
+        return self._session
+    
+    async def send_message(self, chat_id: int, text: str) -> Optional[int]:
+        """Send a message through the pooled session; returns the HTTP status"""
+        telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
+        if not telegram_token:
+            print("⚠️ TELEGRAM_BOT_TOKEN not found in environment variables")
+            analytics.track_error("telegram_token", "Token not configured")
+            return None
         
-    except Exception as e:
-        error_time = time.time() - start_time
-        print(f"❌ Telegram webhook error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        analytics.track_error("webhook_error", str(e))
-        return {"status": "error", "message": str(e)}
+        session = await self._get_session()
+        async with session.post(
+            f"https://api.telegram.org/bot{telegram_token}/sendMessage",
+            json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
+        ) as response:
+            if response.status != 200:
+                print(f"❌ Failed to send Telegram response: {response.status} - {await response.text()}")
+                analytics.track_error("telegram_send", f"Status: {response.status}")
+            return response.status
+    
+    async def _worker(self, worker_id: int):
+        while True:
+            enqueued_at, update = await self._queue.get()
+            try:
+                await self._process(update)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"❌ Telegram worker {worker_id} error: {str(e)}")
+                analytics.track_error("webhook_error", str(e))
+            finally:
+                self._latencies.append(time.monotonic() - enqueued_at)
+                self._queue.task_done()
+    
+    async def _process(self, update: "TelegramUpdate"):
+        start_time = time.time()
+        reply = await asyncio.to_thread(build_telegram_reply, update)
+        if reply is None:
+            return
+        
+        status = await self.send_message(reply["chat_id"], reply["text"])
+        if status != 200:
+            return
+        
+        # Track successful interaction
+        await asyncio.to_thread(track_telegram_reply, reply, time.time() - start_time)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self.stats,
+            "workers": len(self._tasks),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "p50_latency": round(latencies[len(latencies) // 2], 3) if latencies else 0,
+            "p99_latency": round(latencies[int(len(latencies) * 0.99)], 3) if latencies else 0
+        }
+
+def build_telegram_reply(update: "TelegramUpdate") -> Optional[Dict[str, Any]]:
+    """Build the reply for one update (blocking: storage, support check, AI)"""
+    if not update.message:
+        return None
+    
+    message = update.message
+    chat_id = message.get("chat", {}).get("id")
+    text = message.get("text", "")
+    user_id = message.get("from", {}).get("id")
+    username = message.get("from", {}).get("username", "Unknown")
+    
+    print(f"📱 Telegram message from {username} ({user_id}): {text}")
+    
+    # Track message
+    analytics.track_request()
+    
+    # --- USER PROFILE AUTO-REGISTRATION ---
+    user_info = get_or_create_telegram_user(user_id, username)
+    print(f"👤 User profile: {user_info['email']}")
+    
+    reply = {"chat_id": chat_id, "user_id": user_id, "username": username, "message": text}
+    
+    # --- AUTOMATIC CUSTOMER SERVICE CHECK ---
+    support_response = customer_service.handle_support_request(user_id, username, text)
+    if support_response:
+        print(f"🆘 Support response: {support_response}")
+        return {**reply, "text": support_response, "support": True}
+    
+    # --- SMART TELEGRAM RESPONSE HANDLING ---
+    response_text = get_telegram_response(text, user_id, username)
+    print(f"🤖 AI response: {response_text[:100]}...")
+    return {**reply, "text": response_text, "support": False}
+
+def track_telegram_reply(reply: Dict[str, Any], response_time: float):
+    """Record analytics for a delivered reply"""
+    analytics.track_message(
+        reply["user_id"], reply["username"], reply["message"], response_time, ai_used=not reply["support"]
+    )
+    if reply["support"]:
+        analytics.track_feature_usage("customer_service")
+    else:
+        ai_learning_engine.track_user_preference(reply["user_id"], "general", 5)  # Assume good response
+
+telegram_pipeline = TelegramUpdatePipeline()
+
+@app.post("/telegram/webhook")
+async def telegram_webhook(update: TelegramUpdate):
+    """Acknowledge Telegram webhook updates immediately - processing runs in the pipeline"""
+    status = telegram_pipeline.submit(update)
+    if status == "dropped":
+        # Let Telegram redeliver once the queue has drained
+        analytics.track_error("telegram_queue_full", f"update_id {update.update_id}")
+        raise HTTPException(status_code=503, detail="Update queue full")
+    return {"status": "success", "message": f"Update {status}"}
 
 @app.get("/telegram/webhook")
 async def telegram_webhook_get():
@@ -1673,7 +2097,8 @@ async def telegram_webhook_get():
         "environment": ENVIRONMENT,
         "version": "100.0.0",
         "render_production": True,
-        "telegram_ready": bool(os.getenv("TELEGRAM_BOT_TOKEN"))
+        "telegram_ready": bool(os.getenv("TELEGRAM_BOT_TOKEN")),
+        "pipeline": telegram_pipeline.get_stats()
     }
 
 @app.get("/telegram/test")
@@ -1830,7 +2255,10 @@ class TelegramNotificationManager:
     
     def send_daily_reminder(self, user_info: dict) -> bool:
         """Send daily savings reminder"""
-        telegram_id = user_info["telegram_id"]
+        return self.send_telegram_message(user_info["telegram_id"], self.build_daily_reminder(user_info))
+    
+    def build_daily_reminder(self, user_info: dict) -> str:
+        """Build daily savings reminder text"""
         email = user_info["email"]
         
         # Get user context
@@ -1859,7 +2287,7 @@ class TelegramNotificationManager:
 
 Muista: Jokainen euro lähempänä tavoitetta! 💪"""
         
-        return self.send_telegram_message(telegram_id, message)
+        return message
     
     def send_watchdog_alert(self, user_info: dict, alert_type: str = "general") -> bool:
         """Send watchdog alert based on user progress"""
@@ -1999,7 +2427,10 @@ Jatka hyvää työtä! Olet menossa oikeaan suuntaan! 🚀"""
     
     def send_weekly_summary(self, user_info: dict) -> bool:
         """Send weekly summary and next week preview"""
-        telegram_id = user_info["telegram_id"]
+        return self.send_telegram_message(user_info["telegram_id"], self.build_weekly_summary(user_info))
+    
+    def build_weekly_summary(self, user_info: dict) -> str:
+        """Build weekly summary and next week preview text"""
         email = user_info["email"]
         
         context_manager = RenderUserContextManager(email)
@@ -2028,7 +2459,7 @@ Jatka hyvää työtä! Olet menossa oikeaan suuntaan! 🚀"""
 
 Hyvää työtä! Jatka samalla energialla! 💪"""
         
-        return self.send_telegram_message(telegram_id, message)
+        return message
     
     def _get_daily_tip(self, context: dict) -> str:
         """Get personalized daily tip"""
@@ -2749,10 +3180,12 @@ def get_detailed_analytics():
         return {"status": "error", "message": str(e)}
 
 @app.post("/api/v1/notifications/mass")
-def send_mass_notification(notification_type: str, custom_message: str = None):
-    """Send mass notification to all users"""
+def send_mass_notification(notification_type: str, custom_message: str = None, broadcast_id: str = None):
+    """Send mass notification to all users (pass broadcast_id to resume an interrupted run)"""
+    if broadcast_id is not None and not MassNotificationManager.BROADCAST_ID_PATTERN.fullmatch(broadcast_id):
+        raise HTTPException(status_code=400, detail="broadcast_id must be 1-64 letters, digits, '_' or '-'")
     try:
-        results = mass_notification_manager.send_mass_notification(notification_type, custom_message)
+        results = mass_notification_manager.send_mass_notification(notification_type, custom_message, broadcast_id)
         return {
             "status": "success",
             "results": results,
@@ -2964,6 +3397,7 @@ class ProductionSchedulerService:
         try:
             users_data = data_manager.get_user_data()
             cycles_data = data_manager.get_cycles_data()
+            updated_cycles = {}
             
             for user_email in users_data.keys():
                 onboarding_key = f"onboarding_{user_email}"
@@ -2980,10 +3414,11 @@ class ProductionSchedulerService:
                         progress = cycle_data.get("progress", {})
                         progress["weeks_completed"] = current_week
                         cycle_data["progress"] = progress
+                        updated_cycles[onboarding_key] = cycle_data
                         
                         print(f"✅ Updated cycle for {user_email}: Week {current_week + 1}")
             
-            data_manager.save_cycles_data(cycles_data)
+            data_manager.save_records(ProductionDataManager.CYCLES, updated_cycles)
             print("✅ Weekly cycle updates completed")
             
         except Exception as e:
@@ -3175,8 +3610,7 @@ class ReceiptTracker:
     def get_last_receipt_date(self, user_id: int) -> Optional[date]:
         """Hae käyttäjän viimeisimmän kuitin päivämäärä"""
         try:
-            data = self.data_manager.get_user_data()
-            user_data = data.get(str(user_id), {})
+            user_data = self.data_manager.get_user(str(user_id)) or {}
             last_receipt = user_data.get('last_receipt_date')
             
             if last_receipt:
@@ -3189,12 +3623,9 @@ class ReceiptTracker:
     def update_receipt_date(self, user_id: int):
         """Päivitä käyttäjän viimeisimmän kuitin päivämäärä"""
         try:
-            data = self.data_manager.get_user_data()
-            if str(user_id) not in data:
-                data[str(user_id)] = {}
-            
-            data[str(user_id)]['last_receipt_date'] = datetime.now().isoformat()
-            self.data_manager.save_user_data(data)
+            user_data = self.data_manager.get_user(str(user_id)) or {}
+            user_data['last_receipt_date'] = datetime.now().isoformat()
+            self.data_manager.save_user(str(user_id), user_data)
             
             # Lähetä vahvistusviesti
             confirmation_message = (
@@ -3350,8 +3781,7 @@ def handle_telegram_command_v1(text: str, user_id: int, username: str) -> str:
 def _handle_profile_command(user_id: int, data_manager: ProductionDataManager) -> str:
     """Käsittele /profile komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Profiilia ei löytynyt. Käytä /onboarding aloittaaksesi."
@@ -3372,13 +3802,9 @@ def _handle_set_goal_command(user_id: int, amount: str, data_manager: Production
     """Käsittele /setgoal komento"""
     try:
         goal_amount = float(amount)
-        data = data_manager.get_user_data()
-        
-        if str(user_id) not in data:
-            data[str(user_id)] = {}
-        
-        data[str(user_id)]['savings_goal'] = goal_amount
-        data_manager.save_user_data(data)
+        user_data = data_manager.get_user(str(user_id)) or {}
+        user_data['savings_goal'] = goal_amount
+        data_manager.save_user(str(user_id), user_data)
         
         return f"✅ Säästötavoite asetettu: {goal_amount}€\n\nKäytä /cycle nähdäksesi 7-viikon suunnitelman!"
     except ValueError:
@@ -3390,13 +3816,9 @@ def _handle_income_command(user_id: int, amount: str, data_manager: ProductionDa
     """Käsittele /income komento"""
     try:
         income_amount = float(amount)
-        data = data_manager.get_user_data()
-        
-        if str(user_id) not in data:
-            data[str(user_id)] = {}
-        
-        data[str(user_id)]['monthly_income'] = income_amount
-        data_manager.save_user_data(data)
+        user_data = data_manager.get_user(str(user_id)) or {}
+        user_data['monthly_income'] = income_amount
+        data_manager.save_user(str(user_id), user_data)
         
         return f"✅ Kuukausitulot päivitetty: {income_amount}€"
     except ValueError:
@@ -3408,13 +3830,9 @@ def _handle_expenses_command(user_id: int, amount: str, data_manager: Production
     """Käsittele /expenses komento"""
     try:
         expenses_amount = float(amount)
-        data = data_manager.get_user_data()
-        
-        if str(user_id) not in data:
-            data[str(user_id)] = {}
-        
-        data[str(user_id)]['monthly_expenses'] = expenses_amount
-        data_manager.save_user_data(data)
+        user_data = data_manager.get_user(str(user_id)) or {}
+        user_data['monthly_expenses'] = expenses_amount
+        data_manager.save_user(str(user_id), user_data)
         
         return f"✅ Kuukausimenot päivitetty: {expenses_amount}€"
     except ValueError:
@@ -3425,8 +3843,7 @@ def _handle_expenses_command(user_id: int, amount: str, data_manager: Production
 def _handle_cycle_command(user_id: int, data_manager: ProductionDataManager) -> str:
     """Käsittele /cycle komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data.get('current_cycle'):
             return "❌ Ei aktiivista sykliä. Käytä /newcycle aloittaaksesi."
@@ -3445,13 +3862,10 @@ def _handle_cycle_command(user_id: int, data_manager: ProductionDataManager) ->
 def _handle_new_cycle_command(user_id: int, data_manager: ProductionDataManager) -> str:
     """Käsittele /newcycle komento"""
     try:
-        data = data_manager.get_user_data()
-        
-        if str(user_id) not in data:
-            data[str(user_id)] = {}
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         # Aloita uusi 7-viikon sykli
-        data[str(user_id)].update({
+        user_data.update({
             'current_cycle': True,
             'current_week': 1,
             'weekly_target': 300,
@@ -3460,7 +3874,7 @@ def _handle_new_cycle_command(user_id: int, data_manager: ProductionDataManager)
             'cycle_start_date': datetime.now().isoformat()
         })
         
-        data_manager.save_user_data(data)
+        data_manager.save_user(str(user_id), user_data)
         
         return (
             "🎉 UUSI 7-VIIKON SYKLI ALOITETTU!\n\n"
@@ -3475,8 +3889,7 @@ def _handle_new_cycle_command(user_id: int, data_manager: ProductionDataManager)
 def _handle_week_command(user_id: int, data_manager: ProductionDataManager) -> str:
     """Käsittele /week komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data.get('current_cycle'):
             return "❌ Ei aktiivista sykliä. Käytä /newcycle aloittaaksesi."
@@ -3525,8 +3938,7 @@ def _handle_analysis_command(user_id: int, data_manager: ProductionDataManager,
 def _handle_report_command(user_id: int, data_manager: ProductionDataManager, notifier: TelegramNotifier) -> str:
     """Käsittele /report komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Ei dataa raporttia varten. Käytä /onboarding aloittaaksesi."
@@ -3546,8 +3958,7 @@ def _handle_report_command(user_id: int, data_manager: ProductionDataManager, no
 def _handle_risk_command(user_id: int, data_manager: ProductionDataManager, notifier: TelegramNotifier) -> str:
     """Käsittele /risk komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Ei dataa riskianalyysia varten."
@@ -3579,8 +3990,7 @@ def _handle_risk_command(user_id: int, data_manager: ProductionDataManager, noti
 def _handle_watchdog_command(user_id: int, data_manager: ProductionDataManager, notifier: TelegramNotifier) -> str:
     """Käsittele /watchdog komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Ei dataa Watchdog-tarkistusta varten."
@@ -3607,8 +4017,7 @@ def _handle_watchdog_command(user_id: int, data_manager: ProductionDataManager,
 def _handle_motivate_command(user_id: int, data_manager: ProductionDataManager, notifier: TelegramNotifier) -> str:
     """Käsittele /motivate komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Ei profiilia motivaatiota varten. Käytä /onboarding aloittaaksesi."
@@ -3632,8 +4041,7 @@ def _handle_motivate_command(user_id: int, data_manager: ProductionDataManager,
 def _handle_progress_command(user_id: int, data_manager: ProductionDataManager, notifier: TelegramNotifier) -> str:
     """Käsittele /progress komento"""
     try:
-        data = data_manager.get_user_data()
-        user_data = data.get(str(user_id), {})
+        user_data = data_manager.get_user(str(user_id)) or {}
         
         if not user_data:
             return "❌ Ei dataa edistymisen tarkistusta varten."
@@ -3808,66 +4216,329 @@ def trigger_milestone_check():
         return {"status": "error", "message": str(e)}
 
 # --- PRODUCTION ANALYTICS & MONITORING ---
+class ResponseTimeHistogram:
+    """
+    Fixed-size HDR-style latency histogram.
+    
+    Values are bucketed on a log scale (each bucket is `precision` wider than
+    the previous one), so memory is bounded by the value range rather than the
+    number of samples and percentiles stay within ~precision relative error.
+    """
+    
+    MIN_VALUE = 0.001  # seconds
+    
+    def __init__(self, precision: float = 0.02):
+        self.precision = precision
+        self._log_base = np.log1p(precision)
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def record(self, value: float, count: int = 1):
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.max = max(self.max, value)
+    
+    def merge(self, other: "ResponseTimeHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+    
+    def percentile(self, p: float) -> float:
+        """Approximate p-th percentile (0-100), 0.0 when empty"""
+        if not self.total:
+            return 0.0
+        rank = max(1, int(np.ceil(self.total * p / 100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+    
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+    
+    def _index(self, value: float) -> int:
+        if value <= self.MIN_VALUE:
+            return 0
+        return int(np.ceil(np.log(value / self.MIN_VALUE) / self._log_base))
+    
+    def _value(self, index: int) -> float:
+        return self.MIN_VALUE * float(np.exp(index * self._log_base))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "total": self.total,
+            "sum": self.sum,
+            "max": self.max
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ResponseTimeHistogram":
+        histogram = cls(data.get("precision", 0.02))
+        histogram.counts = {int(index): count for index, count in data.get("counts", {}).items()}
+        histogram.total = data.get("total", 0)
+        histogram.sum = data.get("sum", 0.0)
+        histogram.max = data.get("max", 0.0)
+        return histogram
+
+class RollingHistogram:
+    """Response time histogram over a sliding window, kept as a ring of per-slot histograms"""
+    
+    def __init__(self, window_seconds: int = 3600, slot_seconds: int = 60):
+        self.slot_seconds = slot_seconds
+        self.slots = window_seconds // slot_seconds
+        self._ring: List[Optional[ResponseTimeHistogram]] = [None] * self.slots
+        self._ring_epochs = [-1] * self.slots
+    
+    def record(self, value: float):
+        epoch = int(time.time()) // self.slot_seconds
+        position = epoch % self.slots
+        if self._ring_epochs[position] != epoch:
+            self._ring[position] = ResponseTimeHistogram()
+            self._ring_epochs[position] = epoch
+        self._ring[position].record(value)
+    
+    def snapshot(self) -> ResponseTimeHistogram:
+        """Merge the live slots of the window into one histogram"""
+        oldest = int(time.time()) // self.slot_seconds - self.slots + 1
+        merged = ResponseTimeHistogram()
+        for histogram, epoch in zip(self._ring, self._ring_epochs):
+            if histogram is not None and epoch >= oldest:
+                merged.merge(histogram)
+        return merged
+
+class HyperLogLog:
+    """HyperLogLog distinct counter (2^p registers, ~1.04/sqrt(2^p) standard error)"""
+    
+    def __init__(self, p: int = 12, registers: bytes = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers else bytearray(self.m)
+    
+    def add(self, item: str):
+        x = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(np.maximum(np.frombuffer(self.registers, dtype=np.uint8),
+                                              np.frombuffer(other.registers, dtype=np.uint8)).tobytes())
+    
+    def count(self) -> int:
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.power(2.0, -registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+    
+    def to_base64(self) -> str:
+        return base64.b64encode(bytes(self.registers)).decode()
+    
+    @classmethod
+    def from_base64(cls, data: str, p: int = 12) -> "HyperLogLog":
+        return cls(p, base64.b64decode(data))
+
 class SentinelAnalytics:
-    """Production analytics and monitoring for Sentinel 100K"""
+    """
+    Production analytics and monitoring for Sentinel 100K.
+    
+    Raw events are appended to daily segment files (data/analytics_events/
+    YYYY-MM-DD.jsonl, pruned after ANALYTICS_RETENTION_DAYS). data/analytics.json
+    only holds fixed-size rollups - counters, a response time histogram,
+    per-day HyperLogLog active-user sketches and per-user totals - which the
+    summary reads directly, so it answers in constant time.
+    """
     
     def __init__(self):
         self.analytics_file = Path("data/analytics.json")
         self.analytics_file.parent.mkdir(exist_ok=True)
+        self.events_dir = Path("data/analytics_events")
+        self.events_dir.mkdir(parents=True, exist_ok=True)
+        self.retention_days = int(os.getenv("ANALYTICS_RETENTION_DAYS", 90))
+        self.save_interval = float(os.getenv("ANALYTICS_SAVE_INTERVAL", 5))  # seconds between rollup saves
+        
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # orders rollup file writes
+        self._segment_day = None
+        self._segment = None
+        self._last_save = 0.0
+        
+        # Recent raw messages for in-process consumers (AI learning patterns)
+        self.recent_messages = deque(maxlen=1000)
+        self.recent_response_times = RollingHistogram(window_seconds=3600)
+        self.active_days_kept = 7
         self.load_analytics()
         
         # Real-time counters
         self.message_counter = 0
         self.user_counter = 0
-        self.response_times = []
         self.error_counter = 0
         self.ai_usage_counter = 0
-        
+    
+    def _empty_data(self) -> Dict[str, Any]:
+        return {
+            "users": {},
+            "counters": {"messages": 0, "ai_messages": 0, "errors": 0},
+            "response_time_histogram": ResponseTimeHistogram().to_dict(),
+            "active_users_hll": {},
+            "features": {
+                "dashboard_usage": 0,
+                "notifications_sent": 0,
+                "milestones_celebrated": 0,
+                "watchdog_alerts": 0
+            },
+            "system_health": {
+                "uptime": 0,
+                "last_restart": datetime.now().isoformat(),
+                "total_requests": 0
+            },
+            "errors": []
+        }
+    
     def load_analytics(self):
-        """Load analytics data"""
+        """Load analytics rollups (migrating the legacy whole-history format)"""
+        self.data = self._empty_data()
         try:
             if self.analytics_file.exists():
                 with open(self.analytics_file, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-            else:
-                self.data = {
-                    "users": {},
-                    "messages": [],
-                    "performance": {
-                        "response_times": [],
-                        "error_rates": [],
-                        "ai_usage": []
-                    },
-                    "features": {
-                        "dashboard_usage": 0,
-                        "notifications_sent": 0,
-                        "milestones_celebrated": 0,
-                        "watchdog_alerts": 0
-                    },
-                    "system_health": {
-                        "uptime": 0,
-                        "last_restart": datetime.now().isoformat(),
-                        "total_requests": 0
-                    }
-                }
+                    stored = json.load(f)
+                self.data.update({key: value for key, value in stored.items() if key in self.data})
+                self.histogram = ResponseTimeHistogram.from_dict(self.data["response_time_histogram"])
+                self.active_users = {day: HyperLogLog.from_base64(registers)
+                                     for day, registers in self.data["active_users_hll"].items()}
+                if "messages" in stored or "performance" in stored:
+                    self._migrate_legacy(stored)
+                return
         except Exception as e:
             print(f"❌ Analytics load error: {e}")
-            self.data = {"users": {}, "messages": [], "performance": {}, "features": {}, "system_health": {}}
+        self.histogram = ResponseTimeHistogram.from_dict(self.data["response_time_histogram"])
+        self.active_users = {}
+    
+    def _migrate_legacy(self, stored: Dict[str, Any]):
+        """Move the unbounded message list into segment files and fold it into rollups"""
+        messages = stored.get("messages", [])
+        histogram = ResponseTimeHistogram()
+        by_day = defaultdict(list)
+        for message in messages:
+            by_day[message.get("timestamp", "")[:10] or date.today().isoformat()].append(message)
+            histogram.record(message.get("response_time", 0))
+        for day, day_messages in by_day.items():
+            with open(self.events_dir / f"{day}.jsonl", 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps({"type": "message", **m}, ensure_ascii=False) + "\n" for m in day_messages))
+        
+        self.data["counters"]["messages"] = len(messages)
+        self.data["counters"]["ai_messages"] = sum(1 for m in messages if m.get("ai_used"))
+        self.data["counters"]["errors"] = len(stored.get("errors", []))
+        self.histogram = histogram
+        for message in messages:
+            self._mark_active(str(message.get("user_id")), message.get("timestamp", "")[:10])
+        self.recent_messages.extend(messages[-self.recent_messages.maxlen:])
+        print(f"📦 Migrated {len(messages)} analytics messages to {self.events_dir}")
+        self.save_analytics()
     
     def save_analytics(self):
-        """Save analytics data"""
+        """Save analytics rollups"""
+        with self._save_lock:
+            self._write_rollups()
+    
+    def _write_rollups(self):
+        """Snapshot the rollups and atomically replace the file (caller holds _save_lock)"""
         try:
-            with open(self.analytics_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                self.data["response_time_histogram"] = self.histogram.to_dict()
+                self.data["active_users_hll"] = {day: hll.to_base64() for day, hll in self.active_users.items()}
+                payload = json.dumps(self.data, ensure_ascii=False)
+                self._last_save = time.monotonic()
+                if self._segment:
+                    self._segment.flush()
+            fd, tmp_path = tempfile.mkstemp(dir=self.analytics_file.parent, prefix=".analytics.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.analytics_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
         except Exception as e:
             print(f"❌ Analytics save error: {e}")
     
+    def _mark_active(self, user_id: str, day: str):
+        """Add a user to the day's active-user sketch, keeping only the last few days"""
+        if not day:
+            return
+        if day not in self.active_users:
+            self.active_users[day] = HyperLogLog()
+            for old_day in sorted(self.active_users)[:-self.active_days_kept]:
+                del self.active_users[old_day]
+        if day in self.active_users:
+            self.active_users[day].add(user_id)
+    
+    def _count_active(self, days: int) -> int:
+        """Distinct users active in the last `days` daily segments, today included"""
+        merged = HyperLogLog()
+        for offset in range(days):
+            day_sketch = self.active_users.get((date.today() - timedelta(days=offset)).isoformat())
+            if day_sketch:
+                merged.merge(day_sketch)
+        return merged.count()
+    
+    def _maybe_save(self):
+        if time.monotonic() - self._last_save < self.save_interval:
+            return
+        # Skip if another thread is already saving; it writes a fresh snapshot
+        if self._save_lock.acquire(blocking=False):
+            try:
+                self._write_rollups()
+            finally:
+                self._save_lock.release()
+    
+    def _append_event(self, event: Dict[str, Any]):
+        """Append a raw event to today's segment file (caller holds the lock)"""
+        today = date.today().isoformat()
+        if today != self._segment_day:
+            if self._segment:
+                self._segment.close()
+            self._segment = open(self.events_dir / f"{today}.jsonl", 'a', encoding='utf-8')
+            self._segment_day = today
+            self._prune_segments()
+        self._segment.write(json.dumps(event, ensure_ascii=False) + "\n")
+    
+    def _prune_segments(self):
+        cutoff = (date.today() - timedelta(days=self.retention_days)).isoformat()
+        for segment in self.events_dir.glob("*.jsonl"):
+            if segment.stem < cutoff:
+                segment.unlink(missing_ok=True)
+    
+    def read_events(self, day: str) -> List[Dict[str, Any]]:
+        """Read the raw events of one day (YYYY-MM-DD)"""
+        segment = self.events_dir / f"{day}.jsonl"
+        if not segment.exists():
+            return []
+        with self._lock:
+            if self._segment:
+                self._segment.flush()
+        with open(segment, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
     def track_message(self, user_id: int, username: str, message: str, response_time: float, ai_used: bool = True):
         """Track user message and response"""
-        self.message_counter += 1
-        
+        now = datetime.now().isoformat()
         message_data = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now,
             "user_id": user_id,
             "username": username,
             "message": message[:100],  # Truncate for privacy
@@ -3876,87 +4547,89 @@ class SentinelAnalytics:
             "message_length": len(message)
         }
         
-        self.data["messages"].append(message_data)
-        
-        # Track user
-        if str(user_id) not in self.data["users"]:
-            self.data["users"][str(user_id)] = {
-                "username": username,
-                "first_seen": datetime.now().isoformat(),
-                "message_count": 0,
-                "last_active": datetime.now().isoformat(),
-                "total_response_time": 0,
-                "ai_usage_count": 0
-            }
-            self.user_counter += 1
-        
-        user_data = self.data["users"][str(user_id)]
-        user_data["message_count"] += 1
-        user_data["last_active"] = datetime.now().isoformat()
-        user_data["total_response_time"] += response_time
-        if ai_used:
-            user_data["ai_usage_count"] += 1
-            self.ai_usage_counter += 1
-        
-        # Track performance
-        self.response_times.append(response_time)
-        self.data["performance"]["response_times"].append(response_time)
-        
-        # Keep only last 1000 entries for performance
-        if len(self.data["performance"]["response_times"]) > 1000:
-            self.data["performance"]["response_times"] = self.data["performance"]["response_times"][-1000:]
+        with self._lock:
+            self.message_counter += 1
+            self._append_event({"type": "message", **message_data})
+            self.recent_messages.append(message_data)
+            
+            # Track user
+            if str(user_id) not in self.data["users"]:
+                self.data["users"][str(user_id)] = {
+                    "username": username,
+                    "first_seen": now,
+                    "message_count": 0,
+                    "last_active": now,
+                    "total_response_time": 0,
+                    "ai_usage_count": 0
+                }
+                self.user_counter += 1
+            
+            user_data = self.data["users"][str(user_id)]
+            user_data["message_count"] += 1
+            user_data["last_active"] = now
+            user_data["total_response_time"] += response_time
+            
+            counters = self.data["counters"]
+            counters["messages"] += 1
+            if ai_used:
+                user_data["ai_usage_count"] += 1
+                counters["ai_messages"] += 1
+                self.ai_usage_counter += 1
+            
+            # Track performance and activity
+            self.histogram.record(response_time)
+            self.recent_response_times.record(response_time)
+            self._mark_active(str(user_id), now[:10])
         
-        self.save_analytics()
+        self._maybe_save()
     
     def track_error(self, error_type: str, error_message: str):
         """Track system errors"""
-        self.error_counter += 1
-        
         error_data = {
             "timestamp": datetime.now().isoformat(),
             "type": error_type,
             "message": error_message
         }
         
-        if "errors" not in self.data:
-            self.data["errors"] = []
-        
-        self.data["errors"].append(error_data)
-        
-        # Keep only last 100 errors
-        if len(self.data["errors"]) > 100:
-            self.data["errors"] = self.data["errors"][-100:]
+        with self._lock:
+            self.error_counter += 1
+            self.data["counters"]["errors"] += 1
+            self._append_event({**error_data, "type": "error", "error_type": error_type})
+            self.data["errors"].append(error_data)
+            
+            # Keep only last 100 errors
+            if len(self.data["errors"]) > 100:
+                self.data["errors"] = self.data["errors"][-100:]
         
-        self.save_analytics()
+        self._maybe_save()
     
-    def track_feature_usage(self, feature: str):
+    def track_request(self):
+        """Count an incoming request (called from the Telegram worker threads)"""
+        with self._lock:
+            self.data["system_health"]["total_requests"] += 1
+    
+    def track_feature_usage(self, feature: str, count: int = 1):
         """Track feature usage"""
-        if feature in self.data["features"]:
-            self.data["features"][feature] += 1
-        else:
-            self.data["features"][feature] = 1
-        self.save_analytics()
+        with self._lock:
+            self.data["features"][feature] = self.data["features"].get(feature, 0) + count
+        self._maybe_save()
     
     def get_analytics_summary(self) -> Dict[str, Any]:
         """Get analytics summary"""
-        total_users = len(self.data["users"])
-        total_messages = len(self.data["messages"])
-        
-        avg_response_time = 0
-        if self.data["performance"]["response_times"]:
-            avg_response_time = statistics.mean(self.data["performance"]["response_times"])
-        
-        # Calculate user engagement
-        active_users_24h = 0
-        active_users_7d = 0
-        now = datetime.now()
-        
-        for user_data in self.data["users"].values():
-            last_active = datetime.fromisoformat(user_data["last_active"])
-            if (now - last_active).days <= 1:
-                active_users_24h += 1
-            if (now - last_active).days <= 7:
-                active_users_7d += 1
+        with self._lock:
+            total_users = len(self.data["users"])
+            counters = dict(self.data["counters"])
+            features = dict(self.data["features"])
+            uptime = self.data["system_health"]["uptime"]
+            
+            # User engagement from the per-day sketches (day granularity: 24h is today's
+            # segment, 7d is today and the six days before)
+            active_users_24h = self._count_active(1)
+            active_users_7d = self._count_active(7)
+            last_hour = self.recent_response_times.snapshot()
+            avg_response_time = self.histogram.mean()
+            p50, p95, p99 = (self.histogram.percentile(p) for p in (50, 95, 99))
+        total_messages = counters["messages"]
         
         return {
             "total_users": total_users,
@@ -3964,74 +4637,226 @@ class SentinelAnalytics:
             "active_users_24h": active_users_24h,
             "active_users_7d": active_users_7d,
             "avg_response_time": round(avg_response_time, 3),
-            "error_rate": len(self.data.get("errors", [])) / max(total_messages, 1),
-            "ai_usage_rate": self.ai_usage_counter / max(total_messages, 1),
-            "features": self.data["features"],
-            "system_uptime": self.data["system_health"]["uptime"]
+            "response_time_p50": round(p50, 3),
+            "response_time_p95": round(p95, 3),
+            "response_time_p99": round(p99, 3),
+            "response_time_last_hour": {
+                "count": last_hour.total,
+                "p50": round(last_hour.percentile(50), 3),
+                "p95": round(last_hour.percentile(95), 3),
+                "p99": round(last_hour.percentile(99), 3)
+            },
+            "error_rate": counters["errors"] / max(total_messages, 1),
+            "ai_usage_rate": counters["ai_messages"] / max(total_messages, 1),
+            "features": features,
+            "system_uptime": uptime
         }
 
 # Initialize analytics
 analytics = SentinelAnalytics()
 
 # --- MASS NOTIFICATION SYSTEM ---
+class AsyncTokenBucket:
+    """Token bucket for async senders: `rate` tokens per second, bursts up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. after a 429 retry_after)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
 class MassNotificationManager:
-    """Mass notification system for production scalability"""
+    """
+    Rate-limit-aware mass notification sender.
+    
+    Messages go out concurrently over a pooled HTTP session, throttled by a
+    global token bucket and a per-chat interval, and 429 responses pause the
+    sender for the returned retry_after. Progress is appended to a checkpoint
+    file so an interrupted broadcast can be resumed with the same broadcast_id;
+    a resumed run skips users that were sent to and retries the failed ones.
+    """
+    
+    BROADCAST_ID_PATTERN = re.compile(r"[\w-]{1,64}")
     
     def __init__(self):
         self.notification_manager = notification_manager
-        self.batch_size = 50  # Send in batches to avoid rate limits
-        self.delay_between_batches = 2  # seconds
-    
-    def send_mass_notification(self, notification_type: str, custom_message: str = None) -> Dict[str, Any]:
-        """Send mass notification to all users"""
-        users = self.notification_manager.get_all_telegram_users()
+        self.api_base = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+        self.global_rate = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))  # messages/second, all chats
+        self.per_chat_interval = float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", 1.0))  # seconds, one chat
+        self.concurrency = int(os.getenv("TELEGRAM_BROADCAST_CONCURRENCY", 20))
+        self.max_retries = 3
+        self.checkpoint_every = 200
+        self.max_reported_errors = 100
+        self.checkpoint_dir = Path("data/broadcasts")
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    
+    def send_mass_notification(self, notification_type: str, custom_message: str = None,
+                               broadcast_id: str = None, users: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Send mass notification to all users (resumes `broadcast_id` if given).
+        
+        Raises ValueError if `broadcast_id` is not 1-64 letters, digits, '_' or '-'.
+        """
+        if broadcast_id is not None and not self.BROADCAST_ID_PATTERN.fullmatch(broadcast_id):
+            raise ValueError("broadcast_id must be 1-64 letters, digits, '_' or '-'")
+        users = users if users is not None else self.notification_manager.get_all_telegram_users()
+        broadcast_id = broadcast_id or f"{notification_type}_{int(time.time())}"
+        
         results = {
+            "broadcast_id": broadcast_id,
             "total_users": len(users),
             "successful": 0,
             "failed": 0,
-            "errors": []
+            "skipped_already_sent": 0,
+            "errors": [],
+            "retries_429": 0
         }
         
-        print(f"📢 Sending mass {notification_type} notification to {len(users)} users...")
-        
-        for i, user in enumerate(users):
-            try:
-                success = False
-                
-                if notification_type == "daily_reminder":
-                    success = self.notification_manager.send_daily_reminder(user)
-                elif notification_type == "weekly_summary":
-                    success = self.notification_manager.send_weekly_summary(user)
-                elif notification_type == "custom_message" and custom_message:
-                    success = self.notification_manager.send_telegram_message(
-                        user["telegram_id"], 
-                        f"📢 <b>Sentinel 100K ilmoitus:</b>\n\n{custom_message}"
-                    )
-                elif notification_type == "system_update":
-                    success = self.notification_manager.send_telegram_message(
-                        user["telegram_id"],
-                        "🔄 <b>Sentinel 100K päivitys</b>\n\nJärjestelmä on päivitetty uusilla ominaisuuksilla! Kysy mitä tahansa talousasioista - olen täällä auttamassa! 💪"
-                    )
-                
-                if success:
-                    results["successful"] += 1
-                    analytics.track_feature_usage(f"mass_notification_{notification_type}")
-                else:
-                    results["failed"] += 1
-                    results["errors"].append(f"Failed to send to {user['email']}")
-                
-                # Batch processing
-                if (i + 1) % self.batch_size == 0:
-                    print(f"📦 Processed batch {(i + 1) // self.batch_size}")
-                    time.sleep(self.delay_between_batches)
-                
-            except Exception as e:
-                results["failed"] += 1
-                results["errors"].append(f"Error sending to {user['email']}: {str(e)}")
-                analytics.track_error("mass_notification", str(e))
-        
-        print(f"✅ Mass notification completed: {results['successful']} successful, {results['failed']} failed")
+        token = os.getenv("TELEGRAM_BOT_TOKEN")
+        if not token:
+            print("⚠️ TELEGRAM_BOT_TOKEN not found in environment variables")
+            analytics.track_error("telegram_token", "Token not configured")
+            results["errors"].append("TELEGRAM_BOT_TOKEN not configured")
+            return results
+        
+        checkpoint_file = self.checkpoint_dir / f"{broadcast_id}.jsonl"
+        completed = self._load_checkpoint(checkpoint_file)
+        pending = [user for user in users if not completed.get(user["telegram_id"])]
+        results["successful"] = results["skipped_already_sent"] = len(users) - len(pending)
+        
+        print(f"📢 Sending mass {notification_type} notification to {len(pending)}/{len(users)} users...")
+        started = time.perf_counter()
+        asyncio.run(self._broadcast(pending, notification_type, custom_message, token, checkpoint_file, results))
+        elapsed = time.perf_counter() - started
+        
+        sent_now = len(pending)
+        results["elapsed_seconds"] = round(elapsed, 3)
+        results["messages_per_second"] = round(sent_now / elapsed, 2) if elapsed > 0 else 0.0
+        if results["successful"]:
+            analytics.track_feature_usage(f"mass_notification_{notification_type}", count=results["successful"])
+        
+        print(f"✅ Mass notification completed: {results['successful']} successful, {results['failed']} failed, "
+              f"{results['messages_per_second']} msg/s")
         return results
+    
+    def _build_message(self, notification_type: str, custom_message: Optional[str], user: Dict[str, Any]) -> Optional[str]:
+        if notification_type == "daily_reminder":
+            return self.notification_manager.build_daily_reminder(user)
+        elif notification_type == "weekly_summary":
+            return self.notification_manager.build_weekly_summary(user)
+        elif notification_type == "custom_message" and custom_message:
+            return f"📢 <b>Sentinel 100K ilmoitus:</b>\n\n{custom_message}"
+        elif notification_type == "system_update":
+            return "🔄 <b>Sentinel 100K päivitys</b>\n\nJärjestelmä on päivitetty uusilla ominaisuuksilla! Kysy mitä tahansa talousasioista - olen täällä auttamassa! 💪"
+        return None
+    
+    async def _broadcast(self, users: List[Dict[str, Any]], notification_type: str, custom_message: Optional[str],
+                         token: str, checkpoint_file: Path, results: Dict[str, Any]):
+        url = f"{self.api_base}/bot{token}/sendMessage"
+        bucket = AsyncTokenBucket(self.global_rate)
+        chat_next_send: Dict[int, float] = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        for user in users:
+            queue.put_nowait(user)
+        progress: List[Dict[str, Any]] = []
+        
+        def record(user: Dict[str, Any], ok: bool, error: str = None):
+            results["successful" if ok else "failed"] += 1
+            if error and len(results["errors"]) < self.max_reported_errors:
+                results["errors"].append(f"{error} ({user['email']})")
+            progress.append({"telegram_id": user["telegram_id"], "ok": ok})
+            if len(progress) >= self.checkpoint_every:
+                self._append_checkpoint(checkpoint_file, progress)
+        
+        async def send(session: aiohttp.ClientSession, user: Dict[str, Any], text: str) -> Optional[str]:
+            chat_id = user["telegram_id"]
+            for attempt in range(self.max_retries + 1):
+                wait = chat_next_send.get(chat_id, 0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await bucket.acquire()
+                chat_next_send[chat_id] = time.monotonic() + self.per_chat_interval
+                try:
+                    async with session.post(url, json={"chat_id": chat_id, "text": text, "parse_mode": "HTML"}) as response:
+                        if response.status == 200:
+                            return None
+                        if response.status == 429:
+                            body = await response.json(content_type=None)
+                            retry_after = float(body.get("parameters", {}).get("retry_after", 1))
+                            results["retries_429"] += 1
+                            bucket.pause(retry_after)
+                            continue
+                        if response.status < 500:
+                            return f"Failed to send: HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.max_retries:
+                        return f"Error sending: {e}"
+                await asyncio.sleep(2 ** attempt)
+            return "Failed to send: retries exhausted"
+        
+        async def worker(session: aiohttp.ClientSession):
+            while True:
+                try:
+                    user = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    text = await asyncio.to_thread(self._build_message, notification_type, custom_message, user)
+                    if text is None:
+                        record(user, False, "No message for notification type")
+                        continue
+                    error = await send(session, user, text)
+                    record(user, error is None, error)
+                except Exception as e:
+                    record(user, False, f"Error sending: {str(e)}")
+                    analytics.track_error("mass_notification", str(e))
+        
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+            await asyncio.gather(*(worker(session) for _ in range(min(self.concurrency, len(users)) or 1)))
+        self._append_checkpoint(checkpoint_file, progress)
+    
+    def _append_checkpoint(self, checkpoint_file: Path, progress: List[Dict[str, Any]]):
+        """Append completed sends to the checkpoint log and clear the buffer"""
+        if not progress:
+            return
+        try:
+            with open(checkpoint_file, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in progress))
+        except Exception as e:
+            print(f"❌ Broadcast checkpoint error: {e}")
+        progress.clear()
+    
+    def _load_checkpoint(self, checkpoint_file: Path) -> Dict[int, bool]:
+        """Load {telegram_id: ok} for sends already attempted in this broadcast (latest outcome wins)"""
+        completed = {}
+        if checkpoint_file.exists():
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        completed[entry["telegram_id"]] = entry["ok"]
+        return completed
 
 # Initialize mass notification manager
 mass_notification_manager = MassNotificationManager()
@@ -4043,6 +4868,12 @@ class AILearningEngine:
     def __init__(self):
         self.learning_data_file = Path("data/ai_learning.json")
         self.learning_data_file.parent.mkdir(exist_ok=True)
+        self.save_interval = float(os.getenv("AI_LEARNING_SAVE_INTERVAL", 5))  # seconds between file saves
+        
+        # Telegram workers track preferences concurrently
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()  # orders learning file writes
+        self._last_save = 0.0
         self.load_learning_data()
     
     def load_learning_data(self):
@@ -4064,40 +4895,66 @@ class AILearningEngine:
     
     def save_learning_data(self):
         """Save AI learning data"""
+        with self._save_lock:
+            self._write_learning_data()
+    
+    def _write_learning_data(self):
+        """Snapshot the data and atomically replace the file (caller holds _save_lock)"""
         try:
-            with open(self.learning_data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                payload = json.dumps(self.data, ensure_ascii=False, indent=2)
+                self._last_save = time.monotonic()
+            fd, tmp_path = tempfile.mkstemp(dir=self.learning_data_file.parent, prefix=".ai_learning.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.learning_data_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
         except Exception as e:
             print(f"❌ AI learning save error: {e}")
     
+    def _maybe_save(self):
+        if time.monotonic() - self._last_save < self.save_interval:
+            return
+        # Skip if another thread is already saving; it writes a fresh snapshot
+        if self._save_lock.acquire(blocking=False):
+            try:
+                self._write_learning_data()
+            finally:
+                self._save_lock.release()
+    
     def track_user_preference(self, user_id: int, message_type: str, response_quality: int):
         """Track user preferences and response quality"""
         user_id_str = str(user_id)
         
-        if user_id_str not in self.data["user_preferences"]:
-            self.data["user_preferences"][user_id_str] = {
-                "preferred_topics": [],
-                "response_ratings": [],
-                "interaction_count": 0
-            }
-        
-        user_prefs = self.data["user_preferences"][user_id_str]
-        user_prefs["interaction_count"] += 1
-        
-        if message_type not in user_prefs["preferred_topics"]:
-            user_prefs["preferred_topics"].append(message_type)
-        
-        user_prefs["response_ratings"].append({
-            "timestamp": datetime.now().isoformat(),
-            "message_type": message_type,
-            "rating": response_quality
-        })
-        
-        # Keep only last 50 ratings per user
-        if len(user_prefs["response_ratings"]) > 50:
-            user_prefs["response_ratings"] = user_prefs["response_ratings"][-50:]
+        with self._lock:
+            if user_id_str not in self.data["user_preferences"]:
+                self.data["user_preferences"][user_id_str] = {
+                    "preferred_topics": [],
+                    "response_ratings": [],
+                    "interaction_count": 0
+                }
+            
+            user_prefs = self.data["user_preferences"][user_id_str]
+            user_prefs["interaction_count"] += 1
+            
+            if message_type not in user_prefs["preferred_topics"]:
+                user_prefs["preferred_topics"].append(message_type)
+            
+            user_prefs["response_ratings"].append({
+                "timestamp": datetime.now().isoformat(),
+                "message_type": message_type,
+                "rating": response_quality
+            })
+            
+            # Keep only last 50 ratings per user
+            if len(user_prefs["response_ratings"]) > 50:
+                user_prefs["response_ratings"] = user_prefs["response_ratings"][-50:]
         
-        self.save_learning_data()
+        # Batched: at most one file rewrite per save_interval
+        self._maybe_save()
     
     def analyze_response_patterns(self) -> Dict[str, Any]:
         """Analyze response patterns for optimization"""
@@ -4109,8 +4966,10 @@ class AILearningEngine:
         }
         
         # Analyze message patterns from analytics
-        if hasattr(analytics, 'data') and 'messages' in analytics.data:
-            messages = analytics.data['messages']
+        if hasattr(analytics, 'recent_messages'):
+            # Snapshot under the lock: Telegram workers append concurrently
+            with analytics._lock:
+                messages = list(analytics.recent_messages)
             
             # Most common question types
             question_types = []
@@ -4132,11 +4991,12 @@ class AILearningEngine:
                 patterns["most_common_questions"] = counter.most_common(5)
         
         # Response quality trends
-        if 'users' in self.data:
-            for user_data in self.data['users'].values():
-                if 'response_ratings' in user_data:
-                    avg_rating = statistics.mean([r['rating'] for r in user_data['response_ratings']])
-                    patterns["response_quality_trends"].append(avg_rating)
+        with self._lock:
+            if 'users' in self.data:
+                for user_data in self.data['users'].values():
+                    if 'response_ratings' in user_data:
+                        avg_rating = statistics.mean([r['rating'] for r in user_data['response_ratings']])
+                        patterns["response_quality_trends"].append(avg_rating)
         
         # Optimization suggestions
         if patterns["response_quality_trends"]:
@@ -1,6 +1,7 @@
 """
 Pytest configuration and fixtures for Sentinel 100K tests.
 """
+import os
 import pytest
 import asyncio
 from typing import Generator, AsyncGenerator
@@ -41,6 +42,17 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest.fixture(scope="session")
+def sentinel(tmp_path_factory):
+    """Import sentinel_render_ready with its data/ side effects kept out of the repo."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("sentinel"))
+    try:
+        import sentinel_render_ready
+    finally:
+        os.chdir(cwd)
+    return sentinel_render_ready
+
 @pytest.fixture(scope="session")
 def engine():
     """Create test database engine."""
@@ -0,0 +1,114 @@
+"""
+Tests for the AIActionBridge action registry and shared event loop.
+"""
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+import backend.ai_action_bridge as bridge_module
+from backend.ai_action_bridge import AIActionBridge
+
+
+@pytest.fixture
+def bridge(monkeypatch):
+    monkeypatch.setattr(bridge_module, "sentinel_integration", None)
+    bridge = AIActionBridge()
+    yield bridge
+    bridge.action_loop.stop()
+
+
+def test_dispatches_registered_handlers(bridge):
+    assert "Tervetuloa" in bridge.execute("u1", "START", {})
+    assert "Virheellinen määrä" in bridge.execute("u1", "SET_GOAL", {})
+
+    bridge.register("PING", lambda user_id, intent, params: f"pong {user_id}")
+    assert bridge.execute("u2", "PING", {}) == "pong u2"
+    assert bridge.get_metrics()["PING"]["count"] == 1
+
+
+def test_one_loop_serves_all_messages(bridge):
+    loops = set()
+
+    async def handler(user_id, intent, params):
+        loops.add(asyncio.get_running_loop())
+        return "ok"
+
+    bridge.register("LOOP", handler)
+    for _ in range(5):
+        bridge.execute("u1", "LOOP", {})
+    assert len(loops) == 1
+
+
+def test_execute_async_from_running_loop(bridge):
+    bridge.register("ASYNC", lambda user_id, intent, params: "ok")
+
+    async def main():
+        return await asyncio.gather(*(bridge.execute_async(str(i), "ASYNC", {}) for i in range(10)))
+
+    assert asyncio.run(main()) == ["ok"] * 10
+
+
+def test_timeout_and_concurrency_limits(bridge):
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(user_id, intent, params):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "done"
+
+    bridge.register("SLOW", slow, timeout=5, concurrency=2)
+    bridge.register("HANG", lambda user_id, intent, params: time.sleep(1), timeout=0.05)
+
+    async def main():
+        return await asyncio.gather(*(bridge.execute_async("u", "SLOW", {}) for _ in range(6)))
+
+    assert asyncio.run(main()) == ["done"] * 6
+    assert peak[0] == 2
+    assert "kesti liian kauan" in bridge.execute("u", "HANG", {})
+    assert bridge.get_metrics()["HANG"]["timeouts"] == 1
+
+
+def test_blocking_sentinel_call_does_not_stall_loop(bridge, monkeypatch):
+    from backend.sentinel_integration_simple import SimpleSentinelIntegration
+    loops = set()
+
+    class Completion:
+        @staticmethod
+        def create(prompt, **kwargs):
+            if "Näytä raportti" in prompt:
+                time.sleep(0.5)  # Slow, blocking OpenAI request
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(text="sentinel reply")])
+
+    sentinel = SimpleSentinelIntegration()
+    process_user_message = sentinel.process_user_message
+
+    async def tracked_process_user_message(user_id, message):
+        loops.add(asyncio.get_running_loop())
+        return await process_user_message(user_id, message)
+
+    sentinel.process_user_message = tracked_process_user_message
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(bridge_module.openai, "Completion", Completion)
+    monkeypatch.setattr(bridge_module, "sentinel_integration", sentinel)
+    bridge.register("REPORT", bridge.handlers["REPORT"].handler, timeout=0.1)
+
+    async def help_after_report():
+        report = asyncio.ensure_future(bridge.execute_async("u1", "REPORT", {}))
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        help_response = await bridge.execute_async("u2", "HELP", {})
+        return help_response, time.perf_counter() - started, await report
+
+    help_response, help_seconds, report_response = asyncio.run(help_after_report())
+    assert help_response == "sentinel reply"
+    assert help_seconds < 0.3
+    assert "kesti liian kauan" in report_response
+    assert loops == {bridge.action_loop.get()}
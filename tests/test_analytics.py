@@ -0,0 +1,139 @@
+"""
+Tests for SentinelAnalytics daily event segments and rollup persistence.
+"""
+import json
+import threading
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def today(sentinel, monkeypatch):
+    """Controllable date.today() for the segment rollover"""
+    current = [date(2025, 3, 10)]
+
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return current[0]
+
+    monkeypatch.setattr(sentinel, "date", FakeDate)
+    return current
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_events_written_to_daily_segments(sentinel, workdir, today):
+    analytics = sentinel.SentinelAnalytics()
+    analytics.track_message(1, "matti", "moi", 0.2)
+    analytics.track_error("telegram_send", "Status: 500")
+    today[0] = date(2025, 3, 11)
+    analytics.track_message(2, "liisa", "hei", 0.4, ai_used=False)
+
+    first_day = analytics.read_events("2025-03-10")
+    assert [event["type"] for event in first_day] == ["message", "error"]
+    assert first_day[0]["user_id"] == 1
+    assert first_day[1]["error_type"] == "telegram_send"
+    assert [event["user_id"] for event in analytics.read_events("2025-03-11")] == [2]
+    assert sorted(path.name for path in analytics.events_dir.iterdir()) == ["2025-03-10.jsonl", "2025-03-11.jsonl"]
+    assert analytics.read_events("2025-03-12") == []
+
+
+def test_segments_pruned_after_retention(sentinel, workdir, today, monkeypatch):
+    monkeypatch.setenv("ANALYTICS_RETENTION_DAYS", "30")
+    analytics = sentinel.SentinelAnalytics()
+    for day in ("2025-01-01", "2025-02-07", "2025-02-08", "2025-03-01"):
+        (analytics.events_dir / f"{day}.jsonl").write_text("{}\n", encoding="utf-8")
+
+    analytics.track_message(1, "matti", "moi", 0.2)
+    assert sorted(path.stem for path in analytics.events_dir.iterdir()) == ["2025-02-08", "2025-03-01", "2025-03-10"]
+
+    today[0] = date(2025, 3, 31)
+    analytics.track_message(1, "matti", "moi", 0.2)
+    assert sorted(path.stem for path in analytics.events_dir.iterdir()) == ["2025-03-01", "2025-03-10", "2025-03-31"]
+
+
+def test_legacy_messages_migrated(sentinel, workdir, today):
+    legacy = {
+        "users": {"1": {"username": "matti", "message_count": 2}},
+        "messages": [
+            {"timestamp": "2025-03-09T10:00:00", "user_id": 1, "message": "a", "response_time": 0.5, "ai_used": True},
+            {"timestamp": "2025-03-10T09:00:00", "user_id": 1, "message": "b", "response_time": 1.5, "ai_used": False},
+            {"timestamp": "2025-03-10T11:00:00", "user_id": 2, "message": "c", "response_time": 1.0, "ai_used": True},
+        ],
+        "performance": {"response_times": [0.5, 1.5, 1.0], "error_rates": [], "ai_usage": []},
+        "features": {"dashboard_usage": 4},
+        "errors": [{"type": "x", "message": "y"}],
+    }
+    (workdir / "data").mkdir()
+    (workdir / "data" / "analytics.json").write_text(json.dumps(legacy), encoding="utf-8")
+
+    analytics = sentinel.SentinelAnalytics()
+    assert [event["message"] for event in analytics.read_events("2025-03-09")] == ["a"]
+    assert [event["message"] for event in analytics.read_events("2025-03-10")] == ["b", "c"]
+    assert analytics.data["counters"] == {"messages": 3, "ai_messages": 2, "errors": 1}
+    assert analytics.data["users"] == legacy["users"]
+    assert analytics.histogram.total == 3
+    assert len(analytics.recent_messages) == 3
+
+    summary = analytics.get_analytics_summary()
+    assert summary["total_messages"] == 3
+    assert summary["active_users_24h"] == 2
+    assert summary["features"]["dashboard_usage"] == 4
+
+    stored = json.loads((workdir / "data" / "analytics.json").read_text(encoding="utf-8"))
+    assert "messages" not in stored and "performance" not in stored
+    assert stored["counters"]["messages"] == 3
+
+    # Reloading the migrated file does not import the messages again
+    reloaded = sentinel.SentinelAnalytics()
+    assert len(reloaded.read_events("2025-03-10")) == 2
+    assert reloaded.data["counters"]["messages"] == 3
+    assert reloaded.histogram.total == 3
+
+
+def test_concurrent_saves_leave_a_valid_file(sentinel, workdir):
+    analytics = sentinel.SentinelAnalytics()
+    analytics.save_interval = 0
+
+    def work(user_id):
+        for i in range(50):
+            analytics.track_message(user_id, f"user{user_id}", "moi", 0.1)
+            if i % 10 == 0:
+                analytics.save_analytics()
+
+    threads = [threading.Thread(target=work, args=(user_id,)) for user_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    analytics.save_analytics()
+
+    stored = json.loads(analytics.analytics_file.read_text(encoding="utf-8"))
+    assert stored["counters"]["messages"] == 400
+    assert [path.name for path in analytics.analytics_file.parent.glob("*.tmp")] == []
+
+
+def test_response_patterns_read_messages_under_lock(sentinel, workdir, monkeypatch):
+    analytics = sentinel.SentinelAnalytics()
+    monkeypatch.setattr(sentinel, "analytics", analytics)
+    analytics.track_message(1, "matti", "miten säästän", 0.1)
+    result = {}
+
+    def analyze():
+        result["patterns"] = sentinel.ai_learning_engine.analyze_response_patterns()
+
+    with analytics._lock:
+        thread = threading.Thread(target=analyze)
+        thread.start()
+        thread.join(timeout=0.2)
+        # A Telegram worker holding the lock mid-append keeps the reader waiting
+        assert thread.is_alive()
+        analytics.recent_messages.append({"message": "näytä tavoite"})
+    thread.join()
+    assert result["patterns"]["most_common_questions"]
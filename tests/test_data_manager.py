@@ -0,0 +1,138 @@
+"""
+Tests for the per-record SQLite store behind ProductionDataManager.
+"""
+import json
+
+import pytest
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def manager(sentinel, workdir):
+    return sentinel.ProductionDataManager()
+
+
+def write_legacy(workdir, name, data):
+    data_dir = workdir / "data"
+    data_dir.mkdir(exist_ok=True)
+    (data_dir / name).write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_per_record_get_save_delete(manager):
+    assert manager.get_user("alice@example.com") is None
+
+    manager.save_user("alice@example.com", {"name": "Alice", "tags": ["säästäjä"]})
+    manager.save_user("bob@example.com", {"name": "Bob"})
+    assert manager.get_user("alice@example.com") == {"name": "Alice", "tags": ["säästäjä"]}
+
+    manager.save_user("alice@example.com", {"name": "Alice", "week": 2})
+    assert manager.get_user("alice@example.com") == {"name": "Alice", "week": 2}
+
+    manager.delete_record(manager.USERS, "alice@example.com")
+    assert manager.get_user("alice@example.com") is None
+    assert manager.get_user_data() == {"bob@example.com": {"name": "Bob"}}
+
+
+def test_stores_are_independent(manager):
+    manager.save_onboarding_profile("onboarding_a@example.com", {"name": "A"})
+    manager.save_cycle("onboarding_a@example.com", {"current_week": 3})
+
+    assert manager.get_cycle("onboarding_a@example.com") == {"current_week": 3}
+    assert manager.get_onboarding_profile("onboarding_a@example.com") == {"name": "A"}
+    assert manager.get_user("onboarding_a@example.com") is None
+
+
+def test_records_persist_across_instances(manager, workdir, sentinel):
+    manager.save_analysis_results({"onboarding_a@example.com": {"score": 1}}, meta={"last_run": "x"})
+    manager._conn.close()
+
+    reopened = sentinel.ProductionDataManager()
+    assert reopened.get_analysis_data() == {
+        "last_run": "x",
+        "results": {"onboarding_a@example.com": {"score": 1}},
+    }
+
+
+def test_legacy_json_imported_once(workdir, sentinel):
+    write_legacy(workdir, "users.json", {"a@example.com": {"name": "A"}})
+    write_legacy(workdir, "cycles.json", {"onboarding_a@example.com": {"current_week": 4}})
+    write_legacy(workdir, "analysis.json", {
+        "last_analysis": "2024-01-01",
+        "results": {"onboarding_a@example.com": {"score": 7}},
+    })
+
+    manager = sentinel.ProductionDataManager()
+    assert manager.get_user("a@example.com") == {"name": "A"}
+    assert manager.get_cycle("onboarding_a@example.com") == {"current_week": 4}
+    assert manager.get_analysis_result("onboarding_a@example.com") == {"score": 7}
+    assert manager.get_analysis_data()["last_analysis"] == "2024-01-01"
+
+    # Later edits to the store are not overwritten by the JSON files on restart
+    manager.delete_record(manager.USERS, "a@example.com")
+    manager.save_cycle("onboarding_a@example.com", {"current_week": 5})
+    manager._conn.close()
+    write_legacy(workdir, "users.json", {"a@example.com": {"name": "A"}, "b@example.com": {"name": "B"}})
+
+    reopened = sentinel.ProductionDataManager()
+    assert reopened.get_user_data() == {}
+    assert reopened.get_cycle("onboarding_a@example.com") == {"current_week": 5}
+
+
+def test_legacy_import_without_files_still_marks_migration(workdir, sentinel):
+    manager = sentinel.ProductionDataManager()
+    manager._conn.close()
+    write_legacy(workdir, "onboarding.json", {"onboarding_a@example.com": {"name": "A"}})
+
+    reopened = sentinel.ProductionDataManager()
+    assert reopened.get_onboarding_data() == {}
+
+
+def test_corrupt_legacy_file_imported_on_next_start(workdir, sentinel):
+    write_legacy(workdir, "cycles.json", {"onboarding_a@example.com": {"current_week": 2}})
+    (workdir / "data" / "users.json").write_text('{"a@example.com": {"name": ', encoding="utf-8")
+
+    manager = sentinel.ProductionDataManager()
+    assert manager.get_user_data() == {}
+    assert manager.get_cycle("onboarding_a@example.com") == {"current_week": 2}
+    manager._conn.close()
+
+    write_legacy(workdir, "users.json", {"a@example.com": {"name": "A"}})
+    reopened = sentinel.ProductionDataManager()
+    assert reopened.get_user("a@example.com") == {"name": "A"}
+
+
+def test_replace_store_drops_missing_keys(manager):
+    manager.save_cycles_data({"onboarding_a@example.com": {"current_week": 1},
+                              "onboarding_b@example.com": {"current_week": 2}})
+    manager.save_cycle("onboarding_c@example.com", {"current_week": 3})
+    manager.save_user("a@example.com", {"name": "A"})
+
+    manager.save_cycles_data({"onboarding_b@example.com": {"current_week": 9}})
+    assert manager.get_cycles_data() == {"onboarding_b@example.com": {"current_week": 9}}
+    assert manager.get_user("a@example.com") == {"name": "A"}
+
+
+def test_save_analysis_data_replaces_results_and_meta(manager):
+    manager.save_analysis_data({"last_analysis": "old", "results": {"onboarding_a@example.com": {"score": 1}}})
+    manager.save_analysis_data({"total_analyzed": 1, "results": {"onboarding_b@example.com": {"score": 2}}})
+
+    assert manager.get_analysis_data() == {
+        "total_analyzed": 1,
+        "results": {"onboarding_b@example.com": {"score": 2}},
+    }
+
+
+def test_writes_invalidate_context_cache(manager, sentinel):
+    cache = sentinel.user_context_cache
+    cache.set("a@example.com", {"user": {"name": "old"}}, cache.version)
+    manager.save_onboarding_profile("onboarding_a@example.com", {"name": "A"})
+    assert cache.get("a@example.com") is None
+
+    cache.set("a@example.com", {"user": {"name": "old"}}, cache.version)
+    manager.save_user_data({})
+    assert cache.get("a@example.com") is None
@@ -0,0 +1,60 @@
+"""
+Tests for the compiled intent matcher.
+"""
+import random
+
+import pytest
+
+from backend.intent_engine import INTENT_KEYWORDS, IntentEngine
+
+
+def sequential_intent(message):
+    """The original substring chain the automaton replaces"""
+    msg = message.lower()
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(keyword in msg for keyword in keywords):
+            return intent
+    return "UNKNOWN"
+
+
+@pytest.fixture
+def engine(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    return IntentEngine(log_path=str(tmp_path / "intent_log.jsonl"))
+
+
+def test_keyword_priority_matches_sequential_chain(engine):
+    words = [keyword for _, keywords in INTENT_KEYWORDS for keyword in keywords] + ["hei", "rahaa"]
+    rng = random.Random(7)
+    for _ in range(2000):
+        message = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 4)))
+        expected = sequential_intent(message)
+        if expected != "UNKNOWN":
+            assert engine.detect_intent(message) == expected, message
+
+
+def test_intent_and_slots_in_one_pass(engine):
+    result = engine.analyze("Tavoite 20000 euroa")
+    assert (result.intent, result.confidence, result.slots) == ("SET_GOAL", 1.0, {"amount": 20000})
+    assert engine.extract_parameters("viikko 3", "WEEK") == {"week": 3}
+
+
+def test_model_handles_inflected_forms_without_llm(engine, monkeypatch):
+    monkeypatch.setattr(engine, "openai_intent", lambda message: pytest.fail("LLM called"))
+    engine.openai_key = "test"
+    assert engine.detect_intent("näytä tuloni") == "INCOME"
+
+
+def test_llm_only_below_threshold_and_cached(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(engine, "openai_intent", lambda message: calls.append(message) or "MOTIVATE")
+    engine.openai_key = "test"
+
+    assert engine.detect_intent("kerro jotain kannustavaa") == "MOTIVATE"
+    assert engine.detect_intent("Kerro jotain kannustavaa ") == "MOTIVATE"
+    assert engine.detect_intent("/help") == "HELP"
+    assert len(calls) == 1
+
+    # LLM answers are logged and feed the local model on retrain
+    engine.retrain()
+    assert engine.model.predict("kerro jotain kannustavaa")[0] == "MOTIVATE"
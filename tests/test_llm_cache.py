@@ -0,0 +1,102 @@
+"""
+Tests for the LLM response cache against a local fake OpenAI server.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from backend.llm_cache import LLMResponseCache
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeOpenAIHandler.requests.append((self.path, body))
+        time.sleep(0.1)
+        if self.path.endswith("/chat/completions"):
+            choice = {"index": 0, "message": {"role": "assistant", "content": f"vastaus {len(self.requests)}"}}
+        else:
+            choice = {"index": 0, "text": " HELP"}
+        payload = json.dumps({"id": "x", "object": "response", "choices": [choice]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    FakeOpenAIHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(openai, "api_base", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setattr(openai, "api_key", "test")
+    yield FakeOpenAIHandler.requests
+    server.shutdown()
+
+
+def messages(text):
+    return [{"role": "system", "content": "Olet talousneuvoja."}, {"role": "user", "content": text}]
+
+
+def test_normalized_prompts_share_a_cached_response(fake_openai):
+    cache = LLMResponseCache()
+    first = cache.chat_completion(messages("Miten säästän enemmän?"))
+    second = cache.chat_completion(messages("  miten   säästän ENEMMÄN? "))
+
+    assert first == second
+    assert len(fake_openai) == 1
+    assert cache.completion("Mikä intentti?").strip() == "HELP"
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_concurrent_identical_prompts_make_one_upstream_call(fake_openai):
+    cache = LLMResponseCache()
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(lambda _: cache.chat_completion(messages("Anna vinkki")), range(8)))
+
+    assert len(set(replies)) == 1
+    assert len(fake_openai) == 1
+    stats = cache.get_stats()
+    assert stats["misses"] == 1 and stats["hits"] + stats["coalesced"] == 7
+
+
+def test_ttl_and_size_bound(fake_openai):
+    cache = LLMResponseCache(max_entries=2, ttl_seconds=60)
+    for text in ("a", "b", "c", "a"):
+        cache.chat_completion(messages(text))
+    assert len(fake_openai) == 4  # "a" was evicted by "c"
+
+    cache.ttl_seconds = 0
+    cache.chat_completion(messages("a"))
+    assert len(fake_openai) == 5
+
+
+def test_errors_are_not_cached():
+    cache = LLMResponseCache()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("upstream down")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            cache.get_or_call("key", failing)
+    assert len(calls) == 2 and cache.get_stats()["errors"] == 2
+
+
+def test_render_app_uses_the_shared_cache(sentinel):
+    assert sentinel.LLMResponseCache is LLMResponseCache
+    assert isinstance(sentinel.llm_response_cache, LLMResponseCache)
@@ -0,0 +1,147 @@
+"""
+Tests that the vectorized night analysis matches the per-user analysis it replaced.
+"""
+import pytest
+
+RISK_LEVELS = ("Low", "Medium", "High", "Critical")
+
+
+def per_user_analysis(sentinel, system, user_email):
+    """The previous run_night_analysis body for one user, over the enhanced context"""
+    context = sentinel.RenderUserContextManager(user_email).get_enhanced_context()
+    current_savings = context.get("current_savings", 0)
+    savings_goal = context.get("savings_goal", 100000)
+    monthly_income = context.get("monthly_income", 0)
+    monthly_expenses = context.get("monthly_expenses", 0)
+    current_week = context.get("current_week", 1)
+    weekly_target = context.get("target_income_weekly", 300)
+
+    savings_ratio = current_savings / savings_goal if savings_goal > 0 else 0
+    expense_ratio = monthly_expenses / monthly_income if monthly_income > 0 else 1
+    week_progress = current_week / 7
+    risk_score = 0
+    if savings_ratio < 0.1:
+        risk_score += 3
+    elif savings_ratio < 0.3:
+        risk_score += 2
+    elif savings_ratio < 0.5:
+        risk_score += 1
+    if expense_ratio > 0.9:
+        risk_score += 3
+    elif expense_ratio > 0.8:
+        risk_score += 2
+    elif expense_ratio > 0.7:
+        risk_score += 1
+    if week_progress > 0.5 and savings_ratio < 0.2:
+        risk_score += 2
+    risk_level = RISK_LEVELS[3 if risk_score >= 6 else 2 if risk_score >= 4 else 1 if risk_score >= 2 else 0]
+
+    if current_week == 1:
+        performance = "not_started"
+    elif current_savings >= weekly_target * current_week:
+        performance = "excellent"
+    elif current_savings >= weekly_target * current_week * 0.8:
+        performance = "good"
+    elif current_savings >= weekly_target * current_week * 0.6:
+        performance = "fair"
+    else:
+        performance = "poor"
+
+    required_weekly = (savings_goal - current_savings) / max(1, 7 - current_week)
+    if required_weekly > weekly_target * 1.2:
+        adjustments = {"increase_target": True, "new_target": min(required_weekly, weekly_target * 1.5),
+                       "reason": "Tavoite vaarassa - lisää viikkotavoitetta"}
+    elif required_weekly < weekly_target * 0.8:
+        adjustments = {"decrease_target": True, "new_target": max(required_weekly, 200),
+                       "reason": "Tavoite saavutettavissa - optimoi strategiaa"}
+    else:
+        adjustments = {"maintain_target": True, "current_target": weekly_target,
+                       "reason": "Olet hyvällä tiellä - jatka samaan malliin"}
+
+    return {
+        "user_id": f"onboarding_{user_email}",
+        "goal_progress": (current_savings / savings_goal * 100) if savings_goal > 0 else 0,
+        "current_week": current_week,
+        "weekly_performance": performance,
+        "risk_level": risk_level,
+        "watchdog_state": system._determine_watchdog_state(context, risk_level),
+        "ai_recommendations": system._generate_ai_recommendations(context, risk_level),
+        "next_week_adjustments": adjustments,
+        "strategy_updated": True,
+        "emergency_actions": system._get_emergency_actions(context, risk_level),
+    }
+
+
+def per_user_results(sentinel, system, emails):
+    results = {}
+    for email in emails:
+        try:
+            results[f"onboarding_{email}"] = per_user_analysis(sentinel, system, email)
+        except Exception:
+            continue
+    return results
+
+
+@pytest.fixture
+def manager(sentinel, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = sentinel.ProductionDataManager()
+    monkeypatch.setattr(sentinel, "data_manager", manager)
+    sentinel.user_context_cache.clear()
+    return manager
+
+
+def seed(manager):
+    cycles = [{"week": week, "savings_target": 300 + 50 * week} for week in range(1, 8)]
+    profiles = {
+        "saver@example.com": ({"current_savings": 60000, "savings_goal": 100000, "monthly_income": 5000,
+                               "monthly_expenses": 2000}, {"current_week": 3, "cycles": cycles}),
+        "risky@example.com": ({"current_savings": 500, "savings_goal": 100000, "monthly_income": 2000,
+                               "monthly_expenses": 1950}, {"current_week": 6, "cycles": cycles}),
+        "middle@example.com": ({"current_savings": 1800, "savings_goal": 4000, "monthly_income": 3000,
+                                "monthly_expenses": 2300}, {"current_week": 4, "cycles": cycles}),
+        "newbie@example.com": ({"current_savings": 100.5, "savings_goal": 0, "monthly_income": 0,
+                                "monthly_expenses": 0}, {"current_week": 1, "cycles": cycles}),
+        "nocycle@example.com": ({"current_savings": 2500}, {}),
+        "noprofile@example.com": (None, None),
+        "badweek@example.com": ({"current_savings": 100}, {"current_week": None, "cycles": cycles}),
+        "badsavings@example.com": ({"current_savings": "lots"}, {"current_week": 2}),
+        "badtarget@example.com": ({"current_savings": 100},
+                                  {"current_week": 1, "cycles": [{"savings_target": None}]}),
+    }
+    for email, (profile, cycle) in profiles.items():
+        manager.save_user(email, {"email": email})
+        if profile is not None:
+            manager.save_onboarding_profile(f"onboarding_{email}", profile)
+        if cycle is not None:
+            manager.save_cycle(f"onboarding_{email}", cycle)
+    return list(profiles)
+
+
+def test_batch_matches_per_user_analysis(sentinel, manager):
+    emails = seed(manager)
+    system = sentinel.ProductionAnalysisSystem()
+    expected = per_user_results(sentinel, system, emails)
+    assert set(expected) == {f"onboarding_{email}" for email in emails[:6]}
+
+    summary = system.run_night_analysis_batch()
+
+    results = manager.load_store(manager.ANALYSIS_RESULTS)
+    for result in results.values():
+        result.pop("analysis_timestamp")
+    assert results == expected
+    assert summary["users_analyzed"] == 6
+    assert sorted(summary["users_skipped"]) == [
+        "badsavings@example.com", "badtarget@example.com", "badweek@example.com"
+    ]
+
+
+def test_malformed_profile_keeps_previous_result(sentinel, manager):
+    manager.save_user("a@example.com", {})
+    manager.save_cycle("onboarding_a@example.com", {"current_week": "kolme"})
+    manager.save_analysis_result("onboarding_a@example.com", {"risk_level": "Low"})
+
+    summary = sentinel.ProductionAnalysisSystem().run_night_analysis_batch()
+    assert summary["users_analyzed"] == 0
+    assert summary["users_skipped"] == ["a@example.com"]
+    assert manager.get_analysis_result("onboarding_a@example.com") == {"risk_level": "Low"}
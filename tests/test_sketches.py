@@ -0,0 +1,95 @@
+"""
+Accuracy and window expiry tests for the analytics sketches.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def clock(sentinel, monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(sentinel.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize("cardinality", [10, 1000, 4096, 20000, 50000])
+def test_hyperloglog_within_error_bound(sentinel, cardinality):
+    hll = sentinel.HyperLogLog()
+    for i in range(cardinality):
+        hll.add(f"user_{i}")
+        hll.add(f"user_{i}")  # duplicates do not count
+
+    # p=12: standard error 1.04 / sqrt(4096) ~ 1.6 %, allow three standard errors
+    assert abs(hll.count() - cardinality) <= max(1, 0.049 * cardinality)
+
+
+def test_hyperloglog_merge_and_serialization(sentinel):
+    first, second = sentinel.HyperLogLog(), sentinel.HyperLogLog()
+    for i in range(30000):
+        first.add(str(i))
+    for i in range(20000, 50000):
+        second.add(str(i))
+
+    restored = sentinel.HyperLogLog.from_base64(first.to_base64())
+    assert restored.count() == first.count()
+    restored.merge(second)
+    assert abs(restored.count() - 50000) <= 0.049 * 50000
+
+
+def test_histogram_percentiles_within_precision(sentinel):
+    values = np.random.default_rng(7).lognormal(mean=-1, sigma=1, size=20000)
+    histogram = sentinel.ResponseTimeHistogram(precision=0.02)
+    for value in values:
+        histogram.record(float(value))
+
+    for p in (50, 90, 95, 99):
+        exact = float(np.percentile(values, p, method="inverted_cdf"))
+        assert histogram.percentile(p) == pytest.approx(exact, rel=0.02)
+    assert histogram.percentile(100) == pytest.approx(values.max())
+    assert histogram.mean() == pytest.approx(values.mean())
+
+
+def test_rolling_histogram_expires_old_minutes(sentinel, clock):
+    rolling = sentinel.RollingHistogram(window_seconds=3600, slot_seconds=60)
+    rolling.record(5.0)
+    clock[0] += 30 * 60
+    rolling.record(1.0)
+
+    assert rolling.snapshot().total == 2
+    clock[0] += 30 * 60  # the first slot has left the hour window
+    snapshot = rolling.snapshot()
+    assert snapshot.total == 1
+    assert snapshot.max == 1.0
+
+    clock[0] += 3600
+    assert rolling.snapshot().total == 0
+
+
+def test_rolling_histogram_reuses_slots_after_wraparound(sentinel, clock):
+    rolling = sentinel.RollingHistogram(window_seconds=600, slot_seconds=60)
+    for minute in range(25):
+        rolling.record(0.1 * (minute + 1))
+        clock[0] += 60
+
+    snapshot = rolling.snapshot()
+    assert snapshot.total == 9  # minutes 16-24; the current minute is still empty
+    assert snapshot.max == pytest.approx(2.5)
+    assert len(rolling._ring) == 10
+
+
+def test_active_users_by_day(sentinel, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    today = date.today()
+    analytics = sentinel.SentinelAnalytics()
+    for offset in range(12):
+        day = (today - timedelta(days=offset)).isoformat()
+        for user in range(10 * (offset + 1)):
+            analytics._mark_active(f"user_{offset}_{user}", day)
+
+    assert len(analytics.active_users) == analytics.active_days_kept
+    assert min(analytics.active_users) == (today - timedelta(days=6)).isoformat()
+    assert analytics._count_active(1) == 10
+    assert analytics._count_active(2) == 30
+    assert abs(analytics._count_active(7) - sum(10 * (offset + 1) for offset in range(7))) <= 8
@@ -0,0 +1,145 @@
+"""
+Tests for the Telegram webhook update pipeline.
+"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def analytics(sentinel, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    analytics = sentinel.SentinelAnalytics()
+    monkeypatch.setattr(sentinel, "analytics", analytics)
+    return analytics
+
+
+@pytest.fixture
+def replies(sentinel, monkeypatch):
+    """Record built replies instead of touching storage, support or OpenAI"""
+    built = []
+
+    def build(update):
+        built.append(update.update_id)
+        return None
+
+    monkeypatch.setattr(sentinel, "build_telegram_reply", build)
+    return built
+
+
+def webhook(sentinel):
+    """The POST /telegram/webhook handler FastAPI dispatches to (a later legacy function reuses the name)"""
+    return next(route.endpoint for route in sentinel.app.routes
+                if getattr(route, "path", None) == "/telegram/webhook" and "POST" in route.methods)
+
+
+def update(sentinel, update_id):
+    return sentinel.TelegramUpdate(update_id=update_id, message={"chat": {"id": 1}, "text": "moi"})
+
+
+def test_redelivered_update_processed_once(sentinel, analytics, replies):
+    pipeline = sentinel.TelegramUpdatePipeline(workers=2)
+
+    async def scenario():
+        statuses = [pipeline.submit(update(sentinel, update_id)) for update_id in (1, 2, 1, 2, 3)]
+        await pipeline.stop()
+        return statuses
+
+    assert asyncio.run(scenario()) == ["queued", "queued", "duplicate", "duplicate", "queued"]
+    assert sorted(replies) == [1, 2, 3]
+    assert pipeline.stats["duplicates"] == 2
+    assert pipeline.stats["processed"] == 3
+
+
+def test_dedup_window_is_bounded(sentinel, analytics, replies):
+    pipeline = sentinel.TelegramUpdatePipeline(workers=1, dedup_window=2)
+
+    async def scenario():
+        statuses = [pipeline.submit(update(sentinel, update_id)) for update_id in (1, 2, 3, 1)]
+        await pipeline.stop()
+        return statuses
+
+    assert asyncio.run(scenario()) == ["queued", "queued", "queued", "queued"]
+
+
+def test_full_queue_returns_503_and_allows_redelivery(sentinel, analytics, replies, monkeypatch):
+    pipeline = sentinel.TelegramUpdatePipeline(workers=0, queue_size=1)
+    monkeypatch.setattr(sentinel, "telegram_pipeline", pipeline)
+
+    endpoint = webhook(sentinel)
+
+    async def scenario():
+        accepted = await endpoint(update(sentinel, 1))
+        with pytest.raises(HTTPException) as rejected:
+            await endpoint(update(sentinel, 2))
+        pipeline._queue.get_nowait()
+        pipeline._queue.task_done()
+        redelivered = await endpoint(update(sentinel, 2))
+        await pipeline.stop(drain_timeout=0)
+        return accepted, rejected.value, redelivered
+
+    accepted, rejected, redelivered = asyncio.run(scenario())
+    assert accepted["message"] == "Update queued"
+    assert rejected.status_code == 503
+    assert redelivered["message"] == "Update queued"
+    assert pipeline.stats["dropped"] == 1
+    assert analytics.data["counters"]["errors"] == 1
+
+
+def test_shared_session_closed_on_shutdown(sentinel, analytics, replies):
+    pipeline = sentinel.TelegramUpdatePipeline(workers=2)
+
+    async def scenario():
+        pipeline.start()
+        session = await pipeline._get_session()
+        assert await pipeline._get_session() is session
+        await pipeline.stop()
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.closed
+    assert pipeline._session is None
+    assert pipeline.get_stats()["workers"] == 0
+
+
+def test_request_counter_is_thread_safe(analytics):
+    def count():
+        for _ in range(2000):
+            analytics.track_request()
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert analytics.data["system_health"]["total_requests"] == 16000
+
+
+def test_concurrent_replies_keep_learning_data_consistent(sentinel, analytics, monkeypatch):
+    engine = sentinel.AILearningEngine()
+    engine.save_interval = 60
+    engine._last_save = time.monotonic()
+    monkeypatch.setattr(sentinel, "ai_learning_engine", engine)
+
+    def work(user_id):
+        for _ in range(50):
+            sentinel.track_telegram_reply(
+                {"user_id": user_id, "username": f"user{user_id}", "message": "moi", "support": False}, 0.1
+            )
+
+    threads = [threading.Thread(target=work, args=(user_id % 4,)) for user_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Replies are batched into periodic saves, not one file rewrite each
+    assert not engine.learning_data_file.exists()
+    engine.save_learning_data()
+
+    stored = json.loads(engine.learning_data_file.read_text(encoding="utf-8"))
+    assert sum(prefs["interaction_count"] for prefs in stored["user_preferences"].values()) == 400
+    assert [path.name for path in engine.learning_data_file.parent.glob("*.tmp")] == []
@@ -0,0 +1,85 @@
+"""
+Tests for the per-user context cache used by RenderUserContextManager.
+"""
+import pytest
+
+
+@pytest.fixture
+def clock(sentinel, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sentinel.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def manager(sentinel, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = sentinel.ProductionDataManager()
+    monkeypatch.setattr(sentinel, "data_manager", manager)
+    sentinel.user_context_cache.clear()
+    return manager
+
+
+def test_entries_expire_after_ttl(sentinel, clock):
+    cache = sentinel.UserContextCache(ttl_seconds=60)
+    cache.set("a@example.com", {"profile": {"name": "A"}}, cache.version)
+
+    clock[0] += 59
+    assert cache.get("a@example.com") == {"profile": {"name": "A"}}
+    clock[0] += 2
+    assert cache.get("a@example.com") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_evicted(sentinel):
+    cache = sentinel.UserContextCache(max_entries=2)
+    cache.set("a", {"n": 1}, cache.version)
+    cache.set("b", {"n": 2}, cache.version)
+    cache.get("a")
+    cache.set("c", {"n": 3}, cache.version)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"n": 1}
+    assert cache.get("c") == {"n": 3}
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_stale_load_not_cached_after_write(sentinel):
+    cache = sentinel.UserContextCache()
+    version = cache.version
+    cache.invalidate(["onboarding_a@example.com"])
+    cache.set("a@example.com", {"profile": {"name": "old"}}, version)
+    assert cache.get("a@example.com") is None
+
+
+def test_returned_slices_are_copies(sentinel):
+    cache = sentinel.UserContextCache()
+    value = {"profile": {"skills": ["Myynti"]}}
+    cache.set("a@example.com", value, cache.version)
+    value["profile"]["skills"].append("UI/UX")
+
+    first = cache.get("a@example.com")
+    first["profile"]["skills"].append("Valokuvaus")
+    assert cache.get("a@example.com") == {"profile": {"skills": ["Myynti"]}}
+
+
+def test_context_manager_sees_saved_profile(sentinel, manager):
+    manager.save_onboarding_profile("onboarding_a@example.com", {"name": "A", "current_savings": 100})
+    assert sentinel.RenderUserContextManager("a@example.com").profile["current_savings"] == 100
+    assert sentinel.user_context_cache.get("a@example.com") is not None
+
+    manager.save_onboarding_profile("onboarding_a@example.com", {"name": "A", "current_savings": 250})
+    assert sentinel.user_context_cache.get("a@example.com") is None
+    assert sentinel.RenderUserContextManager("a@example.com").profile["current_savings"] == 250
+
+
+def test_context_manager_mutation_does_not_leak(sentinel, manager):
+    manager.save_cycle("onboarding_a@example.com", {"current_week": 2})
+    context = sentinel.RenderUserContextManager("a@example.com")
+    context.cycles["current_week"] = 7
+    context.get_enhanced_context()["latest_analysis"]["risk_level"] = "high"
+
+    fresh = sentinel.RenderUserContextManager("a@example.com")
+    assert fresh.cycles == {"current_week": 2}
+    assert fresh.analysis == {}
+    assert manager.get_cycle("onboarding_a@example.com") == {"current_week": 2}